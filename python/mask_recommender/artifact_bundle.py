@@ -0,0 +1,233 @@
+"""
+Single-file binary artifact for a custom_lr model.
+
+Holds the same data as custom_model_params.pt, custom_model_metadata.json and
+custom_mask_data.json, laid out so inference can ``np.memmap`` it and read the
+arrays in place instead of unpickling tensors and parsing JSON:
+
+    magic (8 bytes) | version (uint32 LE) | header length (uint32 LE)
+    header (UTF-8 JSON, padded to a 64-byte boundary)
+    array data, each array starting on a 64-byte boundary
+
+The header carries the model metadata, the dtype/shape/offset of every array,
+and how each mask_data attribute is encoded column-wise:
+
+- ``number``: float64 values (+ null flags when any value is None)
+- ``string``: int32 codes into a dictionary stored in the header (-1 = None)
+- ``json``: anything else, kept as a JSON list in the header
+
+Parameters are stored as float32 under their saved names (alpha_mask_raw, ...).
+"""
+
+import json
+import struct
+from collections.abc import Mapping
+
+import numpy as np
+
+BUNDLE_MAGIC = b'BSCLRBND'
+BUNDLE_VERSION = 1
+BUNDLE_FILENAME = 'custom_model.bundle'
+_PREAMBLE = struct.Struct('<8sII')
+_ALIGNMENT = 64
+_ABSENT = object()
+
+
+def _aligned(offset):
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _is_number(value):
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, (bool, np.bool_))
+
+
+def _to_json_value(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _encode_column(name, values, arrays):
+    present = np.array([value is not _ABSENT for value in values], dtype=np.uint8)
+    values = [None if value is _ABSENT else value for value in values]
+    non_null = [value for value in values if value is not None]
+    spec = {}
+
+    if all(_is_number(value) for value in non_null):
+        spec['kind'] = 'number'
+        spec['integer'] = bool(non_null) and all(isinstance(value, (int, np.integer)) for value in non_null)
+        arrays[f'columns/{name}/values'] = np.array(
+            [np.nan if value is None else float(value) for value in values],
+            dtype=np.float64,
+        )
+        nulls = np.array([value is None for value in values], dtype=np.uint8)
+        if nulls.any():
+            arrays[f'columns/{name}/null'] = nulls
+    elif all(isinstance(value, str) for value in non_null):
+        dictionary = sorted(set(non_null))
+        lookup = {entry: idx for idx, entry in enumerate(dictionary)}
+        spec['kind'] = 'string'
+        spec['dictionary'] = dictionary
+        arrays[f'columns/{name}/codes'] = np.array(
+            [-1 if value is None else lookup[value] for value in values],
+            dtype=np.int32,
+        )
+    else:
+        spec['kind'] = 'json'
+        spec['values'] = [_to_json_value(value) for value in values]
+
+    if not present.all():
+        arrays[f'columns/{name}/present'] = present
+    return spec
+
+
+def write_custom_lr_bundle(path, params, metadata, mask_data):
+    """Write params, metadata and mask_data into one bundle file at ``path``."""
+    arrays = {}
+    for name, value in params.items():
+        if hasattr(value, 'detach'):
+            value = value.detach().cpu().numpy()
+        arrays[f'params/{name}'] = np.ascontiguousarray(value, dtype=np.float32)
+
+    records = list(mask_data.items())
+    arrays['mask_ids'] = np.array([int(mask_id) for mask_id, _ in records], dtype=np.int64)
+    column_names = []
+    for _, mask_info in records:
+        for key in mask_info:
+            if key not in column_names:
+                column_names.append(key)
+    columns = {
+        name: _encode_column(name, [mask_info.get(name, _ABSENT) for _, mask_info in records], arrays)
+        for name in column_names
+    }
+
+    array_specs = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = _aligned(offset)
+        array_specs[name] = {
+            'dtype': array.dtype.str,
+            'shape': list(array.shape),
+            'offset': offset,
+        }
+        offset += array.nbytes
+
+    header = json.dumps({
+        'metadata': metadata,
+        'param_names': list(params),
+        'columns': columns,
+        'arrays': array_specs,
+    }).encode('utf-8')
+    data_start = _aligned(_PREAMBLE.size + len(header))
+
+    with open(path, 'wb') as handle:
+        handle.write(_PREAMBLE.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(header)))
+        handle.write(header)
+        handle.write(b'\0' * (data_start - _PREAMBLE.size - len(header)))
+        for name, array in arrays.items():
+            position = data_start + array_specs[name]['offset']
+            handle.write(b'\0' * (position - handle.tell()))
+            handle.write(array.tobytes())
+    return path
+
+
+class _Column:
+    def __init__(self, spec, arrays, name):
+        self.kind = spec['kind']
+        self.integer = spec.get('integer', False)
+        self.dictionary = spec.get('dictionary')
+        self.json_values = spec.get('values')
+        self.values = arrays.get(f'columns/{name}/values')
+        self.null = arrays.get(f'columns/{name}/null')
+        self.codes = arrays.get(f'columns/{name}/codes')
+        self.present = arrays.get(f'columns/{name}/present')
+
+    def is_present(self, row):
+        return self.present is None or bool(self.present[row])
+
+    def value(self, row):
+        if self.kind == 'number':
+            if self.null is not None and self.null[row]:
+                return None
+            value = float(self.values[row])
+            return int(value) if self.integer else value
+        if self.kind == 'string':
+            code = int(self.codes[row])
+            return None if code < 0 else self.dictionary[code]
+        return self.json_values[row]
+
+
+class BundleMaskRecord(Mapping):
+    """Read-only mask_info view over one row of the bundle's columns."""
+
+    __slots__ = ('_columns', '_row')
+
+    def __init__(self, columns, row):
+        self._columns = columns
+        self._row = row
+
+    def __getitem__(self, key):
+        column = self._columns[key]
+        if not column.is_present(self._row):
+            raise KeyError(key)
+        return column.value(self._row)
+
+    def __iter__(self):
+        return (name for name, column in self._columns.items() if column.is_present(self._row))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class BundleMaskData(Mapping):
+    """mask_data-compatible mapping (str mask id -> mask_info) backed by the bundle."""
+
+    def __init__(self, mask_ids, columns):
+        self.mask_ids = mask_ids
+        self._columns = columns
+        self._rows = {str(int(mask_id)): row for row, mask_id in enumerate(mask_ids)}
+
+    def __getitem__(self, key):
+        return BundleMaskRecord(self._columns, self._rows[str(key)])
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+
+class CustomLrBundle:
+    def __init__(self, version, params, metadata, mask_data):
+        self.version = version
+        self.params = params
+        self.metadata = metadata
+        self.mask_data = mask_data
+
+
+def load_custom_lr_bundle(path):
+    """Memory-map a bundle; parameter and column arrays are read-only views into the file."""
+    with open(path, 'rb') as handle:
+        magic, version, header_length = _PREAMBLE.unpack(handle.read(_PREAMBLE.size))
+        if magic != BUNDLE_MAGIC:
+            raise ValueError(f"{path} is not a custom_lr bundle")
+        if version != BUNDLE_VERSION:
+            raise ValueError(f"Unsupported custom_lr bundle version {version} (expected {BUNDLE_VERSION})")
+        header = json.loads(handle.read(header_length).decode('utf-8'))
+
+    data_start = _aligned(_PREAMBLE.size + header_length)
+    buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    arrays = {
+        name: np.ndarray(
+            tuple(spec['shape']),
+            dtype=np.dtype(spec['dtype']),
+            buffer=buffer,
+            offset=data_start + spec['offset'],
+        )
+        for name, spec in header['arrays'].items()
+    }
+
+    params = {name: arrays[f'params/{name}'] for name in header['param_names']}
+    columns = {name: _Column(spec, arrays, name) for name, spec in header['columns'].items()}
+    mask_data = BundleMaskData(arrays['mask_ids'], columns)
+    return CustomLrBundle(version, params, header['metadata'], mask_data)
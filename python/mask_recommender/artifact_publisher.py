@@ -0,0 +1,183 @@
+"""
+Concurrent S3 publisher for training artifacts.
+
+One ``ArtifactPublisher`` owns a single boto3 S3 client (clients are thread
+safe) and a thread pool. ``upload_file``, ``put_bytes`` and ``put_json`` start
+an upload and return a Future of its ``s3://`` URI right away, so a training
+run can queue params, mask data, metrics, metadata and the bundle and let
+them upload in parallel. Files go through ``upload_file`` with a
+``TransferConfig``, which switches to concurrent multipart uploads above
+``MULTIPART_THRESHOLD``.
+
+``copy`` publishes an alias of an uploaded object (e.g. a ``*_latest`` key)
+with a server-side copy once the source upload finishes, instead of sending
+the bytes again. ``publish_pointer`` waits for every required upload before
+it writes the pointer object, so a reader that follows the pointer never
+sees a key that does not exist yet.
+"""
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+
+try:
+    from timing_stats import TimingStats
+except ModuleNotFoundError:
+    from mask_recommender.timing_stats import TimingStats  # type: ignore
+
+DEFAULT_UPLOAD_WORKERS = 8
+MULTIPART_THRESHOLD = 16 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 16 * 1024 * 1024
+TRANSFER_MAX_CONCURRENCY = 4
+
+
+def default_transfer_config():
+    return TransferConfig(
+        multipart_threshold=MULTIPART_THRESHOLD,
+        multipart_chunksize=MULTIPART_CHUNKSIZE,
+        max_concurrency=TRANSFER_MAX_CONCURRENCY,
+        use_threads=True,
+    )
+
+
+class ArtifactPublisher:
+    """
+    Uploads artifacts to ``bucket`` concurrently through one S3 client.
+
+    Uploads are required by default: ``wait`` and ``publish_pointer`` raise
+    the first failure once every upload has finished. ``required=False``
+    uploads (previews, diagnostics) are left out of that check; callers read
+    their Future themselves.
+    """
+
+    def __init__(
+        self,
+        bucket,
+        region=None,
+        client=None,
+        max_workers=DEFAULT_UPLOAD_WORKERS,
+        transfer_config=None,
+    ):
+        self.bucket = bucket
+        self.client = client if client is not None else boto3.client('s3', region_name=region)
+        self.transfer_config = transfer_config or default_transfer_config()
+        self.timing_stats = TimingStats({'operations': 0, 'bytes': 0, 'seconds': 0.0, 'copies': 0})
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='artifact-upload')
+        self._lock = threading.Lock()
+        self._latest = {}
+        self._required = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def uri(self, key):
+        return f"s3://{self.bucket}/{key}"
+
+    def _submit(self, operation, key, fn, size=None, required=True):
+        with self._lock:
+            # A second write to the same key runs after the first one.
+            previous = self._latest.get(key)
+            future = self._executor.submit(self._run, operation, key, fn, size, previous)
+            self._latest[key] = future
+            if required:
+                self._required.append(future)
+        return future
+
+    def _run(self, operation, key, fn, size, previous):
+        # Futures run in submission order, so an earlier write is already running or done.
+        if previous is not None:
+            previous.exception()
+        started = time.perf_counter()
+        try:
+            fn()
+        finally:
+            seconds = time.perf_counter() - started
+            self.timing_stats.record(
+                {'operation': operation, 'key': key, 'bytes': size, 'seconds': seconds},
+                operations=1,
+                bytes=size or 0,
+                seconds=seconds,
+                copies=int(operation == 'copy'),
+            )
+        return self.uri(key)
+
+    def upload_file(self, local_path, key, content_type=None, required=True):
+        extra_args = {'ContentType': content_type} if content_type else None
+        return self._submit(
+            'upload_file',
+            key,
+            lambda: self.client.upload_file(
+                str(local_path),
+                self.bucket,
+                key,
+                ExtraArgs=extra_args,
+                Config=self.transfer_config,
+            ),
+            required=required,
+        )
+
+    def put_bytes(self, key, body, content_type=None, required=True):
+        extra_args = {'ContentType': content_type} if content_type else {}
+        return self._submit(
+            'put_object',
+            key,
+            lambda: self.client.put_object(Bucket=self.bucket, Key=key, Body=body, **extra_args),
+            size=len(body),
+            required=required,
+        )
+
+    def put_json(self, key, payload, required=True):
+        body = json.dumps(payload, indent=2).encode('utf-8')
+        return self.put_bytes(key, body, content_type='application/json', required=required)
+
+    def copy(self, source_key, key, required=True):
+        """Server-side copy of ``source_key`` to ``key`` once ``source_key``'s upload (if queued here) succeeds."""
+        with self._lock:
+            source_future = self._latest.get(source_key)
+
+        def copy_object():
+            if source_future is not None:
+                source_future.result()
+            self.client.copy(
+                {'Bucket': self.bucket, 'Key': source_key},
+                self.bucket,
+                key,
+                Config=self.transfer_config,
+            )
+
+        return self._submit('copy', key, copy_object, required=required)
+
+    def wait(self):
+        """Block until every required upload finishes; raise the first failure."""
+        with self._lock:
+            futures = list(self._required)
+        errors = [future.exception() for future in futures]
+        for error in errors:
+            if error is not None:
+                raise error
+
+    def publish_pointer(self, key, payload):
+        """Write ``payload`` to ``key`` after every required upload has succeeded."""
+        self.wait()
+        uri = self.put_json(key, payload).result()
+        logging.info("Published pointer %s", uri)
+        return uri
+
+    @property
+    def timings(self):
+        """The most recent operations (operation, key, bytes, seconds)."""
+        return self.timing_stats.entries()
+
+    def timing_summary(self):
+        return self.timing_stats.summary()
@@ -0,0 +1,83 @@
+"""
+Timing, peak-memory and regression checks for the benchmark runner.
+
+Each case is timed over ``repeat`` runs without tracing (after ``warmup``
+untimed runs), then run once more under tracemalloc for peak memory.
+tracemalloc sees Python and NumPy allocations; torch's CPU allocator is not
+traced, so torch-heavy cases under-report memory.
+"""
+
+import gc
+import time
+import tracemalloc
+
+import numpy as np
+
+DEFAULT_MAX_P50_REGRESSION = 0.25
+DEFAULT_MAX_MEMORY_REGRESSION = 0.25
+# Cases faster than this are too noisy to gate on a relative p50 change.
+DEFAULT_MIN_P50_MS = 5.0
+
+
+def measure(fn, repeat=5, warmup=1):
+    for _ in range(warmup):
+        fn()
+
+    timings_ms = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        fn()
+        timings_ms.append((time.perf_counter() - started) * 1000.0)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    timings = np.asarray(timings_ms, dtype=np.float64)
+    return {
+        'runs': int(timings.size),
+        'p50_ms': float(np.percentile(timings, 50)),
+        'p95_ms': float(np.percentile(timings, 95)),
+        'min_ms': float(timings.min()),
+        'peak_memory_bytes': int(peak_bytes),
+    }
+
+
+def compare_reports(
+    current,
+    baseline,
+    max_p50_regression=DEFAULT_MAX_P50_REGRESSION,
+    max_memory_regression=DEFAULT_MAX_MEMORY_REGRESSION,
+    min_p50_ms=DEFAULT_MIN_P50_MS,
+):
+    """
+    Regressions of ``current`` against ``baseline`` as readable strings. Only
+    scale/case pairs present in both reports are compared.
+    """
+    regressions = []
+    for scale, cases in current.get('results', {}).items():
+        baseline_cases = baseline.get('results', {}).get(scale, {})
+        for case, result in cases.items():
+            reference = baseline_cases.get(case)
+            if reference is None:
+                continue
+
+            p50_limit = reference['p50_ms'] * (1.0 + max_p50_regression)
+            if result['p50_ms'] > p50_limit and max(result['p50_ms'], reference['p50_ms']) >= min_p50_ms:
+                regressions.append(
+                    f"{scale} {case}: p50 {result['p50_ms']:.1f}ms > {p50_limit:.1f}ms "
+                    f"(baseline {reference['p50_ms']:.1f}ms)"
+                )
+
+            memory_limit = reference['peak_memory_bytes'] * (1.0 + max_memory_regression)
+            if result['peak_memory_bytes'] > memory_limit:
+                regressions.append(
+                    f"{scale} {case}: peak memory {result['peak_memory_bytes']} B > {int(memory_limit)} B "
+                    f"(baseline {reference['peak_memory_bytes']} B)"
+                )
+    return regressions
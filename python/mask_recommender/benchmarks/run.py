@@ -0,0 +1,264 @@
+"""
+Benchmark the recommender hot paths on synthetic data.
+
+    cd python/mask_recommender
+    python -m benchmarks.run --scales 1 10 --output benchmark_report.json
+    python -m benchmarks.run --scales 1 10 --baseline benchmark_report.json
+
+Exits non-zero when a case's p50 or peak memory regresses past the
+thresholds relative to --baseline.
+"""
+
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import torch
+
+try:
+    from benchmarks.harness import (DEFAULT_MAX_MEMORY_REGRESSION, DEFAULT_MAX_P50_REGRESSION, DEFAULT_MIN_P50_MS,
+                                    compare_reports, measure)
+    from benchmarks.synthetic import synthetic_faces, synthetic_fit_tests, synthetic_masks
+    from feature_builder import apply_perimeter_features
+    from inference.lambda_function import MaskRecommenderInference
+    from mask_feature_store import build_mask_feature_store
+    from train import (_compute_top_k_any_fit_probability_metrics, _compute_top_k_hit_rates,
+                       _cross_validate_custom_lr,
+                       _custom_lr_category_metadata, _custom_lr_mask_categories,
+                       _detach_custom_lr_parameters, _initialize_custom_lr_parameters,
+                       attach_mask_empirical_priors_to_masks, calc_preds, compute_mask_empirical_priors,
+                       filter_fit_tests, prep_data_in_torch_with_categories, prepare_training_data)
+except ModuleNotFoundError:
+    from mask_recommender.benchmarks.harness import (  # type: ignore
+        DEFAULT_MAX_MEMORY_REGRESSION,
+        DEFAULT_MAX_P50_REGRESSION,
+        DEFAULT_MIN_P50_MS,
+        compare_reports,
+        measure,
+    )
+    from mask_recommender.benchmarks.synthetic import (  # type: ignore
+        synthetic_faces,
+        synthetic_fit_tests,
+        synthetic_masks,
+    )
+    from mask_recommender.feature_builder import apply_perimeter_features  # type: ignore
+    from mask_recommender.inference.lambda_function import MaskRecommenderInference  # type: ignore
+    from mask_recommender.mask_feature_store import build_mask_feature_store  # type: ignore
+    from mask_recommender.train import (  # type: ignore
+        _compute_top_k_any_fit_probability_metrics,
+        _compute_top_k_hit_rates,
+        _cross_validate_custom_lr,
+        _custom_lr_category_metadata,
+        _custom_lr_mask_categories,
+        _detach_custom_lr_parameters,
+        _initialize_custom_lr_parameters,
+        attach_mask_empirical_priors_to_masks,
+        calc_preds,
+        compute_mask_empirical_priors,
+        filter_fit_tests,
+        prep_data_in_torch_with_categories,
+        prepare_training_data,
+    )
+
+CASES = [
+    'apply_perimeter_features',
+    'prepare_training_data',
+    'prep_data_in_torch_with_categories',
+    'calc_preds',
+    'recommend_masks_custom',
+    'compute_top_k_hit_rates',
+    'compute_top_k_any_fit_probability_metrics',
+    'cross_validate_custom_lr',
+    'cross_validate_custom_lr_batched',
+]
+
+
+class InMemoryRecommender(MaskRecommenderInference):
+    """The inference Lambda's recommender with artifacts handed in instead of read from S3."""
+
+    def __init__(self, params, metadata, mask_data):
+        self._artifacts = (params, metadata, mask_data)
+        super().__init__()
+
+    def load_custom_model(self, force=False):
+        self.custom_params, self.custom_metadata, self.custom_mask_data = self._artifacts
+        self.custom_last_loaded_at = time.time()
+
+    def refresh_custom_model(self):
+        return False
+
+
+def _mask_data(masks):
+    return {
+        str(int(row['id'])): {
+            'id': int(row['id']),
+            'fit_family_id': int(row['fit_family_id']),
+            'unique_internal_model_code': row['unique_internal_model_code'],
+            'perimeter_mm': row['perimeter_mm'],
+            'strap_type': row['strap_type'],
+            'style': row['style'],
+        }
+        for row in masks.to_dict('records')
+    }
+
+
+def build_cases(scale, seed=0, cv_epochs=20, cv_folds=5):
+    """Callables for every case at ``scale``, sharing one set of synthetic inputs."""
+    masks = synthetic_masks(scale=scale, seed=seed)
+    fit_tests = synthetic_fit_tests(masks, scale=scale, seed=seed)
+    priors = compute_mask_empirical_priors(filter_fit_tests(fit_tests))
+    mask_features = build_mask_feature_store(attach_mask_empirical_priors_to_masks(masks, priors))
+
+    def prepare():
+        return prepare_training_data(fit_tests, mask_empirical_priors=priors, mask_features=mask_features)
+
+    cleaned = prepare().reset_index(drop=True)
+    metadata = _custom_lr_category_metadata(cleaned)
+
+    def prep():
+        return prep_data_in_torch_with_categories(
+            cleaned,
+            mask_categories=_custom_lr_mask_categories(metadata),
+            style_categories=metadata['style_categories'],
+            strap_categories=metadata['strap_type_categories'],
+        )
+
+    data = prep()
+    torch.manual_seed(seed)
+    params = _initialize_custom_lr_parameters(metadata)
+    with torch.no_grad():
+        probabilities = calc_preds(data, params).squeeze(1).numpy()
+    labels = cleaned['qlft_pass_normalized'].to_numpy(dtype=float)
+
+    recommender = InMemoryRecommender(_detach_custom_lr_parameters(params), metadata, _mask_data(masks))
+    face = synthetic_faces(1, seed=seed).iloc[0].to_dict()
+
+    def predict():
+        with torch.no_grad():
+            return calc_preds(data, params)
+
+    def cross_validate(batched=False):
+        return _cross_validate_custom_lr(
+            cleaned,
+            metadata,
+            epochs=cv_epochs,
+            learning_rate=0.01,
+            class_weighting=False,
+            num_folds=cv_folds,
+            random_seed=seed,
+            batched=batched,
+        )
+
+    cases = {
+        'apply_perimeter_features': lambda: apply_perimeter_features(fit_tests),
+        'prepare_training_data': prepare,
+        'prep_data_in_torch_with_categories': prep,
+        'calc_preds': predict,
+        'recommend_masks_custom': lambda: recommender.recommend_masks_custom(face),
+        'compute_top_k_hit_rates': lambda: _compute_top_k_hit_rates(cleaned, labels, probabilities),
+        'compute_top_k_any_fit_probability_metrics': lambda: _compute_top_k_any_fit_probability_metrics(
+            cleaned,
+            labels,
+            probabilities,
+        ),
+        'cross_validate_custom_lr': cross_validate,
+        'cross_validate_custom_lr_batched': lambda: cross_validate(batched=True),
+    }
+    sizes = {'masks': int(len(masks)), 'fit_tests': int(len(fit_tests)), 'training_rows': int(len(cleaned))}
+    return cases, sizes
+
+
+def run_benchmarks(scales, cases=None, repeat=5, warmup=1, seed=0, cv_epochs=20, cv_folds=5):
+    selected = list(cases or CASES)
+    report = {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'torch': torch.__version__,
+        'repeat': repeat,
+        'seed': seed,
+        'sizes': {},
+        'results': {},
+    }
+    for scale in scales:
+        label = f"{scale:g}x"
+        scale_cases, sizes = build_cases(scale, seed=seed, cv_epochs=cv_epochs, cv_folds=cv_folds)
+        report['sizes'][label] = sizes
+        report['results'][label] = {}
+        for case in selected:
+            # CV is the slowest case by far; one timed run is enough to gate on.
+            is_cv = case.startswith('cross_validate_custom_lr')
+            case_repeat = 1 if is_cv else repeat
+            case_warmup = 0 if is_cv else warmup
+            result = measure(scale_cases[case], repeat=case_repeat, warmup=case_warmup)
+            report['results'][label][case] = result
+            print(
+                f"{label:>5} {case:<36} p50={result['p50_ms']:10.1f}ms "
+                f"peak={result['peak_memory_bytes'] / 1e6:8.1f}MB",
+                flush=True,
+            )
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark mask recommender hot paths on synthetic data.")
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10], help='Data scales relative to today (1, 10, 100).')
+    parser.add_argument('--cases', nargs='+', choices=CASES, default=CASES, help='Cases to run.')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case.')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed runs per case before timing.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic data.')
+    parser.add_argument('--cv-epochs', type=int, default=20, help='Epochs per fold for cross_validate_custom_lr.')
+    parser.add_argument('--cv-folds', type=int, default=5, help='Folds for cross_validate_custom_lr.')
+    parser.add_argument('--output', default='benchmark_report.json', help='Path to write the JSON report.')
+    parser.add_argument('--baseline', default=None, help='Report to compare against; regressions fail the run.')
+    parser.add_argument('--max-p50-regression', type=float, default=DEFAULT_MAX_P50_REGRESSION,
+                        help='Allowed relative p50 increase over the baseline.')
+    parser.add_argument('--max-memory-regression', type=float, default=DEFAULT_MAX_MEMORY_REGRESSION,
+                        help='Allowed relative peak-memory increase over the baseline.')
+    parser.add_argument('--min-p50-ms', type=float, default=DEFAULT_MIN_P50_MS,
+                        help='Ignore p50 changes for cases faster than this.')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(message)s")
+    logging.getLogger().setLevel(logging.WARNING)
+
+    report = run_benchmarks(
+        args.scales,
+        cases=args.cases,
+        repeat=args.repeat,
+        warmup=args.warmup,
+        seed=args.seed,
+        cv_epochs=args.cv_epochs,
+        cv_folds=args.cv_folds,
+    )
+    Path(args.output).write_text(json.dumps(report, indent=2), encoding='utf-8')
+    print(f"Wrote {args.output}")
+
+    if not args.baseline:
+        return 0
+    baseline = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+    regressions = compare_reports(
+        report,
+        baseline,
+        max_p50_regression=args.max_p50_regression,
+        max_memory_regression=args.max_memory_regression,
+        min_p50_ms=args.min_p50_ms,
+    )
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
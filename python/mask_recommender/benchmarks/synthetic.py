@@ -0,0 +1,102 @@
+"""
+Synthetic masks and fit tests shaped like the Breathesafe payloads.
+
+Scale 1 approximates the current catalog and fit-test volume; 10 and 100 are
+for checking how the hot paths grow. Everything is seeded, so a scale and
+seed always produce the same frames.
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+BASE_MASK_COUNT = 300
+BASE_FIT_FAMILY_COUNT = 220
+BASE_USER_COUNT = 250
+BASE_FIT_TEST_COUNT = 3000
+
+STYLES = ['Cup', 'Bifold', 'Bifold & Gasket', 'Boat', 'Duckbill', 'Trifold', 'Adhesive']
+STRAP_TYPES = ['Earloop', 'Adjustable Earloop', 'Headstrap', 'Adjustable Headstrap', 'Strapless']
+BRANDS = ['3M', 'Moldex', 'Zimi', 'Trident', 'GVS', 'Drager', 'Honeywell', 'BNX', 'Vogmask', 'Aura']
+SIZE_SUFFIXES = ['', ' S', ' XS', ' Regular', ' Large', ' XXL', ' Kids', ' Petite', ' Regular extended straps']
+
+
+def _scaled(base, scale):
+    return max(1, int(round(base * scale)))
+
+
+def synthetic_masks(scale=1, seed=0):
+    rng = np.random.default_rng(seed)
+    mask_count = _scaled(BASE_MASK_COUNT, scale)
+    fit_family_count = _scaled(BASE_FIT_FAMILY_COUNT, scale)
+
+    rows = []
+    for mask_id in range(1, mask_count + 1):
+        brand = BRANDS[rng.integers(len(BRANDS))]
+        model = f"M{rng.integers(1000, 9999)}"
+        suffix = SIZE_SUFFIXES[rng.integers(len(SIZE_SUFFIXES))]
+        current_state = None
+        if rng.random() < 0.5:
+            breakdown = [{brand: 'brand'}, {model: 'model'}]
+            if suffix.strip():
+                breakdown.append({suffix.strip(): 'size'})
+            current_state = json.dumps({'current_state': {'breakdown': breakdown}})
+        rows.append(
+            {
+                'id': mask_id,
+                'fit_family_id': int(rng.integers(1, fit_family_count + 1)),
+                'unique_internal_model_code': f"{brand} {model}{suffix}",
+                'current_state': current_state,
+                'perimeter_mm': round(float(rng.normal(300.0, 25.0)), 1),
+                'strap_type': STRAP_TYPES[rng.integers(len(STRAP_TYPES))],
+                'style': STYLES[rng.integers(len(STYLES))],
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def synthetic_faces(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            'nose_mm': rng.normal(42.0, 4.0, count).round(2),
+            'chin_mm': rng.normal(110.0, 10.0, count).round(2),
+            'top_cheek_mm': rng.normal(95.0, 8.0, count).round(2),
+            'mid_cheek_mm': rng.normal(80.0, 7.0, count).round(2),
+            'strap_mm': rng.normal(260.0, 20.0, count).round(2),
+            'facial_hair_beard_length_mm': rng.choice([0.0, 0.0, 0.0, 1.0, 5.0], count),
+        }
+    )
+
+
+def synthetic_fit_tests(masks, scale=1, seed=0):
+    """Fit tests joined to ``masks`` the way the fit-tests export delivers them."""
+    rng = np.random.default_rng(seed + 1)
+    fit_test_count = _scaled(BASE_FIT_TEST_COUNT, scale)
+    user_count = _scaled(BASE_USER_COUNT, scale)
+
+    user_ids = rng.integers(1, user_count + 1, fit_test_count)
+    faces = synthetic_faces(user_count, seed=seed + 2).iloc[user_ids - 1].reset_index(drop=True)
+    mask_rows = masks.iloc[rng.integers(len(masks), size=fit_test_count)].reset_index(drop=True)
+
+    facial_perimeter = faces[['nose_mm', 'chin_mm', 'top_cheek_mm', 'mid_cheek_mm']].sum(axis=1)
+    gap_cm = (facial_perimeter - mask_rows['perimeter_mm']) / 10.0
+    pass_probability = 1.0 / (1.0 + np.exp(0.08 * gap_cm ** 2 - 0.4))
+    passed = rng.random(fit_test_count) < pass_probability
+
+    fit_tests = pd.concat(
+        [
+            mask_rows[['fit_family_id', 'unique_internal_model_code', 'perimeter_mm', 'strap_type', 'style']],
+            faces,
+        ],
+        axis=1,
+    )
+    fit_tests.insert(0, 'mask_id', mask_rows['id'].to_numpy())
+    fit_tests.insert(0, 'user_id', user_ids)
+    fit_tests.insert(0, 'id', np.arange(1, fit_test_count + 1))
+    fit_tests['qlft_pass'] = np.where(passed, 'pass', 'fail')
+    fit_tests['created_at'] = (
+        pd.Timestamp('2026-01-01T00:00:00Z') + pd.to_timedelta(np.arange(fit_test_count), unit='min')
+    ).strftime('%Y-%m-%dT%H:%M:%SZ')
+    return fit_tests
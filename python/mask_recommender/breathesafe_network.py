@@ -6,21 +6,134 @@ from __future__ import annotations
 
 import logging
 import os
-from typing import Dict
+import threading
+import time
+from typing import Dict, List
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+  from timing_stats import TimingStats
+except ModuleNotFoundError:
+  from mask_recommender.timing_stats import TimingStats  # type: ignore
 
 INTERNAL_EXPORT_TOKEN_HEADER = "X-Breathesafe-Internal-Token"
 
+# (connect, read) seconds. The read timeout applies between bytes, not to the
+# whole download.
+DEFAULT_TIMEOUT = (10, 60)
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 16
+RETRY_TOTAL = 4
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_STATUS_FORCELIST = (429, 500, 502, 503, 504)
+# Only idempotent requests are retried after they reach Rails; a POST (login)
+# is retried only when the connection could not be opened.
+RETRY_ALLOWED_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class BreathesafeSession(requests.Session):
+  """
+  A requests.Session that records how long each request took.
+
+  ``timing_summary()`` totals every request (count, seconds, retries,
+  failures) for the life of the session; ``timings`` holds the most recent
+  entries (method, URL, status, seconds, retries). With ``stream=True`` the
+  time covers the response headers only.
+  """
+
+  def __init__(self):
+    super().__init__()
+    self.timing_stats = TimingStats({"requests": 0, "seconds": 0.0, "retries": 0, "failed": 0})
+
+  @property
+  def timings(self) -> List[Dict]:
+    return self.timing_stats.entries()
+
+  def request(self, method, url, *args, **kwargs):
+    started = time.perf_counter()
+    status = None
+    retries = 0
+    try:
+      response = super().request(method, url, *args, **kwargs)
+      status = response.status_code
+      retry_state = getattr(response.raw, "retries", None)
+      retries = len(retry_state.history) if retry_state is not None else 0
+      return response
+    finally:
+      seconds = time.perf_counter() - started
+      self.timing_stats.record(
+        {
+          "method": method.upper(),
+          "url": url.split("?", 1)[0],
+          "status": status,
+          "seconds": seconds,
+          "retries": retries,
+        },
+        requests=1,
+        seconds=seconds,
+        retries=retries,
+        failed=int(status is None or status >= 400),
+      )
+      logging.debug("%s %s -> %s in %.3fs (%s retries)", method.upper(), url, status, seconds, retries)
+
+  def timing_summary(self) -> Dict:
+    return self.timing_stats.summary()
+
+
+def build_retry(total: int = RETRY_TOTAL, backoff_factor: float = RETRY_BACKOFF_FACTOR) -> Retry:
+  return Retry(
+    total=total,
+    connect=total,
+    read=total,
+    status=total,
+    backoff_factor=backoff_factor,
+    status_forcelist=RETRY_STATUS_FORCELIST,
+    allowed_methods=RETRY_ALLOWED_METHODS,
+    respect_retry_after_header=True,
+    raise_on_status=False,
+  )
+
 
-def build_session(cookie: str | None) -> requests.Session:
-  session = requests.Session()
+def build_session(
+  cookie: str | None,
+  retries: int = RETRY_TOTAL,
+  backoff_factor: float = RETRY_BACKOFF_FACTOR,
+  pool_maxsize: int = POOL_MAXSIZE,
+) -> BreathesafeSession:
+  """
+  A pooled session with exponential-backoff retries on idempotent requests
+  and gzip responses. Pass ``retries=0`` to fail on the first error.
+  """
+  session = BreathesafeSession()
+  adapter = HTTPAdapter(
+    pool_connections=POOL_CONNECTIONS,
+    pool_maxsize=pool_maxsize,
+    max_retries=build_retry(retries, backoff_factor),
+  )
+  session.mount("http://", adapter)
+  session.mount("https://", adapter)
   if cookie:
     session.headers.update({"Cookie": cookie})
-  session.headers.update({"Accept": "application/json"})
+  session.headers.update({"Accept": "application/json", "Accept-Encoding": "gzip, deflate"})
   return session
 
 
+_shared_session = None
+_shared_session_lock = threading.Lock()
+
+
+def shared_session() -> BreathesafeSession:
+  """The process-wide anonymous session, so unauthenticated calls reuse one pool."""
+  global _shared_session
+  with _shared_session_lock:
+    if _shared_session is None:
+      _shared_session = build_session(None)
+    return _shared_session
+
+
 def login_with_credentials(
   session: requests.Session, base_url: str, email: str, password: str
 ) -> None:
@@ -29,7 +142,7 @@ def login_with_credentials(
   response = session.post(
     login_url,
     json={"user": {"email": email, "password": password}},
-    timeout=30,
+    timeout=DEFAULT_TIMEOUT,
   )
   if response.status_code not in (200, 201):
     raise RuntimeError(f"Login failed ({response.status_code}): {response.text}")
@@ -39,7 +152,7 @@ def login_with_credentials(
 def logout(session: requests.Session, base_url: str) -> None:
   logout_url = f"{base_url.rstrip('/')}/users/log_out.json"
   logging.info("Logging out via %s", logout_url)
-  response = session.delete(logout_url, timeout=30)
+  response = session.delete(logout_url, timeout=DEFAULT_TIMEOUT)
   if response.status_code != 200:
     logging.warning(
       "Logout returned status %s: %s", response.status_code, response.text
@@ -50,16 +163,16 @@ def logout(session: requests.Session, base_url: str) -> None:
 
 def fetch_json(session: requests.Session, url: str, headers: Dict | None = None) -> Dict:
   logging.info("Fetching %s", url)
-  response = session.get(url, headers=headers, timeout=60)
+  response = session.get(url, headers=headers, timeout=DEFAULT_TIMEOUT)
   response.raise_for_status()
   return response.json()
 
 
-def fetch_facial_measurements_fit_tests(
+def facial_measurements_fit_tests_request(
   base_url='http://localhost:3000',
-  session=None,
   include_without_facial_measurements=False,
 ):
+  """URL and headers for the fit-test export (internal route when a token is set)."""
   base = base_url.rstrip('/')
   internal_api_token = os.getenv("MASK_RECOMMENDER_INTERNAL_API_TOKEN")
   params = ""
@@ -71,8 +184,19 @@ def fetch_facial_measurements_fit_tests(
   else:
     fit_tests_url = f"{base}/facial_measurements_fit_tests.json{params}"
     headers = None
+  return fit_tests_url, headers
+
+
+def fetch_facial_measurements_fit_tests(
+  base_url='http://localhost:3000',
+  session=None,
+  include_without_facial_measurements=False,
+):
+  fit_tests_url, headers = facial_measurements_fit_tests_request(
+    base_url, include_without_facial_measurements
+  )
   if session is None:
-    session = build_session(None)
+    session = shared_session()
 
   return fetch_json(session, fit_tests_url, headers=headers)[
     "fit_tests_with_facial_measurements"
@@ -83,6 +207,6 @@ def fetch_dashboard_stats(base_url='http://localhost:3000', session=None):
   base = base_url.rstrip('/')
   url = f"{base}/dashboard/stats.json"
   if session is None:
-    session = build_session(None)
+    session = shared_session()
 
   return fetch_json(session, url)
@@ -2,7 +2,8 @@ import logging
 import os
 
 import pandas as pd
-from breathesafe_network import build_session, fetch_facial_measurements_fit_tests, fetch_json
+from breathesafe_network import build_session
+from export_cache import default_export_cache, fetch_fit_tests_frame, fetch_masks_frame
 from predict_arkit_from_traditional import predict_arkit_from_traditional
 
 FACIAL_FEATURE_COLUMNS = [
@@ -52,11 +53,12 @@ def is_truthy(value):
 
 def load_fit_tests_with_imputation(base_url, session=None, email=None, password=None, cookie=None):
     session = session or build_session(None)
-    fit_tests_payload = fetch_facial_measurements_fit_tests(
+    export_cache = default_export_cache()
+    fit_tests = fetch_fit_tests_frame(
         base_url=base_url,
-        session=session
+        session=session,
+        cache=export_cache,
     )
-    fit_tests = pd.DataFrame(fit_tests_payload)
 
     email = email or os.getenv('BREATHESAFE_SERVICE_EMAIL')
     password = password or os.getenv('BREATHESAFE_SERVICE_PASSWORD')
@@ -66,6 +68,7 @@ def load_fit_tests_with_imputation(base_url, session=None, email=None, password=
             cookie=cookie,
             email=email,
             password=password,
+            cache=export_cache,
         )
 
     logging.info("BREATHESAFE_SERVICE_EMAIL/PASSWORD not set; skipping ARKit imputation.")
@@ -90,7 +93,5 @@ def filter_fit_tests_for_bayesian(df):
     return filtered
 
 
-def get_masks(session, masks_url):
-    session = session or build_session(None)
-    masks_payload = fetch_json(session, masks_url).get("masks", [])
-    return pd.DataFrame(masks_payload)
+def get_masks(session, masks_url, cache=None):
+    return fetch_masks_frame(session, masks_url, cache=cache or default_export_cache())
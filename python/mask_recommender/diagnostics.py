@@ -0,0 +1,357 @@
+"""
+Diagnostics stage for custom_lr training runs.
+
+train.main publishes the model and custom_latest.json first, then hands this
+module plain-data figure specs (lists and NumPy arrays, no model objects).
+Figures are rendered headlessly with matplotlib's object-oriented API (no
+pyplot state), and each PNG is uploaded to S3 or written under the images
+directory as soon as it is rendered, several uploads at a time. Rendering is
+serial by default: a spawn worker re-imports the training script (torch,
+sklearn, matplotlib) as __mp_main__, which costs more than the handful of
+figures. ``render_workers`` > 1 (0 = one per CPU, at most
+MAX_RENDER_WORKERS) renders in a spawn process pool instead; where a pool
+cannot start (AWS Lambda has no /dev/shm), figures render serially.
+
+A figure spec is a dict::
+
+    {'name': 'roc_auc', 'kind': 'roc', 'filename': '<ts>_custom_roc_auc.png', 'data': {...}}
+
+``kind`` selects a renderer from RENDERERS. JSON documents (``{'name',
+'filename', 'payload'}``) are published alongside. Publishing is best effort:
+a failed render or upload is logged and reported as a None artifact, never
+raised, so diagnostics cannot fail a training run.
+"""
+
+import io
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import boto3
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+
+DEFAULT_UPLOAD_WORKERS = 8
+MAX_RENDER_WORKERS = 4
+PROBE_COLORS = ['#111111', '#7a3cff', '#118ab2', '#ef476f', '#2a9d8f', '#bc6c25']
+
+
+def _png_bytes(fig):
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+    return buf.getvalue()
+
+
+def render_training_loss(data):
+    fig = Figure(figsize=(8, 4))
+    ax = fig.subplots()
+    train_losses = data['train_losses']
+    val_losses = data.get('val_losses') or []
+    epochs_range = range(1, len(train_losses) + 1)
+    ax.plot(epochs_range, train_losses, label='train loss')
+    if val_losses:
+        ax.plot(epochs_range, val_losses, label='val loss')
+    ax.set_xlabel('Epoch')
+    ax.set_ylabel('Loss')
+    ax.set_title('Custom LR Training Loss')
+    ax.grid(True, linestyle='--', alpha=0.4)
+    ax.legend()
+    fig.tight_layout()
+    return _png_bytes(fig)
+
+
+def render_roc(data):
+    fig = Figure(figsize=(8, 4))
+    ax = fig.subplots()
+    for curve in data['curves']:
+        ax.plot(curve['fpr'], curve['tpr'], label=f"{curve['label']} (AUC={curve['auc']:.3f})", linewidth=2)
+    ax.plot([0, 1], [0, 1], linestyle='--', color='gray')
+    ax.set_xlabel('False Positive Rate')
+    ax.set_ylabel('True Positive Rate')
+    ax.set_title('Custom LR ROC-AUC Curves')
+    ax.grid(True, linestyle='--', alpha=0.4)
+    ax.legend()
+    fig.tight_layout()
+    return _png_bytes(fig)
+
+
+def render_top_k_hit_rates(data):
+    fig = Figure(figsize=(7, 4))
+    ax = fig.subplots()
+    labels = data['labels']
+    values = data['values']
+    bars = ax.bar(labels, values, color=['#1f77b4', '#2ca02c', '#ff7f0e'])
+    ax.set_ylim(0.0, 1.0)
+    ax.set_ylabel('Mean Hit Rate')
+    ax.set_title('Cross-Validation Top-K Hit Rates')
+    ax.grid(True, axis='y', linestyle='--', alpha=0.4)
+    for bar, value in zip(bars, values):
+        ax.text(
+            bar.get_x() + (bar.get_width() / 2.0),
+            min(value + 0.03, 0.98),
+            f"{value:.3f}",
+            ha='center',
+            va='bottom',
+            fontsize=10,
+        )
+    fig.tight_layout()
+    return _png_bytes(fig)
+
+
+def _draw_probe(ax, probe_idx, probe):
+    probe_color = probe['color']
+    probe_diff_cm = probe['diff_cm']
+    probe_probability = probe['probability']
+    probe_label = probe['label']
+    box = {'boxstyle': 'round,pad=0.2', 'fc': 'white', 'ec': probe_color, 'alpha': 0.9}
+    ax.axvspan(probe_diff_cm - 0.08, probe_diff_cm + 0.08, color=probe_color, alpha=0.14, zorder=1)
+    ax.axvline(probe_diff_cm, color=probe_color, linestyle='-', linewidth=2.4, alpha=0.95, zorder=2)
+    ax.scatter(
+        [probe_diff_cm],
+        [probe_probability],
+        color=probe_color,
+        edgecolors='black',
+        linewidths=1.2,
+        s=90,
+        marker='X',
+        zorder=10,
+    )
+    annotation_y = min(0.97, max(0.03, probe_probability + 0.06))
+    ax.annotate(
+        f"{probe_label}: {probe_probability:.0%}",
+        xy=(probe_diff_cm, probe_probability),
+        xytext=(probe_diff_cm + 0.15, annotation_y),
+        textcoords='data',
+        fontsize=7,
+        color=probe_color,
+        fontweight='bold',
+        ha='left',
+        va='bottom' if annotation_y >= probe_probability else 'top',
+        bbox=box,
+        arrowprops={'arrowstyle': '-', 'color': probe_color, 'lw': 1.0, 'alpha': 0.9},
+        zorder=11,
+    )
+
+    finite_xticks = []
+    for x in list(ax.get_xticks()) + [probe_diff_cm]:
+        try:
+            x_value = float(x)
+        except (TypeError, ValueError):
+            continue
+        if np.isfinite(x_value):
+            finite_xticks.append(round(x_value, 2))
+    if finite_xticks:
+        ax.set_xticks(sorted(set(finite_xticks)))
+    ax.text(
+        0.02,
+        0.98 - (probe_idx * 0.09),
+        f"{probe_label}: x={probe_diff_cm:.2f}, p={probe_probability:.0%}",
+        transform=ax.transAxes,
+        ha='left',
+        va='top',
+        fontsize=7,
+        color=probe_color,
+        bbox=box,
+        zorder=12,
+    )
+
+
+def render_perimeter_diff_page(data):
+    """One 4x4 page of per-mask fit probability against perimeter_diff."""
+    fig = Figure(figsize=(20, 16))
+    axes = fig.subplots(4, 4, sharex=False, sharey=True).flatten()
+
+    for ax, panel in zip(axes, data['panels']):
+        diff_values = panel['diff_values']
+        ax.plot(diff_values, panel['specific_probs'], label='mask-specific', color='#1f77b4', linewidth=2)
+        ax.plot(
+            diff_values,
+            panel['generic_probs'],
+            label='style-only',
+            color='#ff7f0e',
+            linewidth=2,
+            linestyle='--',
+        )
+        for outcome, color in (('pass', 'green'), ('fail', 'red')):
+            x_values, y_values = panel[f'{outcome}_points']
+            if len(x_values):
+                ax.scatter(x_values, y_values, color=color, alpha=0.5, s=26, label=outcome)
+        for probe_idx, probe in enumerate(panel['probes']):
+            _draw_probe(ax, probe_idx, probe)
+
+        ax.set_title(panel['mask_code'], fontsize=9)
+        ax.set_xlim(*panel['x_limits'])
+        ax.set_ylim(-0.05, 1.05)
+        ax.grid(True, linestyle='--', alpha=0.25)
+        ax.tick_params(axis='x', labelrotation=35, labelsize=7, pad=2)
+
+    for unused_ax in axes[len(data['panels']):]:
+        unused_ax.axis('off')
+
+    legend_handles = [
+        Line2D([0], [0], color='#1f77b4', linewidth=2, label='mask-specific'),
+        Line2D([0], [0], color='#ff7f0e', linewidth=2, linestyle='--', label='style-only'),
+        Line2D([0], [0], marker='o', color='green', linestyle='None', alpha=0.5, markersize=6, label='pass'),
+        Line2D([0], [0], marker='o', color='red', linestyle='None', alpha=0.5, markersize=6, label='fail'),
+    ]
+    for probe_label, probe_color in data['probe_legend']:
+        legend_handles.append(
+            Line2D(
+                [0], [0],
+                color=probe_color,
+                linestyle='-',
+                linewidth=2.4,
+                marker='o',
+                markersize=5,
+                label=f'{probe_label} actual',
+            )
+        )
+    fig.legend(
+        handles=legend_handles,
+        loc='upper center',
+        bbox_to_anchor=(0.5, 0.965),
+        ncol=min(4, len(legend_handles)),
+        frameon=False,
+    )
+    fig.supxlabel('perimeter_diff', y=0.02)
+    fig.supylabel('probability / actual qlft pass')
+    fig.suptitle(
+        f"Custom LR perimeter_diff diagnostics (page {data['page']}/{data['num_pages']})",
+        y=0.992,
+    )
+    fig.tight_layout(rect=[0, 0.07, 1, 0.88])
+    return _png_bytes(fig)
+
+
+RENDERERS = {
+    'training_loss': render_training_loss,
+    'roc': render_roc,
+    'top_k_hit_rates': render_top_k_hit_rates,
+    'perimeter_diff_page': render_perimeter_diff_page,
+}
+
+
+def render_figure(figure):
+    return RENDERERS[figure['kind']](figure['data'])
+
+
+def _render_worker(figure):
+    """(name, png bytes or None); errors are returned, not raised, so one bad figure cannot sink the pool."""
+    try:
+        return figure['name'], render_figure(figure), None
+    except Exception as exc:  # noqa: BLE001 - diagnostics are best effort
+        return figure['name'], None, f"{type(exc).__name__}: {exc}"
+
+
+def _resolve_render_workers(workers, figure_count):
+    if workers is None:
+        workers = 1
+    elif workers <= 0:
+        workers = min(os.cpu_count() or 1, MAX_RENDER_WORKERS)
+    return max(1, min(int(workers), figure_count))
+
+
+def _iter_rendered(figures, workers):
+    """Yield (name, png, error) in completion order."""
+    workers = _resolve_render_workers(workers, len(figures))
+    if workers > 1:
+        try:
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        except (OSError, NotImplementedError) as exc:
+            logging.warning("Process pool unavailable (%s); rendering %s diagnostics figures serially.", exc, len(figures))
+        else:
+            with executor:
+                futures = [executor.submit(_render_worker, figure) for figure in figures]
+                for future in as_completed(futures):
+                    yield future.result()
+            return
+    for figure in figures:
+        yield _render_worker(figure)
+
+
+class DiagnosticsPublisher:
+    """
+    Writes diagnostics to ``mask_recommender/models/<timestamp>/`` in S3 when
+    ``bucket`` is given (one shared client, concurrent puts; pass ``client``
+    to reuse the training run's), else to ``images_dir``.
+    """
+
+    def __init__(
+        self,
+        timestamp,
+        images_dir,
+        bucket=None,
+        region=None,
+        upload_workers=DEFAULT_UPLOAD_WORKERS,
+        client=None,
+    ):
+        self.timestamp = timestamp
+        self.images_dir = images_dir
+        self.bucket = bucket
+        self.upload_workers = upload_workers
+        self._s3 = None
+        if bucket:
+            self._s3 = client if client is not None else boto3.client('s3', region_name=region)
+
+    def key(self, filename):
+        return f"mask_recommender/models/{self.timestamp}/{filename}"
+
+    def publish(self, filename, body, content_type):
+        if self._s3 is not None:
+            key = self.key(filename)
+            self._s3.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType=content_type)
+            return f"s3://{self.bucket}/{key}"
+        os.makedirs(self.images_dir, exist_ok=True)
+        path = os.path.join(self.images_dir, filename)
+        with open(path, 'wb') as handle:
+            handle.write(body)
+        logging.info("Saved %s", path)
+        return path
+
+
+def _publish_best_effort(publisher, name, filename, body, content_type):
+    try:
+        return publisher.publish(filename, body, content_type)
+    except Exception as exc:  # noqa: BLE001 - diagnostics are best effort
+        logging.warning("Skipping %s upload due to error: %s", name, exc)
+        return None
+
+
+def publish_diagnostics(figures, publisher, documents=(), render_workers=1):
+    """
+    Render ``figures`` and publish them with ``documents``. Returns
+    ({name: artifact uri/path or None}, timings) where timings has the
+    stage's 'render_and_publish' seconds and figure/failure counts.
+    """
+    started = time.perf_counter()
+    filenames = {figure['name']: figure['filename'] for figure in figures}
+    artifacts = {}
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(1, publisher.upload_workers)) as uploads:
+        pending = {}
+        for document in documents:
+            body = json.dumps(document['payload'], indent=2).encode('utf-8')
+            pending[document['name']] = uploads.submit(
+                _publish_best_effort, publisher, document['name'], document['filename'], body, 'application/json'
+            )
+        for name, png, error in _iter_rendered(list(figures), render_workers):
+            if png is None:
+                logging.warning("Skipping %s: rendering failed (%s)", name, error)
+                artifacts[name] = None
+                failures += 1
+                continue
+            pending[name] = uploads.submit(_publish_best_effort, publisher, name, filenames[name], png, 'image/png')
+        for name, future in pending.items():
+            artifacts[name] = future.result()
+            failures += artifacts[name] is None
+    timings = {
+        'render_and_publish': time.perf_counter() - started,
+        'figures': len(filenames),
+        'documents': len(documents),
+        'failures': int(failures),
+    }
+    return artifacts, timings
@@ -0,0 +1,292 @@
+"""
+On-disk cache for the Breathesafe JSON exports (fit tests, masks, facial
+measurement summaries).
+
+Each export is stored as Parquet plus a small JSON sidecar, keyed by the
+request URL (base URL + endpoint + query), a caller-supplied ``scope`` and the
+column projection. Responses are parsed with json_stream, so a full fetch never
+holds the whole payload as Python objects.
+A fetch then goes through three tiers:
+
+- younger than ``ttl_seconds``: served from disk without a request;
+- otherwise revalidated with If-None-Match / If-Modified-Since. Rails' default
+  Rack::ETag / Rack::ConditionalGet middleware answers 304 when the export is
+  unchanged, which skips the transfer and the JSON parse;
+- for endpoints that accept ``updated_since`` (``delta_column=...``), only rows
+  changed since the newest cached value are fetched and merged in by id.
+  Deltas cannot see deleted rows, so use them only for append/update-only
+  exports.
+
+Entries are not keyed by credentials. Exports whose contents depend on who is
+asking (the public fit-test route for a logged-in user vs. an anonymous one)
+should pass a ``scope`` (see credential_scope).
+
+The default TTL is 0, so every fetch is revalidated and the cache never serves
+stale data; set MASK_RECOMMENDER_EXPORT_CACHE_TTL_SECONDS to trade freshness
+for skipping requests entirely. MASK_RECOMMENDER_EXPORT_CACHE=off disables it.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+try:
+    from breathesafe_network import DEFAULT_TIMEOUT, facial_measurements_fit_tests_request, shared_session
+    from json_stream import stream_records_frame
+except ModuleNotFoundError:
+    from mask_recommender.breathesafe_network import (  # type: ignore
+        DEFAULT_TIMEOUT,
+        facial_measurements_fit_tests_request,
+        shared_session,
+    )
+    from mask_recommender.json_stream import stream_records_frame  # type: ignore
+
+DEFAULT_TTL_SECONDS = 0.0
+EXPORT_CACHE_VERSION = 1
+
+
+def _cache_key(url, scope, columns=None):
+    projection = ','.join(columns) if columns is not None else '*'
+    return hashlib.sha256(f"{url}\n{scope}\n{projection}".encode('utf-8')).hexdigest()[:32]
+
+
+def _needs_json_encoding(values):
+    """Object columns Parquet cannot store losslessly: nested or mixed-type values."""
+    import pyarrow as pa
+
+    if any(isinstance(value, (dict, list)) for value in values):
+        return True
+    try:
+        pa.array(values, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return True
+    return False
+
+
+def _encode_for_parquet(frame):
+    encoded = frame.copy()
+    json_columns = []
+    for column in encoded.columns:
+        if encoded[column].dtype != object:
+            continue
+        values = encoded[column].tolist()
+        if _needs_json_encoding(values):
+            encoded[column] = [None if value is None else json.dumps(value) for value in values]
+            json_columns.append(column)
+    return encoded, json_columns
+
+
+def _decode_from_parquet(frame, json_columns):
+    for column in json_columns:
+        frame[column] = [None if value is None else json.loads(value) for value in frame[column].tolist()]
+    return frame
+
+
+def _max_delta_value(frame, delta_column):
+    if delta_column not in frame.columns:
+        return None
+    values = frame[delta_column].dropna().astype(str)
+    return values.max() if not values.empty else None
+
+
+class ExportCache:
+    """Parquet cache for JSON exports. See the module docstring for the fetch tiers."""
+
+    def __init__(self, cache_dir, ttl_seconds=DEFAULT_TTL_SECONDS, clock=time.time):
+        self.cache_dir = Path(cache_dir)
+        self.ttl_seconds = float(ttl_seconds)
+        self._clock = clock
+        self.stats = {'fresh': 0, 'not_modified': 0, 'delta': 0, 'full': 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, tier):
+        # train.main fetches several exports through one cache concurrently.
+        with self._stats_lock:
+            self.stats[tier] += 1
+
+    def _paths(self, url, scope, columns=None):
+        key = _cache_key(url, scope, columns)
+        return self.cache_dir / f"{key}.parquet", self.cache_dir / f"{key}.json"
+
+    def _read(self, url, scope, columns=None):
+        data_path, meta_path = self._paths(url, scope, columns)
+        if not meta_path.exists() or not data_path.exists():
+            return None, None
+        try:
+            meta = json.loads(meta_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None, None
+        if meta.get('version') != EXPORT_CACHE_VERSION:
+            return None, None
+        frame = _decode_from_parquet(pd.read_parquet(data_path), meta.get('json_columns', []))
+        return frame, meta
+
+    def _write(self, url, scope, columns, frame, meta):
+        data_path, meta_path = self._paths(url, scope, columns)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        encoded, json_columns = _encode_for_parquet(frame)
+        meta = {**meta, 'version': EXPORT_CACHE_VERSION, 'json_columns': json_columns, 'rows': int(len(frame))}
+        # Write to temporary names and rename so readers never see a torn entry.
+        data_tmp = data_path.with_suffix('.parquet.tmp')
+        meta_tmp = meta_path.with_suffix('.json.tmp')
+        encoded.to_parquet(data_tmp, index=False)
+        meta_tmp.write_text(json.dumps(meta), encoding='utf-8')
+        os.replace(data_tmp, data_path)
+        os.replace(meta_tmp, meta_path)
+
+    def _touch(self, url, scope, columns, meta):
+        _, meta_path = self._paths(url, scope, columns)
+        meta_tmp = meta_path.with_suffix('.json.tmp')
+        meta_tmp.write_text(json.dumps({**meta, 'fetched_at': self._clock()}), encoding='utf-8')
+        os.replace(meta_tmp, meta_path)
+
+    def fetch_frame(
+        self,
+        session,
+        url,
+        records_key,
+        headers=None,
+        scope='',
+        delta_column=None,
+        id_column='id',
+        columns=None,
+    ):
+        """
+        The export at ``url`` as a DataFrame of ``payload[records_key]`` (the
+        payload itself when ``records_key`` is None), the same frame
+        ``pd.DataFrame(records)`` would give. ``columns`` projects the records
+        while they are parsed; delta merges need ``id_column`` in it.
+        """
+        cached, meta = self._read(url, scope, columns)
+        if cached is not None and self._clock() - meta.get('fetched_at', 0) < self.ttl_seconds:
+            self._count('fresh')
+            return cached
+
+        request_headers = dict(headers or {})
+        params = None
+        since = meta.get('max_delta_value') if cached is not None and delta_column else None
+        if since is not None:
+            params = {'updated_since': since}
+        elif cached is not None:
+            if meta.get('etag'):
+                request_headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                request_headers['If-Modified-Since'] = meta['last_modified']
+
+        logging.info("Fetching %s%s", url, f" (updated_since={since})" if since else "")
+        response = session.get(
+            url,
+            headers=request_headers or None,
+            params=params,
+            timeout=DEFAULT_TIMEOUT,
+            stream=True,
+        )
+        if response.status_code == 304 and cached is not None:
+            response.close()
+            self._count('not_modified')
+            self._touch(url, scope, columns, meta)
+            return cached
+        if not response.ok:
+            response.close()
+        response.raise_for_status()
+        frame = stream_records_frame(response, records_key, columns=columns)
+        changed_rows = len(frame)
+
+        if since is not None:
+            self._count('delta')
+            if not frame.empty:
+                merged = pd.concat([cached, frame], ignore_index=True)
+                frame = merged.drop_duplicates(subset=[id_column], keep='last').reset_index(drop=True)
+            else:
+                frame = cached
+            logging.info("Merged %s changed rows into cached %s", changed_rows, url)
+        else:
+            self._count('full')
+
+        self._write(
+            url,
+            scope,
+            columns,
+            frame,
+            {
+                'url': url,
+                'scope': scope,
+                'fetched_at': self._clock(),
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'delta_column': delta_column,
+                'max_delta_value': _max_delta_value(frame, delta_column) if delta_column else None,
+            },
+        )
+        return frame
+
+
+def _stream_frame(session, url, records_key, headers=None, columns=None):
+    logging.info("Fetching %s", url)
+    response = session.get(url, headers=headers, timeout=DEFAULT_TIMEOUT, stream=True)
+    if not response.ok:
+        response.close()
+    response.raise_for_status()
+    return stream_records_frame(response, records_key, columns=columns)
+
+
+def credential_scope(email=None, cookie=None):
+    """Cache scope for exports fetched as a logged-in account."""
+    if email:
+        return email
+    if cookie:
+        return f"cookie:{hashlib.sha256(cookie.encode('utf-8')).hexdigest()[:16]}"
+    return ''
+
+
+def default_export_cache():
+    """
+    The process-wide cache under $MASK_RECOMMENDER_CACHE_DIR/exports, or None
+    when MASK_RECOMMENDER_EXPORT_CACHE=off.
+    """
+    if os.environ.get('MASK_RECOMMENDER_EXPORT_CACHE', '').strip().lower() in ('0', 'off', 'false', 'no'):
+        return None
+    cache_dir = os.environ.get('MASK_RECOMMENDER_EXPORT_CACHE_DIR') or os.path.join(
+        os.environ.get('MASK_RECOMMENDER_CACHE_DIR', '/tmp/mask_recommender'),
+        'exports',
+    )
+    ttl_seconds = float(os.environ.get('MASK_RECOMMENDER_EXPORT_CACHE_TTL_SECONDS', DEFAULT_TTL_SECONDS))
+    return ExportCache(cache_dir, ttl_seconds=ttl_seconds)
+
+
+def fetch_fit_tests_frame(
+    base_url='http://localhost:3000',
+    session=None,
+    include_without_facial_measurements=False,
+    cache=None,
+    scope='',
+    columns=None,
+):
+    """
+    fetch_facial_measurements_fit_tests as a DataFrame, streamed and projected
+    to ``columns`` when given, through ``cache`` when given.
+    """
+    url, headers = facial_measurements_fit_tests_request(base_url, include_without_facial_measurements)
+    session = session or shared_session()
+    if cache is None:
+        return _stream_frame(session, url, 'fit_tests_with_facial_measurements', headers=headers, columns=columns)
+    return cache.fetch_frame(
+        session,
+        url,
+        'fit_tests_with_facial_measurements',
+        headers=headers,
+        scope=scope,
+        columns=columns,
+    )
+
+
+def fetch_masks_frame(session, masks_url, cache=None):
+    session = session or shared_session()
+    if cache is None:
+        return _stream_frame(session, masks_url, 'masks')
+    return cache.fetch_frame(session, masks_url, 'masks')
@@ -1,5 +1,7 @@
+import hashlib
 import json
 import re
+from collections import OrderedDict
 
 import numpy as np
 import pandas as pd
@@ -74,6 +76,18 @@ MASK_SIZE_FEATURE_COLUMNS = [
     "mask_strap_length_strap_match",
 ]
 
+# Columns add_mask_size_features writes from the parsed mask code.
+MASK_SIZING_COLUMNS = [
+    "mask_face_size_rank",
+    "mask_strap_length_rank",
+    "mask_face_size_is_xs",
+    "mask_face_size_is_s",
+    "mask_face_size_is_regular",
+    "mask_face_size_is_large",
+    "mask_face_size_is_xxl",
+    "mask_strap_length_is_extended",
+]
+
 PERIMETER_PENALTY_FEATURE_COLUMNS = [
     "abs_perimeter_diff_gt_1cm",
     "abs_perimeter_diff_gt_2cm",
@@ -102,6 +116,15 @@ PERIMETER_PENALTY_FEATURE_COLUMNS = [
     "small_mask_large_face_gt_30cm",
 ]
 
+MASK_CODE_ATTRIBUTE_COLUMNS = [
+    "mask_face_size_rank",
+    "mask_face_size_bucket",
+    "mask_strap_length_rank",
+    "mask_strap_length_bucket",
+    "brand_model",
+]
+_ABSENT_STATE_KEY = object()
+
 MASK_EMPIRICAL_FEATURE_COLUMNS = [
     "mask_fit_test_count",
     "mask_smoothed_pass_rate",
@@ -115,6 +138,30 @@ MASK_EMPIRICAL_FEATURE_COLUMNS = [
     "mask_zero_passes_min_10_x_earloop",
 ]
 
+# Business rules shared by the add_* chain and apply_feature_plan.
+EARLOOP_STRAP_TYPES = ("earloop", "adjustable earloop")
+HEADSTRAP_STRAP_TYPES = ("headstrap", "adjustable headstrap")
+STRAP_TYPE_STRENGTHS = {
+    "earloop": -2.0,
+    "adjustable earloop": -1.4,
+    "headstrap": 0.8,
+    "adjustable headstrap": 1.0,
+    "strapless": -0.2,
+}
+FACE_SIZE_ANCHORS_CM = {
+    "xs": 22.0,
+    "s": 25.0,
+    "regular": 29.0,
+    "large": 33.0,
+    "xxl": 36.0,
+}
+BIFOLD_STYLES = ("bifold", "bifold & gasket")
+BOAT_OR_DUCKBILL_STYLES = ("boat", "duckbill")
+# Small/petite/kids masks are penalized per cm of facial perimeter above this.
+SMALL_MASK_FACE_EXCESS_FROM_CM = 24.0
+SMALL_MASK_LARGE_FACE_CM = 30.0
+_KIDS_CODE_PATTERN = re.compile(r"\bkids?\b|\bchild(?:ren)?\b|\byouth\b")
+
 
 def _extract_breakdown(current_state):
     if current_state is None or (isinstance(current_state, float) and pd.isna(current_state)):
@@ -153,9 +200,9 @@ def _tokenize_mask_code(unique_internal_model_code):
     return [token for token in re.split(r"[\s\-—,\[\]\(\)/]+", text) if token]
 
 
-def _size_tokens_from_breakdown(current_state):
+def _size_tokens_from_breakdown(breakdown):
     tokens = []
-    for entry in _extract_breakdown(current_state):
+    for entry in breakdown:
         if not isinstance(entry, dict) or not entry:
             continue
         token, label = next(iter(entry.items()))
@@ -168,16 +215,20 @@ def _size_tokens_from_breakdown(current_state):
     return tokens
 
 
-def _normalized_mask_code_text(unique_internal_model_code, current_state=None):
+def _normalized_mask_code_text(unique_internal_model_code, breakdown):
     parts = []
     if unique_internal_model_code:
         parts.append(str(unique_internal_model_code).lower())
-    parts.extend(_size_tokens_from_breakdown(current_state))
+    parts.extend(_size_tokens_from_breakdown(breakdown))
     return " ".join(parts)
 
 
 def parse_mask_sizing(unique_internal_model_code, current_state=None):
-    text = _normalized_mask_code_text(unique_internal_model_code, current_state=current_state)
+    return _mask_sizing_from_breakdown(unique_internal_model_code, _extract_breakdown(current_state))
+
+
+def _mask_sizing_from_breakdown(unique_internal_model_code, breakdown):
+    text = _normalized_mask_code_text(unique_internal_model_code, breakdown)
 
     face_size_rank = 0.0
     face_size_bucket = "regular"
@@ -219,10 +270,13 @@ def parse_mask_sizing(unique_internal_model_code, current_state=None):
 
 
 def derive_brand_model(unique_internal_model_code, current_state=None):
+    return _brand_model_from_breakdown(unique_internal_model_code, _extract_breakdown(current_state))
+
+
+def _brand_model_from_breakdown(unique_internal_model_code, breakdown):
     brand_tokens = []
     model_tokens = []
 
-    breakdown = _extract_breakdown(current_state)
     for entry in breakdown:
         if not isinstance(entry, dict) or not entry:
             continue
@@ -257,18 +311,190 @@ def derive_brand_model(unique_internal_model_code, current_state=None):
     return " ".join(parts).strip()
 
 
-def add_brand_model_column(frame):
-    if frame is None or frame.empty:
-        return frame
+def _code_key(unique_internal_model_code):
+    # Type is part of the key: parsing depends on str() and truthiness, so 0,
+    # 0.0 and "0" must not share an entry.
+    return type(unique_internal_model_code).__name__, str(unique_internal_model_code)
+
 
+def _current_state_key(current_state):
+    """Hashable stand-in for current_state; None when it has no breakdown."""
+    if current_state is None or (isinstance(current_state, float) and pd.isna(current_state)):
+        return None
+    if isinstance(current_state, str):
+        return current_state.strip() or None
+    # Already-decoded payloads are keyed by their breakdown, which is all the
+    # parsers read.
+    breakdown = _extract_breakdown(current_state)
+    return json.dumps({"breakdown": breakdown}, sort_keys=True, default=str) if breakdown else None
+
+
+def _state_digest(state_key):
+    if state_key is None:
+        return None
+    return hashlib.blake2b(state_key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class MaskCodeCache:
+    """
+    Bounded LRU of parsed mask attributes (sizing buckets/ranks and
+    brand_model) keyed by (unique_internal_model_code, current_state digest).
+
+    There are only a few hundred distinct masks, so parsing each once and
+    broadcasting to rows replaces a JSON decode and a dozen regexes per row.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, unique_internal_model_code, current_state=None, state_key=_ABSENT_STATE_KEY):
+        if state_key is _ABSENT_STATE_KEY:
+            state_key = _current_state_key(current_state)
+        key = (_code_key(unique_internal_model_code), _state_digest(state_key))
+        attributes = self._entries.get(key)
+        if attributes is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return attributes
+
+        self.misses += 1
+        breakdown = _extract_breakdown(state_key)
+        attributes = {
+            **_mask_sizing_from_breakdown(unique_internal_model_code, breakdown),
+            "brand_model": _brand_model_from_breakdown(unique_internal_model_code, breakdown),
+        }
+        self._entries[key] = attributes
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return attributes
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+MASK_CODE_CACHE = MaskCodeCache()
+
+
+def mask_code_attributes(frame, cache=None):
+    """
+    Parsed mask attributes for every row of ``frame`` (MASK_CODE_ATTRIBUTE_COLUMNS,
+    same index). Each distinct (code, current_state) pair is parsed once through
+    ``cache`` (MASK_CODE_CACHE by default) and broadcast back to its rows.
+    """
+    cache = MASK_CODE_CACHE if cache is None else cache
+    codes = frame["unique_internal_model_code"].tolist()
     current_state_series = frame.get("current_state")
     if current_state_series is None:
-        current_state_series = pd.Series([None] * len(frame), index=frame.index)
+        state_keys = [None] * len(frame)
+    else:
+        state_keys = [_current_state_key(state) for state in current_state_series.tolist()]
+
+    unique_rows = {}
+    inverse = np.empty(len(frame), dtype=np.intp)
+    for row, (code, state_key) in enumerate(zip(codes, state_keys)):
+        inverse[row] = unique_rows.setdefault((_code_key(code), state_key), (len(unique_rows), code))[0]
+
+    unique_attributes = [None] * len(unique_rows)
+    for (_, state_key), (position, code) in unique_rows.items():
+        unique_attributes[position] = cache.get(code, state_key=state_key)
+    unique_frame = pd.DataFrame(unique_attributes, columns=MASK_CODE_ATTRIBUTE_COLUMNS)
+    result = unique_frame.take(inverse)
+    result.index = frame.index
+    return result
+
+
+def _string_codes(series, fill, lower=False, strip=True):
+    """Factorize a cleaned string column so per-value work runs once per unique value."""
+    cleaned = series.fillna(fill).astype(str)
+    if strip:
+        cleaned = cleaned.str.strip()
+    if lower:
+        cleaned = cleaned.str.lower()
+    codes, uniques = pd.factorize(cleaned, sort=True)
+    return codes, list(uniques)
+
+
+def _strap_type_features(strap_series, row_count):
+    """STRAP_FEATURE_COLUMNS as float64 arrays, classifying each distinct strap type once."""
+    if strap_series is None:
+        strap_series = pd.Series([""] * row_count)
+    strap_codes, strap_values = _string_codes(strap_series, "", lower=True)
+    strap_table = np.array(
+        [
+            [
+                float(value in EARLOOP_STRAP_TYPES),
+                float(value in HEADSTRAP_STRAP_TYPES),
+                float("adjustable" in value),
+                STRAP_TYPE_STRENGTHS.get(value, 0.0),
+            ]
+            for value in strap_values
+        ],
+        dtype=np.float64,
+    ).reshape(len(strap_values), len(STRAP_FEATURE_COLUMNS))
+    return dict(zip(STRAP_FEATURE_COLUMNS, strap_table[strap_codes].T))
+
+
+def _mask_sizing_features(sizing):
+    """
+    MASK_SIZING_COLUMNS plus mask_face_size_anchor_cm as float64 arrays, from
+    a ``mask_code_attributes`` frame.
+    """
+    face_size_bucket = sizing["mask_face_size_bucket"].to_numpy(dtype=object)
+    features = {
+        "mask_face_size_rank": sizing["mask_face_size_rank"].to_numpy(dtype=np.float64),
+        "mask_strap_length_rank": sizing["mask_strap_length_rank"].to_numpy(dtype=np.float64),
+    }
+    anchor_cm = np.zeros(len(sizing), dtype=np.float64)
+    for bucket, bucket_anchor_cm in FACE_SIZE_ANCHORS_CM.items():
+        flag = (face_size_bucket == bucket).astype(np.float64)
+        features[f"mask_face_size_is_{bucket}"] = flag
+        anchor_cm = anchor_cm + flag * bucket_anchor_cm
+    features["mask_strap_length_is_extended"] = (
+        sizing["mask_strap_length_bucket"].to_numpy(dtype=object) == "extended"
+    ).astype(np.float64)
+    features["mask_face_size_anchor_cm"] = anchor_cm
+    return features
+
+
+def _mask_code_flags(code_series, row_count):
+    """mask_is_petite / mask_is_kids as float64 arrays, matching each distinct code once."""
+    if code_series is None:
+        code_series = pd.Series([""] * row_count)
+    code_codes, code_values = _string_codes(code_series, "", lower=True, strip=False)
+    return {
+        "mask_is_petite": np.array(["petite" in value for value in code_values], dtype=np.float64)[code_codes],
+        "mask_is_kids": np.array(
+            [bool(_KIDS_CODE_PATTERN.search(value)) for value in code_values],
+            dtype=np.float64,
+        )[code_codes],
+    }
 
-    derived = [
-        derive_brand_model(code, state)
-        for code, state in zip(frame["unique_internal_model_code"], current_state_series)
-    ]
+
+def add_brand_model_column(frame):
+    if frame is None or frame.empty:
+        return frame
+
+    derived = mask_code_attributes(frame)["brand_model"].to_numpy()
 
     result = frame.copy()
     if "brand_model" in result.columns:
@@ -287,25 +513,9 @@ def add_mask_size_features(frame):
         return frame
 
     result = frame.copy()
-    current_state_series = result.get("current_state")
-    if current_state_series is None:
-        current_state_series = pd.Series([None] * len(result), index=result.index)
-
-    sizing = [
-        parse_mask_sizing(code, state)
-        for code, state in zip(result["unique_internal_model_code"], current_state_series)
-    ]
-    sizing_frame = pd.DataFrame(sizing, index=result.index)
-    result["mask_face_size_rank"] = sizing_frame["mask_face_size_rank"].astype(float)
-    result["mask_strap_length_rank"] = sizing_frame["mask_strap_length_rank"].astype(float)
-    result["mask_face_size_is_xs"] = (sizing_frame["mask_face_size_bucket"] == "xs").astype(float)
-    result["mask_face_size_is_s"] = (sizing_frame["mask_face_size_bucket"] == "s").astype(float)
-    result["mask_face_size_is_regular"] = (sizing_frame["mask_face_size_bucket"] == "regular").astype(float)
-    result["mask_face_size_is_large"] = (sizing_frame["mask_face_size_bucket"] == "large").astype(float)
-    result["mask_face_size_is_xxl"] = (sizing_frame["mask_face_size_bucket"] == "xxl").astype(float)
-    result["mask_strap_length_is_extended"] = (
-        sizing_frame["mask_strap_length_bucket"] == "extended"
-    ).astype(float)
+    sizing = _mask_sizing_features(mask_code_attributes(result))
+    for column in MASK_SIZING_COLUMNS:
+        result[column] = sizing[column]
     return result
 
 
@@ -382,9 +592,9 @@ def add_geometry_penalty_features(frame):
 
     result = frame.copy()
     style_series = result["style"].fillna("").astype(str).str.strip().str.lower()
-    is_bifold = style_series.isin(["bifold", "bifold & gasket"])
+    is_bifold = style_series.isin(BIFOLD_STYLES)
     is_cup = style_series.eq("cup")
-    is_boat_or_duckbill = style_series.isin(["boat", "duckbill"])
+    is_boat_or_duckbill = style_series.isin(BOAT_OR_DUCKBILL_STYLES)
 
     result["bifold_abs_diff_gt_1cm"] = (
         is_bifold & (result["abs_perimeter_diff"] >= 1.0)
@@ -421,25 +631,22 @@ def add_geometry_penalty_features(frame):
     result["face_too_large_for_mask_gt_2cm"] = (result["face_size_gap_cm"] >= 2.0).astype(float)
     result["face_too_small_for_mask_gt_2cm"] = (result["face_size_gap_cm"] <= -2.0).astype(float)
 
-    code_series = result.get("unique_internal_model_code")
-    if code_series is None:
-        code_series = pd.Series([""] * len(result), index=result.index)
-    code_text = code_series.fillna("").astype(str).str.lower()
-    facial_perimeter_excess = (result["facial_perimeter_cm"] - 24.0).clip(lower=0.0)
-    petite_flag = code_text.str.contains("petite", regex=False)
-    kids_flag = code_text.str.contains(r"\bkids?\b|\bchild(?:ren)?\b|\byouth\b", regex=True)
+    code_flags = _mask_code_flags(result.get("unique_internal_model_code"), len(result))
+    petite_flag = pd.Series(code_flags["mask_is_petite"], index=result.index)
+    kids_flag = pd.Series(code_flags["mask_is_kids"], index=result.index)
+    facial_perimeter_excess = (result["facial_perimeter_cm"] - SMALL_MASK_FACE_EXCESS_FROM_CM).clip(lower=0.0)
 
     result["xs_large_face_penalty"] = result["mask_face_size_is_xs"] * facial_perimeter_excess
     result["s_large_face_penalty"] = result["mask_face_size_is_s"] * facial_perimeter_excess
-    result["petite_large_face_penalty"] = petite_flag.astype(float) * facial_perimeter_excess
-    result["kids_large_face_penalty"] = kids_flag.astype(float) * facial_perimeter_excess
+    result["petite_large_face_penalty"] = petite_flag * facial_perimeter_excess
+    result["kids_large_face_penalty"] = kids_flag * facial_perimeter_excess
     result["small_mask_large_face_gt_30cm"] = (
-        (result["facial_perimeter_cm"] >= 30.0)
+        (result["facial_perimeter_cm"] >= SMALL_MASK_LARGE_FACE_CM)
         & (
             result["mask_face_size_is_xs"].astype(bool)
             | result["mask_face_size_is_s"].astype(bool)
-            | petite_flag
-            | kids_flag
+            | petite_flag.astype(bool)
+            | kids_flag.astype(bool)
         )
     ).astype(float)
 
@@ -451,28 +658,8 @@ def add_strap_type_features(frame):
         return frame
 
     result = frame.copy()
-    strap_series = result.get("strap_type")
-    if strap_series is None:
-        strap_series = pd.Series([""] * len(result), index=result.index)
-    strap_series = strap_series.fillna("").astype(str).str.strip().str.lower()
-
-    is_earloop = strap_series.isin(["earloop", "adjustable earloop"])
-    is_headstrap = strap_series.isin(["headstrap", "adjustable headstrap"])
-    is_adjustable = strap_series.str.contains("adjustable", regex=False)
-
-    strength_map = {
-        "earloop": -2.0,
-        "adjustable earloop": -1.4,
-        "headstrap": 0.8,
-        "adjustable headstrap": 1.0,
-        "strapless": -0.2,
-    }
-    strap_strength = strap_series.map(strength_map).fillna(0.0)
-
-    result["strap_is_earloop_like"] = is_earloop.astype(float)
-    result["strap_is_headstrap_like"] = is_headstrap.astype(float)
-    result["strap_is_adjustable"] = is_adjustable.astype(float)
-    result["strap_type_strength"] = strap_strength.astype(float)
+    for column, values in _strap_type_features(result.get("strap_type"), len(result)).items():
+        result[column] = values
     return result
 
 
@@ -564,12 +751,9 @@ def add_mask_size_face_interactions(frame):
         return frame
 
     result = frame.copy()
-    result["mask_face_size_anchor_cm"] = (
-        result["mask_face_size_is_xs"] * 22.0
-        + result["mask_face_size_is_s"] * 25.0
-        + result["mask_face_size_is_regular"] * 29.0
-        + result["mask_face_size_is_large"] * 33.0
-        + result["mask_face_size_is_xxl"] * 36.0
+    result["mask_face_size_anchor_cm"] = sum(
+        result[f"mask_face_size_is_{bucket}"] * anchor_cm
+        for bucket, anchor_cm in FACE_SIZE_ANCHORS_CM.items()
     )
     result["face_size_gap_cm"] = result["facial_perimeter_cm"] - result["mask_face_size_anchor_cm"]
     result["abs_face_size_gap_cm"] = result["face_size_gap_cm"].abs()
@@ -638,18 +822,325 @@ def diff_bin_index(series):
     ).astype(int)
 
 
-def apply_perimeter_features(
-    inference_rows,
-    use_facial_perimeter=False,
-    use_diff_perimeter_bins=False,
-    use_diff_perimeter_mask_bins=False
-):
+MASK_SIZE_PLAN_COLUMNS = MASK_SIZING_COLUMNS + [
+    "mask_face_size_anchor_cm",
+    "face_size_gap_cm",
+    "abs_face_size_gap_cm",
+    "face_size_gap_sq",
+    "mask_size_face_perimeter_match",
+    "mask_size_chin_match",
+    "mask_size_top_cheek_match",
+    "mask_strap_length_strap_match",
+]
+
+PERIMETER_DIFF_PLAN_COLUMNS = [
+    "perimeter_diff",
+    "perimeter_diff_sq",
+    "abs_perimeter_diff",
+    "abs_perimeter_diff_gt_1cm",
+    "abs_perimeter_diff_gt_2cm",
+    "abs_perimeter_diff_gt_3cm",
+    "abs_perimeter_diff_gt_4cm",
+    "abs_perimeter_diff_gt_5cm",
+]
+
+# Columns that depend only on the mask row (strap type, code, current_state).
+MASK_SIDE_FEATURE_COLUMNS = STRAP_FEATURE_COLUMNS + MASK_SIZING_COLUMNS + [
+    "mask_face_size_anchor_cm",
+    "mask_is_petite",
+    "mask_is_kids",
+]
+
+
+def _style_dummy_columns(style_values):
+    return [f"{STYLE_INTERACTION_PREFIX}{value}" for value in style_values]
+
+
+def feature_plan_columns(style_values):
+    """
+    Derived columns written by ``apply_feature_plan``, in the order the
+    add_* chain used to append them, for the given (sorted) style values.
+    """
+    geometry_columns = [
+        column for column in PERIMETER_PENALTY_FEATURE_COLUMNS
+        if not column.startswith("abs_perimeter_diff_gt_")
+    ]
+    columns = (
+        STRAP_FEATURE_COLUMNS
+        + ["facial_perimeter_mm"]
+        + FACE_SHAPE_FEATURE_COLUMNS
+        + MASK_SIZE_PLAN_COLUMNS
+        + PERIMETER_DIFF_PLAN_COLUMNS
+        + geometry_columns
+    )
+    style_columns = _style_dummy_columns(style_values)
+    for style_column in style_columns:
+        columns += [
+            f"{PERIMETER_DIFF_STYLE_PREFIX}{style_column}",
+            f"{ABS_PERIMETER_DIFF_STYLE_PREFIX}{style_column}",
+            f"{PERIMETER_DIFF_SQ_STYLE_PREFIX}{style_column}",
+        ]
+    for style_column in style_columns:
+        columns += [
+            f"{FACE_STYLE_INTERACTION_PREFIX}{face_column}_x_{style_column}"
+            for face_column in FACE_SHAPE_FEATURE_COLUMNS
+        ]
+    for style_column in style_columns:
+        columns += [
+            f"{STRAP_STYLE_INTERACTION_PREFIX}{strap_column}_x_{style_column}"
+            for strap_column in STRAP_FEATURE_COLUMNS
+        ]
+    return columns
+
+
+def _safe_divide(numerator, denominator):
+    result = np.zeros_like(numerator, dtype=np.float64)
+    np.divide(numerator, denominator, out=result, where=denominator != 0)
+    return result
+
+
+def mask_side_features(frame):
+    """MASK_SIDE_FEATURE_COLUMNS for every row of ``frame``, as float64."""
+    row_count = len(frame)
+    features = {
+        **_strap_type_features(frame.get("strap_type"), row_count),
+        **_mask_sizing_features(mask_code_attributes(frame)),
+        **_mask_code_flags(frame.get("unique_internal_model_code"), row_count),
+    }
+    return pd.DataFrame(features, index=frame.index, columns=MASK_SIDE_FEATURE_COLUMNS)
+
+
+def _mask_side_feature_values(frame, mask_features=None):
+    """
+    Mask-side columns for ``frame`` as an (n, k) float64 array. Rows whose
+    mask_id is in ``mask_features`` (a mask feature store indexed by mask id)
+    are gathered from it; the rest are computed from the row.
+    """
+    if mask_features is None or "mask_id" not in frame.columns:
+        return mask_side_features(frame).to_numpy(dtype=np.float64)
+
+    mask_ids = pd.to_numeric(frame["mask_id"], errors="coerce").to_numpy(dtype=np.float64)
+    positions = mask_features.index.get_indexer(mask_ids)
+    values = mask_features[MASK_SIDE_FEATURE_COLUMNS].to_numpy(dtype=np.float64)[positions]
+    missing = positions < 0
+    if missing.any():
+        values[missing] = mask_side_features(frame.loc[missing]).to_numpy(dtype=np.float64)
+    return values
+
+
+def _can_apply_feature_plan(frame):
+    if frame is None or frame.empty:
+        return False
+    required_columns = FACIAL_FEATURE_COLUMNS + ["perimeter_mm", "style", "unique_internal_model_code"]
+    return all(column in frame.columns for column in required_columns)
+
+
+def apply_feature_plan(frame, dtype=np.float32, mask_features=None):
+    """
+    Single-pass equivalent of the default apply_perimeter_features chain
+    (strap, face shape, mask size, size/face, perimeter diff, geometry and the
+    three style interaction builders).
+
+    Style dummies are computed once and every derived column is written into
+    one preallocated float32 block, instead of each add_* step copying the
+    frame and re-running get_dummies. Values are computed in float64 and
+    rounded once when written, so they equal the chain's output cast to
+    float32 (the dtype both models train and score on); pass
+    ``dtype=np.float64`` for the chain's exact values.
+    With ``mask_features`` (see mask_feature_store), mask-side columns are
+    looked up by mask_id instead of parsed per row. Frames missing the
+    required inputs fall back to the add_* chain.
+    """
+    if not _can_apply_feature_plan(frame):
+        return _apply_default_perimeter_chain(frame)
+
+    row_count = len(frame)
+    # Same coercion as add_face_shape_features, which has always made every
+    # facial measurement (strap_mm included) and perimeter_mm numeric with 0
+    # for missing values before the later steps read them.
+    numeric_columns = FACIAL_FEATURE_COLUMNS + ["perimeter_mm"]
+    numeric = frame[numeric_columns].apply(pd.to_numeric, errors="coerce").fillna(0)
+    nose = numeric["nose_mm"].to_numpy(dtype=np.float64)
+    chin = numeric["chin_mm"].to_numpy(dtype=np.float64)
+    top_cheek = numeric["top_cheek_mm"].to_numpy(dtype=np.float64)
+    mid_cheek = numeric["mid_cheek_mm"].to_numpy(dtype=np.float64)
+    strap = numeric["strap_mm"].to_numpy(dtype=np.float64)
+    mask_perimeter_mm = numeric["perimeter_mm"].to_numpy(dtype=np.float64)
+
+    style_series = frame["style"].fillna("unknown").astype(str).str.strip().replace("", "unknown")
+    style_codes, style_values = pd.factorize(style_series, sort=True)
+    style_values = list(style_values)
+    style_dummies = np.zeros((row_count, len(style_values)), dtype=np.float64)
+    style_dummies[np.arange(row_count), style_codes] = 1.0
+    # Geometry penalties match on the lower-cased style ("unknown" matches nothing).
+    style_lower = np.array([value.lower() for value in style_values], dtype=object)
+
+    columns = feature_plan_columns(style_values)
+    column_index = {column: idx for idx, column in enumerate(columns)}
+    block = np.empty((row_count, len(columns)), dtype=dtype, order="F")
+
+    def put(column, values):
+        block[:, column_index[column]] = values
+
+    # Mask-only columns: strap type flags, sizing and kids/petite flags.
+    mask_side = dict(zip(MASK_SIDE_FEATURE_COLUMNS, _mask_side_feature_values(frame, mask_features).T))
+    for column in STRAP_FEATURE_COLUMNS:
+        put(column, mask_side[column])
+    is_earloop = mask_side["strap_is_earloop_like"]
+    is_headstrap = mask_side["strap_is_headstrap_like"]
+
+    # Face shape.
+    facial_perimeter_mm = nose + chin + top_cheek + mid_cheek
+    facial_perimeter_cm = facial_perimeter_mm / MM_PER_CM
+    strap_ratio = _safe_divide(strap, facial_perimeter_mm)
+    face_shape = {
+        "facial_perimeter_cm": facial_perimeter_cm,
+        "strap_ratio": strap_ratio,
+        "nose_ratio": _safe_divide(nose, facial_perimeter_mm),
+        "chin_ratio": _safe_divide(chin, facial_perimeter_mm),
+        "top_cheek_ratio": _safe_divide(top_cheek, facial_perimeter_mm),
+        "mid_cheek_ratio": _safe_divide(mid_cheek, facial_perimeter_mm),
+        "chin_to_nose_ratio": _safe_divide(chin, nose),
+        "top_to_mid_cheek_ratio": _safe_divide(top_cheek, mid_cheek),
+        "strap_minus_perimeter_cm": (strap - facial_perimeter_mm) / MM_PER_CM,
+        "nose_sq_cm2": (nose / MM_PER_CM) ** 2,
+        "chin_sq_cm2": (chin / MM_PER_CM) ** 2,
+        "top_cheek_sq_cm2": (top_cheek / MM_PER_CM) ** 2,
+        "mid_cheek_sq_cm2": (mid_cheek / MM_PER_CM) ** 2,
+        "strap_sq_cm2": (strap / MM_PER_CM) ** 2,
+    }
+    put("facial_perimeter_mm", facial_perimeter_mm)
+    for column in FACE_SHAPE_FEATURE_COLUMNS:
+        put(column, face_shape[column])
+
+    # Mask sizing against the face.
+    face_size_rank = mask_side["mask_face_size_rank"]
+    strap_length_rank = mask_side["mask_strap_length_rank"]
+    bucket_flags = {bucket: mask_side[f"mask_face_size_is_{bucket}"] for bucket in FACE_SIZE_ANCHORS_CM}
+    face_size_anchor_cm = mask_side["mask_face_size_anchor_cm"]
+    face_size_gap_cm = facial_perimeter_cm - face_size_anchor_cm
+    abs_face_size_gap_cm = np.abs(face_size_gap_cm)
+    for column in MASK_SIZING_COLUMNS + ["mask_face_size_anchor_cm"]:
+        put(column, mask_side[column])
+    put("face_size_gap_cm", face_size_gap_cm)
+    put("abs_face_size_gap_cm", abs_face_size_gap_cm)
+    put("face_size_gap_sq", face_size_gap_cm ** 2)
+    put("mask_size_face_perimeter_match", face_size_rank * facial_perimeter_cm)
+    put("mask_size_chin_match", face_size_rank * (chin / MM_PER_CM))
+    put("mask_size_top_cheek_match", face_size_rank * (top_cheek / MM_PER_CM))
+    put("mask_strap_length_strap_match", strap_length_rank * strap_ratio)
+
+    # Perimeter difference, in cm.
+    perimeter_diff_mm = facial_perimeter_mm - mask_perimeter_mm
+    perimeter_diff = perimeter_diff_mm / MM_PER_CM
+    perimeter_diff_sq = (perimeter_diff_mm ** 2) / (MM_PER_CM ** 2)
+    abs_perimeter_diff = np.abs(perimeter_diff)
+    put("perimeter_diff", perimeter_diff)
+    put("perimeter_diff_sq", perimeter_diff_sq)
+    put("abs_perimeter_diff", abs_perimeter_diff)
+    for threshold in range(1, 6):
+        put(f"abs_perimeter_diff_gt_{threshold}cm", abs_perimeter_diff >= float(threshold))
+
+    # Style/strap geometry penalties.
+    is_bifold = np.isin(style_lower, BIFOLD_STYLES)[style_codes]
+    is_cup = (style_lower == "cup")[style_codes]
+    is_boat_or_duckbill = np.isin(style_lower, BOAT_OR_DUCKBILL_STYLES)[style_codes]
+    put("bifold_abs_diff_gt_1cm", is_bifold & (abs_perimeter_diff >= 1.0))
+    put("bifold_abs_diff_gt_2cm", is_bifold & (abs_perimeter_diff >= 2.0))
+    put("cup_abs_diff_gt_2cm", is_cup & (abs_perimeter_diff >= 2.0))
+    put("cup_abs_diff_gt_3cm", is_cup & (abs_perimeter_diff >= 3.0))
+    put("boat_duckbill_positive_diff_gt_2cm", is_boat_or_duckbill & (perimeter_diff >= 2.0))
+    put(
+        "boat_duckbill_negative_diff_ok_band",
+        is_boat_or_duckbill & (perimeter_diff <= -1.0) & (perimeter_diff >= -6.0),
+    )
+    put("earloop_abs_diff", is_earloop * abs_perimeter_diff)
+    put("earloop_abs_diff_sq", is_earloop * perimeter_diff_sq)
+    put("earloop_and_diff_gt_2cm", is_earloop.astype(bool) & (abs_perimeter_diff >= 2.0))
+    put("earloop_and_diff_gt_3cm", is_earloop.astype(bool) & (abs_perimeter_diff >= 3.0))
+    put("headstrap_abs_diff", is_headstrap * abs_perimeter_diff)
+    put("abs_face_size_gap_gt_2cm", abs_face_size_gap_cm >= 2.0)
+    put("abs_face_size_gap_gt_4cm", abs_face_size_gap_cm >= 4.0)
+    put("face_too_large_for_mask_gt_2cm", face_size_gap_cm >= 2.0)
+    put("face_too_small_for_mask_gt_2cm", face_size_gap_cm <= -2.0)
+
+    petite_flag = mask_side["mask_is_petite"].astype(bool)
+    kids_flag = mask_side["mask_is_kids"].astype(bool)
+    facial_perimeter_excess = np.clip(facial_perimeter_cm - SMALL_MASK_FACE_EXCESS_FROM_CM, 0.0, None)
+    put("xs_large_face_penalty", bucket_flags["xs"] * facial_perimeter_excess)
+    put("s_large_face_penalty", bucket_flags["s"] * facial_perimeter_excess)
+    put("petite_large_face_penalty", petite_flag.astype(np.float64) * facial_perimeter_excess)
+    put("kids_large_face_penalty", kids_flag.astype(np.float64) * facial_perimeter_excess)
+    put(
+        "small_mask_large_face_gt_30cm",
+        (facial_perimeter_cm >= SMALL_MASK_LARGE_FACE_CM)
+        & (bucket_flags["xs"].astype(bool) | bucket_flags["s"].astype(bool) | petite_flag | kids_flag),
+    )
+
+    # Style interactions, all from the one dummy matrix.
+    style_columns = _style_dummy_columns(style_values)
+    for idx, style_column in enumerate(style_columns):
+        style_mask = style_dummies[:, idx]
+        put(f"{PERIMETER_DIFF_STYLE_PREFIX}{style_column}", perimeter_diff * style_mask)
+        put(
+            f"{ABS_PERIMETER_DIFF_STYLE_PREFIX}{style_column}",
+            abs_perimeter_diff * style_mask * ABS_PERIMETER_DIFF_STYLE_INTERACTION_MULTIPLIER,
+        )
+        put(
+            f"{PERIMETER_DIFF_SQ_STYLE_PREFIX}{style_column}",
+            perimeter_diff_sq * style_mask * PERIMETER_DIFF_SQ_STYLE_INTERACTION_MULTIPLIER,
+        )
+        for face_column in FACE_SHAPE_FEATURE_COLUMNS:
+            put(
+                f"{FACE_STYLE_INTERACTION_PREFIX}{face_column}_x_{style_column}",
+                face_shape[face_column] * style_mask,
+            )
+        for strap_column in STRAP_FEATURE_COLUMNS:
+            put(
+                f"{STRAP_STYLE_INTERACTION_PREFIX}{strap_column}_x_{style_column}",
+                mask_side[strap_column] * style_mask,
+            )
+
+    base = frame.drop(columns=[column for column in columns if column in frame.columns])
+    base[numeric_columns] = numeric
+    derived = pd.DataFrame(block, index=frame.index, columns=columns, copy=False)
+    return pd.concat([base, derived], axis=1)
+
+
+def _apply_default_perimeter_chain(inference_rows):
     inference_rows = add_strap_type_features(inference_rows)
     inference_rows = add_face_shape_features(inference_rows)
     inference_rows = add_mask_size_features(inference_rows)
     inference_rows = add_mask_size_face_interactions(inference_rows)
+    inference_rows = inference_rows.copy()
+    numeric_columns = FACIAL_PERIMETER_COMPONENTS + ["perimeter_mm"]
+    inference_rows[numeric_columns] = (
+        inference_rows[numeric_columns]
+        .apply(pd.to_numeric, errors="coerce")
+        .fillna(0)
+    )
+    inference_rows["perimeter_diff"] = inference_rows["facial_perimeter_mm"] - inference_rows["perimeter_mm"]
+    inference_rows["perimeter_diff_sq"] = inference_rows["perimeter_diff"] ** 2
+    inference_rows = scale_perimeter_diff_features(inference_rows)
+    inference_rows = add_geometry_penalty_features(inference_rows)
+    inference_rows = add_style_perimeter_interactions(inference_rows)
+    inference_rows = add_face_style_interactions(inference_rows)
+    inference_rows = add_strap_style_interactions(inference_rows)
+    return inference_rows
+
 
+def apply_perimeter_features(
+    inference_rows,
+    use_facial_perimeter=False,
+    use_diff_perimeter_bins=False,
+    use_diff_perimeter_mask_bins=False,
+    mask_features=None
+):
     if use_diff_perimeter_bins or use_diff_perimeter_mask_bins:
+        inference_rows = add_strap_type_features(inference_rows)
+        inference_rows = add_face_shape_features(inference_rows)
+        inference_rows = add_mask_size_features(inference_rows)
+        inference_rows = add_mask_size_face_interactions(inference_rows)
         inference_rows = inference_rows.copy()
         numeric_columns = FACIAL_PERIMETER_COMPONENTS + ["perimeter_mm"]
         inference_rows[numeric_columns] = (
@@ -703,39 +1194,9 @@ def apply_perimeter_features(
         )
         return inference_rows
 
+    inference_rows = apply_feature_plan(inference_rows, mask_features=mask_features)
     if use_facial_perimeter:
-        inference_rows = inference_rows.copy()
-        numeric_columns = FACIAL_PERIMETER_COMPONENTS + ["perimeter_mm"]
-        inference_rows[numeric_columns] = (
-            inference_rows[numeric_columns]
-            .apply(pd.to_numeric, errors="coerce")
-            .fillna(0)
-        )
-        inference_rows["perimeter_diff"] = inference_rows["facial_perimeter_mm"] - inference_rows["perimeter_mm"]
-        inference_rows["perimeter_diff_sq"] = inference_rows["perimeter_diff"] ** 2
-        inference_rows = scale_perimeter_diff_features(inference_rows)
-        inference_rows = add_geometry_penalty_features(inference_rows)
-        inference_rows = add_style_perimeter_interactions(inference_rows)
-        inference_rows = add_face_style_interactions(inference_rows)
-        inference_rows = add_strap_style_interactions(inference_rows)
         inference_rows = inference_rows.drop(columns=FACIAL_FEATURE_COLUMNS, errors="ignore")
-        return inference_rows
-
-    inference_rows = inference_rows.copy()
-    numeric_columns = FACIAL_PERIMETER_COMPONENTS + ["perimeter_mm"]
-    inference_rows[numeric_columns] = (
-        inference_rows[numeric_columns]
-        .apply(pd.to_numeric, errors="coerce")
-        .fillna(0)
-    )
-    inference_rows["perimeter_diff"] = inference_rows["facial_perimeter_mm"] - inference_rows["perimeter_mm"]
-    inference_rows["perimeter_diff_sq"] = inference_rows["perimeter_diff"] ** 2
-    inference_rows = scale_perimeter_diff_features(inference_rows)
-    inference_rows = add_geometry_penalty_features(inference_rows)
-    inference_rows = add_style_perimeter_interactions(inference_rows)
-    inference_rows = add_face_style_interactions(inference_rows)
-    inference_rows = add_strap_style_interactions(inference_rows)
-
     return inference_rows
 
 
@@ -746,12 +1207,14 @@ def build_feature_frame(
     use_facial_perimeter=False,
     use_diff_perimeter_bins=False,
     use_diff_perimeter_mask_bins=False,
+    mask_features=None,
 ):
     transformed = apply_perimeter_features(
         inference_rows,
         use_facial_perimeter=use_facial_perimeter,
         use_diff_perimeter_bins=use_diff_perimeter_bins,
-        use_diff_perimeter_mask_bins=use_diff_perimeter_mask_bins
+        use_diff_perimeter_mask_bins=use_diff_perimeter_mask_bins,
+        mask_features=mask_features
     )
     transformed = add_brand_model_column(transformed)
 
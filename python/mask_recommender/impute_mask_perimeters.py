@@ -21,12 +21,11 @@ import pandas as pd
 
 from breathesafe_network import (
   build_session,
-  fetch_json,
-  fetch_facial_measurements_fit_tests,
   fetch_dashboard_stats,
   login_with_credentials,
   logout,
 )
+from export_cache import credential_scope, default_export_cache, fetch_fit_tests_frame, fetch_masks_frame
 
 FEATURE_COLUMNS = [
   "nose_mm",
@@ -125,13 +124,11 @@ def parse_args() -> argparse.Namespace:
   return parser.parse_args()
 
 
-def fetch_masks(session, base_url: str) -> pd.DataFrame:
+def fetch_masks(session, base_url: str, cache=None) -> pd.DataFrame:
   url = f"{base_url.rstrip('/')}/masks.json?per_page=2000"
-  data = fetch_json(session, url)
-  masks = data.get("masks", [])
-  if not masks:
+  df = fetch_masks_frame(session, url, cache=cache)
+  if df.empty:
     return pd.DataFrame()
-  df = pd.DataFrame(masks)
   df["perimeter_mm"] = pd.to_numeric(df.get("perimeter_mm"), errors="coerce")
   return df
 
@@ -223,16 +220,18 @@ def main() -> None:
   else:
     logging.warning("Proceeding without authentication; some endpoints may fail.")
 
-  masks_df = fetch_masks(session, args.base_url)
+  export_cache = default_export_cache()
+  masks_df = fetch_masks(session, args.base_url, cache=export_cache)
   if masks_df.empty:
     raise RuntimeError("No masks returned from API.")
 
-  fit_tests_payload = fetch_facial_measurements_fit_tests(
+  fit_tests_df = add_pass_flag(fetch_fit_tests_frame(
     base_url=args.base_url,
     session=session,
     include_without_facial_measurements=True,
-  )
-  fit_tests_df = add_pass_flag(pd.DataFrame(fit_tests_payload))
+    cache=export_cache,
+    scope=credential_scope(args.email, args.cookie),
+  ))
 
   predicted_df = pd.read_csv(args.predicted_fit_tests)
   predicted_df["face_perimeter"] = predicted_df[FEATURE_COLUMNS].sum(axis=1)
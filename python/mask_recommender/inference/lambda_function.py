@@ -5,26 +5,38 @@ import time
 from typing import Dict, List, Tuple
 
 import boto3
-import pandas as pd
-import torch
+from botocore.exceptions import ClientError
 try:
-    from feature_builder import FACIAL_FEATURE_COLUMNS, MASK_EMPIRICAL_FEATURE_COLUMNS, derive_brand_model
-    from train import calc_preds, prep_data_in_torch_with_categories, _custom_lr_mask_categories
+    from artifact_bundle import load_custom_lr_bundle
+    from scoring import (DEFAULT_BATCH_CHUNK_SIZE, InvalidRankingOptions, batch_chunk_size, compiled_model_for,
+                         ranking_fields, ranking_maps, ranking_options)
 except ModuleNotFoundError:
-    from mask_recommender.feature_builder import (  # type: ignore
-        FACIAL_FEATURE_COLUMNS,
-        MASK_EMPIRICAL_FEATURE_COLUMNS,
-        derive_brand_model,
-    )
-    from mask_recommender.train import (  # type: ignore
-        calc_preds,
-        prep_data_in_torch_with_categories,
-        _custom_lr_mask_categories,
+    from mask_recommender.artifact_bundle import load_custom_lr_bundle  # type: ignore
+    from mask_recommender.scoring import (  # type: ignore
+        DEFAULT_BATCH_CHUNK_SIZE,
+        InvalidRankingOptions,
+        batch_chunk_size,
+        compiled_model_for,
+        ranking_fields,
+        ranking_maps,
+        ranking_options,
     )
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 DEFAULT_MODEL_TYPE = "custom_lr"
+CUSTOM_LATEST_KEY = 'mask_recommender/models/custom_latest.json'
+CUSTOM_ARTIFACT_PATHS = {
+    'params_key': '/tmp/mask_recommender_custom_params.pt',
+    'metadata_key': '/tmp/mask_recommender_custom_metadata.json',
+    'mask_data_key': '/tmp/mask_recommender_custom_mask_data.json',
+    'bundle_key': '/tmp/mask_recommender_custom_model.bundle',
+}
+LEGACY_ARTIFACT_KEY_NAMES = ('params_key', 'metadata_key', 'mask_data_key')
+
+# Module-level so warm Lambda invocations reuse the loaded model instead of
+# re-downloading and re-deserializing every artifact per request.
+_RECOMMENDER = None
 
 
 def _normalize_model_type(model_type):
@@ -34,6 +46,13 @@ def _normalize_model_type(model_type):
     logger.info("Coercing unsupported model_type=%s to %s", normalized, DEFAULT_MODEL_TYPE)
     return DEFAULT_MODEL_TYPE
 
+
+def _is_not_modified(exc: ClientError) -> bool:
+    error = exc.response.get('Error', {})
+    status = exc.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+    return str(error.get('Code')) in ('304', 'NotModified') or status == 304
+
+
 class MaskRecommenderInference:
     def __init__(self):
         self.s3_client = boto3.client('s3', region_name=self._s3_region())
@@ -42,6 +61,9 @@ class MaskRecommenderInference:
         self.custom_metadata = None
         self.custom_mask_data = None
         self.custom_last_loaded_at = None
+        self.custom_latest_etag = None
+        self.custom_artifact_keys = {}
+        self.custom_compiled_cache = {}
         self.refresh_seconds = int(os.environ.get('MODEL_REFRESH_SECONDS', '300'))
         logger.info(
             "Lambda init: function=%s version=%s image_tag=%s",
@@ -97,97 +119,137 @@ class MaskRecommenderInference:
             self.load_custom_model(force=True)
             return
         if (time.time() - self.custom_last_loaded_at) > self.refresh_seconds:
+            try:
+                self.refresh_custom_model()
+            except Exception as exc:
+                logger.warning("Keeping cached custom model; refresh failed: %s", exc)
+
+    def _fetch_latest_payload(self, etag=None):
+        request = {'Bucket': self.bucket, 'Key': CUSTOM_LATEST_KEY}
+        if etag:
+            request['IfNoneMatch'] = etag
+        try:
+            response = self.s3_client.get_object(**request)
+        except ClientError as exc:
+            if etag and _is_not_modified(exc):
+                return None, etag
+            raise
+        payload = json.loads(response['Body'].read().decode('utf-8'))
+        return payload, response.get('ETag')
+
+    def refresh_custom_model(self) -> bool:
+        """
+        Revalidate custom_latest.json with If-None-Match and reload only the
+        artifacts whose keys changed. Returns True when anything was reloaded.
+        """
+        if self.custom_params is None:
             self.load_custom_model(force=True)
+            return True
+
+        latest_payload, etag = self._fetch_latest_payload(etag=self.custom_latest_etag)
+        self.custom_last_loaded_at = time.time()
+        if latest_payload is None:
+            logger.info("custom_latest.json not modified (etag=%s); reusing cached model.", etag)
+            return False
+        return self._apply_latest_payload(latest_payload, etag)
 
     def load_custom_model(self, force: bool = False) -> None:
         if not force and self.custom_params is not None:
             return
 
-        latest_key = 'mask_recommender/models/custom_latest.json'
-        latest_path = '/tmp/mask_recommender_custom_latest.json'
-        self._download_file(latest_key, latest_path)
-        with open(latest_path, 'r') as f:
-            latest_payload = json.load(f)
+        latest_payload, etag = self._fetch_latest_payload()
+        self._apply_latest_payload(latest_payload, etag, force=force)
 
-        params_key = latest_payload['params_key']
-        metadata_key = latest_payload['metadata_key']
-        mask_data_key = latest_payload['mask_data_key']
-
-        params_path = '/tmp/mask_recommender_custom_params.pt'
-        metadata_path = '/tmp/mask_recommender_custom_metadata.json'
-        mask_data_path = '/tmp/mask_recommender_custom_mask_data.json'
-
-        self._download_file(params_key, params_path)
-        self._download_file(metadata_key, metadata_path)
-        self._download_file(mask_data_key, mask_data_path)
+    def _load_artifact(self, key_name: str, local_path: str) -> Dict:
+        """The model attributes ``key_name``'s artifact provides, loaded from ``local_path``."""
+        if key_name == 'bundle_key':
+            bundle = load_custom_lr_bundle(local_path)
+            return {
+                'custom_params': bundle.params,
+                'custom_metadata': bundle.metadata,
+                'custom_mask_data': bundle.mask_data,
+            }
+        if key_name == 'params_key':
+            # Legacy artifacts only; bundles keep cold starts free of torch.
+            import torch
 
-        with open(metadata_path, 'r') as f:
-            self.custom_metadata = json.load(f)
+            return {'custom_params': torch.load(local_path, map_location='cpu')}
+        with open(local_path, 'r') as f:
+            loaded = json.load(f)
+        if key_name == 'metadata_key':
+            return {'custom_metadata': loaded}
+        return {'custom_mask_data': loaded}
 
-        with open(mask_data_path, 'r') as f:
-            self.custom_mask_data = json.load(f)
+    def _apply_latest_payload(self, latest_payload: Dict, etag, force: bool = False) -> bool:
+        # Prefer the single memory-mapped bundle when training published one.
+        key_names = ('bundle_key',) if latest_payload.get('bundle_key') else LEGACY_ARTIFACT_KEY_NAMES
+        changed = [
+            key_name for key_name in key_names
+            if force or self.custom_artifact_keys.get(key_name) != latest_payload[key_name]
+        ]
+        # Load every changed artifact before swapping any in, so a failed
+        # download never leaves new params next to old metadata or mask data.
+        loaded = {}
+        for key_name in changed:
+            local_path = CUSTOM_ARTIFACT_PATHS[key_name]
+            self._download_file(latest_payload[key_name], local_path)
+            loaded.update(self._load_artifact(key_name, local_path))
+        for attribute, value in loaded.items():
+            setattr(self, attribute, value)
 
-        self.custom_params = torch.load(params_path, map_location='cpu')
+        self.custom_artifact_keys = {key_name: latest_payload[key_name] for key_name in key_names}
+        self.custom_latest_etag = etag
         self.custom_last_loaded_at = time.time()
-        logger.info(
-            "Loaded custom model %s from s3://%s/%s",
-            latest_payload.get('timestamp'),
-            self.bucket,
-            params_key
+        if changed:
+            logger.info(
+                "Loaded custom model %s from s3://%s/%s (reloaded=%s)",
+                latest_payload.get('timestamp'),
+                self.bucket,
+                latest_payload[key_names[0]],
+                ",".join(changed),
+            )
+        return bool(changed)
+
+    def compiled_custom_model(self):
+        return compiled_model_for(
+            self.custom_compiled_cache,
+            self.custom_params,
+            self.custom_metadata,
+            self.custom_mask_data,
         )
 
-    def _build_inference_rows(self, mask_data: Dict, facial_features: Dict) -> pd.DataFrame:
-        rows = []
-        for mask_id, mask_info in mask_data.items():
-            perimeter = mask_info.get('perimeter_mm')
-            if perimeter is None or (isinstance(perimeter, float) and pd.isna(perimeter)):
-                perimeter = 0
-            row = {
-                'mask_id': int(mask_id),
-                'fit_family_id': mask_info.get('fit_family_id'),
-                'perimeter_mm': perimeter,
-                'strap_type': mask_info.get('strap_type') or '',
-                'style': mask_info.get('style') or '',
-                'brand_model': mask_info.get('brand_model') or derive_brand_model(
-                    mask_info.get('unique_internal_model_code'),
-                    mask_info.get('current_state')
-                ),
-                'unique_internal_model_code': mask_info.get('unique_internal_model_code') or '',
-                'facial_hair_beard_length_mm': facial_features.get('facial_hair_beard_length_mm', 0) or 0,
-            }
-            for col in FACIAL_FEATURE_COLUMNS:
-                row[col] = facial_features.get(col, 0) or 0
-            for col in MASK_EMPIRICAL_FEATURE_COLUMNS:
-                row[col] = mask_info.get(col, 0) or 0
-            rows.append(row)
-        return pd.DataFrame(rows)
+    def recommend_masks_custom(self, facial_features: Dict, **options) -> List[Dict]:
+        """options: top_k, min_proba, styles, strap_types (see scoring.select_top)."""
+        self._maybe_refresh_custom()
+        if not self.custom_params or not self.custom_metadata or not self.custom_mask_data:
+            logger.error('Custom model or mask data not loaded; returning empty recommendations.')
+            return []
 
+        return self.compiled_custom_model().recommend(facial_features, **options)
 
-    def recommend_masks_custom(self, facial_features: Dict) -> List[Dict]:
+    def recommend_masks_custom_batch(
+        self,
+        facial_features_list: List[Dict],
+        chunk_size: int = DEFAULT_BATCH_CHUNK_SIZE,
+        **options,
+    ) -> List[List[Dict]]:
         self._maybe_refresh_custom()
         if not self.custom_params or not self.custom_metadata or not self.custom_mask_data:
             logger.error('Custom model or mask data not loaded; returning empty recommendations.')
-            return []
+            return [[] for _ in facial_features_list]
 
-        inference_rows = self._build_inference_rows(self.custom_mask_data, facial_features)
-        custom_data = prep_data_in_torch_with_categories(
-            inference_rows,
-            mask_categories=_custom_lr_mask_categories(self.custom_metadata),
-            style_categories=self.custom_metadata['style_categories'],
-            strap_categories=self.custom_metadata['strap_type_categories'],
+        return self.compiled_custom_model().recommend_batch(
+            facial_features_list,
+            chunk_size=chunk_size,
+            **options,
         )
-        with torch.no_grad():
-            probs = calc_preds(custom_data, self.custom_params).squeeze(1).cpu().tolist()
-
-        recommendations = []
-        for idx, (mask_id, mask_info) in enumerate(self.custom_mask_data.items()):
-            recommendations.append({
-                'mask_id': int(mask_id),
-                'proba_fit': float(probs[idx]),
-                'mask_info': mask_info,
-            })
-        recommendations.sort(key=lambda x: x['proba_fit'], reverse=True)
-        return recommendations
+
+
+def get_recommender() -> MaskRecommenderInference:
+    global _RECOMMENDER
+    if _RECOMMENDER is None:
+        _RECOMMENDER = MaskRecommenderInference()
+    return _RECOMMENDER
 
 
 def handler(event, context):
@@ -196,9 +258,11 @@ def handler(event, context):
         method = payload.get("method")
         facial_features = payload.get('facial_measurements', {})
         model_type = _normalize_model_type(payload.get('model_type'))
-        recommender = MaskRecommenderInference()
+        options = ranking_options(payload)
+        fields = ranking_fields(payload)
+        recommender = get_recommender()
         if method == "warmup":
-            recommender.load_custom_model(force=True)
+            recommender.refresh_custom_model()
             warmed_model = recommender.custom_metadata
             return {
                 'statusCode': 200,
@@ -208,18 +272,33 @@ def handler(event, context):
                     'model': warmed_model,
                 })
             }
-        recommendations = recommender.recommend_masks_custom(facial_features)
+        faces = payload.get('facial_measurements_batch')
+        if faces is not None:
+            chunk_size = batch_chunk_size(payload)
+            rankings = recommender.recommend_masks_custom_batch(faces, chunk_size=chunk_size, **options)
+            return {
+                'statusCode': 200,
+                'body': json.dumps({
+                    'results': [ranking_maps(recommendations, fields) for recommendations in rankings],
+                    'model': recommender.custom_metadata,
+                })
+            }
+        recommendations = recommender.recommend_masks_custom(facial_features, **options)
         model_payload = recommender.custom_metadata
-        mask_id_map = {str(idx): rec['mask_id'] for idx, rec in enumerate(recommendations)}
-        proba_map = {str(idx): rec['proba_fit'] for idx, rec in enumerate(recommendations)}
         return {
             'statusCode': 200,
             'body': json.dumps({
-                'mask_id': mask_id_map,
-                'proba_fit': proba_map,
+                **ranking_maps(recommendations, fields),
                 'model': model_payload,
             })
         }
+    except InvalidRankingOptions as exc:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({
+                'error': str(exc)
+            })
+        }
     except Exception as exc:
         logger.exception('Error in lambda handler: %s', exc)
         return {
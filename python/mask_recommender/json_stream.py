@@ -0,0 +1,261 @@
+"""
+Streaming ingestion of the Breathesafe JSON exports into DataFrames.
+
+``response.json()`` followed by ``pd.DataFrame(records)`` keeps three copies of
+an export alive at once: the response text, the parsed list of dicts, and the
+frame. ``stream_records_frame`` instead decodes the records array one object at
+a time with ``json.JSONDecoder.raw_decode`` over ``response.iter_content`` and
+appends each projected value to per-column batches. Every ``batch_size`` rows a
+batch is packed into a typed NumPy array (bool, int64, float64, or object as a
+fallback), so peak memory is roughly the final frame plus one batch of Python
+objects. Ints mixed with nulls stay objects until every batch is in, since a
+later batch of strings makes the whole column object.
+
+The result has the same columns, dtypes and values as
+``pd.DataFrame(records)`` (``pd.DataFrame(records)[columns]`` with a
+projection), including NaN for keys a record omits. Projected columns that no
+record has come back as all-NaN object columns.
+"""
+
+import codecs
+import json
+
+import numpy as np
+import pandas as pd
+
+STREAM_CHUNK_SIZE = 1 << 16
+COLUMN_BATCH_SIZE = 4096
+_INT64_MIN = -(1 << 63)
+_INT64_MAX = (1 << 63) - 1
+_WHITESPACE = ' \t\n\r'
+
+
+class _Missing:
+    """Marks a key a record omitted (NaN in pd.DataFrame(records), unlike null)."""
+
+
+_MISSING = _Missing()
+
+
+class _TextBuffer:
+    """Decoded text from a byte-chunk iterator with a read position."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.exhausted = False
+
+    def fill(self):
+        """Read one more chunk; False once the input is exhausted."""
+        if self.exhausted:
+            return False
+        # Drop consumed text so the buffer stays around one chunk long.
+        self.text = self.text[self.pos:]
+        self.pos = 0
+        for chunk in self._chunks:
+            if not chunk:
+                continue
+            self.text += self._decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+            return True
+        self.text += self._decoder.decode(b'', final=True)
+        self.exhausted = True
+        return True
+
+    def skip_whitespace(self):
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text) or not self.fill():
+                return
+
+    def peek(self):
+        self.skip_whitespace()
+        if self.pos >= len(self.text):
+            raise ValueError("Unexpected end of JSON input")
+        return self.text[self.pos]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos} of the JSON stream")
+        self.pos += 1
+
+    def decode_value(self, decoder):
+        self.skip_whitespace()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+            # A number at the end of the buffer may continue in the next chunk.
+            if end == len(self.text) and not self.exhausted:
+                self.fill()
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_array(buffer, decoder):
+    buffer.expect('[')
+    if buffer.peek() == ']':
+        buffer.pos += 1
+        return
+    while True:
+        yield buffer.decode_value(decoder)
+        separator = buffer.peek()
+        buffer.pos += 1
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError(f"Expected ',' or ']' at offset {buffer.pos - 1} of the JSON stream")
+
+
+def iter_json_records(chunks, records_key=None):
+    """
+    Yield the elements of ``payload[records_key]`` (of the top-level array when
+    ``records_key`` is None) from an iterable of bytes or str chunks. Other
+    top-level values are decoded and skipped.
+    """
+    buffer = _TextBuffer(chunks)
+    decoder = json.JSONDecoder()
+    if records_key is None:
+        yield from _iter_array(buffer, decoder)
+        return
+
+    buffer.expect('{')
+    if buffer.peek() == '}':
+        return
+    while True:
+        key = buffer.decode_value(decoder)
+        buffer.expect(':')
+        if key == records_key:
+            yield from _iter_array(buffer, decoder)
+        else:
+            buffer.decode_value(decoder)
+        separator = buffer.peek()
+        buffer.pos += 1
+        if separator == '}':
+            return
+        if separator != ',':
+            raise ValueError(f"Expected ',' or '}}' at offset {buffer.pos - 1} of the JSON stream")
+
+
+def _pack_batch(values):
+    """(kind, array) for one batch, using the types pandas would infer.
+
+    Batches whose values only become float64 in an all-numeric column
+    (ints next to floats or nulls) stay as objects, kind 'numeric', so a later
+    string batch still gets the original ints and Nones back.
+    """
+    present = [value for value in values if value is not None and value is not _MISSING]
+    if not present:
+        # pandas reads a column of None and NaN (omitted keys) as float64.
+        kind = 'missing' if any(value is _MISSING for value in values) else 'null'
+        return kind, _object_array(values)
+    if len(present) == len(values) and all(type(value) is bool for value in present):
+        return 'bool', np.array(present, dtype=bool)
+    if any(type(value) is int and not _INT64_MIN <= value <= _INT64_MAX for value in present):
+        return 'object', _object_array(values)
+    if len(present) == len(values) and all(type(value) is int for value in present):
+        return 'int', np.array(present, dtype=np.int64)
+    if all(type(value) is float for value in present) and None not in values:
+        return 'float', np.array([np.nan if value is _MISSING else value for value in values], dtype=np.float64)
+    if all(type(value) in (int, float) for value in present):
+        return 'numeric', _object_array(values)
+    return 'object', _object_array(values)
+
+
+def _object_array(values):
+    array = np.empty(len(values), dtype=object)
+    array[:] = [np.nan if value is _MISSING else value for value in values]
+    return array
+
+
+def _combine_batches(batches):
+    if not batches:
+        return np.empty(0, dtype=object)
+    kinds = {kind for kind, _ in batches}
+    arrays = [array for _, array in batches]
+    typed = kinds - {'null', 'missing'}
+    if len(kinds) == 1 and typed and typed != {'numeric'}:
+        return np.concatenate(arrays)
+    if typed <= {'int', 'float', 'numeric'} and (typed or 'missing' in kinds):
+        # Integers mixed with floats or nulls become float64, as in pandas.
+        return np.concatenate([
+            array.astype(np.float64) if kind == 'int'
+            else np.full(len(array), np.nan) if kind in ('null', 'missing')
+            else np.array([np.nan if value is None else value for value in array], dtype=np.float64)
+            if kind == 'numeric'
+            else array
+            for kind, array in batches
+        ])
+    return np.concatenate([array.astype(object) for array in arrays])
+
+
+class ColumnarRecordBuilder:
+    """Accumulates record dicts into typed per-column batches."""
+
+    def __init__(self, columns=None, batch_size=COLUMN_BATCH_SIZE):
+        self.columns = list(columns) if columns is not None else None
+        self.batch_size = batch_size
+        self._pending = {}
+        self._batches = {}
+        self._rows = 0
+        self._pending_rows = 0
+        if self.columns is not None:
+            for column in self.columns:
+                self._add_column(column)
+
+    def _add_column(self, column):
+        self._batches[column] = []
+        # Earlier rows did not have this key.
+        flushed = self._rows - self._pending_rows
+        if flushed:
+            self._batches[column].append(('missing', _object_array([_MISSING] * flushed)))
+        self._pending[column] = [_MISSING] * self._pending_rows
+
+    def append(self, record):
+        if self.columns is None:
+            for column in record:
+                if column not in self._pending:
+                    self._add_column(column)
+        for column, values in self._pending.items():
+            values.append(record.get(column, _MISSING))
+        self._rows += 1
+        self._pending_rows += 1
+        if self._pending_rows >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending_rows:
+            return
+        for column, values in self._pending.items():
+            self._batches[column].append(_pack_batch(values))
+            self._pending[column] = []
+        self._pending_rows = 0
+
+    def to_frame(self):
+        self._flush()
+        if not self._batches:
+            return pd.DataFrame(index=pd.RangeIndex(self._rows))
+        data = {column: _combine_batches(batches) for column, batches in self._batches.items()}
+        return pd.DataFrame(data, columns=list(self._batches))
+
+
+def read_records_frame(chunks, records_key=None, columns=None, batch_size=COLUMN_BATCH_SIZE):
+    """``pd.DataFrame(payload[records_key])`` decoded incrementally from ``chunks``."""
+    builder = ColumnarRecordBuilder(columns=columns, batch_size=batch_size)
+    for record in iter_json_records(chunks, records_key):
+        builder.append(record)
+    return builder.to_frame()
+
+
+def stream_records_frame(response, records_key=None, columns=None, chunk_size=STREAM_CHUNK_SIZE):
+    """read_records_frame over a ``requests`` response opened with ``stream=True``."""
+    try:
+        return read_records_frame(response.iter_content(chunk_size=chunk_size), records_key, columns=columns)
+    finally:
+        response.close()
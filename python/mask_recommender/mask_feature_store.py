@@ -0,0 +1,62 @@
+"""
+Mask feature store: the mask-only feature columns, computed once per training
+run from the masks table.
+
+None of these depend on the user: strap flags, sizing ranks/buckets, the
+kids/petite flags, perimeter_mm, brand_model and the empirical priors. Feature
+building looks them up by mask_id (``apply_feature_plan(mask_features=...)``)
+and only computes the face-side and face x mask interaction columns per row.
+
+Because of that lookup, training rows take their mask-side features from the
+masks table, like custom_mask_data.json at inference, rather than from the
+mask columns joined onto each fit test; the two differ when a mask was edited
+after it was tested. Rows for masks missing from the table are still computed
+from the row.
+
+The store is a DataFrame indexed by mask_id with MASK_FEATURE_STORE_COLUMNS.
+"""
+
+import numpy as np
+import pandas as pd
+try:
+    from feature_builder import (MASK_EMPIRICAL_FEATURE_COLUMNS, MASK_SIDE_FEATURE_COLUMNS, add_brand_model_column,
+                                 mask_side_features)
+except ModuleNotFoundError:
+    from mask_recommender.feature_builder import (  # type: ignore
+        MASK_EMPIRICAL_FEATURE_COLUMNS,
+        MASK_SIDE_FEATURE_COLUMNS,
+        add_brand_model_column,
+        mask_side_features,
+    )
+
+# mask_badness_x_abs_perimeter_diff needs the face, so it is not stored.
+MASK_PRIOR_FEATURE_COLUMNS = [
+    column for column in MASK_EMPIRICAL_FEATURE_COLUMNS
+    if column != 'mask_badness_x_abs_perimeter_diff'
+]
+MASK_FEATURE_STORE_COLUMNS = ['perimeter_mm', 'brand_model'] + MASK_SIDE_FEATURE_COLUMNS + MASK_PRIOR_FEATURE_COLUMNS
+
+
+def build_mask_feature_store(masks_df):
+    """
+    Build the store from the masks table (``id`` or ``mask_id`` column). Prior
+    columns are taken from the frame when present, i.e. after
+    attach_mask_empirical_priors_to_masks.
+    """
+    id_column = 'mask_id' if 'mask_id' in masks_df.columns else 'id'
+    mask_ids = pd.to_numeric(masks_df[id_column], errors='coerce')
+    masks = masks_df[mask_ids.notna()]
+    mask_ids = mask_ids[mask_ids.notna()].astype(np.int64)
+    keep = ~mask_ids.duplicated().to_numpy()
+    masks = masks[keep]
+    mask_ids = mask_ids[keep]
+
+    store = mask_side_features(masks)
+    store['perimeter_mm'] = pd.to_numeric(masks['perimeter_mm'], errors='coerce')
+    store['brand_model'] = add_brand_model_column(masks)['brand_model']
+    for column in MASK_PRIOR_FEATURE_COLUMNS:
+        if column in masks.columns:
+            store[column] = pd.to_numeric(masks[column], errors='coerce')
+
+    store.index = pd.Index(mask_ids.to_numpy(), name='mask_id')
+    return store[[column for column in MASK_FEATURE_STORE_COLUMNS if column in store.columns]]
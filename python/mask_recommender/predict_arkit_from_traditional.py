@@ -20,12 +20,14 @@ from __future__ import annotations
 import argparse
 import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List
 import joblib
 
 import numpy as np
 import pandas as pd
+import requests
 from sklearn.metrics import mean_absolute_error, r2_score
 from sklearn.multioutput import MultiOutputRegressor
 from sklearn.pipeline import Pipeline
@@ -37,6 +39,7 @@ from breathesafe_network import (
     logout,
     fetch_json,
 )
+from export_cache import credential_scope
 
 FEATURE_COLUMNS = [
     "face_width",
@@ -229,8 +232,15 @@ def predict_arkit_from_traditional(
     password=None,
     model_path=None,
     users_output_file=None,
-    output_file=None
+    output_file=None,
+    cache=None,
 ):
+    """
+    ``cache`` (an export_cache.ExportCache) serves the summary and fit-test
+    exports from disk when they are unchanged; entries are scoped to the
+    account (export_cache.credential_scope) because both exports depend on who
+    is logged in.
+    """
     base_url = base_url.rstrip("/")
     session = build_session(cookie)
 
@@ -248,32 +258,54 @@ def predict_arkit_from_traditional(
     summary_url = f"{base_url}/facial_measurements/summary.json"
     fit_tests_url = f"{base_url}/facial_measurements_fit_tests.json"
 
-    summary_payload = fetch_json(session, summary_url)["facial_measurements"]
-    summary_df = prepare_dataframe(summary_payload, FEATURE_COLUMNS, TARGET_COLUMNS)
-
-    model = train_model(summary_df)
-    if model_path:
-        model_path.parent.mkdir(parents=True, exist_ok=True)
-
-        joblib.dump(model, model_path)
-        logging.info("Saved trained model to %s", model_path)
-
-    user_table_df, _ = build_user_table(summary_df, model)
-
-    if users_output_file:
-        users_output_file.parent.mkdir(parents=True, exist_ok=True)
-        user_table_df[
-            ["user_id"] + FEATURE_COLUMNS + TARGET_COLUMNS + ["actual"]
-        ].to_csv(users_output_file, index=False)
-
-        logging.info("Wrote user-level ARKit aggregates to %s", users_output_file)
-
-    fit_tests_payload = fetch_json(session, fit_tests_url)[
-        "fit_tests_with_facial_measurements"
-    ]
-
-    if logged_in:
-        logout(session, base_url)
+    scope = credential_scope(email, cookie)
+
+    def fetch_fit_tests():
+        if cache is not None:
+            return cache.fetch_frame(
+                session, fit_tests_url, "fit_tests_with_facial_measurements", scope=scope
+            )
+        return fetch_json(session, fit_tests_url)["fit_tests_with_facial_measurements"]
+
+    # The fit-test export does not depend on the summary, so download it while
+    # the summary is fetched and the regression is trained.
+    executor = ThreadPoolExecutor(max_workers=1)
+    fit_tests_future = executor.submit(fetch_fit_tests)
+    try:
+        if cache is not None:
+            summary_payload = cache.fetch_frame(session, summary_url, "facial_measurements", scope=scope)
+        else:
+            summary_payload = fetch_json(session, summary_url)["facial_measurements"]
+        summary_df = prepare_dataframe(summary_payload, FEATURE_COLUMNS, TARGET_COLUMNS)
+
+        model = train_model(summary_df)
+        if model_path:
+            model_path.parent.mkdir(parents=True, exist_ok=True)
+
+            joblib.dump(model, model_path)
+            logging.info("Saved trained model to %s", model_path)
+
+        user_table_df, _ = build_user_table(summary_df, model)
+
+        if users_output_file:
+            users_output_file.parent.mkdir(parents=True, exist_ok=True)
+            user_table_df[
+                ["user_id"] + FEATURE_COLUMNS + TARGET_COLUMNS + ["actual"]
+            ].to_csv(users_output_file, index=False)
+
+            logging.info("Wrote user-level ARKit aggregates to %s", users_output_file)
+
+        fit_tests_payload = fit_tests_future.result()
+    finally:
+        # On failure, stop or join the download before logging its session out.
+        fit_tests_future.cancel()
+        executor.shutdown(wait=True)
+        if logged_in:
+            try:
+                logout(session, base_url)
+            except requests.RequestException as exc:
+                logging.warning("Logout failed: %s", exc)
+        logging.info("Breathesafe requests for ARKit imputation: %s", session.timing_summary())
 
     fit_tests_df = prepare_dataframe(fit_tests_payload, FEATURE_COLUMNS, TARGET_COLUMNS)
 
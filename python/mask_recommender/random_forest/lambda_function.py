@@ -2,7 +2,6 @@ import json
 import logging
 from typing import Any, Dict
 
-from .training_service import train
 from .inference_service import infer
 
 logger = logging.getLogger()
@@ -24,6 +23,9 @@ def handler(event: Dict[str, Any], context: Any):
 
         method = (body.get("method") or "infer").strip().lower()
         if method == "train":
+            # Imported here so inference cold starts do not load scikit-learn.
+            from .training_service import train
+
             epochs = int(body.get("epochs", 0))  # ignored by RF; retained for API parity
             data_url = body.get("data_url", DEFAULT_DATA_URL)
             target_col = body.get("target_col", "target")
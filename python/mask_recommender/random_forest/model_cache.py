@@ -0,0 +1,62 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REFRESH_SECONDS = int(os.environ.get("MODEL_REFRESH_SECONDS", "300"))
+
+
+class CachedArtifact:
+    """
+    Keeps a loaded artifact for the life of the process (warm Lambda
+    invocations share it). At most every ``ttl_seconds`` the cheap
+    ``version_fn`` (an ETag) is checked, and ``loader`` runs again only when
+    the version changed. If revalidation fails the cached value is kept.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        loader: Callable[[], Any],
+        version_fn: Callable[[], str],
+        ttl_seconds: float = DEFAULT_REFRESH_SECONDS,
+    ):
+        self.name = name
+        self.loader = loader
+        self.version_fn = version_fn
+        self.ttl_seconds = ttl_seconds
+        self.value: Any = None
+        self.version: Optional[str] = None
+        self.loads = 0
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.value = None
+            self.version = None
+            self._checked_at = None
+
+    def get(self) -> Any:
+        with self._lock:
+            now = time.monotonic()
+            if self._checked_at is not None and now - self._checked_at < self.ttl_seconds:
+                return self.value
+            try:
+                version = self.version_fn()
+            except Exception as exc:
+                if self._checked_at is None:
+                    raise
+                logger.warning("Keeping cached %s; revalidation failed: %s", self.name, exc)
+                self._checked_at = now
+                return self.value
+            if self._checked_at is None or version != self.version:
+                self.value = self.loader()
+                self.version = version
+                self.loads += 1
+                logger.info("Loaded %s (version=%s)", self.name, version)
+            self._checked_at = now
+            return self.value
@@ -1,11 +1,14 @@
 import io
 import json
 import os
+import shutil
 import time
-from typing import Any, Dict, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
 
 import boto3
 import joblib
+from botocore.exceptions import ClientError
 
 
 def _env() -> str:
@@ -30,74 +33,156 @@ def s3_client():
     return boto3.client("s3", region_name=region)
 
 
-def save_bytes_to_s3(data: bytes, key: str) -> str:
+_DEV_MODEL_DIR = "/tmp/mask-recommender-development/models"
+_UPLOAD_WORKERS = 4
+MODEL_LATEST_KEY = "rf_classifier_latest.joblib"
+TREE_ENSEMBLE_LATEST_KEY = "rf_ensemble_latest.npz"
+
+
+def save_bytes_to_s3(data: bytes, key: str, s3=None) -> str:
     if _env() == "development":
-        base = "/tmp/mask-recommender-development/models"
-        os.makedirs(base, exist_ok=True)
-        path = os.path.join(base, key)
+        os.makedirs(_DEV_MODEL_DIR, exist_ok=True)
+        path = os.path.join(_DEV_MODEL_DIR, key)
         with open(path, "wb") as f:
             f.write(data)
         return f"file://{path}"
     else:
         bucket, prefix = get_s3_bucket_and_prefix()
-        s3 = s3_client()
+        s3 = s3 or s3_client()
         s3.put_object(Bucket=bucket, Key=f"{prefix}/{key}", Body=data)
         return f"s3://{bucket}/{prefix}/{key}"
 
 
-def upload_checkpoint(state: Dict[str, Any], metrics: Dict[str, Any]) -> Dict[str, str]:
+def copy_in_s3(source_key: str, key: str, s3=None) -> str:
+    """Alias an already-saved object under ``key`` without re-sending its bytes (server-side copy in S3)."""
+    if _env() == "development":
+        path = os.path.join(_DEV_MODEL_DIR, key)
+        shutil.copyfile(os.path.join(_DEV_MODEL_DIR, source_key), path)
+        return f"file://{path}"
+    else:
+        bucket, prefix = get_s3_bucket_and_prefix()
+        s3 = s3 or s3_client()
+        s3.copy_object(
+            Bucket=bucket,
+            Key=f"{prefix}/{key}",
+            CopySource={"Bucket": bucket, "Key": f"{prefix}/{source_key}"},
+        )
+        return f"s3://{bucket}/{prefix}/{key}"
+
+
+def save_versioned_with_latest(data: bytes, versioned_key: str, latest_key: str, s3=None) -> Tuple[str, str]:
+    """Save ``data`` once under ``versioned_key``, then copy it to ``latest_key`` so latest never precedes its version."""
+    versioned = save_bytes_to_s3(data, versioned_key, s3=s3)
+    latest = copy_in_s3(versioned_key, latest_key, s3=s3)
+    return versioned, latest
+
+
+def _save_model_artifacts(
+    model_bytes: bytes,
+    tree_ensemble: Optional[bytes],
+    timestamp: str,
+    s3=None,
+) -> Dict[str, str]:
+    paths: Dict[str, str] = {}
+    paths["model_versioned"], paths["model_latest"] = save_versioned_with_latest(
+        model_bytes,
+        f"rf_classifier_{timestamp}.joblib",
+        MODEL_LATEST_KEY,
+        s3=s3,
+    )
+    # The compiled ensemble goes second: inference treats an ensemble last
+    # modified before the joblib model as stale (see object_stat).
+    if tree_ensemble is not None:
+        paths["ensemble_versioned"], paths["ensemble_latest"] = save_versioned_with_latest(
+            tree_ensemble,
+            f"rf_ensemble_{timestamp}.npz",
+            TREE_ENSEMBLE_LATEST_KEY,
+            s3=s3,
+        )
+    return paths
+
+
+def upload_checkpoint(
+    state: Dict[str, Any],
+    metrics: Dict[str, Any],
+    tree_ensemble: Optional[bytes] = None,
+) -> Dict[str, str]:
     timestamp = time.strftime("%Y%m%d_%H%M%S")
-    # Model (joblib)
+    # Model (joblib), serialized once
     buf = io.BytesIO()
     joblib.dump(state, buf)
-    buf.seek(0)
-    model_latest = save_bytes_to_s3(buf.getvalue(), "rf_classifier_latest.joblib")
-    buf.seek(0)
-    model_versioned = save_bytes_to_s3(buf.getvalue(), f"rf_classifier_{timestamp}.joblib")
+    model_bytes = buf.getvalue()
     # Metrics
     metrics_bytes = json.dumps(metrics).encode("utf-8")
-    metrics_latest = save_bytes_to_s3(metrics_bytes, "metrics_latest.json")
-    metrics_versioned = save_bytes_to_s3(metrics_bytes, f"metrics_{timestamp}.json")
-    return {
-        "model_latest": model_latest,
-        "model_versioned": model_versioned,
-        "metrics_latest": metrics_latest,
-        "metrics_versioned": metrics_versioned,
-    }
+    s3 = None if _env() == "development" else s3_client()
+    with ThreadPoolExecutor(max_workers=_UPLOAD_WORKERS) as pool:
+        model_future = pool.submit(_save_model_artifacts, model_bytes, tree_ensemble, timestamp, s3)
+        metrics_future = pool.submit(
+            save_versioned_with_latest,
+            metrics_bytes,
+            f"metrics_{timestamp}.json",
+            "metrics_latest.json",
+            s3,
+        )
+        paths = model_future.result()
+        metrics_versioned, metrics_latest = metrics_future.result()
+    paths["metrics_latest"] = metrics_latest
+    paths["metrics_versioned"] = metrics_versioned
+    return paths
 
 
 def save_mask_data(mask_data: Dict[str, Any]) -> Dict[str, str]:
     timestamp = time.strftime("%Y%m%d_%H%M%S")
     payload = json.dumps(mask_data).encode("utf-8")
+    versioned, latest = save_versioned_with_latest(
+        payload,
+        f"mask_data_{timestamp}.json",
+        "mask_data_latest.json",
+    )
+    return {
+        "mask_data_latest": latest,
+        "mask_data_versioned": versioned,
+    }
+
+
+def object_version(key: str) -> str:
+    """
+    Cheap change marker for a saved artifact: the S3 ETag (one HEAD request),
+    or the file's mtime and size in development.
+    """
     if _env() == "development":
-        base = "/tmp/mask-recommender-development/models"
-        os.makedirs(base, exist_ok=True)
-        latest_path = os.path.join(base, "mask_data_latest.json")
-        versioned_path = os.path.join(base, f"mask_data_{timestamp}.json")
-        with open(latest_path, "wb") as f:
-            f.write(payload)
-        with open(versioned_path, "wb") as f:
-            f.write(payload)
-        return {
-            "mask_data_latest": f"file://{latest_path}",
-            "mask_data_versioned": f"file://{versioned_path}",
-        }
+        stat = os.stat(os.path.join(_DEV_MODEL_DIR, key))
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
     else:
         bucket, prefix = get_s3_bucket_and_prefix()
-        s3 = s3_client()
-        latest_key = f"{prefix}/mask_data_latest.json"
-        versioned_key = f"{prefix}/mask_data_{timestamp}.json"
-        s3.put_object(Bucket=bucket, Key=latest_key, Body=payload)
-        s3.put_object(Bucket=bucket, Key=versioned_key, Body=payload)
-        return {
-            "mask_data_latest": f"s3://{bucket}/{latest_key}",
-            "mask_data_versioned": f"s3://{bucket}/{versioned_key}",
-        }
+        response = s3_client().head_object(Bucket=bucket, Key=f"{prefix}/{key}")
+        return str(response["ETag"])
+
+
+def _is_missing(error: ClientError) -> bool:
+    return str(error.response.get("Error", {}).get("Code")) in ("404", "NoSuchKey", "NotFound")
+
+
+def object_stat(key: str) -> Optional[Tuple[str, float]]:
+    """(object_version, last-modified epoch seconds) of a saved artifact, or None when it does not exist."""
+    try:
+        if _env() == "development":
+            stat = os.stat(os.path.join(_DEV_MODEL_DIR, key))
+            return f"{stat.st_mtime_ns}-{stat.st_size}", stat.st_mtime
+        bucket, prefix = get_s3_bucket_and_prefix()
+        response = s3_client().head_object(Bucket=bucket, Key=f"{prefix}/{key}")
+        return str(response["ETag"]), response["LastModified"].timestamp()
+    except FileNotFoundError:
+        return None
+    except ClientError as e:
+        if _is_missing(e):
+            return None
+        raise
 
 
 def load_mask_data() -> Dict[str, Any]:
     if _env() == "development":
-        base = "/tmp/mask-recommender-development/models"
+        base = _DEV_MODEL_DIR
         path = os.path.join(base, "mask_data_latest.json")
         with open(path, "rb") as f:
             return json.loads(f.read().decode("utf-8"))
@@ -134,8 +219,8 @@ def load_mask_data() -> Dict[str, Any]:
 
 def load_latest_model() -> Dict[str, Any]:
     if _env() == "development":
-        base = "/tmp/mask-recommender-development/models"
-        path = os.path.join(base, "rf_classifier_latest.joblib")
+        base = _DEV_MODEL_DIR
+        path = os.path.join(base, MODEL_LATEST_KEY)
         with open(path, "rb") as f:
             buf = io.BytesIO(f.read())
         buf.seek(0)
@@ -144,9 +229,27 @@ def load_latest_model() -> Dict[str, Any]:
     else:
         bucket, prefix = get_s3_bucket_and_prefix()
         s3 = s3_client()
-        key = f"{prefix}/rf_classifier_latest.joblib"
+        key = f"{prefix}/{MODEL_LATEST_KEY}"
         buf = io.BytesIO()
         s3.download_fileobj(bucket, key, buf)
         buf.seek(0)
         state = joblib.load(buf)
         return state
+
+
+def load_tree_ensemble() -> Optional[bytes]:
+    """The compiled forest (.npz bytes), or None when training did not publish one."""
+    try:
+        if _env() == "development":
+            with open(os.path.join(_DEV_MODEL_DIR, TREE_ENSEMBLE_LATEST_KEY), "rb") as f:
+                return f.read()
+        bucket, prefix = get_s3_bucket_and_prefix()
+        buf = io.BytesIO()
+        s3_client().download_fileobj(bucket, f"{prefix}/{TREE_ENSEMBLE_LATEST_KEY}", buf)
+        return buf.getvalue()
+    except FileNotFoundError:
+        return None
+    except ClientError as e:
+        if _is_missing(e):
+            return None
+        raise
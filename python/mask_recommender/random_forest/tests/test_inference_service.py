@@ -5,7 +5,7 @@ import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
 
-from python.mask_recommender.random_forest.inference_service import infer
+from python.mask_recommender.random_forest.inference_service import clear_cache, infer
 from python.mask_recommender.random_forest import s3_io
 
 
@@ -47,6 +47,10 @@ def test_infer_shapes(monkeypatch):
 
     monkeypatch.setattr(s3_io, "load_latest_model", fake_load_latest_model)
     monkeypatch.setattr(s3_io, "load_mask_data", fake_load_mask_data)
+    monkeypatch.setattr(s3_io, "object_version", lambda key: "v1")
+    monkeypatch.setattr(s3_io, "object_stat", lambda key: ("v1", 0.0))
+    monkeypatch.setattr(s3_io, "load_tree_ensemble", lambda: None)
+    clear_cache()
 
     out = infer({"face_width": 135, "face_length": 112}, mask_ids=None)
     assert set(out.keys()) == {"mask_id", "proba_fit", "threshold"}
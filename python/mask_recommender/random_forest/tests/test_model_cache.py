@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from python.mask_recommender.random_forest import inference_service, s3_io
+from python.mask_recommender.random_forest.inference_service import clear_cache, infer, to_binary_float, to_float_safe
+from python.mask_recommender.random_forest.model_cache import CachedArtifact
+
+FEATURE_NAMES = [
+    "face_width", "nose_protrusion", "bitragion_subnasale_arc", "facial_hair_beard_length_mm",
+    "perimeter_mm", "adjustable_headstrap", "adjustable_earloops",
+    "mask_id_1", "mask_id_2", "mask_id_3", "style_Bifold", "style_Cup", "strap_type_Earloop",
+]
+MASK_DATA = {
+    "1": {"mask_id": 1, "perimeter_mm": 500, "style": "Bifold", "strap_type": "Earloop", "adjustable_earloops": "yes"},
+    "2": {"mask_id": 2, "perimeter_mm": None, "style": "Cup", "strap_type": "Headstrap", "adjustable_headstrap": 1},
+    "3": {"mask_id": 3, "perimeter_mm": "510.5", "style": None, "strap_type": "Earloop"},
+    "4": {"mask_id": 4, "perimeter_mm": 480, "style": "Cup", "strap_type": "Earloop"},
+}
+
+
+def _feature_row(facial, mask_info):
+    """Reference row built one mask at a time, the way inference used to."""
+    row = {name: 0.0 for name in FEATURE_NAMES}
+    row.update({
+        "face_width": to_float_safe(facial.get("face_width")),
+        "nose_protrusion": to_float_safe(facial.get("nose_protrusion")),
+        "bitragion_subnasale_arc": to_float_safe(facial.get("bitragion_subnasale_arc")),
+        "facial_hair_beard_length_mm": to_float_safe(facial.get("facial_hair_beard_length_mm")),
+        "perimeter_mm": to_float_safe(mask_info.get("perimeter_mm")),
+        "adjustable_headstrap": to_binary_float(mask_info.get("adjustable_headstrap")),
+        "adjustable_earloops": to_binary_float(mask_info.get("adjustable_earloops")),
+    })
+    style = "" if mask_info.get("style") is None else str(mask_info.get("style"))
+    strap_type = "" if mask_info.get("strap_type") is None else str(mask_info.get("strap_type"))
+    for one_hot in (f"mask_id_{mask_info['mask_id']}", f"style_{style}", f"strap_type_{strap_type}"):
+        if one_hot in row:
+            row[one_hot] = 1.0
+    return pd.DataFrame([{**row, "mask_id": int(mask_info["mask_id"])}])
+
+
+def _state():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(80, len(FEATURE_NAMES))).astype(np.float32)
+    y = (X[:, 0] + X[:, 4] > 0).astype(np.int64)
+    rf = RandomForestClassifier(n_estimators=5, random_state=0).fit(X, y)
+    return {"model": rf, "feature_names": FEATURE_NAMES, "threshold": 0.4, "stats": None}
+
+
+@pytest.fixture
+def artifacts(monkeypatch):
+    state = _state()
+    versions = {"rf_classifier_latest.joblib": "m1", "mask_data_latest.json": "d1"}
+    loads = {"model": 0, "mask_data": 0}
+
+    def load_latest_model():
+        loads["model"] += 1
+        return state
+
+    def load_mask_data():
+        loads["mask_data"] += 1
+        return MASK_DATA
+
+    monkeypatch.setattr(s3_io, "load_latest_model", load_latest_model)
+    monkeypatch.setattr(s3_io, "load_mask_data", load_mask_data)
+    monkeypatch.setattr(s3_io, "object_version", lambda key: versions[key])
+    monkeypatch.setattr(s3_io, "object_stat", lambda key: (versions[key], 0.0) if key in versions else None)
+    monkeypatch.setattr(s3_io, "load_tree_ensemble", lambda: None)
+    clear_cache()
+    yield state, versions, loads
+    clear_cache()
+
+
+@pytest.mark.parametrize("mask_ids", [None, [3, 1], ["2"], [99]])
+def test_infer_matches_per_row_feature_frames(artifacts, mask_ids):
+    state, _, _ = artifacts
+    facial = {"face_width": 141.5, "nose_protrusion": "22", "bitragion_subnasale_arc": None}
+
+    out = infer(facial, mask_ids)
+
+    items = [(mid, info) for mid, info in MASK_DATA.items() if not mask_ids or int(mid) in {int(i) for i in mask_ids}]
+    if not items:
+        assert out == {"mask_id": {}, "proba_fit": {}}
+        return
+    frame = pd.concat(
+        [_feature_row(facial, {**info, "mask_id": int(mid)}) for mid, info in items],
+        ignore_index=True,
+    )
+    probs = state["model"].predict_proba(frame[FEATURE_NAMES].to_numpy(dtype=np.float32))[:, 1]
+    order = np.argsort(-probs)
+    assert out["mask_id"] == {str(i): int(frame.iloc[idx]["mask_id"]) for i, idx in enumerate(order)}
+    assert out["proba_fit"] == {str(i): float(probs[idx]) for i, idx in enumerate(order)}
+    assert out["threshold"] == 0.4
+
+
+def test_infer_reuses_cached_artifacts_until_the_etag_changes(artifacts, monkeypatch):
+    _, versions, loads = artifacts
+    monkeypatch.setattr(inference_service._MODEL, "ttl_seconds", 0)
+    monkeypatch.setattr(inference_service._MASK_DATA, "ttl_seconds", 0)
+
+    infer({"face_width": 140})
+    infer({"face_width": 150})
+    assert loads == {"model": 1, "mask_data": 1}
+
+    versions["mask_data_latest.json"] = "d2"
+    infer({"face_width": 140})
+    assert loads == {"model": 1, "mask_data": 2}
+    assert inference_service._MASK_BLOCK_CACHE.keys() == {("rf_classifier_latest.joblib@m1", "d2")}
+
+
+def test_cached_artifact_skips_revalidation_within_ttl_and_survives_failures():
+    versions = ["v1"]
+    checks = []
+
+    def version_fn():
+        checks.append(1)
+        if versions[0] is None:
+            raise RuntimeError("S3 unavailable")
+        return versions[0]
+
+    loaded = []
+    cache = CachedArtifact("model", loader=lambda: loaded.append(versions[0]) or len(loaded), version_fn=version_fn, ttl_seconds=60)
+    assert cache.get() == 1
+    versions[0] = "v2"
+    assert cache.get() == 1
+    assert len(checks) == 1
+
+    cache.ttl_seconds = 0
+    assert cache.get() == 2
+    versions[0] = None
+    assert cache.get() == 2
+    assert loaded == ["v1", "v2"]
+
+
+def test_object_version_changes_when_a_development_artifact_is_rewritten(monkeypatch, tmp_path):
+    monkeypatch.setenv("ENVIRONMENT", "development")
+    monkeypatch.setattr(s3_io, "_DEV_MODEL_DIR", str(tmp_path))
+    s3_io.save_bytes_to_s3(b"one", "mask_data_latest.json")
+    first = s3_io.object_version("mask_data_latest.json")
+    s3_io.save_bytes_to_s3(b"three", "mask_data_latest.json")
+
+    assert s3_io.object_version("mask_data_latest.json") != first
@@ -0,0 +1,51 @@
+import io
+import json
+
+import boto3
+import joblib
+import pytest
+
+from python.mask_recommender.random_forest import s3_io
+
+
+def test_upload_checkpoint_copies_latest_from_versioned_objects(monkeypatch):
+    mock_aws = pytest.importorskip("moto").mock_aws
+    monkeypatch.setenv("ENVIRONMENT", "staging")
+    monkeypatch.setenv("S3_BUCKET_REGION", "us-east-1")
+    monkeypatch.delenv("S3_BUCKET", raising=False)
+    monkeypatch.delenv("AWS_PROFILE", raising=False)
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="breathesafe-staging")
+
+        paths = s3_io.upload_checkpoint({"threshold": 0.4}, {"val_f1": 0.7})
+
+        assert s3_io.load_latest_model() == {"threshold": 0.4}
+        prefix = "mask-recommender-staging/models"
+        for name in ("model", "metrics"):
+            versioned_key = paths[f"{name}_versioned"].split("breathesafe-staging/", 1)[1]
+            latest_key = paths[f"{name}_latest"].split("breathesafe-staging/", 1)[1]
+            assert latest_key.startswith(prefix)
+            versioned = s3.get_object(Bucket="breathesafe-staging", Key=versioned_key)
+            latest = s3.get_object(Bucket="breathesafe-staging", Key=latest_key)
+            assert latest["Body"].read() == versioned["Body"].read()
+        metrics_key = paths["metrics_latest"].split("breathesafe-staging/", 1)[1]
+        metrics = s3.get_object(Bucket="breathesafe-staging", Key=metrics_key)["Body"].read()
+        assert json.loads(metrics) == {"val_f1": 0.7}
+
+
+def test_save_mask_data_in_development_writes_versioned_then_latest(monkeypatch, tmp_path):
+    monkeypatch.setenv("ENVIRONMENT", "development")
+    monkeypatch.setattr(s3_io, "_DEV_MODEL_DIR", str(tmp_path))
+
+    paths = s3_io.save_mask_data({"1": {"mask_id": 1}})
+    model_paths = s3_io.upload_checkpoint({"threshold": 0.5}, {})
+
+    assert paths["mask_data_latest"] == f"file://{tmp_path}/mask_data_latest.json"
+    assert paths["mask_data_versioned"].startswith(f"file://{tmp_path}/mask_data_")
+    assert s3_io.load_mask_data() == {"1": {"mask_id": 1}}
+    with open(model_paths["model_latest"][len("file://"):], "rb") as f:
+        assert joblib.load(io.BytesIO(f.read())) == {"threshold": 0.5}
@@ -0,0 +1,173 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from python.mask_recommender.random_forest import inference_service, s3_io
+from python.mask_recommender.random_forest.inference_service import clear_cache, infer
+from python.mask_recommender.random_forest.tree_ensemble import TreeEnsemble
+
+REPO_ROOT = Path(__file__).resolve().parents[4]
+
+
+def _forest(missing_rate=0.0, **params):
+    rng = np.random.default_rng(3)
+    X = rng.normal(size=(600, 8)).astype(np.float32)
+    X[:, 6] = rng.integers(0, 2, size=600)
+    y = (X[:, 0] + 0.5 * X[:, 6] + rng.normal(scale=0.5, size=600) > 0).astype(np.int64)
+    if missing_rate:
+        X[rng.random(X.shape) < missing_rate] = np.nan
+    options = {"n_estimators": 25, "min_samples_leaf": 2, "random_state": 0, "n_jobs": 1}
+    options.update(params)
+    return RandomForestClassifier(**options).fit(X, y), rng
+
+
+@pytest.mark.parametrize(
+    "missing_rate, params",
+    [(0.0, {}), (0.0, {"class_weight": "balanced_subsample", "max_depth": 4}), (0.05, {})],
+)
+def test_tree_ensemble_matches_sklearn_predict_proba(missing_rate, params):
+    forest, rng = _forest(missing_rate, **params)
+    ensemble = TreeEnsemble.from_sklearn(forest)
+    X = rng.normal(size=(200, 8))
+    if missing_rate:
+        X[rng.random(X.shape) < 0.1] = np.nan
+    # Rows sitting exactly on split thresholds exercise the `<=` rule.
+    internal = (ensemble.left != -1) & np.isfinite(ensemble.threshold)
+    X[:50, ensemble.feature[internal][:50]] = ensemble.threshold[internal][:50]
+
+    np.testing.assert_array_equal(ensemble.predict_proba(X), forest.predict_proba(X))
+    np.testing.assert_array_equal(
+        ensemble.apply(X) - ensemble.roots[:, np.newaxis],
+        np.stack([tree.apply(X.astype(np.float32)) for tree in forest.estimators_]),
+    )
+
+
+def test_tree_ensemble_round_trips_through_npz_bytes():
+    forest, rng = _forest()
+    ensemble = TreeEnsemble.from_sklearn(forest, feature_names=[f"f{i}" for i in range(8)], decision_threshold=0.4)
+
+    loaded = TreeEnsemble.from_bytes(ensemble.to_bytes())
+
+    X = rng.normal(size=(20, 8))
+    np.testing.assert_array_equal(loaded.predict_proba(X), forest.predict_proba(X))
+    assert loaded.feature_names == [f"f{i}" for i in range(8)]
+    assert loaded.decision_threshold == 0.4
+    assert loaded.max_depth == ensemble.max_depth
+
+
+def test_infer_scores_the_published_ensemble_without_importing_sklearn(tmp_path):
+    forest, _ = _forest()
+    feature_names = [
+        "face_width", "nose_protrusion", "bitragion_subnasale_arc", "facial_hair_beard_length_mm",
+        "perimeter_mm", "adjustable_headstrap", "mask_id_1", "mask_id_2",
+    ]
+    ensemble = TreeEnsemble.from_sklearn(forest, feature_names=feature_names, decision_threshold=0.45)
+    (tmp_path / s3_io.MODEL_LATEST_KEY).write_bytes(b"not loaded")
+    (tmp_path / s3_io.TREE_ENSEMBLE_LATEST_KEY).write_bytes(ensemble.to_bytes())
+    (tmp_path / "mask_data_latest.json").write_text('{"1": {"perimeter_mm": 0.3}, "2": {"perimeter_mm": -1.2}}')
+    script = (
+        "import json, sys\n"
+        "from python.mask_recommender.random_forest import s3_io\n"
+        f"s3_io._DEV_MODEL_DIR = {str(tmp_path)!r}\n"
+        "from python.mask_recommender.random_forest.lambda_function import handler\n"
+        "response = handler({'method': 'infer', 'facial_measurements': {'face_width': 0.8}}, None)\n"
+        "print(json.dumps({'body': json.loads(response['body']), 'sklearn': 'sklearn' in sys.modules}))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=REPO_ROOT,
+        env={"ENVIRONMENT": "development", "PATH": "/usr/bin:/bin"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    output = json.loads(result.stdout.strip().splitlines()[-1])
+
+    X = np.zeros((2, 8), dtype=np.float32)
+    X[:, 0] = 0.8
+    X[:, 4] = [0.3, -1.2]
+    X[[0, 1], [6, 7]] = 1.0
+    probs = forest.predict_proba(X)[:, 1]
+    order = np.argsort(-probs)
+    assert output["sklearn"] is False
+    assert output["body"]["mask_id"] == {str(i): int(idx) + 1 for i, idx in enumerate(order)}
+    assert output["body"]["proba_fit"] == {str(i): float(probs[idx]) for i, idx in enumerate(order)}
+    assert output["body"]["threshold"] == 0.45
+
+
+def test_infer_compiles_the_joblib_model_when_no_ensemble_was_published(monkeypatch):
+    forest, _ = _forest()
+    feature_names = [f"f{i}" for i in range(6)] + ["mask_id_1", "mask_id_2"]
+    monkeypatch.setattr(s3_io, "load_tree_ensemble", lambda: None)
+    monkeypatch.setattr(
+        s3_io,
+        "load_latest_model",
+        lambda: {"model": forest, "feature_names": feature_names, "threshold": 0.3, "stats": None},
+    )
+    monkeypatch.setattr(s3_io, "load_mask_data", lambda: {"1": {}, "2": {}})
+    monkeypatch.setattr(s3_io, "object_version", lambda key: "v1")
+    monkeypatch.setattr(s3_io, "object_stat", lambda key: ("v1", 0.0))
+    clear_cache()
+
+    out = infer({}, mask_ids=[2])
+
+    assert isinstance(inference_service._MODEL.value.ensemble, TreeEnsemble)
+    assert out["mask_id"] == {"0": 2}
+    assert out["threshold"] == 0.3
+    clear_cache()
+
+
+def test_infer_serves_the_joblib_model_when_the_published_ensemble_is_older(monkeypatch, tmp_path):
+    monkeypatch.setenv("ENVIRONMENT", "development")
+    monkeypatch.setattr(s3_io, "_DEV_MODEL_DIR", str(tmp_path))
+    feature_names = [f"f{i}" for i in range(6)] + ["mask_id_1", "mask_id_2"]
+    stale, _ = _forest(max_depth=1)
+    current, _ = _forest(max_depth=6)
+    s3_io.save_mask_data({"1": {}, "2": {}})
+    s3_io.upload_checkpoint(
+        {"model": stale, "feature_names": feature_names, "threshold": 0.2},
+        {},
+        tree_ensemble=TreeEnsemble.from_sklearn(stale, feature_names=feature_names, decision_threshold=0.2).to_bytes(),
+    )
+    # A later run that published only the joblib model.
+    s3_io.upload_checkpoint({"model": current, "feature_names": feature_names, "threshold": 0.3}, {})
+    ensemble_path = tmp_path / s3_io.TREE_ENSEMBLE_LATEST_KEY
+    model_mtime = os.stat(tmp_path / s3_io.MODEL_LATEST_KEY).st_mtime
+    os.utime(ensemble_path, (model_mtime - 60, model_mtime - 60))
+    clear_cache()
+
+    out = infer({})
+
+    X = np.zeros((2, 8), dtype=np.float32)
+    X[[0, 1], [6, 7]] = 1.0
+    assert out["threshold"] == 0.3
+    assert sorted(out["proba_fit"].values()) == sorted(current.predict_proba(X)[:, 1].tolist())
+    assert inference_service._MODEL.version.startswith(s3_io.MODEL_LATEST_KEY)
+    clear_cache()
+
+
+def test_scoring_model_sends_large_batches_to_the_matching_sklearn_forest(monkeypatch):
+    forest, rng = _forest()
+    other, _ = _forest(max_depth=3)
+    loads = []
+    model = inference_service.ScoringModel(TreeEnsemble.from_sklearn(forest))
+    monkeypatch.setattr(inference_service, "COMPILED_MAX_WORK", 10 * model.ensemble.max_depth)
+    monkeypatch.setattr(s3_io, "load_latest_model", lambda: loads.append(1) or {"model": forest})
+    small, large = rng.normal(size=(10, 8)), rng.normal(size=(300, 8))
+
+    np.testing.assert_array_equal(model.predict_proba(small), forest.predict_proba(small))
+    assert loads == []
+    np.testing.assert_array_equal(model.predict_proba(large), model.ensemble.predict_proba(large))
+    model.predict_proba(large)
+    assert loads == [1]
+    assert model._forest is forest
+
+    mismatched = inference_service.ScoringModel(TreeEnsemble.from_sklearn(other))
+    np.testing.assert_array_equal(mismatched.predict_proba(large), other.predict_proba(large))
+    assert mismatched._forest is None
@@ -14,6 +14,7 @@ import joblib
 from .data_prep import prepare_dataset
 from .data_utils import try_load_remote_json
 from . import s3_io
+from .tree_ensemble import TreeEnsemble
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -115,6 +116,9 @@ def train(
     except Exception:
         pass
 
+    # Flat arrays scored by inference_service without importing sklearn.
+    tree_ensemble = TreeEnsemble.from_sklearn(rf_full, feature_names=feature_names, decision_threshold=threshold)
+
     s3_paths = s3_io.upload_checkpoint(
         state,
         {  # type: ignore[arg-type]
@@ -129,6 +133,7 @@ def train(
             "n_val": int(y_val.size),
             "n_total": int(y.size),
         },
+        tree_ensemble=tree_ensemble.to_bytes(),
     )
 
     # Build mask catalog similar to pytorch training_service
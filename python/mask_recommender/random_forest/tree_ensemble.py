@@ -0,0 +1,198 @@
+"""
+Compiled tree-ensemble scoring for the random forest recommender.
+
+``TreeEnsemble.from_sklearn`` flattens a fitted ``RandomForestClassifier``
+into contiguous NumPy arrays: every tree's nodes concatenated, with child
+indices offset into the shared node arrays and each node's class
+probabilities as ``DecisionTreeClassifier.predict_proba`` returns them.
+``predict_proba`` then walks all trees for all rows at once, one vectorized
+step per tree level over the (tree, row) pairs still walking, instead of
+sklearn's per-tree Cython calls behind input validation and a joblib dispatch.
+That wins for small batches; sklearn's walk is cheaper per row, so
+``inference_service`` sends large batches of deep trees to sklearn instead.
+
+It follows sklearn's decision rule: ``X`` is cast to float32, a row goes left
+when ``x <= threshold`` and NaNs follow ``missing_go_to_left``. Tree
+probabilities are summed in tree order and divided by the number of trees, so
+results are identical to a single-threaded ``predict_proba`` (forests
+predicted with ``n_jobs > 1`` add trees in thread-completion order and can
+differ in the last bit).
+
+Nothing here imports sklearn; ``to_bytes``/``from_bytes`` round-trip the
+arrays through an ``.npz`` file without pickles.
+"""
+
+import io
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+LEAF = -1
+COMPACT_EVERY = 4
+
+
+@dataclass
+class TreeEnsemble:
+    feature: np.ndarray
+    threshold: np.ndarray
+    left: np.ndarray
+    right: np.ndarray
+    missing_go_to_left: np.ndarray
+    value: np.ndarray
+    roots: np.ndarray
+    max_depth: int
+    classes: np.ndarray
+    feature_names: List[str]
+    decision_threshold: float = 0.5
+
+    @classmethod
+    def from_sklearn(
+        cls,
+        forest: Any,
+        feature_names: Optional[List[str]] = None,
+        decision_threshold: float = 0.5,
+    ) -> "TreeEnsemble":
+        if getattr(forest, "n_outputs_", 1) != 1:
+            raise ValueError("TreeEnsemble supports single-output forests only")
+        n_classes = int(forest.n_classes_)
+        features, thresholds, lefts, rights, missing, values, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            node_count = int(tree.node_count)
+            is_leaf = tree.children_left == LEAF
+            roots.append(offset)
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int64))
+            thresholds.append(np.asarray(tree.threshold, dtype=np.float64))
+            lefts.append(np.where(is_leaf, LEAF, tree.children_left + offset).astype(np.int64))
+            rights.append(np.where(is_leaf, LEAF, tree.children_right + offset).astype(np.int64))
+            missing_left = getattr(tree, "missing_go_to_left", None)
+            if missing_left is None:
+                missing_left = np.zeros(node_count, dtype=bool)
+            missing.append(np.asarray(missing_left, dtype=bool))
+            proba = np.array(tree.value[:, 0, :n_classes], dtype=np.float64)
+            if (proba.sum(axis=1) > 1.0 + 1e-6).any():
+                # sklearn < 1.4 stored weighted counts and normalized them in predict_proba.
+                normalizer = proba.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                proba /= normalizer
+            values.append(proba)
+            offset += node_count
+            max_depth = max(max_depth, int(tree.max_depth))
+        if feature_names is None:
+            feature_names = [str(name) for name in getattr(forest, "feature_names_in_", [])]
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts),
+            right=np.concatenate(rights),
+            missing_go_to_left=np.concatenate(missing),
+            value=np.concatenate(values),
+            roots=np.array(roots, dtype=np.int64),
+            max_depth=max_depth,
+            classes=np.asarray(forest.classes_),
+            feature_names=list(feature_names),
+            decision_threshold=float(decision_threshold),
+        )
+
+    def __post_init__(self) -> None:
+        node_count = self.left.size
+        self._is_leaf = self.left == LEAF
+        # children[2 * node + go_right]; leaves point at themselves so finished pairs can keep stepping.
+        nodes = np.arange(node_count, dtype=np.int64)
+        self._children = np.empty(2 * node_count, dtype=np.int64)
+        self._children[0::2] = np.where(self._is_leaf, nodes, self.left)
+        self._children[1::2] = np.where(self._is_leaf, nodes, self.right)
+        # For float32 x, x <= t (float64) exactly when x <= the largest float32 not above t.
+        threshold = self.threshold.astype(np.float32)
+        above = threshold.astype(np.float64) > self.threshold
+        threshold[above] = np.nextafter(threshold[above], np.float32(-np.inf))
+        self._threshold32 = threshold
+
+    @property
+    def n_trees(self) -> int:
+        return int(self.roots.size)
+
+    def apply(self, X: Any) -> np.ndarray:
+        """Leaf node index (into the flattened arrays) per tree and row: shape (n_trees, n_rows)."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        has_missing = bool(np.isnan(flat_X).any())
+        # One slot per (tree, row) pair; every step advances the pairs that are
+        # still walking, and finished pairs are dropped every COMPACT_EVERY steps.
+        leaves = np.repeat(self.roots, n_rows)
+        walking = np.arange(leaves.size)
+        node = leaves.copy()
+        row_offset = np.tile(np.arange(n_rows, dtype=np.int64) * n_features, self.n_trees)
+        for step in range(self.max_depth):
+            values = flat_X[row_offset + self.feature[node]]
+            go_right = values > self._threshold32[node]
+            if has_missing:
+                missing = np.isnan(values)
+                if missing.any():
+                    go_right[missing] = ~self.missing_go_to_left[node[missing]]
+            node = self._children[2 * node + go_right]
+            if step % COMPACT_EVERY == COMPACT_EVERY - 1:
+                done = self._is_leaf[node]
+                if done.any():
+                    leaves[walking[done]] = node[done]
+                    still_walking = ~done
+                    walking = walking[still_walking]
+                    node = node[still_walking]
+                    row_offset = row_offset[still_walking]
+                    if not walking.size:
+                        break
+        leaves[walking] = node
+        return leaves.reshape(self.n_trees, n_rows)
+
+    def predict_proba(self, X: Any) -> np.ndarray:
+        leaf_values = self.value[self.apply(X)]
+        proba = np.zeros(leaf_values.shape[1:], dtype=np.float64)
+        for tree_values in leaf_values:
+            proba += tree_values
+        proba /= self.n_trees
+        return proba
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            "feature": self.feature,
+            "threshold": self.threshold,
+            "left": self.left,
+            "right": self.right,
+            "missing_go_to_left": self.missing_go_to_left,
+            "value": self.value,
+            "roots": self.roots,
+            "max_depth": np.array(self.max_depth, dtype=np.int64),
+            "classes": self.classes,
+            "feature_names": np.array(self.feature_names, dtype=str),
+            "decision_threshold": np.array(self.decision_threshold, dtype=np.float64),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "TreeEnsemble":
+        return cls(
+            feature=arrays["feature"],
+            threshold=arrays["threshold"],
+            left=arrays["left"],
+            right=arrays["right"],
+            missing_go_to_left=arrays["missing_go_to_left"],
+            value=arrays["value"],
+            roots=arrays["roots"],
+            max_depth=int(arrays["max_depth"]),
+            classes=arrays["classes"],
+            feature_names=[str(name) for name in arrays["feature_names"]],
+            decision_threshold=float(arrays["decision_threshold"]),
+        )
+
+    def to_bytes(self) -> bytes:
+        buf = io.BytesIO()
+        np.savez(buf, **self.to_arrays())
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TreeEnsemble":
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            return cls.from_arrays({name: arrays[name] for name in arrays.files})
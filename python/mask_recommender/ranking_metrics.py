@@ -0,0 +1,168 @@
+"""
+Per-user ranking metrics for the custom_lr evaluation (CV folds and holdout).
+
+Rows are put into one order with a single ``np.lexsort`` over
+(user, -probability): users in order of first appearance, each user's rows by
+descending probability. Per-user quantities are then segment reductions over
+that order (``np.logical_or.reduceat``, fixed-width reshapes) instead of a
+Python loop over ``groupby('user_id')``.
+
+Results are identical to sorting each user's rows with
+``sort_values('predicted_probability', ascending=False)`` under a stable sort:
+rows with exactly equal probabilities keep their original order. Rows without
+a user id are skipped, as ``groupby`` skips them.
+"""
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import brier_score_loss, log_loss, roc_auc_score
+
+PROBABILITY_CLIP = 1e-6
+
+
+class UserRanking:
+    """Rows grouped by user and ordered by descending probability within each user."""
+
+    def __init__(self, user_ids, probabilities):
+        codes, _ = pd.factorize(pd.Series(user_ids).reset_index(drop=True), sort=False)
+        probabilities = np.asarray(probabilities, dtype=float)
+        rows = np.flatnonzero(codes >= 0)
+        self.order = rows[np.lexsort((-probabilities[rows], codes[rows]))]
+        sorted_codes = codes[self.order]
+        if sorted_codes.size:
+            self.starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+        else:
+            self.starts = np.array([], dtype=int)
+        self.lengths = np.diff(np.r_[self.starts, sorted_codes.size])
+        # 0 for each user's most probable row, 1 for the next, ...
+        self.ranks = np.arange(sorted_codes.size) - np.repeat(self.starts, self.lengths)
+
+    @property
+    def num_users(self):
+        return int(self.starts.size)
+
+    def any_per_user(self, values):
+        """Whether any of each user's (ranked) values is true."""
+        if not self.num_users:
+            return np.array([], dtype=bool)
+        return np.logical_or.reduceat(np.asarray(values, dtype=bool), self.starts)
+
+
+def user_equal_weights(user_ids):
+    """Sample weights giving every user (missing ids count as one user) a total weight of 1."""
+    codes, _ = pd.factorize(pd.to_numeric(pd.Series(user_ids), errors='coerce'), use_na_sentinel=False)
+    return 1.0 / np.bincount(codes)[codes].astype(float)
+
+
+def probability_quality_metrics(labels, probabilities):
+    labels = np.asarray(labels, dtype=float)
+    probabilities = np.asarray(probabilities, dtype=float)
+    if labels.size == 0:
+        return {
+            'sample_count': 0,
+            'positive_rate': None,
+            'mean_predicted_probability': None,
+            'roc_auc': None,
+            'brier_score': None,
+            'log_loss': None,
+        }
+
+    clipped_probabilities = np.clip(probabilities, PROBABILITY_CLIP, 1.0 - PROBABILITY_CLIP)
+    try:
+        roc_auc = roc_auc_score(labels, clipped_probabilities)
+    except ValueError:
+        roc_auc = None
+    try:
+        negative_log_likelihood = log_loss(labels, clipped_probabilities, labels=[0, 1])
+    except ValueError:
+        negative_log_likelihood = None
+
+    return {
+        'sample_count': int(labels.size),
+        'positive_rate': float(np.mean(labels)),
+        'mean_predicted_probability': float(np.mean(clipped_probabilities)),
+        'roc_auc': roc_auc,
+        'brier_score': float(brier_score_loss(labels, clipped_probabilities)),
+        'log_loss': negative_log_likelihood,
+    }
+
+
+def calibration_bins(labels, probabilities, num_bins=5):
+    labels = np.asarray(labels, dtype=float)
+    probabilities = np.asarray(probabilities, dtype=float)
+    if labels.size == 0:
+        return []
+
+    clipped_probabilities = np.clip(probabilities, PROBABILITY_CLIP, 1.0 - PROBABILITY_CLIP)
+    bin_edges = np.linspace(0.0, 1.0, num_bins + 1)
+    bins = []
+    for index in range(num_bins):
+        lower = float(bin_edges[index])
+        upper = float(bin_edges[index + 1])
+        if index == num_bins - 1:
+            mask = (clipped_probabilities >= lower) & (clipped_probabilities <= upper)
+        else:
+            mask = (clipped_probabilities >= lower) & (clipped_probabilities < upper)
+        if not mask.any():
+            continue
+        bin_probabilities = clipped_probabilities[mask]
+        bin_labels = labels[mask]
+        bins.append({
+            'bin_start': lower,
+            'bin_end': upper,
+            'sample_count': int(mask.sum()),
+            'mean_predicted_probability': float(np.mean(bin_probabilities)),
+            'observed_positive_rate': float(np.mean(bin_labels)),
+        })
+    return bins
+
+
+def top_k_hit_rates(user_ids, labels, probabilities, ks=(1, 3, 5)):
+    """
+    Among users with at least one positive row, the share whose k most
+    probable rows include a positive, for each k.
+    """
+    ranking = UserRanking(user_ids, probabilities)
+    positives = np.asarray(labels, dtype=float)[ranking.order] == 1
+    eligible = ranking.any_per_user(positives)
+    hit_rates = {}
+    for k in ks:
+        hits = ranking.any_per_user(positives & (ranking.ranks < k))[eligible].astype(float)
+        hit_rates[str(k)] = float(np.mean(hits)) if hits.size else None
+    return {
+        'eligible_users': int(eligible.sum()) if ks else 0,
+        'top_k_hit_rate': hit_rates,
+    }
+
+
+def top_k_any_fit_probability_metrics(user_ids, labels, probabilities, k=3):
+    """
+    For users with at least ``k`` rows: whether any of their top-``k`` rows
+    fits, against two predictions of that event from the top-``k``
+    probabilities (independence: 1 - prod(1 - p); max_baseline: max p).
+    """
+    ranking = UserRanking(user_ids, probabilities)
+    eligible = ranking.lengths >= k
+    top_rows = np.repeat(eligible, ranking.lengths) & (ranking.ranks < k)
+    # Eligible users contribute exactly k rows each, contiguously and in rank order.
+    ranked_rows = ranking.order[top_rows]
+    top_probabilities = np.clip(
+        np.asarray(probabilities, dtype=float)[ranked_rows],
+        PROBABILITY_CLIP,
+        1.0 - PROBABILITY_CLIP,
+    ).reshape(-1, k)
+    top_labels = (np.asarray(labels, dtype=float)[ranked_rows] == 1).reshape(-1, k)
+
+    observed_any_fit = top_labels.any(axis=1).astype(float)
+    independence_probabilities = 1.0 - np.prod(1.0 - top_probabilities, axis=1)
+    max_probabilities = np.max(top_probabilities, axis=1)
+
+    return {
+        'k': int(k),
+        'eligible_users': int(eligible.sum()),
+        'excluded_users_with_fewer_than_k_rows': int((~eligible).sum()),
+        'independence': probability_quality_metrics(observed_any_fit, independence_probabilities),
+        'max_baseline': probability_quality_metrics(observed_any_fit, max_probabilities),
+        'independence_calibration_bins': calibration_bins(observed_any_fit, independence_probabilities),
+        'max_baseline_calibration_bins': calibration_bins(observed_any_fit, max_probabilities),
+    }
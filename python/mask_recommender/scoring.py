@@ -0,0 +1,438 @@
+"""
+Precompiled custom_lr scoring.
+
+Between recommendation requests only the facial measurements change, so every
+mask-dependent term of ``train.calc_preds`` can be resolved once per loaded
+model: the fit-family and style one-hots collapse into one (alpha, beta, gamma)
+coefficient row per mask, the strap one-hot collapses into a per-mask bias and
+the mask perimeter is kept in centimeters. Scoring a face is then
+
+    d = facial_perimeter_cm - mask_perimeter_cm
+    proba = sigmoid(strap_bias + alpha * d**2 + beta * d + gamma)
+
+evaluated over all masks at once with NumPy.
+
+This module is also the home of ``calc_preds`` so inference can score without
+importing train (and with it matplotlib, sklearn and the training stack).
+torch is only imported when tensors are actually passed in.
+"""
+
+import math
+
+import numpy as np
+
+# Same component order as train.FACIAL_MEASUREMENTS so the float sums match.
+FACIAL_PERIMETER_MEASUREMENTS = [
+    'nose_mm',
+    'top_cheek_mm',
+    'mid_cheek_mm',
+    'chin_mm',
+]
+UNKNOWN_FIT_FAMILY = 'unknown-fit-family'
+# Faces scored per (faces x masks) block in batch mode; bounds peak memory to
+# roughly chunk_size * num_masks * 4 bytes per intermediate array.
+DEFAULT_BATCH_CHUNK_SIZE = 256
+DEFAULT_RANKING_FIELDS = ('mask_id', 'proba_fit')
+
+
+def _as_float32_array(value):
+    if hasattr(value, 'detach'):
+        value = value.detach().cpu().numpy()
+    return np.asarray(value, dtype=np.float32)
+
+
+def _to_number(value):
+    if value is None or isinstance(value, bool):
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def fit_family_key(fit_family_id, mask_id=None, unique_internal_model_code=None):
+    """Scalar twin of ``train._fit_family_key_series`` for a single mask."""
+    for candidate in (fit_family_id, mask_id):
+        number = _to_number(candidate)
+        if not math.isnan(number):
+            return str(int(number))
+    code = '' if unique_internal_model_code is None else str(unique_internal_model_code)
+    return code or UNKNOWN_FIT_FAMILY
+
+
+def resolve_parameter_views(params):
+    """
+    torch parameter views (alpha = -exp(alpha_raw)) from raw or resolved
+    params. Parameters may carry a leading batch dimension (one set per fold).
+    """
+    if 'mask_specific_parameters' in params and 'style_specific_parameters' in params:
+        return params
+
+    import torch
+
+    mask_specific_parameters = torch.concat(
+        [
+            -torch.exp(params['alpha_mask_raw']),
+            params['beta_gamma_mask']
+        ],
+        axis=-1
+    )
+    style_specific_parameters = torch.concat(
+        [
+            -torch.exp(params['alpha_style_raw']),
+            params['beta_gamma_style']
+        ],
+        axis=-1
+    )
+    return {
+        'mask_specific_parameters': mask_specific_parameters,
+        'style_specific_parameters': style_specific_parameters,
+        'strap_specific_parameters': params['strap_specific_parameters'],
+    }
+
+
+def resolve_parameter_arrays(params):
+    """
+    NumPy version of ``resolve_parameter_views``. Accepts raw
+    (alpha_*_raw / beta_gamma_*) or already-resolved parameters, as tensors or
+    arrays.
+    """
+    if 'mask_specific_parameters' in params and 'style_specific_parameters' in params:
+        return {
+            'mask_specific_parameters': _as_float32_array(params['mask_specific_parameters']),
+            'style_specific_parameters': _as_float32_array(params['style_specific_parameters']),
+            'strap_specific_parameters': _as_float32_array(params['strap_specific_parameters']),
+        }
+    return {
+        'mask_specific_parameters': np.concatenate(
+            [-np.exp(_as_float32_array(params['alpha_mask_raw'])), _as_float32_array(params['beta_gamma_mask'])],
+            axis=1,
+        ),
+        'style_specific_parameters': np.concatenate(
+            [-np.exp(_as_float32_array(params['alpha_style_raw'])), _as_float32_array(params['beta_gamma_style'])],
+            axis=1,
+        ),
+        'strap_specific_parameters': _as_float32_array(params['strap_specific_parameters']),
+    }
+
+
+# Integer category codes used by the index layout, keyed by the one-hot
+# matrix they replace. Code -1 marks a category missing from the model.
+CATEGORY_CODE_KEYS = {
+    'fit_tests_by_masks': 'mask_codes',
+    'fit_tests_by_styles': 'style_codes',
+    'fit_tests_by_strap_types': 'strap_type_codes',
+}
+
+
+def _category_terms(data, onehot_key, table, backend):
+    """
+    ``onehot @ table`` for the one-hot layout, or the equivalent row gather for
+    the index layout. A zero row is appended to the table so code -1 (the last
+    row) scores like an all-zero one-hot row; every other row equals the
+    matmul exactly, since a one-hot product only ever adds zeros.
+    """
+    codes_key = CATEGORY_CODE_KEYS[onehot_key]
+    if codes_key not in data:
+        return data[onehot_key] @ table
+    zero_row_shape = tuple(table.shape[:-2]) + (1, table.shape[-1])
+    if backend == 'torch':
+        import torch
+
+        padded = torch.concat([table, table.new_zeros(zero_row_shape)], axis=-2)
+    else:
+        padded = np.concatenate([table, np.zeros(zero_row_shape, dtype=table.dtype)], axis=-2)
+    return padded[..., data[codes_key], :]
+
+
+def _calc_preds_torch(data, params):
+    import torch
+
+    resolved_params = resolve_parameter_views(params)
+    fit_tests_by_mask_specific_parameters = _category_terms(
+        data, 'fit_tests_by_masks', resolved_params['mask_specific_parameters'], 'torch'
+    )
+    fit_tests_by_style_specific_parameters = _category_terms(
+        data, 'fit_tests_by_styles', resolved_params['style_specific_parameters'], 'torch'
+    )
+    fit_tests_by_mask_and_style_specific_parameters = fit_tests_by_mask_specific_parameters + fit_tests_by_style_specific_parameters
+
+    fit_tests_by_facial_feature_fit = fit_tests_by_mask_and_style_specific_parameters * data['perimeter_diffs']
+    fit_tests_by_strap_specific_parameters = _category_terms(
+        data, 'fit_tests_by_strap_types', resolved_params['strap_specific_parameters'], 'torch'
+    )
+
+    logits = fit_tests_by_strap_specific_parameters + fit_tests_by_facial_feature_fit.sum(axis=-1, keepdim=True)
+
+    return torch.sigmoid(logits)
+
+
+def _calc_preds_numpy(data, params):
+    resolved_params = resolve_parameter_arrays(params)
+    by_mask_and_style = (
+        _category_terms(data, 'fit_tests_by_masks', resolved_params['mask_specific_parameters'], 'numpy')
+        + _category_terms(data, 'fit_tests_by_styles', resolved_params['style_specific_parameters'], 'numpy')
+    )
+    by_strap = _category_terms(data, 'fit_tests_by_strap_types', resolved_params['strap_specific_parameters'], 'numpy')
+    logits = by_strap + (by_mask_and_style * data['perimeter_diffs']).sum(axis=1).reshape(-1, 1)
+    with np.errstate(over='ignore'):
+        return np.float32(1.0) / (np.float32(1.0) + np.exp(-logits))
+
+
+def calc_preds(data, params):
+    """
+    Fit probabilities (rows x 1) for prepared data in either layout: one-hot
+    matrices or integer category codes (``layout='index'``). NumPy arrays use
+    the NumPy backend; tensors use torch so training keeps its autograd graph.
+    Torch parameters stacked along a leading dimension (K sets) give K x rows x 1.
+    """
+    if isinstance(data['perimeter_diffs'], np.ndarray):
+        return _calc_preds_numpy(data, params)
+    return _calc_preds_torch(data, params)
+
+
+def facial_perimeter_cm(facial_features):
+    """Facial perimeter in cm as float32, matching the training-time computation."""
+    total_mm = 0.0
+    for column in FACIAL_PERIMETER_MEASUREMENTS:
+        total_mm += _to_number(facial_features.get(column, 0) or 0)
+    return np.float32(total_mm) / np.float32(10.0)
+
+
+def _category_rows(parameters, categories, values):
+    """Gather parameter rows by category; unknown categories contribute zeros."""
+    lookup = {category: idx for idx, category in enumerate(categories)}
+    indices = np.array([lookup.get(value, -1) for value in values], dtype=np.int64)
+    width = parameters.shape[1]
+    padded = np.concatenate([parameters, np.zeros((1, width), dtype=np.float32)], axis=0)
+    return padded[indices]
+
+
+class CompiledCustomModel:
+    """Mask-side arrays for a loaded custom_lr model, in ``mask_data`` order."""
+
+    def __init__(self, mask_ids, mask_infos, coefficients, strap_bias, mask_perimeter_cm, source=None):
+        self.mask_ids = np.asarray(mask_ids, dtype=np.int64)
+        self.mask_infos = list(mask_infos)
+        self.styles = np.array([info.get('style') or '' for info in self.mask_infos], dtype=object)
+        self.strap_types = np.array([info.get('strap_type') or '' for info in self.mask_infos], dtype=object)
+        self.coefficients = np.ascontiguousarray(coefficients, dtype=np.float32)
+        self.strap_bias = np.ascontiguousarray(strap_bias, dtype=np.float32)
+        self.mask_perimeter_cm = np.ascontiguousarray(mask_perimeter_cm, dtype=np.float32)
+        self._source = source or ()
+
+    @classmethod
+    def from_artifacts(cls, params, metadata, mask_data):
+        resolved = resolve_parameter_arrays(params)
+        fit_family_categories = metadata.get('fit_family_categories') or metadata.get('mask_code_categories', [])
+
+        mask_ids = []
+        mask_infos = []
+        family_keys = []
+        styles = []
+        strap_types = []
+        perimeters_mm = []
+        for mask_id, mask_info in mask_data.items():
+            mask_ids.append(int(mask_id))
+            mask_infos.append(mask_info)
+            family_keys.append(fit_family_key(
+                mask_info.get('fit_family_id'),
+                int(mask_id),
+                mask_info.get('unique_internal_model_code'),
+            ))
+            styles.append(mask_info.get('style') or '')
+            strap_types.append(mask_info.get('strap_type') or '')
+            perimeter = _to_number(mask_info.get('perimeter_mm'))
+            perimeters_mm.append(0.0 if math.isnan(perimeter) else perimeter)
+
+        coefficients = (
+            _category_rows(resolved['mask_specific_parameters'], fit_family_categories, family_keys)
+            + _category_rows(resolved['style_specific_parameters'], metadata['style_categories'], styles)
+        )
+        strap_bias = _category_rows(
+            resolved['strap_specific_parameters'],
+            metadata['strap_type_categories'],
+            strap_types,
+        )[:, 0]
+        mask_perimeter_cm = np.asarray(perimeters_mm, dtype=np.float32) / np.float32(10.0)
+        return cls(
+            mask_ids,
+            mask_infos,
+            coefficients.reshape(-1, 3),
+            strap_bias,
+            mask_perimeter_cm,
+            source=(params, metadata, mask_data),
+        )
+
+    def __len__(self):
+        return int(self.mask_ids.shape[0])
+
+    def built_from(self, params, metadata, mask_data):
+        """True when this model was compiled from exactly these artifact objects."""
+        if len(self._source) != 3:
+            return False
+        return all(current is previous for current, previous in zip((params, metadata, mask_data), self._source))
+
+    def predict_proba(self, face_perimeter_cm):
+        """
+        Fit probabilities for every mask. A scalar perimeter returns shape
+        (masks,); a 1-D array of perimeters returns shape (faces, masks).
+        """
+        face_perimeter_cm = np.asarray(face_perimeter_cm, dtype=np.float32)
+        diff = face_perimeter_cm[..., None] - self.mask_perimeter_cm
+        alpha, beta, gamma = self.coefficients[:, 0], self.coefficients[:, 1], self.coefficients[:, 2]
+        logits = self.strap_bias + (alpha * (diff * diff) + beta * diff + gamma)
+        with np.errstate(over='ignore'):
+            return np.float32(1.0) / (np.float32(1.0) + np.exp(-logits))
+
+    def iter_predict_proba(self, facial_features_list, chunk_size=DEFAULT_BATCH_CHUNK_SIZE):
+        """Yield (faces, masks) probability blocks of at most ``chunk_size`` faces."""
+        chunk_size = max(1, int(chunk_size))
+        perimeters = np.array(
+            [facial_perimeter_cm(facial_features) for facial_features in facial_features_list],
+            dtype=np.float32,
+        )
+        for start in range(0, perimeters.shape[0], chunk_size):
+            yield self.predict_proba(perimeters[start:start + chunk_size])
+
+    def mask_filter(self, styles=None, strap_types=None):
+        """Boolean mask over masks restricted to the given styles / strap types."""
+        keep = np.ones(len(self), dtype=bool)
+        if styles:
+            keep &= np.isin(self.styles, list(styles))
+        if strap_types:
+            keep &= np.isin(self.strap_types, list(strap_types))
+        return keep
+
+    def _ranked(self, probs, order):
+        return [
+            {
+                'mask_id': int(self.mask_ids[idx]),
+                'proba_fit': float(probs[idx]),
+                'mask_info': self.mask_infos[idx],
+            }
+            for idx in order
+        ]
+
+    def recommend(self, facial_features, top_k=None, min_proba=None, styles=None, strap_types=None):
+        """Masks for one face, highest probability first (ties keep mask order)."""
+        probs = self.predict_proba(facial_perimeter_cm(facial_features))
+        keep = self.mask_filter(styles=styles, strap_types=strap_types)
+        return self._ranked(probs, select_top(probs, top_k=top_k, min_proba=min_proba, keep=keep))
+
+    def recommend_batch(
+        self,
+        facial_features_list,
+        chunk_size=DEFAULT_BATCH_CHUNK_SIZE,
+        top_k=None,
+        min_proba=None,
+        styles=None,
+        strap_types=None,
+    ):
+        """Per-face rankings, in input order, scored chunk by chunk."""
+        keep = self.mask_filter(styles=styles, strap_types=strap_types)
+        rankings = []
+        for probs in self.iter_predict_proba(facial_features_list, chunk_size=chunk_size):
+            for row_probs in probs:
+                order = select_top(row_probs, top_k=top_k, min_proba=min_proba, keep=keep)
+                rankings.append(self._ranked(row_probs, order))
+        return rankings
+
+
+def select_top(probs, top_k=None, min_proba=None, keep=None):
+    """
+    Indices of the selected masks ordered by descending probability, ties in
+    ascending index order, i.e. the same result as a stable full sort followed
+    by truncation. Uses ``np.argpartition`` so only the kept top_k are sorted.
+    """
+    candidates = np.arange(probs.shape[0]) if keep is None else np.flatnonzero(keep)
+    if min_proba is not None:
+        candidates = candidates[probs[candidates] >= min_proba]
+    if top_k is not None and 0 <= top_k < candidates.shape[0]:
+        if top_k == 0:
+            return candidates[:0]
+        values = probs[candidates]
+        kth_value = values[np.argpartition(-values, top_k - 1)[top_k - 1]]
+        above = candidates[values > kth_value]
+        tied = candidates[values == kth_value][:top_k - above.shape[0]]
+        candidates = np.concatenate([above, tied])
+    values = probs[candidates]
+    return candidates[np.lexsort((candidates, -values))]
+
+
+def _as_list(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+
+class InvalidRankingOptions(ValueError):
+    """A request's ranking parameters (top_k, min_proba, chunk_size) are malformed."""
+
+
+def _parse_option(payload, name, parse, description, minimum=None):
+    value = payload.get(name)
+    if value is None:
+        return None
+    try:
+        parsed = parse(value)
+    except (TypeError, ValueError):
+        raise InvalidRankingOptions(f"{name} must be {description}, got {value!r}") from None
+    if minimum is not None and parsed < minimum:
+        raise InvalidRankingOptions(f"{name} must be {description}, got {value!r}")
+    return parsed
+
+
+def ranking_options(payload):
+    """
+    Optional ranking parameters from a request payload: top_k, min_proba,
+    styles, strap_types. Unset parameters are omitted; malformed ones raise
+    InvalidRankingOptions.
+    """
+    payload = payload or {}
+    options = {
+        'top_k': _parse_option(payload, 'top_k', int, 'a non-negative integer', minimum=0),
+        'min_proba': _parse_option(payload, 'min_proba', float, 'a number'),
+        'styles': _as_list(payload.get('styles')),
+        'strap_types': _as_list(payload.get('strap_types')),
+    }
+    return {key: value for key, value in options.items() if value is not None}
+
+
+def batch_chunk_size(payload):
+    """Faces scored per chunk for a batch request; DEFAULT_BATCH_CHUNK_SIZE when unset."""
+    chunk_size = _parse_option(payload or {}, 'chunk_size', int, 'a positive integer', minimum=1)
+    return DEFAULT_BATCH_CHUNK_SIZE if chunk_size is None else chunk_size
+
+
+def ranking_fields(payload):
+    return _as_list((payload or {}).get('fields'))
+
+
+def ranking_maps(recommendations, fields=None):
+    """
+    Columnar response maps keyed by rank ("0", "1", ...). ``fields`` may name
+    mask_id, proba_fit or any mask_data attribute; defaults to mask_id and
+    proba_fit.
+    """
+    maps = {}
+    for field in fields or DEFAULT_RANKING_FIELDS:
+        if field in ('mask_id', 'proba_fit'):
+            maps[field] = {str(idx): rec[field] for idx, rec in enumerate(recommendations)}
+        else:
+            maps[field] = {str(idx): rec['mask_info'].get(field) for idx, rec in enumerate(recommendations)}
+    return maps
+
+
+def compiled_model_for(cache, params, metadata, mask_data):
+    """
+    Return ``cache['compiled']`` when it was built from these artifacts,
+    otherwise recompile and store it.
+    """
+    compiled = cache.get('compiled')
+    if compiled is None or not compiled.built_from(params, metadata, mask_data):
+        compiled = CompiledCustomModel.from_artifacts(params, metadata, mask_data)
+        cache['compiled'] = compiled
+    return compiled
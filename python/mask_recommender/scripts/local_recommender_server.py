@@ -4,23 +4,20 @@ import sys
 from pathlib import Path
 
 import boto3
-import pandas as pd
-import torch
 from botocore.exceptions import ClientError
 from flask import Flask, jsonify, request
 
 REPO_ROOT = Path(__file__).resolve().parents[2]
 sys.path.insert(0, str(REPO_ROOT))
 
-from mask_recommender.feature_builder import (  # noqa: E402
-    FACIAL_FEATURE_COLUMNS,
-    MASK_EMPIRICAL_FEATURE_COLUMNS,
-    derive_brand_model,
-)
-from mask_recommender.train import (  # noqa: E402
-    calc_preds,
-    prep_data_in_torch_with_categories,
-    _custom_lr_mask_categories,
+from mask_recommender.artifact_bundle import BUNDLE_FILENAME, load_custom_lr_bundle  # noqa: E402
+from mask_recommender.scoring import (  # noqa: E402
+    InvalidRankingOptions,
+    batch_chunk_size,
+    compiled_model_for,
+    ranking_fields,
+    ranking_maps,
+    ranking_options,
 )
 
 APP = Flask(__name__)
@@ -81,8 +78,10 @@ def _download_latest_custom_from_s3() -> Path:
     output_dir = _model_root() / f"custom_{timestamp}"
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    for key_name in ("params_key", "metadata_key", "mask_data_key"):
-        key = payload[key_name]
+    for key_name in ("params_key", "metadata_key", "mask_data_key", "bundle_key"):
+        key = payload.get(key_name)
+        if not key:
+            continue
         filename = Path(key).name
         target = output_dir / filename
         s3.download_file(bucket, key, str(target))
@@ -130,6 +129,15 @@ def _find_latest_custom_model_dir(base_dir: Path) -> Path:
 
 
 def _load_custom_artifacts(model_dir: Path):
+    bundle_path = model_dir / BUNDLE_FILENAME
+    if bundle_path.exists():
+        bundle = load_custom_lr_bundle(bundle_path)
+        return {
+            "params": bundle.params,
+            "metadata": bundle.metadata,
+            "mask_data": bundle.mask_data,
+        }
+
     params_path = model_dir / "custom_model_params.pt"
     metadata_path = model_dir / "custom_model_metadata.json"
     mask_data_path = model_dir / "custom_mask_data.json"
@@ -139,6 +147,8 @@ def _load_custom_artifacts(model_dir: Path):
     with mask_data_path.open("r", encoding="utf-8") as handle:
         mask_data = json.load(handle)
 
+    import torch
+
     params = torch.load(params_path, map_location="cpu")
     return {
         "params": params,
@@ -186,72 +196,65 @@ def _extract_facial_measurements(payload):
     return nested.get("facial_measurements") or {}
 
 
-def _build_inference_rows(mask_data, facial_features):
-    rows = []
-    for mask_id, mask_info in mask_data.items():
-        perimeter = mask_info.get("perimeter_mm")
-        if perimeter is None or (isinstance(perimeter, float) and pd.isna(perimeter)):
-            perimeter = 0
-        row = {
-            "mask_id": int(mask_id),
-            "fit_family_id": mask_info.get("fit_family_id"),
-            "perimeter_mm": perimeter,
-            "strap_type": mask_info.get("strap_type") or "",
-            "style": mask_info.get("style") or "",
-            "brand_model": mask_info.get("brand_model") or derive_brand_model(
-                mask_info.get("unique_internal_model_code"),
-                mask_info.get("current_state")
-            ),
-            "unique_internal_model_code": mask_info.get("unique_internal_model_code") or "",
-            "facial_hair_beard_length_mm": facial_features.get("facial_hair_beard_length_mm", 0) or 0,
-        }
-        for col in FACIAL_FEATURE_COLUMNS:
-            row[col] = facial_features.get(col, 0) or 0
-        for col in MASK_EMPIRICAL_FEATURE_COLUMNS:
-            row[col] = mask_info.get(col, 0) or 0
-        rows.append(row)
-    return pd.DataFrame(rows)
+def _extract_facial_measurements_batch(payload):
+    if not payload:
+        return None
 
+    if "facial_measurements_batch" in payload:
+        return payload.get("facial_measurements_batch") or []
 
-def _infer_custom(payload, artifacts):
-    facial_features = _extract_facial_measurements(payload)
-    inference_rows = _build_inference_rows(artifacts["mask_data"], facial_features)
-    custom_data = prep_data_in_torch_with_categories(
-        inference_rows,
-        mask_categories=_custom_lr_mask_categories(artifacts["metadata"]),
-        style_categories=artifacts["metadata"]["style_categories"],
-        strap_categories=artifacts["metadata"]["strap_type_categories"],
-    )
+    nested = payload.get("mask_recommender") or {}
+    return nested.get("facial_measurements_batch")
 
-    with torch.no_grad():
-        probs = calc_preds(custom_data, artifacts["params"]).squeeze(1).cpu().tolist()
 
-    recommendations = []
-    for idx, (mask_id, mask_info) in enumerate(artifacts["mask_data"].items()):
-        recommendations.append({
-            "mask_id": int(mask_id),
-            "proba_fit": float(probs[idx]),
-            "mask_info": mask_info,
-        })
+def _compiled_custom_model(artifacts):
+    return compiled_model_for(
+        artifacts,
+        artifacts["params"],
+        artifacts["metadata"],
+        artifacts["mask_data"],
+    )
+
 
-    recommendations.sort(key=lambda item: item["proba_fit"], reverse=True)
-    mask_id_map = {str(idx): rec["mask_id"] for idx, rec in enumerate(recommendations)}
-    proba_map = {str(idx): rec["proba_fit"] for idx, rec in enumerate(recommendations)}
-    empirical_debug_map = {
-        str(idx): {
-            "mask_fit_test_count": float(rec["mask_info"].get("mask_fit_test_count", 0) or 0),
-            "mask_pass_count": float(rec["mask_info"].get("mask_pass_count", 0) or 0),
-            "mask_smoothed_pass_rate": float(rec["mask_info"].get("mask_smoothed_pass_rate", 0.5) or 0.5),
+def _ranking_payload(recommendations, fields=None):
+    payload = ranking_maps(recommendations, [field for field in fields or [] if field != "empirical_debug"])
+    if fields is None or "empirical_debug" in fields:
+        payload["empirical_debug"] = {
+            str(idx): {
+                "mask_fit_test_count": float(rec["mask_info"].get("mask_fit_test_count", 0) or 0),
+                "mask_pass_count": float(rec["mask_info"].get("mask_pass_count", 0) or 0),
+                "mask_smoothed_pass_rate": float(rec["mask_info"].get("mask_smoothed_pass_rate", 0.5) or 0.5),
+            }
+            for idx, rec in enumerate(recommendations)
         }
-        for idx, rec in enumerate(recommendations)
+    return payload
+
+
+def _infer_custom(payload, artifacts):
+    facial_features = _extract_facial_measurements(payload)
+    options = ranking_options(payload)
+    recommendations = _compiled_custom_model(artifacts).recommend(facial_features, **options)
+
+    ranking = _ranking_payload(recommendations, ranking_fields(payload))
+    empirical_debug = ranking.pop("empirical_debug", None)
+    model = dict(artifacts["metadata"])
+    if empirical_debug is not None:
+        model["empirical_debug"] = empirical_debug
+    return {
+        **ranking,
+        "model": model,
     }
+
+
+def _infer_custom_batch(payload, artifacts):
+    faces = _extract_facial_measurements_batch(payload) or []
+    chunk_size = batch_chunk_size(payload)
+    options = ranking_options(payload)
+    rankings = _compiled_custom_model(artifacts).recommend_batch(faces, chunk_size=chunk_size, **options)
+    fields = ranking_fields(payload)
     return {
-        "mask_id": mask_id_map,
-        "proba_fit": proba_map,
-        "model": {
-            **artifacts["metadata"],
-            "empirical_debug": empirical_debug_map,
-        }
+        "results": [_ranking_payload(recommendations, fields) for recommendations in rankings],
+        "model": artifacts["metadata"],
     }
 
 
@@ -325,7 +328,12 @@ def recommend_masks():
             "error": "Custom LR artifacts are not available locally or in S3.",
             "details": str(exc),
         }), 503
-    return jsonify(_infer_custom(payload, custom_artifacts))
+    try:
+        if _extract_facial_measurements_batch(payload) is not None:
+            return jsonify(_infer_custom_batch(payload, custom_artifacts))
+        return jsonify(_infer_custom(payload, custom_artifacts))
+    except InvalidRankingOptions as exc:
+        return jsonify({"error": str(exc)}), 400
 
 
 @APP.route("/health", methods=["GET"])
@@ -22,8 +22,9 @@ from data_prep import (BAYESIAN_FACE_COLUMNS, FACIAL_FEATURE_COLUMNS, get_masks,
                        filter_fit_tests_for_bayesian,
                        load_fit_tests_with_imputation)
 from qa import build_mask_candidates, build_recommendation_preview
-from sklearn.metrics import (auc, f1_score, precision_score, recall_score,
+from sklearn.metrics import (auc, precision_score, recall_score,
                              roc_auc_score, roc_curve)
+from threshold_search import best_f1_threshold
 from train import load_focus_examples
 
 
@@ -255,15 +256,7 @@ def predict_from_trace(trace, mask_idx, bin_idx, beard, earloop, headstrap):
 
 
 def evaluate_predictions(val_probs, val_labels):
-    threshold_grid = np.arange(0.05, 0.96, 0.01)
-    best_threshold = 0.5
-    best_f1 = 0.0
-    for candidate in threshold_grid:
-        preds = (val_probs >= candidate).astype(int)
-        candidate_f1 = f1_score(val_labels, preds, zero_division=0)
-        if candidate_f1 > best_f1:
-            best_f1 = candidate_f1
-            best_threshold = float(candidate)
+    best_threshold, best_f1 = best_f1_threshold(val_labels, val_probs)
 
     val_preds = (val_probs >= best_threshold).astype(int)
     precision = precision_score(val_labels, val_preds, zero_division=0)
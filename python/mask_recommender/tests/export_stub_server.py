@@ -0,0 +1,92 @@
+"""
+A local stand-in for the Breathesafe export endpoints.
+
+    with StubExportServer({"/masks.json": {"masks": [...]}}) as server:
+        fetch_json(session, f"{server.base_url}/masks.json")
+
+Every response carries an ETag derived from its body and honours
+If-None-Match with a 304, like Rails' Rack::ETag / Rack::ConditionalGet.
+Routes listed in ``delta_routes`` (path -> (records_key, column)) also filter
+their records by an ``updated_since`` query parameter. Requests are recorded in
+``server.requests``, payloads can be swapped through ``server.routes``, and
+``server.failures[path] = [502, ...]`` makes the next requests to a path fail
+with those statuses.
+"""
+
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class StubExportServer:
+    def __init__(self, routes, delta_routes=None):
+        self.routes = dict(routes)
+        self.delta_routes = dict(delta_routes or {})
+        self.requests = []
+        self.failures = {}
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def _payload(self, path, query):
+        payload = self.routes[path]
+        since = query.get('updated_since', [None])[0]
+        if since is None or path not in self.delta_routes:
+            return payload
+        records_key, column = self.delta_routes[path]
+        return {
+            **payload,
+            records_key: [record for record in payload[records_key] if str(record.get(column)) > since],
+        }
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                query = parse_qs(parts.query)
+                stub.requests.append({'path': parts.path, 'query': query, 'headers': dict(self.headers)})
+                if stub.failures.get(parts.path):
+                    self.send_response(stub.failures[parts.path].pop(0))
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                if parts.path not in stub.routes:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = json.dumps(stub._payload(parts.path, query)).encode('utf-8')
+                etag = f'W/"{hashlib.md5(body).hexdigest()}"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                return
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
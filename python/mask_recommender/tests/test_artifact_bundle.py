@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+import torch
+
+from mask_recommender.artifact_bundle import BUNDLE_FILENAME, load_custom_lr_bundle, write_custom_lr_bundle
+from mask_recommender.scoring import CompiledCustomModel, facial_perimeter_cm
+
+
+def _artifacts():
+    torch.manual_seed(1)
+    params = {
+        "alpha_mask_raw": torch.randn((2, 1)) - 4.0,
+        "beta_gamma_mask": torch.randn((2, 2)),
+        "alpha_style_raw": torch.randn((1, 1)) - 4.0,
+        "beta_gamma_style": torch.randn((1, 2)),
+        "strap_specific_parameters": torch.randn((2, 1)),
+    }
+    metadata = {
+        "timestamp": "20260101000000",
+        "fit_family_categories": ["101", "102"],
+        "style_categories": ["Cup"],
+        "strap_type_categories": ["Earloop", "Headstrap"],
+    }
+    mask_data = {
+        "1": {
+            "id": 1,
+            "fit_family_id": 101,
+            "unique_internal_model_code": "MASK-A",
+            "perimeter_mm": 300.5,
+            "strap_type": "Earloop",
+            "style": "Cup",
+            "mask_fit_test_count": 4,
+            "mask_smoothed_pass_rate": 0.25,
+        },
+        "2": {
+            "id": 2,
+            "fit_family_id": None,
+            "unique_internal_model_code": "MASK-B",
+            "perimeter_mm": None,
+            "strap_type": "Headstrap",
+            "style": None,
+        },
+    }
+    return params, metadata, mask_data
+
+
+def test_bundle_round_trips_params_metadata_and_mask_data(tmp_path):
+    params, metadata, mask_data = _artifacts()
+    path = write_custom_lr_bundle(tmp_path / BUNDLE_FILENAME, params, metadata, mask_data)
+
+    bundle = load_custom_lr_bundle(path)
+
+    assert bundle.metadata == metadata
+    assert {mask_id: dict(info) for mask_id, info in bundle.mask_data.items()} == mask_data
+    assert "mask_fit_test_count" not in bundle.mask_data["2"]
+    for name, value in params.items():
+        assert isinstance(bundle.params[name], np.ndarray)
+        assert bundle.params[name].dtype == np.float32
+        assert not bundle.params[name].flags.writeable
+        np.testing.assert_array_equal(bundle.params[name], value.numpy())
+
+
+def test_bundle_scores_identically_to_source_artifacts(tmp_path):
+    params, metadata, mask_data = _artifacts()
+    bundle = load_custom_lr_bundle(write_custom_lr_bundle(tmp_path / BUNDLE_FILENAME, params, metadata, mask_data))
+    face = facial_perimeter_cm({"nose_mm": 40, "chin_mm": 50, "top_cheek_mm": 60, "mid_cheek_mm": 55})
+
+    expected = CompiledCustomModel.from_artifacts(params, metadata, mask_data).predict_proba(face)
+    actual = CompiledCustomModel.from_artifacts(bundle.params, bundle.metadata, bundle.mask_data).predict_proba(face)
+
+    np.testing.assert_array_equal(actual, expected)
+
+
+def test_bundle_rejects_unknown_version(tmp_path):
+    params, metadata, mask_data = _artifacts()
+    path = write_custom_lr_bundle(tmp_path / BUNDLE_FILENAME, params, metadata, mask_data)
+    raw = bytearray(path.read_bytes())
+    raw[8:12] = (99).to_bytes(4, "little")
+    path.write_bytes(bytes(raw))
+
+    with pytest.raises(ValueError, match="version 99"):
+        load_custom_lr_bundle(path)
@@ -0,0 +1,112 @@
+import json
+import threading
+
+import boto3
+import pytest
+from boto3.s3.transfer import TransferConfig
+
+from mask_recommender.artifact_publisher import ArtifactPublisher
+
+BUCKET = "breathesafe-development"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    mock_aws = pytest.importorskip("moto").mock_aws
+    monkeypatch.delenv("AWS_PROFILE", raising=False)
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def _read(s3, key):
+    return s3.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+
+
+def test_publisher_uploads_copies_and_publishes_pointer_last(s3, tmp_path):
+    local_path = tmp_path / "params.pt"
+    local_path.write_bytes(b"params")
+    with ArtifactPublisher(BUCKET, client=s3) as publisher:
+        params = publisher.upload_file(local_path, "models/1/params.pt")
+        metrics = publisher.put_json("models/1/metrics.json", {"f1": 0.5})
+        alias = publisher.copy("models/1/params.pt", "models/params_latest.pt")
+        pointer_uri = publisher.publish_pointer("models/latest.json", {"params_key": "models/1/params.pt"})
+
+        assert params.result() == f"s3://{BUCKET}/models/1/params.pt"
+        assert metrics.result() == f"s3://{BUCKET}/models/1/metrics.json"
+        assert alias.result() == f"s3://{BUCKET}/models/params_latest.pt"
+        summary = publisher.timing_summary()
+
+    assert pointer_uri == f"s3://{BUCKET}/models/latest.json"
+    assert _read(s3, "models/params_latest.pt") == b"params"
+    assert json.loads(_read(s3, "models/1/metrics.json")) == {"f1": 0.5}
+    assert _read(s3, "models/1/metrics.json").startswith(b"{\n")
+    assert s3.head_object(Bucket=BUCKET, Key="models/1/metrics.json")["ContentType"] == "application/json"
+    assert [entry["key"] for entry in publisher.timings][-1] == "models/latest.json"
+    assert summary["operations"] == 4
+    assert summary["copies"] == 1
+
+
+def test_publisher_does_not_write_pointer_when_an_upload_fails(s3, tmp_path):
+    with ArtifactPublisher(BUCKET, client=s3) as publisher:
+        publisher.put_json("models/1/metrics.json", {"f1": 0.5})
+        publisher.upload_file(tmp_path / "missing.pt", "models/1/params.pt")
+        optional = publisher.put_bytes("previews/1.json", b"{}", required=False)
+
+        with pytest.raises(FileNotFoundError):
+            publisher.publish_pointer("models/latest.json", {"params_key": "models/1/params.pt"})
+        assert optional.result() == f"s3://{BUCKET}/previews/1.json"
+
+    keys = {item["Key"] for item in s3.list_objects_v2(Bucket=BUCKET)["Contents"]}
+    assert keys == {"models/1/metrics.json", "previews/1.json"}
+
+
+def test_publisher_shuts_down_its_upload_threads_when_publishing_raises(s3, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        with ArtifactPublisher(BUCKET, client=s3) as publisher:
+            publisher.upload_file(tmp_path / "missing.pt", "models/1/params.pt")
+            publisher.publish_pointer("models/latest.json", {"params_key": "models/1/params.pt"})
+
+    assert not any(thread.name.startswith("artifact-upload") for thread in threading.enumerate())
+    with pytest.raises(RuntimeError):
+        publisher.put_json("models/1/metrics.json", {})
+
+
+def test_publisher_serializes_writes_to_the_same_key(s3):
+    release = threading.Event()
+    original_put_object = s3.put_object
+    calls = []
+
+    def slow_first_put(**kwargs):
+        calls.append(kwargs["Body"])
+        if len(calls) == 1:
+            release.wait(timeout=5)
+        return original_put_object(**kwargs)
+
+    s3.put_object = slow_first_put
+    with ArtifactPublisher(BUCKET, client=s3) as publisher:
+        publisher.put_json("models/1/metrics.json", {"version": 1})
+        second = publisher.put_json("models/1/metrics.json", {"version": 2})
+        release.set()
+        second.result()
+
+    assert json.loads(_read(s3, "models/1/metrics.json")) == {"version": 2}
+
+
+def test_publisher_uses_multipart_uploads_above_the_threshold(s3, tmp_path):
+    local_path = tmp_path / "bundle.bin"
+    body = bytes(range(256)) * (11 * 1024 * 1024 // 256)
+    local_path.write_bytes(body)
+    config = TransferConfig(multipart_threshold=5 * 1024 * 1024, multipart_chunksize=5 * 1024 * 1024)
+
+    with ArtifactPublisher(BUCKET, client=s3, transfer_config=config) as publisher:
+        publisher.upload_file(local_path, "models/1/bundle.bin")
+        publisher.copy("models/1/bundle.bin", "models/bundle_latest.bin")
+        publisher.wait()
+
+    # Multipart ETags end in -<part count>.
+    assert s3.head_object(Bucket=BUCKET, Key="models/1/bundle.bin")["ETag"].strip('"').endswith("-3")
+    assert _read(s3, "models/bundle_latest.bin") == body
@@ -0,0 +1,39 @@
+import pandas as pd
+
+from mask_recommender.benchmarks.harness import compare_reports
+from mask_recommender.benchmarks.run import run_benchmarks
+from mask_recommender.benchmarks.synthetic import synthetic_fit_tests, synthetic_masks
+
+
+def test_synthetic_data_is_seeded_and_scales():
+    masks = synthetic_masks(scale=0.1, seed=3)
+    fit_tests = synthetic_fit_tests(masks, scale=0.1, seed=3)
+
+    pd.testing.assert_frame_equal(fit_tests, synthetic_fit_tests(synthetic_masks(scale=0.1, seed=3), scale=0.1, seed=3))
+    assert len(masks) == 30
+    assert len(fit_tests) == 300
+    assert set(fit_tests["mask_id"]) <= set(masks["id"])
+
+
+def test_run_benchmarks_reports_each_case():
+    report = run_benchmarks([0.05], cases=["apply_perimeter_features", "recommend_masks_custom"], repeat=2, warmup=0)
+
+    results = report["results"]["0.05x"]
+    assert set(results) == {"apply_perimeter_features", "recommend_masks_custom"}
+    assert results["apply_perimeter_features"]["runs"] == 2
+    assert results["apply_perimeter_features"]["peak_memory_bytes"] > 0
+    assert report["sizes"]["0.05x"]["masks"] == 15
+
+
+def test_compare_reports_flags_p50_and_memory_regressions():
+    def report(p50_ms, peak_memory_bytes):
+        return {"results": {"1x": {"case": {"p50_ms": p50_ms, "peak_memory_bytes": peak_memory_bytes}}}}
+
+    baseline = report(100.0, 1000)
+
+    assert compare_reports(report(120.0, 1200), baseline) == []
+    regressions = compare_reports(report(130.0, 1300), baseline)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("1x case: p50")
+    # Sub-millisecond cases are too noisy to gate on p50.
+    assert compare_reports(report(0.4, 10), report(0.2, 10)) == []
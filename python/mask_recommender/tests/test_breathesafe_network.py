@@ -1,5 +1,10 @@
+import pytest
+import requests
+
 from mask_recommender import breathesafe_network
 
+from .export_stub_server import StubExportServer
+
 
 class DummyResponse:
     def __init__(self, payload):
@@ -45,3 +50,36 @@ def test_fetch_facial_measurements_fit_tests_uses_public_route_without_token(mon
 
     assert session.calls[0]["url"] == "https://www.breathesafe.xyz/facial_measurements_fit_tests.json"
     assert session.calls[0]["headers"] is None
+
+
+def test_build_session_retries_transient_errors_on_gets_and_records_timings():
+    routes = {"/dashboard/stats.json": {"fit_tests": 3}}
+    with StubExportServer(routes) as server:
+        server.failures["/dashboard/stats.json"] = [502, 503]
+        session = breathesafe_network.build_session(None, backoff_factor=0)
+
+        stats = breathesafe_network.fetch_dashboard_stats(server.base_url, session=session)
+
+    assert stats == {"fit_tests": 3}
+    assert len(server.requests) == 3
+    assert "gzip" in server.requests[-1]["headers"]["Accept-Encoding"]
+    assert session.timings[0]["url"] == f"{server.base_url}/dashboard/stats.json"
+    assert session.timings[0]["status"] == 200
+    assert session.timing_summary()["requests"] == 1
+    assert session.timing_summary()["retries"] == 2
+
+
+def test_build_session_gives_up_after_bounded_retries_and_never_retries_posts():
+    retry = breathesafe_network.build_retry()
+    assert retry.is_retry("GET", 502)
+    assert not retry.is_retry("POST", 502)
+
+    with StubExportServer({"/dashboard/stats.json": {}}) as server:
+        server.failures["/dashboard/stats.json"] = [502] * 5
+        session = breathesafe_network.build_session(None, retries=2, backoff_factor=0)
+
+        with pytest.raises(requests.HTTPError):
+            breathesafe_network.fetch_dashboard_stats(server.base_url, session=session)
+
+    assert len(server.requests) == 3
+    assert session.timing_summary()["failed"] == 1
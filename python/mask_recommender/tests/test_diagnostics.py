@@ -0,0 +1,108 @@
+import json
+
+import boto3
+import numpy as np
+import pytest
+
+from mask_recommender.diagnostics import DiagnosticsPublisher, publish_diagnostics
+
+TIMESTAMP = "20260501120000"
+
+
+def _perimeter_page(page, num_pages):
+    diff_values = np.linspace(-3.0, 3.0, 20, dtype=np.float32)
+    panel = {
+        "mask_code": f"MASK-{page}",
+        "diff_values": diff_values,
+        "specific_probs": 1.0 / (1.0 + np.exp(diff_values)),
+        "generic_probs": np.full(len(diff_values), 0.5),
+        "pass_points": (np.array([-1.0]), np.array([1.0])),
+        "fail_points": (np.array([], dtype=float), np.array([], dtype=float)),
+        "probes": [{"label": "probe", "color": "#111111", "diff_cm": 0.4, "probability": 0.6}],
+        "x_limits": (-3.5, 3.5),
+    }
+    return {
+        "name": f"perimeter_diff_diagnostics_page_{page}",
+        "kind": "perimeter_diff_page",
+        "filename": f"{TIMESTAMP}_custom_perimeter_diff_diagnostics_page_{page}.png",
+        "data": {"page": page, "num_pages": num_pages, "panels": [panel], "probe_legend": [("probe", "#111111")]},
+    }
+
+
+def _figures():
+    return [
+        {
+            "name": "training_loss",
+            "kind": "training_loss",
+            "filename": f"{TIMESTAMP}_custom_training_loss.png",
+            "data": {"train_losses": [0.7, 0.6, 0.5], "val_losses": [0.72, 0.65, 0.6]},
+        },
+        {
+            "name": "roc_auc",
+            "kind": "roc",
+            "filename": f"{TIMESTAMP}_custom_roc_auc.png",
+            "data": {"curves": [{"label": "train", "fpr": [0.0, 0.5, 1.0], "tpr": [0.0, 0.8, 1.0], "auc": 0.65}]},
+        },
+        _perimeter_page(1, 2),
+        _perimeter_page(2, 2),
+    ]
+
+
+@pytest.mark.parametrize("render_workers", [1, 2])
+def test_publish_diagnostics_writes_each_figure_locally(tmp_path, render_workers):
+    documents = [{"name": "probe_points", "filename": f"{TIMESTAMP}_probe_points.json", "payload": [{"page": 1}]}]
+
+    artifacts, timings = publish_diagnostics(
+        _figures(),
+        DiagnosticsPublisher(TIMESTAMP, str(tmp_path)),
+        documents=documents,
+        render_workers=render_workers,
+    )
+
+    for figure in _figures():
+        path = tmp_path / figure["filename"]
+        assert artifacts[figure["name"]] == str(path)
+        assert path.read_bytes().startswith(b"\x89PNG")
+    assert json.loads((tmp_path / f"{TIMESTAMP}_probe_points.json").read_text()) == [{"page": 1}]
+    assert timings["figures"] == 4
+    assert timings["documents"] == 1
+    assert timings["failures"] == 0
+
+
+def test_publish_diagnostics_reports_render_failures_without_raising(tmp_path):
+    broken = dict(_figures()[0], name="broken", filename="broken.png", data={})
+
+    artifacts, timings = publish_diagnostics(
+        [broken, _figures()[1]],
+        DiagnosticsPublisher(TIMESTAMP, str(tmp_path)),
+        render_workers=1,
+    )
+
+    assert artifacts["broken"] is None
+    assert artifacts["roc_auc"] == str(tmp_path / f"{TIMESTAMP}_custom_roc_auc.png")
+    assert timings["failures"] == 1
+    assert not (tmp_path / "broken.png").exists()
+
+
+def test_publish_diagnostics_uploads_to_s3(tmp_path, monkeypatch):
+    mock_aws = pytest.importorskip("moto").mock_aws
+    monkeypatch.delenv("AWS_PROFILE", raising=False)
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="breathesafe-staging")
+        publisher = DiagnosticsPublisher(TIMESTAMP, str(tmp_path), bucket="breathesafe-staging", region="us-east-1")
+
+        artifacts, timings = publish_diagnostics(_figures(), publisher, render_workers=1)
+
+        prefix = f"mask_recommender/models/{TIMESTAMP}"
+        for figure in _figures():
+            key = f"{prefix}/{figure['filename']}"
+            assert artifacts[figure["name"]] == f"s3://breathesafe-staging/{key}"
+            uploaded = s3.get_object(Bucket="breathesafe-staging", Key=key)
+            assert uploaded["ContentType"] == "image/png"
+            assert uploaded["Body"].read().startswith(b"\x89PNG")
+    assert timings["failures"] == 0
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,90 @@
+import pandas as pd
+import pytest
+import requests
+
+from mask_recommender.export_cache import ExportCache, fetch_fit_tests_frame, fetch_masks_frame
+
+from .export_stub_server import StubExportServer
+
+pytest.importorskip("pyarrow", exc_type=ImportError)
+
+MASKS = [
+    {"id": 1, "unique_internal_model_code": "3M Aura", "perimeter_mm": 300, "current_state": {"breakdown": []},
+     "image_urls": ["a.png"], "updated_at": "2026-01-01T00:00:00Z"},
+    {"id": 2, "unique_internal_model_code": "Zimi", "perimeter_mm": None, "current_state": None,
+     "image_urls": [], "updated_at": "2026-01-02T00:00:00Z"},
+]
+FIT_TESTS = [
+    {"id": 10, "user_id": 1, "mask_id": 1, "qlft_pass": True, "nose_mm": 40.5},
+    {"id": 11, "user_id": 2, "mask_id": 2, "qlft_pass": None, "nose_mm": None},
+]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_export_cache_round_trips_nested_columns_and_revalidates_with_etag(tmp_path):
+    clock = Clock()
+    cache = ExportCache(tmp_path, ttl_seconds=60, clock=clock)
+    with StubExportServer({"/masks.json": {"masks": MASKS}}) as server:
+        session = requests.Session()
+        url = f"{server.base_url}/masks.json?per_page=1000"
+
+        first = fetch_masks_frame(session, url, cache=cache)
+        clock.now += 30
+        fresh = fetch_masks_frame(session, url, cache=cache)
+        clock.now += 60
+        revalidated = fetch_masks_frame(session, url, cache=cache)
+        server.routes["/masks.json"] = {"masks": MASKS[:1]}
+        clock.now += 60
+        changed = fetch_masks_frame(session, url, cache=cache)
+
+    pd.testing.assert_frame_equal(first, pd.DataFrame(MASKS))
+    pd.testing.assert_frame_equal(fresh, first)
+    pd.testing.assert_frame_equal(revalidated, first)
+    assert revalidated["current_state"].tolist() == [{"breakdown": []}, None]
+    assert revalidated["image_urls"].tolist() == [["a.png"], []]
+    assert changed["id"].tolist() == [1]
+    assert cache.stats == {"fresh": 1, "not_modified": 1, "delta": 0, "full": 2}
+    assert len(server.requests) == 3
+    assert "If-None-Match" in server.requests[1]["headers"]
+    assert server.requests[0]["query"] == {"per_page": ["1000"]}
+
+
+def test_export_cache_merges_updated_since_deltas_by_id(tmp_path):
+    cache = ExportCache(tmp_path)
+    routes = {"/masks.json": {"masks": MASKS}}
+    with StubExportServer(routes, delta_routes={"/masks.json": ("masks", "updated_at")}) as server:
+        session = requests.Session()
+        url = f"{server.base_url}/masks.json"
+
+        cache.fetch_frame(session, url, "masks", delta_column="updated_at")
+        updated = {**MASKS[0], "perimeter_mm": 305, "updated_at": "2026-01-03T00:00:00Z"}
+        added = {**MASKS[1], "id": 3, "updated_at": "2026-01-04T00:00:00Z"}
+        server.routes["/masks.json"] = {"masks": [updated, MASKS[1], added]}
+        merged = cache.fetch_frame(session, url, "masks", delta_column="updated_at")
+
+    assert server.requests[1]["query"] == {"updated_since": ["2026-01-02T00:00:00Z"]}
+    assert sorted(merged["id"].tolist()) == [1, 2, 3]
+    assert merged.set_index("id").loc[1, "perimeter_mm"] == 305
+    assert cache.stats["delta"] == 1
+
+
+def test_fetch_fit_tests_frame_matches_uncached_fetch_and_scopes_entries(tmp_path, monkeypatch):
+    monkeypatch.delenv("MASK_RECOMMENDER_INTERNAL_API_TOKEN", raising=False)
+    cache = ExportCache(tmp_path, ttl_seconds=60)
+    routes = {"/facial_measurements_fit_tests.json": {"fit_tests_with_facial_measurements": FIT_TESTS}}
+    with StubExportServer(routes) as server:
+        uncached = fetch_fit_tests_frame(server.base_url, session=requests.Session())
+        cached = fetch_fit_tests_frame(server.base_url, session=requests.Session(), cache=cache, scope="a@example.com")
+        fetch_fit_tests_frame(server.base_url, session=requests.Session(), cache=cache, scope="a@example.com")
+        fetch_fit_tests_frame(server.base_url, session=requests.Session(), cache=cache, scope="b@example.com")
+
+    pd.testing.assert_frame_equal(cached, uncached)
+    # One uncached fetch plus one fetch per scope.
+    assert len(server.requests) == 3
@@ -1,11 +1,18 @@
+import json
+
+import numpy as np
 import pandas as pd
 
 from mask_recommender.feature_builder import (FACE_SHAPE_FEATURE_COLUMNS,
                                              MASK_SIZE_FEATURE_COLUMNS,
                                              PERIMETER_PENALTY_FEATURE_COLUMNS,
+                                             MaskCodeCache,
+                                             _apply_default_perimeter_chain,
+                                             apply_feature_plan,
                                              apply_perimeter_features,
                                              build_feature_frame,
                                              derive_brand_model,
+                                             mask_code_attributes,
                                              parse_mask_sizing)
 
 
@@ -66,8 +73,8 @@ def test_build_feature_frame_adds_engineered_face_shape_features():
         assert column in encoded.columns
     assert "face_style_x_nose_ratio_x_style_term_Cup" in encoded.columns
     assert "face_style_x_nose_ratio_x_style_term_Bifold" in encoded.columns
-    assert encoded.loc[0, "facial_perimeter_cm"] == 20.5
-    assert encoded.loc[1, "facial_perimeter_cm"] == 21.4
+    assert encoded.loc[0, "facial_perimeter_cm"] == np.float32(20.5)
+    assert encoded.loc[1, "facial_perimeter_cm"] == np.float32(21.4)
     assert encoded.loc[0, "strap_ratio"] > 0
     assert encoded.loc[1, "chin_to_nose_ratio"] > 1
     assert encoded.loc[0, "earloop_abs_diff"] > 0
@@ -119,3 +126,102 @@ def test_derive_brand_model_prefers_breakdown_and_falls_back_to_code():
         }
     }
     assert derive_brand_model("Trident Regular", brand_only_state) == "Trident"
+
+
+def test_apply_feature_plan_matches_add_feature_chain():
+    rng = np.random.default_rng(7)
+    row_count = 60
+    frame = pd.DataFrame(
+        {
+            "mask_id": np.arange(row_count),
+            "perimeter_mm": rng.choice([0, 250, 300, 335.5, np.nan], size=row_count),
+            "strap_type": rng.choice(["Earloop", "Adjustable Headstrap", "Headstrap", None, ""], size=row_count),
+            "style": rng.choice(["Cup", "Bifold", "Bifold & Gasket", "Boat", " duckbill ", None, ""], size=row_count),
+            "unique_internal_model_code": rng.choice(
+                ["3M-8210", "ZIMI-KIDS-S", "PETITE-XS", "ACME Large (M/L)", None],
+                size=row_count,
+            ),
+            "facial_hair_beard_length_mm": rng.choice([0, 2, np.nan], size=row_count),
+            "nose_mm": rng.uniform(30, 50, size=row_count),
+            "chin_mm": rng.uniform(40, 60, size=row_count),
+            "top_cheek_mm": rng.uniform(50, 70, size=row_count),
+            "mid_cheek_mm": rng.choice([0.0, 55.0, 61.5], size=row_count),
+            "strap_mm": rng.uniform(100, 140, size=row_count),
+        }
+    )
+
+    expected = _apply_default_perimeter_chain(frame)
+    actual = apply_feature_plan(frame)
+    exact = apply_feature_plan(frame, dtype=np.float64)
+
+    assert list(actual.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(exact, expected, check_dtype=False)
+
+    derived = [column for column in actual.columns if column not in frame.columns]
+    assert set(actual[derived].dtypes) == {np.dtype(np.float32)}
+    pd.testing.assert_frame_equal(actual[derived], expected[derived].astype(np.float32))
+    pd.testing.assert_frame_equal(actual.drop(columns=derived), expected.drop(columns=derived))
+
+
+def test_apply_feature_plan_coerces_strap_mm_like_the_add_feature_chain():
+    frame = pd.DataFrame(
+        {
+            "perimeter_mm": ["300", None, 280],
+            "strap_type": ["Earloop", "Headstrap", None],
+            "style": ["Cup", "Bifold", None],
+            "unique_internal_model_code": ["MASK-A", "MASK-B KIDS", None],
+            "nose_mm": [40, "41.5", None],
+            "chin_mm": [50, 52, 48],
+            "top_cheek_mm": [60, 61, 59],
+            "mid_cheek_mm": [55, 56, 54],
+            "strap_mm": ["120", None, "n/a"],
+        }
+    )
+
+    expected = _apply_default_perimeter_chain(frame)
+    actual = apply_feature_plan(frame, dtype=np.float64)
+
+    assert expected["strap_mm"].tolist() == [120.0, 0.0, 0.0]
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+
+def test_mask_code_attributes_parses_each_mask_once_and_broadcasts():
+    current_state = {"current_state": {"breakdown": [{"3M": "brand"}, {"Aura": "model"}, {"XS": "size"}]}}
+    frame = pd.DataFrame(
+        {
+            "unique_internal_model_code": ["3M Aura 9205+", "Trident Regular", "3M Aura 9205+", None] * 3,
+            "current_state": [current_state, None, json.dumps(current_state), None] * 3,
+        },
+        index=np.arange(12) * 10,
+    )
+    cache = MaskCodeCache()
+
+    attributes = mask_code_attributes(frame, cache=cache)
+
+    assert list(attributes.index) == list(frame.index)
+    for (_, row), (_, parsed) in zip(frame.iterrows(), attributes.iterrows()):
+        code, state = row["unique_internal_model_code"], row["current_state"]
+        assert parsed.to_dict() == {
+            **parse_mask_sizing(code, state),
+            "brand_model": derive_brand_model(code, state),
+        }
+    # The decoded and JSON-string forms of a state are separate keys.
+    assert cache.stats()["misses"] == 4
+    assert cache.stats()["hits"] == 0
+
+    mask_code_attributes(frame, cache=cache)
+    assert cache.stats()["hits"] == 4
+
+
+def test_mask_code_cache_evicts_least_recently_used():
+    cache = MaskCodeCache(maxsize=2)
+
+    cache.get("Mask A S")
+    cache.get("Mask B")
+    cache.get("Mask A S")
+    cache.get("Mask C XXL")
+    cache.get("Mask A S")
+    cache.get("Mask B")
+
+    assert cache.stats() == {"size": 2, "maxsize": 2, "hits": 2, "misses": 4, "evictions": 2}
+    assert cache.get("Mask C XXL")["mask_face_size_bucket"] == "xxl"
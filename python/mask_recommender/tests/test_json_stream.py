@@ -0,0 +1,83 @@
+import json
+
+import pandas as pd
+import pytest
+import requests
+
+from mask_recommender.export_cache import fetch_fit_tests_frame
+from mask_recommender.json_stream import iter_json_records, read_records_frame
+
+from .export_stub_server import StubExportServer
+
+RECORDS = [
+    {"id": 1, "user_id": 7, "qlft_pass": True, "nose_mm": 40, "style": "Bifold", "results": {"n": [1, 2]}},
+    {"id": 2, "user_id": 8, "qlft_pass": None, "nose_mm": 41.5, "style": None, "results": None},
+    {"id": 3, "user_id": 9, "qlft_pass": False, "style": "Cup ✓", "results": [], "extra": 1},
+    {"id": 4, "user_id": 7, "qlft_pass": True, "nose_mm": None, "style": "Duckbill", "results": {}, "extra": None},
+    {"id": 5, "user_id": 10, "qlft_pass": True, "nose_mm": 39, "style": "Bifold", "results": {"n": []}},
+]
+
+
+def _chunks(payload, size):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    return [body[start:start + size] for start in range(0, len(body), size)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 16])
+@pytest.mark.parametrize("batch_size", [1, 2, 4096])
+def test_read_records_frame_matches_dataframe_of_parsed_records(chunk_size, batch_size):
+    payload = {"count": 5, "fit_tests_with_facial_measurements": RECORDS, "next": {"page": None}}
+
+    frame = read_records_frame(
+        _chunks(payload, chunk_size),
+        "fit_tests_with_facial_measurements",
+        batch_size=batch_size,
+    )
+
+    expected = pd.DataFrame(RECORDS)
+    pd.testing.assert_frame_equal(frame, expected)
+    assert frame["results"].tolist() == expected["results"].tolist()
+    assert frame["style"].tolist()[:3] == ["Bifold", None, "Cup ✓"]
+
+
+def test_read_records_frame_projects_columns_and_reads_top_level_arrays():
+    columns = ["nose_mm", "id", "qlft_pass"]
+
+    frame = read_records_frame(_chunks(RECORDS, 5), None, columns=columns, batch_size=2)
+
+    pd.testing.assert_frame_equal(frame, pd.DataFrame(RECORDS)[columns])
+
+
+@pytest.mark.parametrize("batch_size", [1, 2, 3, 4096])
+def test_read_records_frame_keeps_values_when_column_types_change_between_batches(batch_size):
+    records = [
+        {"code": 1, "score": 1, "flag": True, "size": 1},
+        {"code": 2, "score": None, "flag": None, "size": 2.5},
+        {"code": None, "score": 3},
+        {"code": "A", "score": "high", "flag": 1, "size": None},
+        {"code": 5, "score": 0.5, "flag": False, "size": 4},
+    ]
+
+    frame = read_records_frame(_chunks(records, 16), None, batch_size=batch_size)
+
+    expected = pd.DataFrame(records)
+    pd.testing.assert_frame_equal(frame, expected)
+    for column in expected:
+        actual_values = frame[column].tolist()
+        expected_values = expected[column].tolist()
+        assert [type(value) for value in actual_values] == [type(value) for value in expected_values]
+        assert [value is None for value in actual_values] == [value is None for value in expected_values]
+
+
+def test_iter_json_records_rejects_truncated_payloads():
+    with pytest.raises(ValueError):
+        list(iter_json_records(_chunks({"masks": RECORDS}, 11)[:-2], "masks"))
+
+
+def test_fetch_fit_tests_frame_streams_projected_columns(monkeypatch):
+    monkeypatch.delenv("MASK_RECOMMENDER_INTERNAL_API_TOKEN", raising=False)
+    routes = {"/facial_measurements_fit_tests.json": {"fit_tests_with_facial_measurements": RECORDS}}
+    with StubExportServer(routes) as server:
+        frame = fetch_fit_tests_frame(server.base_url, session=requests.Session(), columns=["id", "qlft_pass"])
+
+    pd.testing.assert_frame_equal(frame, pd.DataFrame(RECORDS)[["id", "qlft_pass"]])
@@ -1,3 +1,5 @@
+import json
+
 import pandas as pd
 import torch
 from mask_recommender.inference import lambda_function
@@ -78,6 +80,7 @@ def test_handler_accepts_facial_measurements(monkeypatch):
             ]
 
     monkeypatch.setattr(lambda_function, "MaskRecommenderInference", DummyRecommender)
+    monkeypatch.setattr(lambda_function, "_RECOMMENDER", None)
 
     event = {
         "facial_measurements": {
@@ -91,3 +94,113 @@ def test_handler_accepts_facial_measurements(monkeypatch):
     }
     response = lambda_function.handler(event, None)
     assert response["statusCode"] == 200
+
+
+def test_handler_reuses_recommender_across_invocations(monkeypatch):
+    created = []
+
+    class DummyRecommender:
+        def __init__(self):
+            created.append(self)
+            self.custom_metadata = {"timestamp": "custom-test"}
+            self.refresh_calls = 0
+
+        def refresh_custom_model(self):
+            self.refresh_calls += 1
+            return False
+
+        def recommend_masks_custom(self, facial_features):
+            return [{"mask_id": 10, "proba_fit": 0.9, "mask_info": {}}]
+
+    monkeypatch.setattr(lambda_function, "MaskRecommenderInference", DummyRecommender)
+    monkeypatch.setattr(lambda_function, "_RECOMMENDER", None)
+
+    warm = lambda_function.handler({"method": "warmup"}, None)
+    first = lambda_function.handler({"facial_measurements": {"nose_mm": 40}}, None)
+    second = lambda_function.handler({"facial_measurements": {"nose_mm": 41}}, None)
+
+    assert warm["statusCode"] == 200
+    assert first["statusCode"] == 200
+    assert second["statusCode"] == 200
+    assert len(created) == 1
+    assert created[0].refresh_calls == 1
+
+
+def test_handler_scores_facial_measurements_batch(monkeypatch):
+    class DummyRecommender:
+        def __init__(self):
+            self.custom_metadata = {"timestamp": "custom-test"}
+
+        def recommend_masks_custom_batch(self, faces, chunk_size):
+            assert chunk_size == 1
+            return [
+                [{"mask_id": 10 + idx, "proba_fit": 0.5, "mask_info": {}}]
+                for idx, _ in enumerate(faces)
+            ]
+
+    monkeypatch.setattr(lambda_function, "MaskRecommenderInference", DummyRecommender)
+    monkeypatch.setattr(lambda_function, "_RECOMMENDER", None)
+
+    response = lambda_function.handler(
+        {"facial_measurements_batch": [{"nose_mm": 40}, {"nose_mm": 41}], "chunk_size": 1},
+        None,
+    )
+
+    body = json.loads(response["body"])
+    assert response["statusCode"] == 200
+    assert [result["mask_id"]["0"] for result in body["results"]] == [10, 11]
+    assert body["model"] == {"timestamp": "custom-test"}
+
+
+def test_handler_passes_ranking_options_and_projects_fields(monkeypatch):
+    class DummyRecommender:
+        def __init__(self):
+            self.custom_metadata = {"timestamp": "custom-test"}
+
+        def recommend_masks_custom(self, facial_features, **options):
+            assert options == {"top_k": 1, "min_proba": 0.2, "styles": ["Cup"]}
+            return [{"mask_id": 10, "proba_fit": 0.9, "mask_info": {"style": "Cup"}}]
+
+    monkeypatch.setattr(lambda_function, "MaskRecommenderInference", DummyRecommender)
+    monkeypatch.setattr(lambda_function, "_RECOMMENDER", None)
+
+    response = lambda_function.handler(
+        {
+            "facial_measurements": {"nose_mm": 40},
+            "top_k": 1,
+            "min_proba": 0.2,
+            "styles": ["Cup"],
+            "fields": ["mask_id", "style"],
+        },
+        None,
+    )
+
+    body = json.loads(response["body"])
+    assert body["mask_id"] == {"0": 10}
+    assert body["style"] == {"0": "Cup"}
+    assert "proba_fit" not in body
+
+
+def test_handler_returns_400_for_malformed_ranking_options(monkeypatch):
+    class DummyRecommender:
+        def __init__(self):
+            self.custom_metadata = {"timestamp": "custom-test"}
+
+        def recommend_masks_custom(self, facial_features, **options):
+            raise AssertionError("malformed options must be rejected before scoring")
+
+        recommend_masks_custom_batch = recommend_masks_custom
+
+    monkeypatch.setattr(lambda_function, "MaskRecommenderInference", DummyRecommender)
+    monkeypatch.setattr(lambda_function, "_RECOMMENDER", None)
+
+    single = lambda_function.handler({"facial_measurements": {"nose_mm": 40}, "top_k": "ten"}, None)
+    batch = lambda_function.handler(
+        {"facial_measurements_batch": [{"nose_mm": 40}], "chunk_size": 0},
+        None,
+    )
+
+    assert single["statusCode"] == 400
+    assert "top_k" in json.loads(single["body"])["error"]
+    assert batch["statusCode"] == 400
+    assert "chunk_size" in json.loads(batch["body"])["error"]
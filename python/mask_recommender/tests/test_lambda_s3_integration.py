@@ -7,6 +7,7 @@ import pandas as pd
 import pytest
 import torch
 
+from mask_recommender.artifact_bundle import write_custom_lr_bundle
 from mask_recommender.inference import lambda_function
 from mask_recommender.train import _detach_custom_lr_parameters
 
@@ -30,90 +31,232 @@ def _mock_s3():
     return None
 
 
+def _configure_aws_env(tmp_dir):
+    credentials_path = tmp_dir / "aws_credentials"
+    credentials_path.write_text(
+        "[breathesafe]\n"
+        "aws_access_key_id=testing\n"
+        "aws_secret_access_key=testing\n"
+    )
+    os.environ["AWS_SHARED_CREDENTIALS_FILE"] = str(credentials_path)
+    os.environ["AWS_PROFILE"] = "breathesafe"
+    os.environ["RAILS_ENV"] = "development"
+    os.environ["AWS_REGION"] = "us-east-1"
+    os.environ["S3_BUCKET_REGION"] = "us-east-1"
+
+
+def _upload_custom_model(s3, bucket, tmp_dir, timestamp, mask_data):
+    params = _detach_custom_lr_parameters(
+        {
+            "mask_specific_parameters": torch.tensor([[0.0, 0.0, 1.0]], dtype=torch.float32),
+            "style_specific_parameters": torch.tensor([[0.0, 0.0, 0.0]], dtype=torch.float32),
+            "strap_specific_parameters": torch.tensor([[0.0]], dtype=torch.float32),
+        }
+    )
+    model_path = tmp_dir / "custom_model_params.pt"
+    torch.save(params, model_path)
+
+    metadata = {
+        "timestamp": timestamp,
+        "model_type": "custom_lr",
+        "fit_family_categories": ["1"],
+        "style_categories": ["Cup"],
+        "strap_type_categories": ["Earloop"],
+    }
+    metadata_path = tmp_dir / "custom_model_metadata.json"
+    metadata_path.write_text(json.dumps(metadata))
+
+    mask_data_path = tmp_dir / "custom_mask_data.json"
+    mask_data_path.write_text(json.dumps(mask_data))
+
+    prefix = f"mask_recommender/models/{timestamp}"
+    latest_payload = {
+        "timestamp": timestamp,
+        "params_key": f"{prefix}/custom_model_params.pt",
+        "metadata_key": f"{prefix}/custom_model_metadata.json",
+        "mask_data_key": f"{prefix}/custom_mask_data.json",
+    }
+
+    s3.upload_file(str(model_path), bucket, latest_payload["params_key"])
+    s3.upload_file(str(metadata_path), bucket, latest_payload["metadata_key"])
+    s3.upload_file(str(mask_data_path), bucket, latest_payload["mask_data_key"])
+    _put_latest(s3, bucket, latest_payload)
+    return latest_payload
+
+
+def _put_latest(s3, bucket, latest_payload):
+    s3.put_object(
+        Bucket=bucket,
+        Key="mask_recommender/models/custom_latest.json",
+        Body=json.dumps(latest_payload).encode("utf-8"),
+        ContentType="application/json",
+    )
+
+
+MASK_DATA = {
+    "1": {
+        "id": 1,
+        "unique_internal_model_code": "MASK-A",
+        "perimeter_mm": 300,
+        "strap_type": "Earloop",
+        "style": "Cup",
+        "fit_family_id": 1,
+    }
+}
+
+FACIAL_FEATURES = {
+    "nose_mm": 40,
+    "chin_mm": 50,
+    "top_cheek_mm": 60,
+    "mid_cheek_mm": 55,
+    "strap_mm": 120,
+    "facial_hair_beard_length_mm": 0,
+}
+
+
 @pytest.mark.skipif(_mock_s3() is None, reason="moto is not installed")
 def test_lambda_loads_model_from_s3_and_recommends():
     with _mock_s3():
         tmp_dir = Path("/tmp/mask_recommender_tests")
         tmp_dir.mkdir(parents=True, exist_ok=True)
-        credentials_path = tmp_dir / "aws_credentials"
-        credentials_path.write_text(
-            "[breathesafe]\n"
-            "aws_access_key_id=testing\n"
-            "aws_secret_access_key=testing\n"
-        )
-        os.environ["AWS_SHARED_CREDENTIALS_FILE"] = str(credentials_path)
-        os.environ["AWS_PROFILE"] = "breathesafe"
-        os.environ["RAILS_ENV"] = "development"
-        os.environ["AWS_REGION"] = "us-east-1"
-        os.environ["S3_BUCKET_REGION"] = "us-east-1"
+        _configure_aws_env(tmp_dir)
 
         bucket = "breathesafe-development"
         session = boto3.Session(profile_name="breathesafe", region_name="us-east-1")
         s3 = session.client("s3")
         s3.create_bucket(Bucket=bucket)
+        _upload_custom_model(s3, bucket, tmp_dir, "20260101000000", MASK_DATA)
 
-        mask_data = {
-            "1": {
-                "id": 1,
-                "unique_internal_model_code": "MASK-A",
-                "perimeter_mm": 300,
-                "strap_type": "Earloop",
-                "style": "Cup",
-            }
-        }
-        facial_features = {
-            "nose_mm": 40,
-            "chin_mm": 50,
-            "top_cheek_mm": 60,
-            "mid_cheek_mm": 55,
-            "strap_mm": 120,
-            "facial_hair_beard_length_mm": 0,
-        }
-        params = _detach_custom_lr_parameters(
+        recommender = lambda_function.MaskRecommenderInference()
+        recommendations = recommender.recommend_masks_custom(FACIAL_FEATURES)
+
+        assert len(recommendations) == 1
+        assert recommendations[0]["mask_id"] == 1
+        assert 0.0 <= recommendations[0]["proba_fit"] <= 1.0
+
+
+@pytest.mark.skipif(_mock_s3() is None, reason="moto is not installed")
+def test_lambda_revalidates_latest_and_redownloads_only_changed_keys(monkeypatch):
+    with _mock_s3():
+        tmp_dir = Path("/tmp/mask_recommender_tests")
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        _configure_aws_env(tmp_dir)
+        monkeypatch.setenv("MODEL_REFRESH_SECONDS", "0")
+
+        bucket = "breathesafe-development"
+        session = boto3.Session(profile_name="breathesafe", region_name="us-east-1")
+        s3 = session.client("s3")
+        s3.create_bucket(Bucket=bucket)
+        latest_payload = _upload_custom_model(s3, bucket, tmp_dir, "20260101000000", MASK_DATA)
+
+        recommender = lambda_function.MaskRecommenderInference()
+        downloaded = []
+        original_download = recommender._download_file
+
+        def tracking_download(key, local_path):
+            downloaded.append(key)
+            original_download(key, local_path)
+
+        recommender._download_file = tracking_download
+
+        assert recommender.refresh_custom_model() is False
+        assert downloaded == []
+
+        updated_mask_data = {**MASK_DATA, "1": {**MASK_DATA["1"], "perimeter_mm": 310}}
+        new_mask_data_key = "mask_recommender/models/20260102000000/custom_mask_data.json"
+        s3.put_object(Bucket=bucket, Key=new_mask_data_key, Body=json.dumps(updated_mask_data).encode("utf-8"))
+        _put_latest(s3, bucket, {**latest_payload, "mask_data_key": new_mask_data_key})
+
+        recommendations = recommender.recommend_masks_custom(FACIAL_FEATURES)
+
+        assert downloaded == [new_mask_data_key]
+        assert recommender.custom_mask_data["1"]["perimeter_mm"] == 310
+        assert len(recommendations) == 1
+
+
+@pytest.mark.skipif(_mock_s3() is None, reason="moto is not installed")
+def test_lambda_keeps_previous_model_when_a_changed_artifact_fails_to_load(monkeypatch):
+    with _mock_s3():
+        tmp_dir = Path("/tmp/mask_recommender_tests")
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        _configure_aws_env(tmp_dir)
+        monkeypatch.setenv("MODEL_REFRESH_SECONDS", "0")
+
+        bucket = "breathesafe-development"
+        session = boto3.Session(profile_name="breathesafe", region_name="us-east-1")
+        s3 = session.client("s3")
+        s3.create_bucket(Bucket=bucket)
+        latest_payload = _upload_custom_model(s3, bucket, tmp_dir, "20260101000000", MASK_DATA)
+        recommender = lambda_function.MaskRecommenderInference()
+        expected = recommender.recommend_masks_custom(FACIAL_FEATURES)
+        params = recommender.custom_params
+
+        # New params load fine, but the metadata that goes with them is corrupt.
+        prefix = "mask_recommender/models/20260102000000"
+        s3.copy_object(
+            Bucket=bucket,
+            Key=f"{prefix}/custom_model_params.pt",
+            CopySource={"Bucket": bucket, "Key": latest_payload["params_key"]},
+        )
+        s3.put_object(Bucket=bucket, Key=f"{prefix}/custom_model_metadata.json", Body=b"{not json")
+        _put_latest(
+            s3,
+            bucket,
             {
-                "mask_specific_parameters": torch.tensor([[0.0, 0.0, 1.0]], dtype=torch.float32),
-                "style_specific_parameters": torch.tensor([[0.0, 0.0, 0.0]], dtype=torch.float32),
-                "strap_specific_parameters": torch.tensor([[0.0]], dtype=torch.float32),
-            }
+                **latest_payload,
+                "params_key": f"{prefix}/custom_model_params.pt",
+                "metadata_key": f"{prefix}/custom_model_metadata.json",
+            },
         )
-        model_path = tmp_dir / "custom_model_params.pt"
-        torch.save(params, model_path)
-
-        metadata = {
-            "timestamp": "20260101000000",
-            "model_type": "custom_lr",
-            "fit_family_categories": ["1"],
-            "style_categories": ["Cup"],
-            "strap_type_categories": ["Earloop"],
-        }
-        metadata_path = tmp_dir / "custom_model_metadata.json"
-        metadata_path.write_text(json.dumps(metadata))
-
-        mask_data["1"]["fit_family_id"] = 1
-        mask_data_path = tmp_dir / "custom_mask_data.json"
-        mask_data_path.write_text(json.dumps(mask_data))
-
-        prefix = "mask_recommender/models/20260101000000"
-        latest_payload = {
-            "timestamp": "20260101000000",
-            "params_key": f"{prefix}/custom_model_params.pt",
-            "metadata_key": f"{prefix}/custom_model_metadata.json",
-            "mask_data_key": f"{prefix}/custom_mask_data.json",
-        }
 
-        s3.upload_file(str(model_path), bucket, latest_payload["params_key"])
-        s3.upload_file(str(metadata_path), bucket, latest_payload["metadata_key"])
-        s3.upload_file(str(mask_data_path), bucket, latest_payload["mask_data_key"])
-        s3.put_object(
-            Bucket=bucket,
-            Key="mask_recommender/models/custom_latest.json",
-            Body=json.dumps(latest_payload).encode("utf-8"),
-            ContentType="application/json",
+        recommendations = recommender.recommend_masks_custom(FACIAL_FEATURES)
+
+        assert recommendations == expected
+        assert recommender.custom_params is params
+        assert recommender.custom_artifact_keys["params_key"] == latest_payload["params_key"]
+        with pytest.raises(json.JSONDecodeError):
+            recommender.refresh_custom_model()
+        assert recommender.custom_params is params
+
+
+@pytest.mark.skipif(_mock_s3() is None, reason="moto is not installed")
+def test_lambda_prefers_bundle_key_when_published(monkeypatch):
+    with _mock_s3():
+        tmp_dir = Path("/tmp/mask_recommender_tests")
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        _configure_aws_env(tmp_dir)
+
+        bucket = "breathesafe-development"
+        session = boto3.Session(profile_name="breathesafe", region_name="us-east-1")
+        s3 = session.client("s3")
+        s3.create_bucket(Bucket=bucket)
+        latest_payload = _upload_custom_model(s3, bucket, tmp_dir, "20260101000000", MASK_DATA)
+        legacy = lambda_function.MaskRecommenderInference()
+        expected = legacy.recommend_masks_custom(FACIAL_FEATURES)
+
+        bundle_path = tmp_dir / "custom_model.bundle"
+        write_custom_lr_bundle(
+            bundle_path,
+            legacy.custom_params,
+            legacy.custom_metadata,
+            legacy.custom_mask_data,
         )
+        bundle_key = "mask_recommender/models/20260101000000/custom_model.bundle"
+        s3.upload_file(str(bundle_path), bucket, bundle_key)
+        _put_latest(s3, bucket, {**latest_payload, "bundle_key": bundle_key})
+
+        downloaded = []
+        original_download = lambda_function.MaskRecommenderInference._download_file
 
+        def tracking_download(self, key, local_path):
+            downloaded.append(key)
+            original_download(self, key, local_path)
+
+        monkeypatch.setattr(lambda_function.MaskRecommenderInference, "_download_file", tracking_download)
         recommender = lambda_function.MaskRecommenderInference()
-        recommendations = recommender.recommend_masks_custom(facial_features)
+        recommendations = recommender.recommend_masks_custom(FACIAL_FEATURES)
 
-        assert len(recommendations) == 1
-        assert recommendations[0]["mask_id"] == 1
-        assert 0.0 <= recommendations[0]["proba_fit"] <= 1.0
+        assert downloaded == [bundle_key]
+        assert [(rec["mask_id"], rec["proba_fit"]) for rec in recommendations] == [
+            (rec["mask_id"], rec["proba_fit"]) for rec in expected
+        ]
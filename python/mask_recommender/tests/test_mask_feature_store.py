@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+from mask_recommender.feature_builder import MASK_SIDE_FEATURE_COLUMNS, apply_feature_plan
+from mask_recommender.mask_feature_store import MASK_FEATURE_STORE_COLUMNS, build_mask_feature_store
+from mask_recommender.train import attach_mask_empirical_priors_to_masks
+
+MASKS = pd.DataFrame(
+    [
+        {"id": 1, "unique_internal_model_code": "3M Aura 9205+ S", "current_state": None,
+         "perimeter_mm": 300, "strap_type": "Headstrap", "style": "Bifold"},
+        {"id": 2, "unique_internal_model_code": "Zimi Kids Earloop", "current_state": None,
+         "perimeter_mm": 260, "strap_type": "Earloop", "style": "Boat"},
+        {"id": 3, "unique_internal_model_code": "Trident Petite Extended Straps", "current_state": None,
+         "perimeter_mm": 280.5, "strap_type": "Adjustable Earloop", "style": "Cup"},
+    ]
+)
+
+
+def _rows():
+    faces = pd.DataFrame(
+        {
+            "nose_mm": [40, 38, 44, 41],
+            "chin_mm": [50, 47, 55, 52],
+            "top_cheek_mm": [60, 58, 63, 61],
+            "mid_cheek_mm": [55, 53, 59, 56],
+            "strap_mm": [120, 115, 130, 122],
+            "facial_hair_beard_length_mm": [0, 0, 3, 0],
+        }
+    )
+    rows = MASKS.iloc[[0, 1, 2, 0]].reset_index(drop=True).rename(columns={"id": "mask_id"})
+    rows = pd.concat([rows, faces], axis=1)
+    # Not in the store: computed from the row itself.
+    unknown = rows.iloc[[1]].assign(mask_id=99, unique_internal_model_code="Acme XS", strap_type="Headstrap")
+    return pd.concat([rows, unknown], ignore_index=True)
+
+
+def test_feature_plan_with_store_matches_per_row_features():
+    priors = {1: {"mask_fit_test_count": 4.0, "mask_zero_passes_min_10": 1.0}}
+    store = build_mask_feature_store(attach_mask_empirical_priors_to_masks(MASKS, priors))
+    rows = _rows()
+
+    expected = apply_feature_plan(rows)
+    actual = apply_feature_plan(rows, mask_features=store)
+
+    pd.testing.assert_frame_equal(actual, expected)
+    assert list(store.index) == [1, 2, 3]
+    assert list(store.columns) == MASK_FEATURE_STORE_COLUMNS
+    assert store.loc[1, "mask_fit_test_count"] == 4.0
+    assert store.loc[2, "mask_zero_passes_min_10_x_earloop"] == 0.0
+    assert store.loc[2, "mask_is_kids"] == 1.0
+    assert store.loc[3, "mask_is_petite"] == 1.0
+
+
+def test_mask_feature_store_parses_brand_models_and_keeps_missing_perimeters():
+    masks = MASKS.assign(brand_model=["", None, "Trident"], perimeter_mm=[300, None, 280.5])
+
+    store = build_mask_feature_store(masks)
+
+    assert np.isnan(store.loc[2, "perimeter_mm"])
+    assert store["brand_model"].tolist() == ["3M Aura", "Zimi Kids", "Trident"]
+    assert store[MASK_SIDE_FEATURE_COLUMNS].dtypes.eq(np.float64).all()
+
+
+def test_feature_plan_with_store_takes_mask_side_features_from_the_masks_table():
+    store = build_mask_feature_store(MASKS)
+    current = _rows().iloc[[0]]
+    # The fit test was recorded before mask 1 was edited from an earloop kids mask.
+    recorded = current.assign(strap_type="Earloop", unique_internal_model_code="3M Aura Kids")
+
+    from_rows = apply_feature_plan(recorded)
+    from_store = apply_feature_plan(recorded, mask_features=store)
+
+    assert from_rows["strap_is_earloop_like"].tolist() == [1.0]
+    assert from_store["strap_is_earloop_like"].tolist() == [0.0]
+    assert from_store["strap_is_headstrap_like"].tolist() == [1.0]
+    pd.testing.assert_frame_equal(
+        from_store.drop(columns=["unique_internal_model_code", "strap_type"]),
+        apply_feature_plan(current).drop(columns=["unique_internal_model_code", "strap_type"]),
+    )
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from mask_recommender.ranking_metrics import (calibration_bins, probability_quality_metrics,
+                                              top_k_any_fit_probability_metrics, top_k_hit_rates,
+                                              user_equal_weights)
+
+
+def _random_evaluation_rows(seed):
+    rng = np.random.default_rng(seed)
+    rows = 300
+    user_ids = rng.integers(0, 40, rows).astype(float)
+    user_ids[rng.random(rows) < 0.05] = np.nan
+    # Two decimals, so many users have tied probabilities.
+    probabilities = np.round(rng.random(rows), 2)
+    labels = (rng.random(rows) < 0.3).astype(float)
+    return user_ids, labels, probabilities
+
+
+def _ranked_users(user_ids, labels, probabilities):
+    working = pd.DataFrame({'user_id': user_ids, 'target_label': labels, 'predicted_probability': probabilities})
+    for _user_id, user_rows in working.groupby('user_id', sort=False):
+        yield user_rows.sort_values('predicted_probability', ascending=False, kind='stable')
+
+
+def test_top_k_hit_rates_match_per_user_sorting():
+    user_ids, labels, probabilities = _random_evaluation_rows(0)
+    hits = {k: [] for k in (1, 3, 5)}
+    for user_rows in _ranked_users(user_ids, labels, probabilities):
+        if (user_rows['target_label'] == 1).any():
+            for k in hits:
+                hits[k].append(float((user_rows.head(k)['target_label'] == 1).any()))
+
+    result = top_k_hit_rates(user_ids, labels, probabilities)
+
+    assert result['eligible_users'] == len(hits[1])
+    assert result['top_k_hit_rate'] == {str(k): float(np.mean(values)) for k, values in hits.items()}
+
+
+def test_top_k_any_fit_probability_metrics_match_per_user_sorting():
+    user_ids, labels, probabilities = _random_evaluation_rows(1)
+    observed, independence, maximum = [], [], []
+    for user_rows in _ranked_users(user_ids, labels, probabilities):
+        if user_rows.shape[0] < 3:
+            continue
+        top = user_rows.head(3)
+        top_probabilities = np.clip(top['predicted_probability'].to_numpy(), 1e-6, 1.0 - 1e-6)
+        observed.append(float((top['target_label'] == 1).any()))
+        independence.append(float(1.0 - np.prod(1.0 - top_probabilities)))
+        maximum.append(float(np.max(top_probabilities)))
+
+    result = top_k_any_fit_probability_metrics(user_ids, labels, probabilities, k=3)
+
+    assert result['eligible_users'] == len(observed)
+    assert result['independence'] == probability_quality_metrics(observed, independence)
+    assert result['max_baseline'] == probability_quality_metrics(observed, maximum)
+    assert result['max_baseline_calibration_bins'] == calibration_bins(observed, maximum)
+
+
+def test_user_equal_weights_give_each_user_unit_weight():
+    weights = user_equal_weights([3, 3, 1, None, 3, None])
+
+    np.testing.assert_array_equal(weights, [1 / 3, 1 / 3, 1.0, 0.5, 1 / 3, 0.5])
@@ -0,0 +1,247 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+from mask_recommender import train as train_module
+from mask_recommender.scoring import (DEFAULT_BATCH_CHUNK_SIZE, CompiledCustomModel, InvalidRankingOptions,
+                                      batch_chunk_size, calc_preds, compiled_model_for, facial_perimeter_cm,
+                                      ranking_maps, ranking_options, select_top)
+
+
+def _artifacts():
+    torch.manual_seed(0)
+    metadata = {
+        "fit_family_categories": ["101", "102", "7"],
+        "style_categories": ["Bifold", "Cup"],
+        "strap_type_categories": ["Earloop", "Headstrap"],
+    }
+    params = {
+        "alpha_mask_raw": torch.randn((3, 1)) - 4.0,
+        "beta_gamma_mask": torch.randn((3, 2)),
+        "alpha_style_raw": torch.randn((2, 1)) - 4.0,
+        "beta_gamma_style": torch.randn((2, 2)),
+        "strap_specific_parameters": torch.randn((2, 1)),
+    }
+    mask_data = {
+        "1": {"fit_family_id": 101, "perimeter_mm": 300, "strap_type": "Earloop", "style": "Cup"},
+        "2": {"fit_family_id": "102", "perimeter_mm": 320.5, "strap_type": "Headstrap", "style": "Bifold"},
+        "7": {"fit_family_id": None, "perimeter_mm": None, "strap_type": "Headstrap", "style": "Cup"},
+        "9": {"fit_family_id": 999, "perimeter_mm": 280, "strap_type": "Strapless", "style": "Boat"},
+    }
+    return params, metadata, mask_data
+
+
+def _reference_probabilities(params, metadata, mask_data, facial_features):
+    rows = []
+    for mask_id, mask_info in mask_data.items():
+        row = {
+            "mask_id": int(mask_id),
+            "fit_family_id": mask_info.get("fit_family_id"),
+            "perimeter_mm": mask_info.get("perimeter_mm") or 0,
+            "strap_type": mask_info.get("strap_type") or "",
+            "style": mask_info.get("style") or "",
+            "unique_internal_model_code": "",
+        }
+        for col in train_module.FACIAL_MEASUREMENTS:
+            row[col] = facial_features.get(col, 0) or 0
+        rows.append(row)
+    data = train_module.prep_data_in_torch_with_categories(
+        pd.DataFrame(rows),
+        mask_categories=metadata["fit_family_categories"],
+        style_categories=metadata["style_categories"],
+        strap_categories=metadata["strap_type_categories"],
+    )
+    with torch.no_grad():
+        return train_module.calc_preds(data, params).squeeze(1).numpy()
+
+
+def test_compiled_model_matches_calc_preds():
+    params, metadata, mask_data = _artifacts()
+    facial_features = {"nose_mm": 40.5, "chin_mm": 50, "top_cheek_mm": 60, "mid_cheek_mm": 55.25}
+
+    compiled = CompiledCustomModel.from_artifacts(params, metadata, mask_data)
+    probs = compiled.predict_proba(facial_perimeter_cm(facial_features))
+
+    expected = _reference_probabilities(params, metadata, mask_data, facial_features)
+    assert probs.dtype == np.float32
+    np.testing.assert_allclose(probs, expected, rtol=1e-6, atol=1e-7)
+
+
+def test_compiled_model_recommend_sorts_descending_and_keeps_mask_info():
+    params, metadata, mask_data = _artifacts()
+    compiled = CompiledCustomModel.from_artifacts(params, metadata, mask_data)
+
+    recommendations = compiled.recommend({"nose_mm": 40, "chin_mm": 50, "top_cheek_mm": 60, "mid_cheek_mm": 55})
+
+    probabilities = [rec["proba_fit"] for rec in recommendations]
+    assert probabilities == sorted(probabilities, reverse=True)
+    assert {rec["mask_id"] for rec in recommendations} == {1, 2, 7, 9}
+    assert all(rec["mask_info"] is mask_data[str(rec["mask_id"])] for rec in recommendations)
+
+
+def test_compiled_model_for_recompiles_only_when_artifacts_change():
+    params, metadata, mask_data = _artifacts()
+    cache = {}
+
+    first = compiled_model_for(cache, params, metadata, mask_data)
+    again = compiled_model_for(cache, params, metadata, mask_data)
+    changed = compiled_model_for(cache, params, metadata, {**mask_data})
+
+    assert first is again
+    assert changed is not first
+
+
+def test_recommend_batch_matches_single_face_rankings_across_chunks():
+    params, metadata, mask_data = _artifacts()
+    compiled = CompiledCustomModel.from_artifacts(params, metadata, mask_data)
+    faces = [
+        {"nose_mm": 40 + offset, "chin_mm": 50, "top_cheek_mm": 60 - offset, "mid_cheek_mm": 55 + 2 * offset}
+        for offset in range(5)
+    ]
+
+    batch = compiled.recommend_batch(faces, chunk_size=2)
+
+    assert len(batch) == len(faces)
+    for facial_features, ranking in zip(faces, batch):
+        assert ranking == compiled.recommend(facial_features)
+
+
+def test_select_top_matches_stable_full_sort_with_ties():
+    rng = np.random.default_rng(3)
+    probs = rng.choice(np.array([0.1, 0.4, 0.4, 0.7, 0.9], dtype=np.float32), size=200)
+    full_order = np.argsort(-probs, kind="stable")
+
+    for top_k in (0, 1, 5, 37, 200, 500):
+        np.testing.assert_array_equal(select_top(probs, top_k=top_k), full_order[:top_k])
+
+    filtered = select_top(probs, min_proba=0.4, keep=np.arange(200) % 2 == 0)
+    expected = [idx for idx in full_order if probs[idx] >= 0.4 and idx % 2 == 0]
+    np.testing.assert_array_equal(filtered, expected)
+
+
+def test_recommend_applies_filters_top_k_and_field_projection():
+    params, metadata, mask_data = _artifacts()
+    compiled = CompiledCustomModel.from_artifacts(params, metadata, mask_data)
+    face = {"nose_mm": 40, "chin_mm": 50, "top_cheek_mm": 60, "mid_cheek_mm": 55}
+    options = ranking_options({"top_k": "1", "strap_types": "Headstrap"})
+
+    recommendations = compiled.recommend(face, **options)
+    headstrap = [rec for rec in compiled.recommend(face) if rec["mask_info"]["strap_type"] == "Headstrap"]
+
+    assert options == {"top_k": 1, "strap_types": ["Headstrap"]}
+    assert recommendations == headstrap[:1]
+    assert ranking_maps(recommendations, ["mask_id", "style"]) == {
+        "mask_id": {"0": headstrap[0]["mask_id"]},
+        "style": {"0": headstrap[0]["mask_info"]["style"]},
+    }
+
+
+@pytest.mark.parametrize("payload", [{"top_k": "ten"}, {"top_k": -1}, {"min_proba": "high"}, {"top_k": [3]}])
+def test_ranking_options_rejects_malformed_values(payload):
+    with pytest.raises(InvalidRankingOptions, match=next(iter(payload))):
+        ranking_options(payload)
+
+
+def test_batch_chunk_size_defaults_and_rejects_non_positive_values():
+    assert batch_chunk_size({}) == DEFAULT_BATCH_CHUNK_SIZE
+    assert batch_chunk_size({"chunk_size": "8"}) == 8
+    for chunk_size in (0, "x"):
+        with pytest.raises(InvalidRankingOptions, match="chunk_size"):
+            batch_chunk_size({"chunk_size": chunk_size})
+
+
+def test_calc_preds_numpy_backend_matches_torch_backend():
+    cleaned = pd.DataFrame(
+        {
+            "mask_id": [1, 2, 7, 9],
+            "fit_family_id": [101, 102, None, 999],
+            "perimeter_mm": [300, 320, 0, 280],
+            "strap_type": ["Earloop", "Headstrap", "Headstrap", "Strapless"],
+            "style": ["Cup", "Bifold", "Cup", "Boat"],
+            "nose_mm": [40, 42, 38, 45],
+            "top_cheek_mm": [60, 62, 58, 61],
+            "mid_cheek_mm": [55, 58, 50, 57],
+            "chin_mm": [50, 52, 48, 51],
+        }
+    )
+    params, metadata, _ = _artifacts()
+    data = train_module.prep_data_in_torch_with_categories(
+        cleaned,
+        mask_categories=metadata["fit_family_categories"],
+        style_categories=metadata["style_categories"],
+        strap_categories=metadata["strap_type_categories"],
+    )
+
+    with torch.no_grad():
+        expected = calc_preds(data, params).numpy()
+    actual = calc_preds({key: value.numpy() for key, value in data.items()}, params)
+
+    assert isinstance(actual, np.ndarray)
+    assert actual.shape == (4, 1)
+    np.testing.assert_allclose(actual, expected, rtol=1e-6, atol=1e-7)
+
+
+def test_calc_preds_index_layout_matches_one_hot_layout():
+    cleaned = pd.DataFrame(
+        {
+            "mask_id": [1, 2, 7, 9, 1],
+            "fit_family_id": [101, 102, None, 999, 101],
+            "perimeter_mm": [300, 320, 0, 280, 310],
+            "strap_type": ["Earloop", "Headstrap", "Headstrap", "Strapless", "Earloop"],
+            "style": ["Cup", "Bifold", "Cup", "Boat", "Bifold"],
+            "nose_mm": [40, 42, 38, 45, 41],
+            "top_cheek_mm": [60, 62, 58, 61, 59],
+            "mid_cheek_mm": [55, 58, 50, 57, 54],
+            "chin_mm": [50, 52, 48, 51, 49],
+        }
+    )
+    params, metadata, _ = _artifacts()
+    categories = {
+        "mask_categories": metadata["fit_family_categories"],
+        "style_categories": metadata["style_categories"],
+        "strap_categories": metadata["strap_type_categories"],
+    }
+    one_hot = train_module.prep_data_in_torch_with_categories(cleaned, **categories)
+    index = train_module.prep_data_in_torch_with_categories(cleaned, layout="index", **categories)
+
+    assert index["mask_codes"].dtype == torch.int64
+    # 999 / Strapless / Boat are unknown to the model.
+    assert index["mask_codes"].tolist()[3] == -1
+    assert index["strap_type_codes"].tolist() == [0, 1, 1, -1, 0]
+    assert "fit_tests_by_masks" not in index
+    with torch.no_grad():
+        expected = calc_preds(one_hot, params).numpy()
+        actual = calc_preds(index, params).numpy()
+        stacked = {key: torch.stack([value, value + 0.5]) for key, value in params.items()}
+        stacked_actual = calc_preds(index, stacked).numpy()
+        shifted = calc_preds(one_hot, {key: value + 0.5 for key, value in params.items()}).numpy()
+    numpy_expected = calc_preds({key: value.numpy() for key, value in one_hot.items()}, params)
+    numpy_actual = calc_preds({key: value.numpy() for key, value in index.items()}, params)
+
+    assert actual.tobytes() == expected.tobytes()
+    assert numpy_actual.tobytes() == numpy_expected.tobytes()
+    assert stacked_actual.shape == (2, 5, 1)
+    assert stacked_actual[0].tobytes() == expected.tobytes()
+    assert stacked_actual[1].tobytes() == shifted.tobytes()
+
+
+def test_inference_lambda_import_does_not_load_training_stack():
+    package_dir = Path(__file__).resolve().parents[1]
+    script = (
+        "import sys; import inference.lambda_function; "
+        "print(sorted(name for name in ('torch', 'matplotlib', 'sklearn', 'train') if name in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=package_dir,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert result.stdout.strip() == "[]"
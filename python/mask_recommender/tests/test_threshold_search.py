@@ -0,0 +1,47 @@
+import numpy as np
+from sklearn.metrics import f1_score, precision_score, recall_score
+
+from mask_recommender.threshold_search import DEFAULT_THRESHOLD_GRID, best_f1_threshold, f1_threshold_curve
+
+
+def _rows(seed, size=200):
+    rng = np.random.default_rng(seed)
+    # Two decimals, so several thresholds land exactly on probabilities.
+    return (rng.random(size) < 0.4).astype(float), np.round(rng.random(size), 2), rng.random(size)
+
+
+def test_f1_threshold_curve_matches_sklearn_at_every_threshold():
+    labels, probabilities, weights = _rows(0)
+
+    curve = f1_threshold_curve(labels, probabilities)
+    weighted = f1_threshold_curve(labels, probabilities, sample_weight=weights)
+
+    for index, threshold in enumerate(DEFAULT_THRESHOLD_GRID):
+        predictions = (probabilities >= threshold).astype(float)
+        assert curve['f1'][index] == f1_score(labels, predictions, zero_division=0)
+        assert curve['precision'][index] == precision_score(labels, predictions, zero_division=0)
+        assert curve['recall'][index] == recall_score(labels, predictions, zero_division=0)
+        assert np.isclose(weighted['f1'][index], f1_score(labels, predictions, sample_weight=weights, zero_division=0))
+
+
+def test_best_f1_threshold_keeps_the_first_strictly_better_threshold():
+    labels, probabilities, _ = _rows(1)
+    best_threshold, best_f1 = 0.5, -1.0
+    for candidate in DEFAULT_THRESHOLD_GRID:
+        candidate_f1 = f1_score(labels, (probabilities >= candidate).astype(float), zero_division=0)
+        if candidate_f1 > best_f1:
+            best_f1, best_threshold = candidate_f1, float(candidate)
+
+    assert best_f1_threshold(labels, probabilities, initial_f1=-1.0) == (best_threshold, best_f1)
+    # Nothing beats an F1 of 0 when there are no positives, so the default stands.
+    assert best_f1_threshold(np.zeros(4), np.array([0.2, 0.4, 0.6, 0.8])) == (0.5, 0.0)
+    assert best_f1_threshold([], []) == (0.5, 0.0)
+
+
+def test_exact_breakpoints_never_miss_the_grid_optimum():
+    labels, probabilities, _ = _rows(2)
+
+    exact = f1_threshold_curve(labels, probabilities, thresholds=None)
+
+    assert np.array_equal(exact['thresholds'], np.unique(probabilities))
+    assert exact['f1'].max() >= f1_threshold_curve(labels, probabilities)['f1'].max()
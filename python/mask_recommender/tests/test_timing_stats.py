@@ -0,0 +1,20 @@
+import threading
+
+from mask_recommender.timing_stats import TimingStats
+
+
+def test_timing_stats_keeps_totals_for_every_call_but_only_recent_entries():
+    stats = TimingStats({"calls": 0, "seconds": 0.0}, recent=3)
+
+    def record_calls():
+        for call in range(250):
+            stats.record({"call": call}, calls=1, seconds=0.5)
+
+    threads = [threading.Thread(target=record_calls) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert stats.summary() == {"calls": 1000, "seconds": 500.0}
+    assert len(stats.entries()) == 3
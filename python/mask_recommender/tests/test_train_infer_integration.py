@@ -1,5 +1,8 @@
+import io
 import os
 import json
+import logging
+import threading
 from pathlib import Path
 
 import boto3
@@ -8,7 +11,9 @@ import pandas as pd
 import pytest
 import torch
 
+from mask_recommender.benchmarks.synthetic import synthetic_fit_tests, synthetic_masks
 from mask_recommender import train as train_module
+from mask_recommender.diagnostics import publish_diagnostics
 from mask_recommender.feature_builder import build_feature_frame
 from mask_recommender.inference import lambda_function
 from mask_recommender.qa import build_mask_candidates, build_inference_rows
@@ -207,9 +212,20 @@ def test_training_lambda_builds_custom_lr_argv():
             "epochs": 100,
             "model_type": "prob",
             "retrain_with_full": True,
+            "cv_workers": 1,
+            "batched_cv": True,
+            "optimizer": "lbfgs",
+            "early_stopping_patience": 20,
+            "warm_start": True,
+            "warm_start_skip_cv": True,
+            "no_diagnostics": True,
         }
     )
 
+    assert argv[-10:] == [
+        "--cv-workers", "1", "--batched-cv", "--optimizer", "lbfgs", "--early-stopping-patience", "20", "--warm-start",
+        "--warm-start-skip-cv", "--no-diagnostics",
+    ]
     assert "--epochs" in argv
     assert "--model-type" in argv
     assert "custom_lr" in argv
@@ -304,6 +320,54 @@ def test_local_infer_exposes_empirical_debug_payload():
 
 
 
+def test_local_infer_custom_batch_returns_rankings_per_face():
+    artifacts = {
+        "params": {
+            "mask_specific_parameters": torch.tensor([[0.0, 0.0, 0.5], [0.0, 0.0, -0.5]], dtype=torch.float32),
+            "style_specific_parameters": torch.tensor([[0.0, 0.0, 0.0]], dtype=torch.float32),
+            "strap_specific_parameters": torch.tensor([[0.0]], dtype=torch.float32),
+        },
+        "metadata": {
+            "timestamp": "2026-03-10",
+            "fit_family_categories": ["1", "2"],
+            "style_categories": ["Cup"],
+            "strap_type_categories": ["Headstrap"],
+        },
+        "mask_data": {
+            "1": {"id": 1, "fit_family_id": 1, "perimeter_mm": 300, "strap_type": "Headstrap", "style": "Cup"},
+            "2": {"id": 2, "fit_family_id": 2, "perimeter_mm": 320, "strap_type": "Headstrap", "style": "Cup"},
+        },
+    }
+    face = {"nose_mm": 40, "chin_mm": 50, "top_cheek_mm": 60, "mid_cheek_mm": 55, "strap_mm": 120}
+
+    result = local_recommender_server._infer_custom_batch(
+        {"facial_measurements_batch": [face, face, face], "chunk_size": 2},
+        artifacts,
+    )
+    single = local_recommender_server._infer_custom({"facial_measurements": face}, artifacts)
+
+    assert len(result["results"]) == 3
+    for ranking in result["results"]:
+        assert ranking["mask_id"] == single["mask_id"] == {"0": 1, "1": 2}
+        assert ranking["proba_fit"] == single["proba_fit"]
+
+
+def test_local_recommender_server_returns_400_for_malformed_ranking_options(monkeypatch):
+    monkeypatch.setattr(local_recommender_server, "_ensure_custom_artifacts", lambda force_reload=False: {})
+    client = local_recommender_server.APP.test_client()
+
+    single = client.post("/mask_recommender", json={"facial_measurements": {"nose_mm": 40}, "top_k": "ten"})
+    batch = client.post(
+        "/mask_recommender",
+        json={"facial_measurements_batch": [{"nose_mm": 40}], "chunk_size": -2},
+    )
+
+    assert single.status_code == 400
+    assert "top_k" in single.get_json()["error"]
+    assert batch.status_code == 400
+    assert "chunk_size" in batch.get_json()["error"]
+
+
 def test_prep_data_in_torch_with_categories_uses_float32_and_stable_shapes():
     cleaned = train_module.prepare_training_data(_fit_tests_df())
     category_metadata = train_module._custom_lr_category_metadata(cleaned)
@@ -492,6 +556,298 @@ def test_group_train_val_indices_by_user_is_seeded_and_repeatable():
     )
 
 
+def _custom_lr_training_jobs(cleaned):
+    fold_indices = train_module._group_k_fold_indices_by_user(cleaned, num_folds=2)
+    jobs = train_module._cross_validation_jobs(fold_indices, random_seed=42)
+    full_idx = torch.arange(cleaned.shape[0])
+    return jobs + [train_module.CustomLrTrainingJob("full_dataset", full_idx, full_idx, 10_042)]
+
+
+def test_custom_lr_training_jobs_in_process_pool_match_serial_results():
+    cleaned = train_module.prepare_training_data(_fit_tests_df())
+    category_metadata = train_module._custom_lr_category_metadata(cleaned)
+    jobs = _custom_lr_training_jobs(cleaned)
+    options = {"epochs": 3, "learning_rate": 0.01, "class_weighting": False}
+
+    serial = train_module.run_custom_lr_training_jobs(jobs, cleaned, category_metadata, workers=1, **options)
+    pooled = train_module.run_custom_lr_training_jobs(jobs, cleaned, category_metadata, workers=2, **options)
+
+    assert list(pooled) == ["fold_1", "fold_2", "full_dataset"]
+    for name, result in serial.items():
+        assert result["train_losses"] == pooled[name]["train_losses"]
+        assert result["val_losses"] == pooled[name]["val_losses"]
+        assert result["val_probs"].tobytes() == pooled[name]["val_probs"].tobytes()
+        for key, value in result["params"].items():
+            assert value.numpy().tobytes() == pooled[name]["params"][key].numpy().tobytes()
+
+
+def test_batched_custom_lr_training_matches_per_job_results():
+    cleaned = train_module.prepare_training_data(_fit_tests_df())
+    category_metadata = train_module._custom_lr_category_metadata(cleaned)
+    jobs = _custom_lr_training_jobs(cleaned)
+    options = {"epochs": 5, "learning_rate": 0.01, "class_weighting": True}
+
+    serial = train_module.run_custom_lr_training_jobs(jobs, cleaned, category_metadata, workers=1, **options)
+    batched = train_module.run_custom_lr_training_jobs(jobs, cleaned, category_metadata, batched=True, **options)
+
+    assert list(batched) == ["fold_1", "fold_2", "full_dataset"]
+    for name, result in serial.items():
+        np.testing.assert_allclose(batched[name]["train_losses"], result["train_losses"], rtol=1e-5, atol=1e-6)
+        np.testing.assert_allclose(batched[name]["val_losses"], result["val_losses"], rtol=1e-5, atol=1e-6)
+        np.testing.assert_allclose(batched[name]["train_probs"], result["train_probs"], atol=1e-6)
+        np.testing.assert_allclose(batched[name]["val_probs"], result["val_probs"], atol=1e-6)
+        np.testing.assert_array_equal(batched[name]["y_val"], result["y_val"])
+        for key, value in result["params"].items():
+            np.testing.assert_allclose(batched[name]["params"][key].numpy(), value.numpy(), atol=1e-6)
+
+
+def test_custom_lr_stop_reason_applies_patience_and_tolerance():
+    stop_reason = train_module._custom_lr_stop_reason
+
+    assert stop_reason([1.0, 0.9, 0.8], [0.5, 0.4, 0.45]) is None
+    assert stop_reason([1.0, 0.9, 0.8], [0.5, 0.4, 0.45], early_stopping_patience=2) is None
+    assert stop_reason([1.0, 0.9, 0.8, 0.7], [0.5, 0.4, 0.45, 0.4], early_stopping_patience=2) == "early_stopping"
+    assert stop_reason([1.0, 0.9995], [0.5, 0.4], convergence_tolerance=1e-3) == "converged"
+    assert stop_reason([1.0, 0.99], [0.5, 0.4], convergence_tolerance=1e-3) is None
+
+
+def test_custom_lr_training_stops_early_and_batched_training_stops_at_the_same_epoch():
+    cleaned = train_module.prepare_training_data(_fit_tests_df())
+    category_metadata = train_module._custom_lr_category_metadata(cleaned)
+    fold_indices = train_module._group_k_fold_indices_by_user(cleaned, num_folds=2)
+    jobs = train_module._cross_validation_jobs(fold_indices, random_seed=42, early_stopping_patience=2)
+    full_idx = torch.arange(cleaned.shape[0])
+    jobs.append(train_module.CustomLrTrainingJob("full_dataset", full_idx, full_idx, 10_042, convergence_tolerance=0.05))
+    options = {"epochs": 200, "learning_rate": 0.5, "class_weighting": False}
+
+    serial = train_module.run_custom_lr_training_jobs(jobs, cleaned, category_metadata, workers=1, **options)
+    batched = train_module.run_custom_lr_training_jobs(jobs, cleaned, category_metadata, batched=True, **options)
+
+    for name, result in serial.items():
+        assert result["epochs_used"] < options["epochs"]
+        assert len(result["train_losses"]) == len(result["val_losses"]) == result["epochs_used"]
+        assert batched[name]["epochs_used"] == result["epochs_used"]
+        assert len(batched[name]["train_losses"]) == len(batched[name]["val_losses"]) == result["epochs_used"]
+        np.testing.assert_allclose(batched[name]["val_losses"], result["val_losses"], rtol=1e-5, atol=1e-6)
+        assert batched[name]["stop_reason"] == result["stop_reason"]
+        np.testing.assert_allclose(batched[name]["val_probs"], result["val_probs"], atol=1e-5)
+    assert serial["fold_1"]["stop_reason"] == "early_stopping"
+    assert serial["full_dataset"]["stop_reason"] == "converged"
+
+
+def test_batched_custom_lr_training_drops_stopped_jobs_from_the_stack(monkeypatch):
+    masks = synthetic_masks(scale=0.05, seed=0)
+    cleaned = train_module.prepare_training_data(synthetic_fit_tests(masks, scale=0.05, seed=0)).reset_index(drop=True)
+    category_metadata = train_module._custom_lr_category_metadata(cleaned)
+    fold_indices = train_module._group_k_fold_indices_by_user(cleaned, num_folds=2)
+    short, long = train_module._cross_validation_jobs(fold_indices, random_seed=42)
+    short.epochs = 3
+    options = {"epochs": 12, "learning_rate": 0.05, "class_weighting": False}
+    alone = train_module.train_custom_lr_jobs_batched([short], cleaned, category_metadata, **options)["fold_1"]
+
+    stack_sizes = []
+    stopped_params = {}
+    original_calc_preds = train_module.calc_preds
+
+    def tracking_calc_preds(data, params):
+        stack_sizes.append(next(iter(params.values())).shape[0])
+        if len(stack_sizes) == 4:
+            stopped_params.update({key: value.detach().clone() for key, value in params.items()})
+        return original_calc_preds(data, params)
+
+    monkeypatch.setattr(train_module, "calc_preds", tracking_calc_preds)
+    results = train_module.train_custom_lr_jobs_batched([short, long], cleaned, category_metadata, **options)
+
+    # fold_1 stops when epoch 4 scores its third epoch; every later pass scores fold_2 only.
+    assert stack_sizes[:4] == [2, 2, 2, 2]
+    assert stack_sizes[4:] == [1] * (len(stack_sizes) - 4)
+    assert results["fold_1"]["epochs_used"] == 3
+    assert results["fold_2"]["epochs_used"] == 12
+    for key, value in alone["params"].items():
+        np.testing.assert_allclose(results["fold_1"]["params"][key].numpy(), value.numpy(), atol=1e-6)
+        np.testing.assert_array_equal(results["fold_1"]["params"][key].numpy(), stopped_params[key][0].numpy())
+    assert any(
+        not np.array_equal(value.numpy(), stopped_params[key][1].numpy())
+        for key, value in results["fold_2"]["params"].items()
+    )
+
+
+def test_custom_lr_lbfgs_optimizer_trains_per_job_but_not_batched():
+    masks = synthetic_masks(scale=0.05, seed=0)
+    cleaned = train_module.prepare_training_data(synthetic_fit_tests(masks, scale=0.05, seed=0)).reset_index(drop=True)
+    category_metadata = train_module._custom_lr_category_metadata(cleaned)
+    jobs = _custom_lr_training_jobs(cleaned)
+    options = {"epochs": 3, "learning_rate": 0.01, "class_weighting": False, "optimizer_name": "lbfgs"}
+
+    results = train_module.run_custom_lr_training_jobs(jobs, cleaned, category_metadata, workers=1, **options)
+
+    full = results["full_dataset"]
+    assert full["epochs_used"] == 3
+    assert full["train_losses"][-1] < full["train_losses"][0]
+    with pytest.raises(ValueError, match="adam optimizer only"):
+        train_module.run_custom_lr_training_jobs(jobs, cleaned, category_metadata, batched=True, **options)
+
+
+def test_warm_start_maps_previous_parameters_onto_new_categories():
+    previous_metadata = {
+        "fit_family_categories": ["101", "102"],
+        "style_categories": ["Bifold", "Cup"],
+        "strap_type_categories": ["Earloop"],
+    }
+    previous_params = {
+        "alpha_mask_raw": torch.tensor([[-1.0], [-2.0]]),
+        "beta_gamma_mask": torch.tensor([[1.0, 2.0], [3.0, 4.0]]),
+        "alpha_style_raw": torch.tensor([[-3.0], [-4.0]]),
+        "beta_gamma_style": torch.tensor([[5.0, 6.0], [7.0, 8.0]]),
+        "strap_specific_parameters": torch.tensor([[9.0]]),
+    }
+    category_metadata = {
+        "fit_family_categories": ["102", "103"],
+        "style_categories": ["Boat", "Cup"],
+        "strap_type_categories": ["Earloop", "Headstrap"],
+    }
+
+    torch.manual_seed(7)
+    params, reused = train_module._warm_start_custom_lr_parameters(previous_params, previous_metadata, category_metadata)
+    torch.manual_seed(7)
+    defaults = train_module._initialize_custom_lr_parameters(category_metadata)
+
+    assert params["alpha_mask_raw"].tolist() == [[-2.0], [-5.0]]
+    assert params["beta_gamma_mask"][0].tolist() == [3.0, 4.0]
+    assert torch.equal(params["beta_gamma_mask"][1], defaults["beta_gamma_mask"][1])
+    assert params["alpha_style_raw"].tolist() == [[0.0], [-4.0]]
+    assert params["beta_gamma_style"][1].tolist() == [7.0, 8.0]
+    assert params["strap_specific_parameters"][0].tolist() == [9.0]
+    assert torch.equal(params["strap_specific_parameters"][1], defaults["strap_specific_parameters"][1])
+    assert reused["fit_family_categories"] == {"reused": 1, "total": 2}
+    assert reused["strap_type_categories"] == {"reused": 1, "total": 2}
+    with pytest.raises(ValueError, match="raw parameter tables"):
+        train_module._warm_start_custom_lr_parameters(
+            {"mask_specific_parameters": torch.zeros((2, 3))},
+            previous_metadata,
+            category_metadata,
+        )
+
+
+def test_load_previous_custom_lr_model_follows_custom_latest(monkeypatch):
+    mock_aws = pytest.importorskip("moto").mock_aws
+    monkeypatch.delenv("AWS_PROFILE", raising=False)
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("RAILS_ENV", "development")
+    monkeypatch.setenv("S3_BUCKET_REGION", "us-east-1")
+
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="breathesafe-development")
+        assert train_module._load_previous_custom_lr_model() is None
+
+        params = {"strap_specific_parameters": torch.tensor([[0.25]])}
+        buffer = io.BytesIO()
+        torch.save(params, buffer)
+        prefix = "mask_recommender/models/20260101000000"
+        s3.put_object(Bucket="breathesafe-development", Key=f"{prefix}/custom_model_params.pt", Body=buffer.getvalue())
+        s3.put_object(
+            Bucket="breathesafe-development",
+            Key=f"{prefix}/custom_model_metadata.json",
+            Body=json.dumps({"style_categories": ["Cup"]}).encode("utf-8"),
+        )
+        s3.put_object(
+            Bucket="breathesafe-development",
+            Key=train_module.CUSTOM_LATEST_KEY,
+            Body=json.dumps(
+                {
+                    "timestamp": "20260101000000",
+                    "params_key": f"{prefix}/custom_model_params.pt",
+                    "metadata_key": f"{prefix}/custom_model_metadata.json",
+                }
+            ).encode("utf-8"),
+        )
+
+        loaded_params, loaded_metadata, latest = train_module._load_previous_custom_lr_model()
+
+    assert loaded_params["strap_specific_parameters"].tolist() == [[0.25]]
+    assert loaded_metadata == {"style_categories": ["Cup"]}
+    assert latest["timestamp"] == "20260101000000"
+
+
+def test_warm_started_job_uses_initial_params_and_its_own_epoch_budget():
+    cleaned = train_module.prepare_training_data(_fit_tests_df())
+    category_metadata = train_module._custom_lr_category_metadata(cleaned)
+    full_idx = torch.arange(cleaned.shape[0])
+    torch.manual_seed(3)
+    initial_params = {
+        key: value.detach() + 0.1
+        for key, value in train_module._initialize_custom_lr_parameters(category_metadata).items()
+    }
+    jobs = [
+        train_module.CustomLrTrainingJob("cold", full_idx, full_idx, 3),
+        train_module.CustomLrTrainingJob("warm", full_idx, full_idx, 3, initial_params=initial_params, epochs=2),
+    ]
+    options = {"epochs": 4, "learning_rate": 0.01, "class_weighting": False}
+
+    serial = train_module.run_custom_lr_training_jobs(jobs, cleaned, category_metadata, workers=1, **options)
+    batched = train_module.run_custom_lr_training_jobs(jobs, cleaned, category_metadata, batched=True, **options)
+
+    assert serial["cold"]["epochs_used"] == batched["cold"]["epochs_used"] == 4
+    assert serial["warm"]["epochs_used"] == batched["warm"]["epochs_used"] == 2
+    assert not torch.equal(serial["warm"]["params"]["beta_gamma_mask"], serial["cold"]["params"]["beta_gamma_mask"])
+    for key, value in serial["warm"]["params"].items():
+        np.testing.assert_allclose(batched["warm"]["params"][key].numpy(), value.numpy(), atol=1e-6)
+
+
+def test_warm_start_record_notes_that_evaluation_trained_cold(caplog):
+    cleaned = train_module.prepare_training_data(_fit_tests_df())
+    category_metadata = train_module._custom_lr_category_metadata(cleaned)
+    full_idx = torch.arange(cleaned.shape[0])
+    previous_params = train_module._initialize_custom_lr_parameters(category_metadata)
+    previous_model = (previous_params, category_metadata, {"timestamp": "20260101000000", "params_key": "p.pt"})
+    full_job = train_module.CustomLrTrainingJob("full_dataset", full_idx, full_idx, 3)
+
+    with caplog.at_level(logging.INFO):
+        warm_start = train_module._warm_start_full_dataset_job(
+            full_job,
+            previous_model,
+            category_metadata,
+            warm_start_epochs=7,
+            evaluation={"epochs": 40, "cross_validation_skipped": True},
+        )
+
+    assert full_job.epochs == 7
+    assert set(full_job.initial_params) == set(previous_params)
+    assert warm_start["from_timestamp"] == "20260101000000"
+    assert warm_start["evaluation"] == {"initialization": "cold", "epochs": 40, "cross_validation_skipped": True}
+    assert "Evaluation trains cold for 40 epochs (cross-validation skipped)" in caplog.text
+
+
+def test_warm_start_skip_cv_requires_warm_start():
+    with pytest.raises(SystemExit):
+        train_module.main(["--warm-start-skip-cv"])
+
+
+def test_custom_lr_training_jobs_fall_back_to_serial_without_process_pool(monkeypatch, caplog):
+    cleaned = train_module.prepare_training_data(_fit_tests_df())
+    category_metadata = train_module._custom_lr_category_metadata(cleaned)
+    jobs = _custom_lr_training_jobs(cleaned)
+
+    def no_shared_memory(*args, **kwargs):
+        raise OSError(38, "Function not implemented")
+
+    monkeypatch.setattr(train_module, "ProcessPoolExecutor", no_shared_memory)
+    results = train_module.run_custom_lr_training_jobs(
+        jobs,
+        cleaned,
+        category_metadata,
+        epochs=2,
+        learning_rate=0.01,
+        class_weighting=False,
+        workers=4,
+    )
+
+    assert set(results) == {"fold_1", "fold_2", "full_dataset"}
+    assert "training 3 custom_lr jobs serially" in caplog.text
+
+
 def test_dedupe_prediction_rows_collapses_clone_like_validation_duplicates():
     fit_tests_df = pd.DataFrame(
         [
@@ -697,11 +1053,11 @@ def test_compute_top_k_any_fit_probability_metrics_uses_top_three_predictions():
     assert result["max_baseline_calibration_bins"]
 
 
-def test_build_cross_validation_top_k_hit_rate_plot_saves_png(tmp_path, monkeypatch):
+def test_cross_validation_top_k_hit_rate_figure_publishes_png(tmp_path, monkeypatch):
     monkeypatch.setenv("MASK_RECOMMENDER_IMAGES_DIR", str(tmp_path))
     monkeypatch.setenv("RAILS_ENV", "development")
 
-    artifact = train_module._build_cross_validation_top_k_hit_rate_plot(
+    figure = train_module._cross_validation_top_k_hit_rate_figure(
         {
             "top_1_hit_rate_mean": 0.76,
             "top_3_hit_rate_mean": 0.92,
@@ -709,11 +1065,93 @@ def test_build_cross_validation_top_k_hit_rate_plot_saves_png(tmp_path, monkeypa
         },
         timestamp="20260413210000",
     )
+    artifacts, timings = publish_diagnostics(
+        [figure],
+        train_module._diagnostics_publisher("20260413210000"),
+        render_workers=1,
+    )
 
-    assert artifact is not None
-    artifact_path = Path(artifact)
+    artifact_path = Path(artifacts["cross_validation_top_k_hit_rates"])
     assert artifact_path.exists()
-    assert artifact_path.suffix == ".png"
+    assert artifact_path.name == "20260413210000_custom_cross_validation_top_k_hit_rates.png"
+    assert timings["failures"] == 0
+    assert train_module._cross_validation_top_k_hit_rate_figure({"top_1_hit_rate_mean": 0.7}, "ts") is None
+
+
+def test_run_custom_lr_diagnostics_publishes_every_figure(tmp_path, monkeypatch):
+    monkeypatch.setenv("MASK_RECOMMENDER_IMAGES_DIR", str(tmp_path))
+    monkeypatch.setenv("RAILS_ENV", "development")
+    monkeypatch.delenv("MASK_RECOMMENDER_PROBE_USER_IDS", raising=False)
+    cleaned = train_module.prepare_training_data(_fit_tests_df())
+    category_metadata = train_module._custom_lr_category_metadata(cleaned)
+    full_idx = torch.arange(cleaned.shape[0])
+    train_result = train_module.train_custom_lr_with_split(
+        cleaned,
+        train_idx=full_idx,
+        val_idx=full_idx,
+        category_metadata=category_metadata,
+        epochs=2,
+        learning_rate=0.01,
+    )
+    labels = np.array([1.0, 0.0, 1.0, 0.0])
+    probs = np.array([0.8, 0.3, 0.6, 0.4])
+
+    fields, timings = train_module._run_custom_lr_diagnostics(
+        timestamp="20260413210000",
+        train_losses=[0.7, 0.6],
+        val_losses=[0.71, 0.65],
+        cross_validation_metrics={"top_1_hit_rate_mean": 0.5, "top_3_hit_rate_mean": 0.75, "top_5_hit_rate_mean": 1.0},
+        roc_inputs=(labels, probs, labels, probs),
+        cleaned_fit_tests=cleaned,
+        parameters=train_result["params"],
+        category_metadata=category_metadata,
+        mask_data=None,
+        base_url=None,
+        render_workers=1,
+    )
+
+    assert Path(fields["training_loss_artifact"]).name == "20260413210000_custom_training_loss.png"
+    assert Path(fields["roc_auc_artifact"]).exists()
+    assert Path(fields["cross_validation_top_k_hit_rate_artifact"]).exists()
+    assert [Path(path).name for path in fields["perimeter_diff_diagnostics_artifacts"]] == [
+        "20260413210000_custom_perimeter_diff_diagnostics_page_1.png",
+    ]
+    probe_points = json.loads((tmp_path / "20260413210000_custom_perimeter_diff_probe_points.json").read_text())
+    assert {row["mask_code"] for row in probe_points} == set(cleaned["unique_internal_model_code"])
+    assert timings["failures"] == 0
+    assert timings["figures"] == 4
+
+
+def test_diagnostics_stage_records_a_failure_instead_of_raising(tmp_path, monkeypatch):
+    monkeypatch.setenv("MASK_RECOMMENDER_IMAGES_DIR", str(tmp_path))
+    monkeypatch.setenv("RAILS_ENV", "development")
+    # Probe users without service credentials make _probe_payloads raise ValueError.
+    monkeypatch.setenv("MASK_RECOMMENDER_PROBE_USER_IDS", "7")
+    monkeypatch.delenv("BREATHESAFE_SERVICE_EMAIL", raising=False)
+    monkeypatch.delenv("BREATHESAFE_SERVICE_PASSWORD", raising=False)
+    cleaned = train_module.prepare_training_data(_fit_tests_df())
+    category_metadata = train_module._custom_lr_category_metadata(cleaned)
+    labels = np.array([1.0, 0.0, 1.0, 0.0])
+    metrics = {"val_f1": 0.7, "diagnostics": {"status": "pending"}}
+
+    train_module._run_custom_lr_diagnostics_stage(
+        metrics,
+        timestamp="20260413210000",
+        train_losses=[0.7, 0.6],
+        val_losses=[0.71, 0.65],
+        cross_validation_metrics={},
+        roc_inputs=(labels, labels, labels, labels),
+        cleaned_fit_tests=cleaned,
+        parameters=train_module._initialize_custom_lr_parameters(category_metadata),
+        category_metadata=category_metadata,
+        mask_data=None,
+        base_url=None,
+    )
+
+    assert metrics["val_f1"] == 0.7
+    assert metrics["diagnostics"]["status"] == "failed"
+    assert metrics["diagnostics"]["error"].startswith("ValueError: MASK_RECOMMENDER_PROBE_USER_IDS requires")
+    assert list(tmp_path.iterdir()) == []
 
 
 def test_save_local_custom_artifacts_persists_metrics(tmp_path, monkeypatch):
@@ -730,3 +1168,62 @@ def test_save_local_custom_artifacts_persists_metrics(tmp_path, monkeypatch):
     metrics_path = artifact_dir / "custom_metrics.json"
     assert metrics_path.exists()
     assert json.loads(metrics_path.read_text(encoding="utf-8"))["val_f1"] == 0.73
+
+
+def test_run_ingestion_fetches_overlaps_fetches_and_records_timings():
+    barrier = threading.Barrier(3, timeout=5)
+
+    def fetch(value):
+        # Every fetch waits for the others, so this only finishes if they overlap.
+        barrier.wait()
+        return value
+
+    results, timings = train_module.run_ingestion_fetches({
+        "fit_tests": lambda: fetch("fit tests"),
+        "masks": lambda: fetch("masks"),
+        "predict_arkit_from_traditional": lambda: fetch("imputed"),
+    })
+
+    assert results == {"fit_tests": "fit tests", "masks": "masks", "predict_arkit_from_traditional": "imputed"}
+    assert set(timings) == {"fit_tests", "masks", "predict_arkit_from_traditional", "total"}
+    assert timings["total"] >= max(timings["fit_tests"], timings["masks"])
+
+
+def test_run_ingestion_fetches_reraises_failures():
+    def failing():
+        raise RuntimeError("502 from Rails")
+
+    with pytest.raises(RuntimeError, match="502"):
+        train_module.run_ingestion_fetches({"masks": lambda: "masks", "fit_tests": failing})
+
+
+def test_predict_arkit_from_traditional_joins_the_download_and_logs_out_when_the_summary_fails(monkeypatch):
+    from mask_recommender import predict_arkit_from_traditional as arkit_module
+
+    events = []
+    download_started = threading.Event()
+    summary_failed = threading.Event()
+
+    class FakeSession:
+        def timing_summary(self):
+            return {"requests": 0}
+
+    def fake_fetch_json(session, url):
+        if url.endswith("/facial_measurements_fit_tests.json"):
+            download_started.set()
+            summary_failed.wait(timeout=5)
+            events.append("fit_tests_downloaded")
+            return {"fit_tests_with_facial_measurements": []}
+        download_started.wait(timeout=5)
+        summary_failed.set()
+        raise RuntimeError("summary unavailable")
+
+    monkeypatch.setattr(arkit_module, "build_session", lambda cookie: FakeSession())
+    monkeypatch.setattr(arkit_module, "login_with_credentials", lambda *args: events.append("login"))
+    monkeypatch.setattr(arkit_module, "logout", lambda *args: events.append("logout"))
+    monkeypatch.setattr(arkit_module, "fetch_json", fake_fetch_json)
+
+    with pytest.raises(RuntimeError, match="summary unavailable"):
+        arkit_module.predict_arkit_from_traditional("http://breathesafe.test", email="a@b.c", password="secret")
+
+    assert events == ["login", "fit_tests_downloaded", "logout"]
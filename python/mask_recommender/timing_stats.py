@@ -0,0 +1,35 @@
+"""
+Running totals for timed calls (HTTP requests, S3 uploads).
+
+Sessions and publishers can live for the whole process (``shared_session()``
+does), so they keep per-counter sums plus a bounded deque of the most recent
+call entries instead of a list that grows with every call.
+"""
+
+import threading
+from collections import deque
+
+RECENT_TIMINGS = 100
+
+
+class TimingStats:
+    """Thread-safe sums of ``counters`` and the last ``recent`` call entries."""
+
+    def __init__(self, counters, recent=RECENT_TIMINGS):
+        self.recent = deque(maxlen=recent)
+        self._totals = dict(counters)
+        self._lock = threading.Lock()
+
+    def record(self, entry, **counts):
+        with self._lock:
+            self.recent.append(entry)
+            for name, value in counts.items():
+                self._totals[name] += value
+
+    def entries(self):
+        with self._lock:
+            return list(self.recent)
+
+    def summary(self):
+        with self._lock:
+            return dict(self._totals)
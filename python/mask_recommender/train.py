@@ -2,11 +2,15 @@ import argparse
 import io
 import json
 import logging
+import multiprocessing
 import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Optional
 
 os.environ.setdefault("MPLBACKEND", "Agg")
 _CACHE_ROOT = os.environ.setdefault("MASK_RECOMMENDER_CACHE_DIR", "/tmp/mask_recommender")
@@ -23,9 +27,6 @@ if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
 import boto3
-if _DEBUG_IMPORTS:
-    print("[train.py] importing matplotlib", flush=True)
-import matplotlib.pyplot as plt
 if _DEBUG_IMPORTS:
     print("[train.py] importing numpy/pandas", flush=True)
 import numpy as np
@@ -36,14 +37,16 @@ import torch
 if _DEBUG_IMPORTS:
     print("[train.py] imported torch", flush=True)
 from botocore.exceptions import ClientError
-from matplotlib.lines import Line2D
-from breathesafe_network import (build_session, fetch_facial_measurements_fit_tests,
-                                 fetch_json, login_with_credentials, logout)
+from artifact_publisher import ArtifactPublisher
+from artifact_bundle import BUNDLE_FILENAME, write_custom_lr_bundle
+from breathesafe_network import build_session, fetch_json, login_with_credentials, logout
+from diagnostics import PROBE_COLORS, DiagnosticsPublisher, publish_diagnostics
+from export_cache import default_export_cache, fetch_fit_tests_frame, fetch_masks_frame
 from feature_builder import (ABS_PERIMETER_DIFF_STYLE_PREFIX,
                              FACE_SHAPE_FEATURE_COLUMNS,
                              FACE_STYLE_INTERACTION_PREFIX,
                              FACIAL_FEATURE_COLUMNS,
-                             FACIAL_PERIMETER_COMPONENTS,
+                             FACIAL_PERIMETER_COMPONENTS, MASK_CODE_CACHE,
                              MASK_EMPIRICAL_FEATURE_COLUMNS,
                              MASK_SIZE_FEATURE_COLUMNS,
                              PERIMETER_DIFF_SQ_STYLE_PREFIX,
@@ -51,23 +54,24 @@ from feature_builder import (ABS_PERIMETER_DIFF_STYLE_PREFIX,
                              PERIMETER_PENALTY_FEATURE_COLUMNS,
                              STRAP_STYLE_INTERACTION_PREFIX,
                              add_brand_model_column, add_face_shape_features,
-                             add_face_style_interactions,
                              add_geometry_penalty_features,
                              add_mask_size_face_interactions,
                              add_mask_size_features,
                              add_strap_style_interactions,
-                             add_strap_type_features,
-                             add_style_perimeter_interactions,
-                             derive_brand_model,
+                             add_strap_type_features, apply_feature_plan,
                              diff_bin_edges, diff_bin_index, diff_bin_labels,
                              scale_perimeter_diff_features)
+from mask_feature_store import build_mask_feature_store
 from predict_arkit_from_traditional import (TARGET_COLUMNS,
                                             predict_arkit_from_traditional)
 from qa import build_mask_candidates, build_recommendation_preview
-from sklearn.metrics import (auc, brier_score_loss, f1_score, log_loss,
-                             precision_score, recall_score, roc_auc_score,
-                             roc_curve)
+from ranking_metrics import top_k_any_fit_probability_metrics, top_k_hit_rates, user_equal_weights
+from scoring import CATEGORY_CODE_KEYS, calc_preds
+from scoring import resolve_parameter_views as _resolve_custom_lr_parameter_views
+from sklearn.metrics import (auc, f1_score, precision_score, recall_score,
+                             roc_auc_score, roc_curve)
 from sklearn.model_selection import GroupKFold
+from threshold_search import best_f1_threshold
 from utils import display_percentage
 
 """
@@ -298,9 +302,8 @@ def produce_summation(betas, users_by_masks_by_strap_types, users_by_masks_by_st
     return summation.sum(axis=2)
 
 
-def get_masks(session, masks_url):
-    masks_payload = fetch_json(session, masks_url).get("masks", [])
-    return pd.DataFrame(masks_payload)
+def get_masks(session, masks_url, cache=None):
+    return fetch_masks_frame(session, masks_url, cache=cache)
 
 
 def get_users_by_masks_by_types(user_ones, sorted_tested_masks, by):
@@ -375,20 +378,21 @@ def prepare_training_data(
     mask_empirical_priors=None,
     use_facial_perimeter=False,
     use_diff_perimeter_bins=False,
-    use_diff_perimeter_mask_bins=False
+    use_diff_perimeter_mask_bins=False,
+    mask_features=None
 ):
     filtered = filter_fit_tests(fit_tests_df)
     filtered = add_brand_model_column(filtered)
-    filtered = add_strap_type_features(filtered)
-    filtered = add_face_shape_features(filtered)
-    filtered = add_mask_size_features(filtered)
-    filtered = add_mask_size_face_interactions(filtered)
-    filtered = add_geometry_penalty_features(filtered)
-    filtered = add_mask_empirical_prior_features(filtered, mask_empirical_priors or {})
-    filtered = add_strap_style_interactions(filtered)
 
     feature_cols = []
     if use_diff_perimeter_bins or use_diff_perimeter_mask_bins:
+        filtered = add_strap_type_features(filtered)
+        filtered = add_face_shape_features(filtered)
+        filtered = add_mask_size_features(filtered)
+        filtered = add_mask_size_face_interactions(filtered)
+        filtered = add_geometry_penalty_features(filtered)
+        filtered = add_mask_empirical_prior_features(filtered, mask_empirical_priors or {})
+        filtered = add_strap_style_interactions(filtered)
         filtered['perimeter_diff'] = filtered['facial_perimeter_mm'] - filtered['perimeter_mm']
         filtered['perimeter_diff_bin_index'] = diff_bin_index(filtered['perimeter_diff'])
         filtered = scale_perimeter_diff_features(filtered)
@@ -418,13 +422,11 @@ def prepare_training_data(
             filtered = pd.concat([filtered, mask_bins], axis=1)
             feature_cols += list(mask_bins.columns)
     else:
-        filtered['perimeter_diff'] = filtered['facial_perimeter_mm'] - filtered['perimeter_mm']
-        filtered['perimeter_diff_sq'] = filtered['perimeter_diff'] ** 2
-        filtered = scale_perimeter_diff_features(filtered)
-        filtered = add_geometry_penalty_features(filtered)
-        filtered = add_style_perimeter_interactions(filtered)
-        filtered = add_face_style_interactions(filtered)
-        filtered = add_strap_style_interactions(filtered)
+        # Priors go in before the perimeter columns exist, as in the original
+        # add_* chain, so mask_badness_x_abs_perimeter_diff keeps its prior value.
+        filtered = add_strap_type_features(filtered)
+        filtered = add_mask_empirical_prior_features(filtered, mask_empirical_priors or {})
+        filtered = apply_feature_plan(filtered, mask_features=mask_features)
         interaction_cols = sorted(
             [
                 column for column in filtered.columns
@@ -536,21 +538,23 @@ def add_mask_empirical_prior_features(frame, priors_by_mask_id):
     if mask_id_source is None:
         mask_id_source = result.get('id')
     if mask_id_source is None or not hasattr(mask_id_source, 'items'):
-        mask_ids = pd.Series([np.nan] * len(result), index=result.index)
+        mask_ids = np.full(len(result), np.nan)
     else:
-        mask_ids = pd.to_numeric(mask_id_source, errors='coerce')
-    for column in MASK_EMPIRICAL_FEATURE_COLUMNS:
-        result[column] = defaults[column]
+        mask_ids = pd.to_numeric(mask_id_source, errors='coerce').to_numpy(dtype=np.float64)
 
-    for idx, mask_id in mask_ids.items():
-        if pd.isna(mask_id):
-            continue
-        prior = priors_by_mask_id.get(int(mask_id))
-        if not prior:
-            continue
-        for column in MASK_EMPIRICAL_FEATURE_COLUMNS:
-            if column in prior:
-                result.at[idx, column] = float(prior.get(column, defaults[column]))
+    # One row per mask, gathered onto the fit tests by mask id.
+    prior_table = pd.DataFrame.from_dict(
+        {mask_id: prior for mask_id, prior in priors_by_mask_id.items() if prior},
+        orient='index',
+    )
+    positions = prior_table.index.get_indexer(mask_ids) if not prior_table.empty else None
+    for column in MASK_EMPIRICAL_FEATURE_COLUMNS:
+        values = np.full(len(result), defaults[column], dtype=np.float64)
+        if positions is not None and column in prior_table.columns:
+            prior_values = prior_table[column].to_numpy(dtype=np.float64)[positions]
+            known = (positions >= 0) & ~np.isnan(prior_values)
+            values[known] = prior_values[known]
+        result[column] = values
 
     if 'abs_perimeter_diff' in result.columns:
         result['mask_badness_x_abs_perimeter_diff'] = (
@@ -950,6 +954,7 @@ def _save_local_custom_artifacts(timestamp, params, metadata, mask_data, metrics
     torch.save(params, params_path)
     metadata_path.write_text(json.dumps(metadata, indent=2), encoding='utf-8')
     mask_data_path.write_text(json.dumps(mask_data, indent=2), encoding='utf-8')
+    write_custom_lr_bundle(local_dir / BUNDLE_FILENAME, params, metadata, mask_data)
     if metrics is not None:
         metrics_path.write_text(json.dumps(metrics, indent=2), encoding='utf-8')
 
@@ -961,14 +966,8 @@ def _should_upload_visual_artifacts_to_s3():
     return _env_name() in ("staging", "production")
 
 
-def _upload_visual_artifact(local_path, timestamp):
-    key = f"mask_recommender/models/{timestamp}/{os.path.basename(local_path)}"
-    return _upload_file_to_s3(local_path, key)
-
-
-def _upload_file_to_s3(local_path, key):
+def _artifact_publisher():
     bucket = _s3_bucket()
-    s3 = boto3.client('s3', region_name=_s3_region())
     profile = os.environ.get('AWS_PROFILE')
     logging.info(
         "S3 upload using bucket=%s region=%s profile=%s",
@@ -976,46 +975,7 @@ def _upload_file_to_s3(local_path, key):
         _s3_region(),
         profile or "default"
     )
-    s3.upload_file(local_path, bucket, key)
-    return f"s3://{bucket}/{key}"
-
-
-def _upload_json_to_s3(payload, key):
-    bucket = _s3_bucket()
-    s3 = boto3.client('s3', region_name=_s3_region())
-    profile = os.environ.get('AWS_PROFILE')
-    logging.info(
-        "S3 upload using bucket=%s region=%s profile=%s",
-        bucket,
-        _s3_region(),
-        profile or "default"
-    )
-    s3.put_object(
-        Bucket=bucket,
-        Key=key,
-        Body=json.dumps(payload, indent=2).encode('utf-8'),
-        ContentType='application/json'
-    )
-    return f"s3://{bucket}/{key}"
-
-
-def _upload_png_bytes_to_s3(png_bytes, key):
-    bucket = _s3_bucket()
-    s3 = boto3.client('s3', region_name=_s3_region())
-    profile = os.environ.get('AWS_PROFILE')
-    logging.info(
-        "S3 upload using bucket=%s region=%s profile=%s",
-        bucket,
-        _s3_region(),
-        profile or "default"
-    )
-    s3.put_object(
-        Bucket=bucket,
-        Key=key,
-        Body=png_bytes,
-        ContentType='image/png'
-    )
-    return f"s3://{bucket}/{key}"
+    return ArtifactPublisher(bucket, region=_s3_region())
 
 
 def _best_effort_visual_upload(upload_fn, artifact_name, fallback_artifact=None):
@@ -1030,7 +990,7 @@ def _best_effort_visual_upload(upload_fn, artifact_name, fallback_artifact=None)
         return fallback_artifact
 
 
-def _build_cross_validation_top_k_hit_rate_plot(cross_validation_metrics, timestamp):
+def _cross_validation_top_k_hit_rate_figure(cross_validation_metrics, timestamp):
     metric_keys = ['top_1_hit_rate_mean', 'top_3_hit_rate_mean', 'top_5_hit_rate_mean']
     metric_values = [
         cross_validation_metrics.get(metric_key)
@@ -1038,46 +998,48 @@ def _build_cross_validation_top_k_hit_rate_plot(cross_validation_metrics, timest
     ]
     if any(value is None for value in metric_values):
         return None
+    return {
+        'name': 'cross_validation_top_k_hit_rates',
+        'kind': 'top_k_hit_rates',
+        'filename': f"{timestamp}_custom_cross_validation_top_k_hit_rates.png",
+        'data': {'labels': ['Top 1', 'Top 3', 'Top 5'], 'values': metric_values},
+    }
 
-    labels = ['Top 1', 'Top 3', 'Top 5']
-    plot_path = os.path.join(
-        _images_output_dir(),
-        f"{timestamp}_custom_cross_validation_top_k_hit_rates.png",
-    )
-
-    plt.figure(figsize=(7, 4))
-    bars = plt.bar(labels, metric_values, color=['#1f77b4', '#2ca02c', '#ff7f0e'])
-    plt.ylim(0.0, 1.0)
-    plt.ylabel('Mean Hit Rate')
-    plt.title('Cross-Validation Top-K Hit Rates')
-    plt.grid(True, axis='y', linestyle='--', alpha=0.4)
-    for bar, value in zip(bars, metric_values):
-        plt.text(
-            bar.get_x() + (bar.get_width() / 2.0),
-            min(value + 0.03, 0.98),
-            f"{value:.3f}",
-            ha='center',
-            va='bottom',
-            fontsize=10,
-        )
-    plt.tight_layout()
-
-    artifact = plot_path
-    if _should_upload_visual_artifacts_to_s3():
-        plot_buf = io.BytesIO()
-        plt.savefig(plot_buf, format='png')
-        plot_buf.seek(0)
-        plot_key = f"mask_recommender/models/{timestamp}/{timestamp}_custom_cross_validation_top_k_hit_rates.png"
-        artifact = _best_effort_visual_upload(
-            lambda: _upload_png_bytes_to_s3(plot_buf.getvalue(), plot_key),
-            "cross-validation top-k hit rate plot",
-            fallback_artifact=None,
-        )
-    else:
-        plt.savefig(plot_path)
-        logging.info("Saved cross-validation top-k hit rate plot to %s", plot_path)
-    plt.close()
-    return artifact
+
+def _training_loss_figure(train_losses, val_losses, timestamp):
+    if not train_losses:
+        return None
+    return {
+        'name': 'training_loss',
+        'kind': 'training_loss',
+        'filename': f"{timestamp}_custom_training_loss.png",
+        'data': {'train_losses': list(train_losses), 'val_losses': list(val_losses or [])},
+    }
+
+
+def _roc_figure(train_labels, train_probs, val_labels, val_probs, timestamp):
+    curves = []
+    for label, labels, probabilities in (
+        ('train', train_labels, train_probs),
+        ('validation', val_labels, val_probs),
+    ):
+        try:
+            fpr, tpr, _ = roc_curve(labels, probabilities)
+        except ValueError:
+            logging.warning("Skipping custom %s ROC curve due to missing class labels.", label)
+            continue
+        curves.append({'label': label, 'fpr': fpr, 'tpr': tpr, 'auc': float(auc(fpr, tpr))})
+    return {
+        'name': 'roc_auc',
+        'kind': 'roc',
+        'filename': f"{timestamp}_custom_roc_auc.png",
+        'data': {'curves': curves},
+    }
+
+
+def _diagnostics_publisher(timestamp, client=None):
+    bucket = _s3_bucket() if _should_upload_visual_artifacts_to_s3() else None
+    return DiagnosticsPublisher(timestamp, _images_output_dir(), bucket=bucket, region=_s3_region(), client=client)
 
 
 def _probe_payloads(base_url=None):
@@ -1138,20 +1100,6 @@ def _probe_payloads(base_url=None):
     return payload
 
 
-def calc_preds(data, params):
-    resolved_params = _resolve_custom_lr_parameter_views(params)
-    fit_tests_by_mask_specific_parameters = data['fit_tests_by_masks'] @ resolved_params['mask_specific_parameters']
-    fit_tests_by_style_specific_parameters = data['fit_tests_by_styles'] @ resolved_params['style_specific_parameters']
-    fit_tests_by_mask_and_style_specific_parameters = fit_tests_by_mask_specific_parameters + fit_tests_by_style_specific_parameters
-
-    fit_tests_by_facial_feature_fit = fit_tests_by_mask_and_style_specific_parameters * data['perimeter_diffs']
-    fit_tests_by_strap_specific_parameters = data['fit_tests_by_strap_types'] @ resolved_params['strap_specific_parameters']
-
-    logits = fit_tests_by_strap_specific_parameters + fit_tests_by_facial_feature_fit.sum(axis=1).reshape(-1, 1)
-
-    return torch.sigmoid(logits)
-
-
 def _fit_family_key_series(frame):
     working = frame.copy()
     if 'fit_family_id' in working.columns:
@@ -1200,7 +1148,16 @@ def prep_data_in_torch_with_categories(
     mask_categories,
     style_categories,
     strap_categories,
+    layout='onehot',
 ):
+    """
+    Tensors for calc_preds. ``layout='onehot'`` builds rows x categories
+    float32 one-hot matrices; ``layout='index'`` keeps one int64 category code
+    per row instead (-1 for categories the model does not know), so memory
+    scales with rows only. calc_preds gives identical results for both.
+    """
+    if layout not in ('onehot', 'index'):
+        raise ValueError(f"Unknown layout {layout!r}; expected 'onehot' or 'index'.")
     frame = frame.copy()
     frame['fit_family_key'] = _fit_family_key_series(frame)
     if 'perimeter_diff' not in frame.columns:
@@ -1210,12 +1167,6 @@ def prep_data_in_torch_with_categories(
     if 'perimeter_diff_sq' not in frame.columns:
         frame['perimeter_diff_sq'] = pd.to_numeric(frame['perimeter_diff'], errors='coerce').fillna(0).astype(np.float32) ** 2
 
-    fit_tests_by_strap_types = torch.from_numpy(
-        pd.get_dummies(
-            pd.Categorical(frame['strap_type'], categories=strap_categories)
-        ).astype(np.float32).to_numpy()
-    )
-
     facial_perimeter_cm_t = torch.from_numpy(
         frame[FACIAL_MEASUREMENTS].sum(axis=1).to_numpy(dtype=np.float32)
     ).reshape(-1, 1) / 10.0
@@ -1228,24 +1179,20 @@ def prep_data_in_torch_with_categories(
     ones = torch.ones((perimeter_diff_cm_t.shape[0], 1), dtype=torch.float32)
     perimeter_diffs = torch.concat([perimeter_diff_cm_sq_t, perimeter_diff_cm_t, ones], axis=1)
 
-    fit_tests_by_masks = torch.from_numpy(
-        pd.get_dummies(
-            pd.Categorical(frame['fit_family_key'], categories=mask_categories)
-        ).astype(np.float32).to_numpy()
-    )
-    fit_tests_by_styles = torch.from_numpy(
-        pd.get_dummies(
-            pd.Categorical(frame['style'], categories=style_categories)
-        ).astype(np.float32).to_numpy()
-    )
-
     data = {
-        'fit_tests_by_masks': fit_tests_by_masks,
-        'fit_tests_by_styles': fit_tests_by_styles,
-        'fit_tests_by_strap_types': fit_tests_by_strap_types,
         'perimeter_diffs': perimeter_diffs,
         'facial_perimeter_cm': facial_perimeter_cm_t,
     }
+    categoricals = {
+        'fit_tests_by_masks': pd.Categorical(frame['fit_family_key'], categories=mask_categories),
+        'fit_tests_by_styles': pd.Categorical(frame['style'], categories=style_categories),
+        'fit_tests_by_strap_types': pd.Categorical(frame['strap_type'], categories=strap_categories),
+    }
+    for onehot_key, categorical in categoricals.items():
+        if layout == 'index':
+            data[CATEGORY_CODE_KEYS[onehot_key]] = torch.from_numpy(np.asarray(categorical.codes, dtype=np.int64))
+        else:
+            data[onehot_key] = torch.from_numpy(pd.get_dummies(categorical).astype(np.float32).to_numpy())
 
     return data
 
@@ -1347,10 +1294,7 @@ def _group_k_fold_indices_by_user(frame, num_folds=5):
 def _user_equal_weights(frame):
     if frame.empty:
         return np.array([], dtype=float)
-
-    user_ids = pd.to_numeric(frame['user_id'], errors='coerce')
-    counts = user_ids.value_counts(dropna=False)
-    return user_ids.map(lambda value: 1.0 / counts[value]).to_numpy(dtype=float)
+    return user_equal_weights(frame['user_id'])
 
 
 def _compute_binary_metrics(labels, probabilities, threshold, sample_weights=None):
@@ -1382,156 +1326,18 @@ def _compute_binary_metrics(labels, probabilities, threshold, sample_weights=Non
     }
 
 
-def _compute_probability_quality_metrics(labels, probabilities):
-    labels = np.asarray(labels, dtype=float)
-    probabilities = np.asarray(probabilities, dtype=float)
-    if labels.size == 0:
-        return {
-            'sample_count': 0,
-            'positive_rate': None,
-            'mean_predicted_probability': None,
-            'roc_auc': None,
-            'brier_score': None,
-            'log_loss': None,
-        }
-
-    clipped_probabilities = np.clip(probabilities, 1e-6, 1.0 - 1e-6)
-    try:
-        roc_auc = roc_auc_score(labels, clipped_probabilities)
-    except ValueError:
-        roc_auc = None
-    try:
-        negative_log_likelihood = log_loss(labels, clipped_probabilities, labels=[0, 1])
-    except ValueError:
-        negative_log_likelihood = None
-
-    return {
-        'sample_count': int(labels.size),
-        'positive_rate': float(np.mean(labels)),
-        'mean_predicted_probability': float(np.mean(clipped_probabilities)),
-        'roc_auc': roc_auc,
-        'brier_score': float(brier_score_loss(labels, clipped_probabilities)),
-        'log_loss': negative_log_likelihood,
-    }
-
-
-def _compute_calibration_bins(labels, probabilities, num_bins=5):
-    labels = np.asarray(labels, dtype=float)
-    probabilities = np.asarray(probabilities, dtype=float)
-    if labels.size == 0:
-        return []
-
-    clipped_probabilities = np.clip(probabilities, 1e-6, 1.0 - 1e-6)
-    bin_edges = np.linspace(0.0, 1.0, num_bins + 1)
-    bins = []
-    for index in range(num_bins):
-        lower = float(bin_edges[index])
-        upper = float(bin_edges[index + 1])
-        if index == num_bins - 1:
-            mask = (clipped_probabilities >= lower) & (clipped_probabilities <= upper)
-        else:
-            mask = (clipped_probabilities >= lower) & (clipped_probabilities < upper)
-        if not mask.any():
-            continue
-        bin_probabilities = clipped_probabilities[mask]
-        bin_labels = labels[mask]
-        bins.append({
-            'bin_start': lower,
-            'bin_end': upper,
-            'sample_count': int(mask.sum()),
-            'mean_predicted_probability': float(np.mean(bin_probabilities)),
-            'observed_positive_rate': float(np.mean(bin_labels)),
-        })
-    return bins
-
-
 def _compute_top_k_hit_rates(frame, labels, probabilities, ks=(1, 3, 5)):
     if frame.empty:
         return {
             'eligible_users': 0,
             'top_k_hit_rate': {str(k): None for k in ks},
         }
-
-    working = frame.copy().reset_index(drop=True)
-    working['target_label'] = np.asarray(labels, dtype=float)
-    working['predicted_probability'] = np.asarray(probabilities, dtype=float)
-
-    eligible_user_hits = {k: [] for k in ks}
-    for _user_id, user_rows in working.groupby('user_id', sort=False):
-        user_rows = user_rows.sort_values('predicted_probability', ascending=False)
-        if not (user_rows['target_label'] == 1).any():
-            continue
-        for k in ks:
-            top_rows = user_rows.head(k)
-            eligible_user_hits[k].append(float((top_rows['target_label'] == 1).any()))
-
-    return {
-        'eligible_users': len(next(iter(eligible_user_hits.values()), [])),
-        'top_k_hit_rate': {
-            str(k): (float(np.mean(values)) if values else None)
-            for k, values in eligible_user_hits.items()
-        },
-    }
+    return top_k_hit_rates(frame['user_id'], labels, probabilities, ks=ks)
 
 
 def _compute_top_k_any_fit_probability_metrics(frame, labels, probabilities, k=3):
-    if frame.empty:
-        return {
-            'k': int(k),
-            'eligible_users': 0,
-            'excluded_users_with_fewer_than_k_rows': 0,
-            'independence': _compute_probability_quality_metrics([], []),
-            'max_baseline': _compute_probability_quality_metrics([], []),
-            'independence_calibration_bins': [],
-            'max_baseline_calibration_bins': [],
-        }
-
-    working = frame.copy().reset_index(drop=True)
-    working['target_label'] = np.asarray(labels, dtype=float)
-    working['predicted_probability'] = np.asarray(probabilities, dtype=float)
-
-    observed_any_fit = []
-    independence_probabilities = []
-    max_probabilities = []
-    excluded_users = 0
-
-    for _user_id, user_rows in working.groupby('user_id', sort=False):
-        ordered_rows = user_rows.sort_values('predicted_probability', ascending=False)
-        if ordered_rows.shape[0] < k:
-            excluded_users += 1
-            continue
-
-        top_rows = ordered_rows.head(k)
-        top_probabilities = np.clip(
-            top_rows['predicted_probability'].to_numpy(dtype=float),
-            1e-6,
-            1.0 - 1e-6,
-        )
-        observed_any_fit.append(float((top_rows['target_label'] == 1).any()))
-        independence_probabilities.append(float(1.0 - np.prod(1.0 - top_probabilities)))
-        max_probabilities.append(float(np.max(top_probabilities)))
-
-    return {
-        'k': int(k),
-        'eligible_users': int(len(observed_any_fit)),
-        'excluded_users_with_fewer_than_k_rows': int(excluded_users),
-        'independence': _compute_probability_quality_metrics(
-            observed_any_fit,
-            independence_probabilities,
-        ),
-        'max_baseline': _compute_probability_quality_metrics(
-            observed_any_fit,
-            max_probabilities,
-        ),
-        'independence_calibration_bins': _compute_calibration_bins(
-            observed_any_fit,
-            independence_probabilities,
-        ),
-        'max_baseline_calibration_bins': _compute_calibration_bins(
-            observed_any_fit,
-            max_probabilities,
-        ),
-    }
+    user_ids = frame['user_id'] if not frame.empty else []
+    return top_k_any_fit_probability_metrics(user_ids, labels, probabilities, k=k)
 
 
 def _summarize_cross_validation_metrics(fold_metrics):
@@ -1581,88 +1387,265 @@ def _summarize_cross_validation_metrics(fold_metrics):
     return summary
 
 
-def _cross_validate_custom_lr(cleaned_fit_tests, category_metadata, epochs, learning_rate, class_weighting, num_folds=5, random_seed=42):
-    fold_indices = _group_k_fold_indices_by_user(cleaned_fit_tests, num_folds=num_folds)
-    fold_metrics = []
+CUSTOM_LATEST_KEY = "mask_recommender/models/custom_latest.json"
+CUSTOM_LR_OPTIMIZERS = ('adam', 'lbfgs')
+LBFGS_MAX_ITER = 20
+
+
+@dataclass
+class CustomLrTrainingJob:
+    name: str
+    train_idx: torch.Tensor
+    val_idx: torch.Tensor
+    seed: int
+    early_stopping_patience: int = 0
+    convergence_tolerance: float = 0.0
+    # Warm start: starting parameters instead of the default initialization,
+    # and an epoch budget overriding the run's --epochs.
+    initial_params: Optional[dict] = None
+    epochs: Optional[int] = None
+
+
+def _custom_lr_stop_reason(train_losses, val_losses, early_stopping_patience=0, convergence_tolerance=0.0):
+    """
+    'early_stopping' once validation loss has not improved on its best for
+    ``early_stopping_patience`` epochs, 'converged' once the last epoch moved
+    training loss by at most ``convergence_tolerance`` relative to the epoch
+    before, else None. Zero disables either rule.
+    """
+    if early_stopping_patience > 0 and val_losses:
+        best_epoch = int(np.argmin(val_losses))
+        if len(val_losses) - 1 - best_epoch >= early_stopping_patience:
+            return 'early_stopping'
+    if convergence_tolerance > 0 and len(train_losses) >= 2:
+        previous, current = train_losses[-2], train_losses[-1]
+        if abs(previous - current) <= convergence_tolerance * max(abs(previous), 1e-12):
+            return 'converged'
+    return None
+
+
+# Set in each pool worker by _init_custom_lr_training_worker so the frame is
+# pickled once per worker rather than once per job.
+_CUSTOM_LR_TRAINING_CONTEXT = None
+
+
+def _init_custom_lr_training_worker(context, torch_threads, log_level):
+    global _CUSTOM_LR_TRAINING_CONTEXT
+    _CUSTOM_LR_TRAINING_CONTEXT = context
+    torch.set_num_threads(torch_threads)
+    logging.basicConfig(
+        level=log_level,
+        format="%(asctime)s %(levelname)s %(processName)s %(message)s",
+        force=True,
+        stream=sys.stdout,
+    )
+
+
+def _run_custom_lr_training_job(job, context=None):
+    context = context or _CUSTOM_LR_TRAINING_CONTEXT
+    torch.manual_seed(job.seed)
+    result = train_custom_lr_with_split(
+        context['cleaned_fit_tests'],
+        train_idx=job.train_idx,
+        val_idx=job.val_idx,
+        category_metadata=context['category_metadata'],
+        epochs=context['epochs'] if job.epochs is None else job.epochs,
+        learning_rate=context['learning_rate'],
+        class_weighting=context['class_weighting'],
+        optimizer_name=context['optimizer_name'],
+        early_stopping_patience=job.early_stopping_patience,
+        convergence_tolerance=job.convergence_tolerance,
+        initial_params=job.initial_params,
+    )
+    return job.name, result
 
-    for fold_number, (train_idx, val_idx) in enumerate(fold_indices, start=1):
-        torch.manual_seed(random_seed + fold_number)
-        fold_result = train_custom_lr_with_split(
+
+def _resolve_training_workers(workers, job_count):
+    if workers is None or workers <= 0:
+        workers = os.cpu_count() or 1
+    return max(1, min(int(workers), job_count))
+
+
+def run_custom_lr_training_jobs(
+    jobs,
+    cleaned_fit_tests,
+    category_metadata,
+    epochs,
+    learning_rate,
+    class_weighting,
+    workers=1,
+    batched=False,
+    optimizer_name='adam',
+):
+    """
+    Train each job (CV fold, holdout split, full retrain) and return results by
+    job name. With more than one worker the jobs run in a spawn process pool,
+    each worker limited to cpu_count // workers torch threads.
+
+    Every job seeds torch itself, so results do not depend on scheduling and
+    match the serial path. Falls back to serial when a pool cannot be created
+    (AWS Lambda has no /dev/shm for multiprocessing semaphores).
+
+    ``batched`` trains all jobs together in one process instead
+    (train_custom_lr_jobs_batched) and ignores ``workers``.
+    """
+    if batched:
+        return train_custom_lr_jobs_batched(
+            jobs,
             cleaned_fit_tests,
-            train_idx=train_idx,
-            val_idx=val_idx,
-            category_metadata=category_metadata,
+            category_metadata,
             epochs=epochs,
             learning_rate=learning_rate,
             class_weighting=class_weighting,
+            optimizer_name=optimizer_name,
         )
-        val_frame = cleaned_fit_tests.iloc[val_idx.tolist()].reset_index(drop=True)
-        deduped_val_frame, deduped_val_probs, deduped_val_labels = _dedupe_prediction_rows(
-            val_frame,
-            fold_result['val_probs'],
-            fold_result['y_val'],
-        )
+    context = {
+        'cleaned_fit_tests': cleaned_fit_tests,
+        'category_metadata': category_metadata,
+        'epochs': epochs,
+        'learning_rate': learning_rate,
+        'class_weighting': class_weighting,
+        'optimizer_name': optimizer_name,
+    }
+    workers = _resolve_training_workers(workers, len(jobs))
+    if workers > 1:
+        torch_threads = max(1, (os.cpu_count() or 1) // workers)
+        try:
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_custom_lr_training_worker,
+                initargs=(context, torch_threads, logging.getLogger().level),
+            )
+        except (OSError, NotImplementedError) as exc:
+            logging.warning("Process pool unavailable (%s); training %s custom_lr jobs serially.", exc, len(jobs))
+        else:
+            logging.info(
+                "Training %s custom_lr jobs across %s workers (torch_threads=%s).",
+                len(jobs),
+                workers,
+                torch_threads,
+            )
+            with executor:
+                return dict(executor.map(_run_custom_lr_training_job, jobs))
 
-        threshold = 0.5
-        best_f1 = -1.0
-        if deduped_val_probs.size:
-            for candidate in np.arange(0.05, 0.96, 0.01):
-                candidate_f1 = f1_score(
-                    deduped_val_labels,
-                    (deduped_val_probs >= candidate).astype(float),
-                    zero_division=0,
-                )
-                if candidate_f1 > best_f1:
-                    best_f1 = candidate_f1
-                    threshold = float(candidate)
-
-        row_level_metrics = _compute_binary_metrics(
-            deduped_val_labels,
-            deduped_val_probs,
-            threshold=threshold,
-        )
-        user_level_metrics = _compute_binary_metrics(
-            deduped_val_labels,
-            deduped_val_probs,
-            threshold=threshold,
-            sample_weights=_user_equal_weights(deduped_val_frame),
-        )
-        top_k_metrics = _compute_top_k_hit_rates(
-            deduped_val_frame,
-            deduped_val_labels,
-            deduped_val_probs,
-        )
-        top_3_any_fit_metrics = _compute_top_k_any_fit_probability_metrics(
-            deduped_val_frame,
-            deduped_val_labels,
-            deduped_val_probs,
-            k=3,
+    return dict(_run_custom_lr_training_job(job, context) for job in jobs)
+
+
+def _cross_validation_jobs(fold_indices, random_seed, early_stopping_patience=0):
+    return [
+        CustomLrTrainingJob(
+            f"fold_{fold_number}",
+            train_idx,
+            val_idx,
+            random_seed + fold_number,
+            early_stopping_patience=early_stopping_patience,
         )
+        for fold_number, (train_idx, val_idx) in enumerate(fold_indices, start=1)
+    ]
 
-        train_users = set(pd.to_numeric(cleaned_fit_tests.iloc[train_idx.tolist()]['user_id'], errors='coerce').dropna().astype(int).tolist())
-        val_users = set(pd.to_numeric(cleaned_fit_tests.iloc[val_idx.tolist()]['user_id'], errors='coerce').dropna().astype(int).tolist())
-
-        fold_metrics.append({
-            'fold': fold_number,
-            'train_users': len(train_users),
-            'val_users': len(val_users),
-            'train_rows': int(train_idx.numel()),
-            'val_rows': int(val_idx.numel()),
-            'deduped_val_rows': int(deduped_val_frame.shape[0]),
-            'row_level': row_level_metrics,
-            'user_level': user_level_metrics,
-            'top_k': top_k_metrics,
-            'top_3_any_fit': top_3_any_fit_metrics,
-        })
 
+def _cross_validation_fold_metrics(cleaned_fit_tests, fold_number, train_idx, val_idx, fold_result):
+    val_frame = cleaned_fit_tests.iloc[val_idx.tolist()].reset_index(drop=True)
+    deduped_val_frame, deduped_val_probs, deduped_val_labels = _dedupe_prediction_rows(
+        val_frame,
+        fold_result['val_probs'],
+        fold_result['y_val'],
+    )
+
+    threshold, _ = best_f1_threshold(deduped_val_labels, deduped_val_probs, initial_f1=-1.0)
+
+    row_level_metrics = _compute_binary_metrics(
+        deduped_val_labels,
+        deduped_val_probs,
+        threshold=threshold,
+    )
+    user_level_metrics = _compute_binary_metrics(
+        deduped_val_labels,
+        deduped_val_probs,
+        threshold=threshold,
+        sample_weights=_user_equal_weights(deduped_val_frame),
+    )
+    top_k_metrics = _compute_top_k_hit_rates(
+        deduped_val_frame,
+        deduped_val_labels,
+        deduped_val_probs,
+    )
+    top_3_any_fit_metrics = _compute_top_k_any_fit_probability_metrics(
+        deduped_val_frame,
+        deduped_val_labels,
+        deduped_val_probs,
+        k=3,
+    )
+
+    train_users = set(pd.to_numeric(cleaned_fit_tests.iloc[train_idx.tolist()]['user_id'], errors='coerce').dropna().astype(int).tolist())
+    val_users = set(pd.to_numeric(cleaned_fit_tests.iloc[val_idx.tolist()]['user_id'], errors='coerce').dropna().astype(int).tolist())
+
+    return {
+        'fold': fold_number,
+        'train_users': len(train_users),
+        'val_users': len(val_users),
+        'train_rows': int(train_idx.numel()),
+        'val_rows': int(val_idx.numel()),
+        'deduped_val_rows': int(deduped_val_frame.shape[0]),
+        'row_level': row_level_metrics,
+        'user_level': user_level_metrics,
+        'top_k': top_k_metrics,
+        'top_3_any_fit': top_3_any_fit_metrics,
+    }
+
+
+def _summarize_cross_validation_jobs(cleaned_fit_tests, jobs, results):
+    fold_metrics = [
+        _cross_validation_fold_metrics(
+            cleaned_fit_tests,
+            fold_number,
+            job.train_idx,
+            job.val_idx,
+            results[job.name],
+        )
+        for fold_number, job in enumerate(jobs, start=1)
+    ]
     return _summarize_cross_validation_metrics(fold_metrics)
 
 
-def _subset_custom_lr_data(data, row_indices):
+def _cross_validate_custom_lr(
+    cleaned_fit_tests,
+    category_metadata,
+    epochs,
+    learning_rate,
+    class_weighting,
+    num_folds=5,
+    random_seed=42,
+    workers=1,
+    batched=False,
+    optimizer_name='adam',
+    early_stopping_patience=0,
+):
+    fold_indices = _group_k_fold_indices_by_user(cleaned_fit_tests, num_folds=num_folds)
+    jobs = _cross_validation_jobs(fold_indices, random_seed, early_stopping_patience=early_stopping_patience)
+    results = run_custom_lr_training_jobs(
+        jobs,
+        cleaned_fit_tests,
+        category_metadata,
+        epochs=epochs,
+        learning_rate=learning_rate,
+        class_weighting=class_weighting,
+        workers=workers,
+        batched=batched,
+        optimizer_name=optimizer_name,
+    )
+    return _summarize_cross_validation_jobs(cleaned_fit_tests, jobs, results)
+
+
+def _as_row_index_tensor(row_indices):
     if isinstance(row_indices, torch.Tensor):
-        row_indices = row_indices.detach().cpu().long()
-    else:
-        row_indices = torch.tensor(row_indices, dtype=torch.long)
+        return row_indices.detach().cpu().long()
+    return torch.tensor(row_indices, dtype=torch.long)
+
+
+def _subset_custom_lr_data(data, row_indices):
+    row_indices = _as_row_index_tensor(row_indices)
     return {
         key: value[row_indices]
         for key, value in data.items()
@@ -1683,35 +1666,114 @@ def _initialize_custom_lr_parameters(category_metadata):
     }
 
 
-def _detach_custom_lr_parameters(parameters):
-    return {
-        key: value.detach().cpu()
-        for key, value in parameters.items()
+# Parameter tables keyed by the category list their rows follow.
+CUSTOM_LR_PARAMETER_CATEGORIES = {
+    'alpha_mask_raw': 'fit_family_categories',
+    'beta_gamma_mask': 'fit_family_categories',
+    'alpha_style_raw': 'style_categories',
+    'beta_gamma_style': 'style_categories',
+    'strap_specific_parameters': 'strap_type_categories',
+}
+
+
+def _category_list(category_metadata, category_key):
+    if category_key == 'fit_family_categories':
+        return _custom_lr_mask_categories(category_metadata)
+    return category_metadata.get(category_key, [])
+
+
+def _warm_start_custom_lr_parameters(previous_params, previous_metadata, category_metadata):
+    """
+    Initial parameters for ``category_metadata`` that reuse the rows of a
+    previous model for every category both models know. Categories new to this
+    run keep the default initialization from _initialize_custom_lr_parameters
+    (call it under the job's seed). Returns the parameters and, per category
+    list, how many rows were reused out of how many.
+    """
+    missing = [key for key in CUSTOM_LR_PARAMETER_CATEGORIES if key not in previous_params]
+    if missing:
+        raise ValueError(f"Previous custom_lr params lack raw parameter tables {missing}.")
+
+    params = {
+        key: value.detach().clone()
+        for key, value in _initialize_custom_lr_parameters(category_metadata).items()
     }
+    reused = {}
+    for key, category_key in CUSTOM_LR_PARAMETER_CATEGORIES.items():
+        previous_rows = {
+            category: row
+            for row, category in enumerate(_category_list(previous_metadata, category_key))
+        }
+        categories = _category_list(category_metadata, category_key)
+        pairs = [
+            (row, previous_rows[category])
+            for row, category in enumerate(categories)
+            if category in previous_rows
+        ]
+        previous_table = torch.as_tensor(previous_params[key], dtype=torch.float32)
+        if pairs:
+            rows, previous_row_indices = (torch.tensor(indices, dtype=torch.long) for indices in zip(*pairs))
+            params[key][rows] = previous_table[previous_row_indices]
+        reused[category_key] = {'reused': len(pairs), 'total': len(categories)}
+    return params, reused
 
 
-def _resolve_custom_lr_parameter_views(params):
-    if 'mask_specific_parameters' in params and 'style_specific_parameters' in params:
-        return params
+def _load_previous_custom_lr_model():
+    """
+    (params, metadata, latest_payload) of the model custom_latest.json points
+    at, or None when there is no usable previous model.
+    """
+    bucket = _s3_bucket()
+    s3 = boto3.client('s3', region_name=_s3_region())
+    try:
+        latest_payload = json.loads(s3.get_object(Bucket=bucket, Key=CUSTOM_LATEST_KEY)['Body'].read())
+        params_body = s3.get_object(Bucket=bucket, Key=latest_payload['params_key'])['Body'].read()
+        metadata_body = s3.get_object(Bucket=bucket, Key=latest_payload['metadata_key'])['Body'].read()
+    except (ClientError, KeyError, ValueError) as exc:
+        logging.warning("No previous custom_lr model to warm start from (%s).", exc)
+        return None
+    params = torch.load(io.BytesIO(params_body), map_location='cpu')
+    return params, json.loads(metadata_body), latest_payload
 
-    mask_specific_parameters = torch.concat(
-        [
-            -torch.exp(params['alpha_mask_raw']),
-            params['beta_gamma_mask']
-        ],
-        axis=1
+
+def _warm_start_full_dataset_job(full_job, previous_model, category_metadata, warm_start_epochs, evaluation):
+    """
+    Start ``full_job`` from ``previous_model`` for ``warm_start_epochs`` and
+    return the run's warm_start record. Only the saved model is warm-started:
+    the CV folds and the holdout split must not start from a model that has
+    seen their validation users, so ``evaluation`` records how they ran cold.
+    """
+    previous_params, previous_metadata, previous_latest = previous_model
+    torch.manual_seed(full_job.seed)
+    full_job.initial_params, reused_categories = _warm_start_custom_lr_parameters(
+        previous_params,
+        previous_metadata,
+        category_metadata,
+    )
+    full_job.epochs = warm_start_epochs
+    logging.info(
+        "Warm starting full_dataset from %s: %s",
+        previous_latest['params_key'],
+        reused_categories,
     )
-    style_specific_parameters = torch.concat(
-        [
-            -torch.exp(params['alpha_style_raw']),
-            params['beta_gamma_style']
-        ],
-        axis=1
+    logging.info(
+        "Evaluation trains cold for %s epochs (cross-validation %s); its metrics describe a cold-started model.",
+        evaluation['epochs'],
+        'skipped' if evaluation['cross_validation_skipped'] else 'included',
     )
     return {
-        'mask_specific_parameters': mask_specific_parameters,
-        'style_specific_parameters': style_specific_parameters,
-        'strap_specific_parameters': params['strap_specific_parameters'],
+        'from_timestamp': previous_latest.get('timestamp'),
+        'from_params_key': previous_latest['params_key'],
+        'epochs': int(warm_start_epochs),
+        'reused_categories': reused_categories,
+        'evaluation': {'initialization': 'cold', **evaluation},
+    }
+
+
+def _detach_custom_lr_parameters(parameters):
+    return {
+        key: value.detach().cpu()
+        for key, value in parameters.items()
     }
 
 
@@ -1721,6 +1783,7 @@ def _predict_custom_lr_probabilities(frame, parameters, category_metadata):
         mask_categories=_custom_lr_mask_categories(category_metadata),
         style_categories=category_metadata['style_categories'],
         strap_categories=category_metadata['strap_type_categories'],
+        layout='index',
     )
     with torch.no_grad():
         return calc_preds(data, parameters).squeeze(1).cpu().numpy()
@@ -1752,7 +1815,7 @@ def _mask_perimeter_mm_from_training_row(row):
     return float(facial_perimeter_mm)
 
 
-def _build_custom_lr_perimeter_diff_diagnostics(
+def _perimeter_diff_diagnostic_figures(
     cleaned_fit_tests,
     parameters,
     category_metadata,
@@ -1760,16 +1823,17 @@ def _build_custom_lr_perimeter_diff_diagnostics(
     mask_data=None,
     base_url=None,
 ):
+    """
+    Figure specs for the paged 4x4 perimeter_diff diagnostics (rendered by
+    diagnostics.render_perimeter_diff_page) and the probe point rows.
+    """
     if cleaned_fit_tests.empty:
-        return []
-
-    images_dir = _images_output_dir()
-    os.makedirs(images_dir, exist_ok=True)
+        return [], []
 
     observed_min = float(pd.to_numeric(cleaned_fit_tests['perimeter_diff'], errors='coerce').min())
     observed_max = float(pd.to_numeric(cleaned_fit_tests['perimeter_diff'], errors='coerce').max())
     if not np.isfinite(observed_min) or not np.isfinite(observed_max):
-        return []
+        return [], []
     if observed_min == observed_max:
         observed_min -= 1.0
         observed_max += 1.0
@@ -1783,22 +1847,23 @@ def _build_custom_lr_perimeter_diff_diagnostics(
     )
     mask_codes = list(grouped.groups.keys())
     if not mask_codes:
-        return []
+        return [], []
 
-    artifact_paths = []
+    figures = []
     probe_point_rows = []
     per_page = 16
     num_pages = int(np.ceil(len(mask_codes) / per_page))
     probes = _probe_payloads(base_url=base_url)
-    probe_colors = ['#111111', '#7a3cff', '#118ab2', '#ef476f', '#2a9d8f', '#bc6c25']
+    probe_legend = [
+        (probe.get('label') or f"probe_{probe_idx + 1}", PROBE_COLORS[probe_idx % len(PROBE_COLORS)])
+        for probe_idx, probe in enumerate(probes)
+    ]
 
     for page_idx in range(num_pages):
         page_codes = mask_codes[page_idx * per_page:(page_idx + 1) * per_page]
-        fig, axes = plt.subplots(4, 4, figsize=(20, 16), sharex=False, sharey=True)
-        axes = axes.flatten()
+        panels = []
 
-        for ax_idx, mask_code in enumerate(page_codes):
-            ax = axes[ax_idx]
+        for mask_code in page_codes:
             rows = grouped.get_group(mask_code).copy()
             representative = rows.iloc[-1]
             live_mask = None
@@ -1808,6 +1873,7 @@ def _build_custom_lr_perimeter_diff_diagnostics(
 
             style = (live_mask or {}).get('style') or representative['style']
             strap_type = (live_mask or {}).get('strap_type') or representative['strap_type']
+            fit_family_id = (live_mask or {}).get('fit_family_id', representative.get('fit_family_id'))
             fit_family_key = _fit_family_key_series(pd.DataFrame([representative])).iloc[0]
             live_perimeter_mm = pd.to_numeric((live_mask or {}).get('perimeter_mm'), errors='coerce')
             if pd.notna(live_perimeter_mm):
@@ -1835,7 +1901,7 @@ def _build_custom_lr_perimeter_diff_diagnostics(
 
             curve_frame = pd.DataFrame({
                 'unique_internal_model_code': [mask_code] * len(diff_values),
-                'fit_family_id': [(live_mask or {}).get('fit_family_id', representative.get('fit_family_id'))] * len(diff_values),
+                'fit_family_id': [fit_family_id] * len(diff_values),
                 'style': [style] * len(diff_values),
                 'strap_type': [strap_type] * len(diff_values),
                 'perimeter_diff': diff_values,
@@ -1857,59 +1923,21 @@ def _build_custom_lr_perimeter_diff_diagnostics(
                 category_metadata=category_metadata,
             )
 
-            ax.plot(diff_values, specific_probs, label='mask-specific', color='#1f77b4', linewidth=2)
-            ax.plot(diff_values, generic_probs, label='style-only', color='#ff7f0e', linewidth=2, linestyle='--')
-
             row_labels = pd.to_numeric(rows['qlft_pass_normalized'], errors='coerce')
             pass_mask = row_labels == 1
             fail_mask = row_labels == 0
-            if pass_mask.any():
-                ax.scatter(
-                    row_diffs[pass_mask],
-                    row_labels[pass_mask],
-                    color='green',
-                    alpha=0.5,
-                    s=26,
-                    label='pass',
-                )
-            if fail_mask.any():
-                ax.scatter(
-                    row_diffs[fail_mask],
-                    row_labels[fail_mask],
-                    color='red',
-                    alpha=0.5,
-                    s=26,
-                    label='fail',
-                )
 
-            strap_type_value = representative['strap_type']
-            style_value = representative['style']
+            panel_probes = []
             for probe_idx, probe in enumerate(probes):
                 facial_measurements = probe.get('facial_measurements') or {}
-                probe_label = probe.get('label') or f"probe_{probe_idx + 1}"
+                probe_label, probe_color = probe_legend[probe_idx]
                 facial_perimeter_mm = sum(float(facial_measurements.get(column, 0) or 0) for column in FACIAL_MEASUREMENTS)
                 probe_diff_cm = (facial_perimeter_mm - mask_perimeter_mm) / 10.0
-                probe_color = probe_colors[probe_idx % len(probe_colors)]
-                ax.axvspan(
-                    probe_diff_cm - 0.08,
-                    probe_diff_cm + 0.08,
-                    color=probe_color,
-                    alpha=0.14,
-                    zorder=1,
-                )
-                ax.axvline(
-                    probe_diff_cm,
-                    color=probe_color,
-                    linestyle='-',
-                    linewidth=2.4,
-                    alpha=0.95,
-                    zorder=2,
-                )
                 probe_frame = pd.DataFrame({
                     'unique_internal_model_code': [mask_code],
-                    'fit_family_id': [(live_mask or {}).get('fit_family_id', representative.get('fit_family_id'))],
-                    'style': [style_value],
-                    'strap_type': [strap_type_value],
+                    'fit_family_id': [fit_family_id],
+                    'style': [representative['style']],
+                    'strap_type': [representative['strap_type']],
                     'perimeter_mm': [mask_perimeter_mm],
                     'facial_hair_beard_length_mm': [facial_measurements.get('facial_hair_beard_length_mm', 0) or 0],
                 })
@@ -1922,42 +1950,12 @@ def _build_custom_lr_perimeter_diff_diagnostics(
                         category_metadata=category_metadata,
                     )[0]
                 )
-                ax.scatter(
-                    [probe_diff_cm],
-                    [probe_probability],
-                    color=probe_color,
-                    edgecolors='black',
-                    linewidths=1.2,
-                    s=90,
-                    marker='X',
-                    zorder=10,
-                )
-                annotation_y = min(0.97, max(0.03, probe_probability + 0.06))
-                annotation_va = 'bottom' if annotation_y >= probe_probability else 'top'
-                ax.annotate(
-                    f"{probe_label}: {probe_probability:.0%}",
-                    xy=(probe_diff_cm, probe_probability),
-                    xytext=(probe_diff_cm + 0.15, annotation_y),
-                    textcoords='data',
-                    fontsize=7,
-                    color=probe_color,
-                    fontweight='bold',
-                    ha='left',
-                    va=annotation_va,
-                    bbox={
-                        'boxstyle': 'round,pad=0.2',
-                        'fc': 'white',
-                        'ec': probe_color,
-                        'alpha': 0.9,
-                    },
-                    arrowprops={
-                        'arrowstyle': '-',
-                        'color': probe_color,
-                        'lw': 1.0,
-                        'alpha': 0.9,
-                    },
-                    zorder=11,
-                )
+                panel_probes.append({
+                    'label': probe_label,
+                    'color': probe_color,
+                    'diff_cm': probe_diff_cm,
+                    'probability': probe_probability,
+                })
                 probe_point_rows.append({
                     'page': page_idx + 1,
                     'mask_code': mask_code,
@@ -1966,120 +1964,112 @@ def _build_custom_lr_perimeter_diff_diagnostics(
                     'probe_probability_of_fit': probe_probability,
                 })
 
-                xticks = list(ax.get_xticks())
-                xticks.append(probe_diff_cm)
-                finite_xticks = []
-                for x in xticks:
-                    try:
-                        x_value = float(x)
-                    except (TypeError, ValueError):
-                        continue
-                    if np.isfinite(x_value):
-                        finite_xticks.append(round(x_value, 2))
-                if finite_xticks:
-                    ax.set_xticks(sorted(set(finite_xticks)))
-                ax.text(
-                    0.02,
-                    0.98 - (probe_idx * 0.09),
-                    f"{probe_label}: x={probe_diff_cm:.2f}, p={probe_probability:.0%}",
-                    transform=ax.transAxes,
-                    ha='left',
-                    va='top',
-                    fontsize=7,
-                    color=probe_color,
-                    bbox={
-                        'boxstyle': 'round,pad=0.2',
-                        'fc': 'white',
-                        'ec': probe_color,
-                        'alpha': 0.9,
-                    },
-                    zorder=12,
-                )
+            panels.append({
+                'mask_code': mask_code,
+                'diff_values': diff_values,
+                'specific_probs': specific_probs,
+                'generic_probs': generic_probs,
+                'pass_points': (row_diffs[pass_mask].to_numpy(), row_labels[pass_mask].to_numpy()),
+                'fail_points': (row_diffs[fail_mask].to_numpy(), row_labels[fail_mask].to_numpy()),
+                'probes': panel_probes,
+                'x_limits': (subplot_min, subplot_max),
+            })
 
-            ax.set_title(mask_code, fontsize=9)
-            ax.set_xlim(subplot_min, subplot_max)
-            ax.set_ylim(-0.05, 1.05)
-            ax.grid(True, linestyle='--', alpha=0.25)
-            ax.tick_params(axis='x', labelrotation=35, labelsize=7, pad=2)
+        figures.append({
+            'name': f"perimeter_diff_diagnostics_page_{page_idx + 1}",
+            'kind': 'perimeter_diff_page',
+            'filename': f"{timestamp}_custom_perimeter_diff_diagnostics_page_{page_idx + 1}.png",
+            'data': {
+                'page': page_idx + 1,
+                'num_pages': num_pages,
+                'panels': panels,
+                'probe_legend': probe_legend,
+            },
+        })
 
-        for unused_ax in axes[len(page_codes):]:
-            unused_ax.axis('off')
+    return figures, probe_point_rows
 
-        legend_handles = [
-            Line2D([0], [0], color='#1f77b4', linewidth=2, label='mask-specific'),
-            Line2D([0], [0], color='#ff7f0e', linewidth=2, linestyle='--', label='style-only'),
-            Line2D([0], [0], marker='o', color='green', linestyle='None', alpha=0.5, markersize=6, label='pass'),
-            Line2D([0], [0], marker='o', color='red', linestyle='None', alpha=0.5, markersize=6, label='fail'),
-        ]
-        for probe_idx, probe in enumerate(probes):
-            probe_label = probe.get('label') or f"probe_{probe_idx + 1}"
-            probe_color = probe_colors[probe_idx % len(probe_colors)]
-            legend_handles.append(
-                Line2D(
-                    [0], [0],
-                    color=probe_color,
-                    linestyle='-',
-                    linewidth=2.4,
-                    marker='o',
-                    markersize=5,
-                    label=f'{probe_label} actual'
-                )
-            )
-        if legend_handles:
-            fig.legend(
-                handles=legend_handles,
-                loc='upper center',
-                bbox_to_anchor=(0.5, 0.965),
-                ncol=min(4, len(legend_handles)),
-                frameon=False,
-            )
-        fig.supxlabel('perimeter_diff', y=0.02)
-        fig.supylabel('probability / actual qlft pass')
-        fig.suptitle(
-            f'Custom LR perimeter_diff diagnostics (page {page_idx + 1}/{num_pages})',
-            y=0.992
-        )
-        fig.tight_layout(rect=[0, 0.07, 1, 0.88])
 
-        output_path = os.path.join(
-            images_dir,
-            f"{timestamp}_custom_perimeter_diff_diagnostics_page_{page_idx + 1}.png"
-        )
-        if _should_upload_visual_artifacts_to_s3():
-            buf = io.BytesIO()
-            fig.savefig(buf, format='png')
-            buf.seek(0)
-            output_key = (
-                f"mask_recommender/models/{timestamp}/"
-                f"{timestamp}_custom_perimeter_diff_diagnostics_page_{page_idx + 1}.png"
-            )
-            uploaded_uri = _best_effort_visual_upload(
-                lambda: _upload_png_bytes_to_s3(buf.getvalue(), output_key),
-                f"custom perimeter diff diagnostics page {page_idx + 1}",
-                fallback_artifact=None,
-            )
-            if uploaded_uri:
-                artifact_paths.append(uploaded_uri)
-        else:
-            fig.savefig(output_path)
-            logging.info("Saved custom perimeter diff diagnostics to %s", output_path)
-            artifact_paths.append(output_path)
-        plt.close(fig)
-
-    probe_points_path = os.path.join(images_dir, f"{timestamp}_custom_perimeter_diff_probe_points.json")
-    if _should_upload_visual_artifacts_to_s3():
-        probe_points_key = f"mask_recommender/models/{timestamp}/{timestamp}_custom_perimeter_diff_probe_points.json"
-        _best_effort_visual_upload(
-            lambda: _upload_json_to_s3(probe_point_rows, probe_points_key),
-            "custom perimeter diff probe points",
-            fallback_artifact=None,
+def _run_custom_lr_diagnostics(
+    timestamp,
+    train_losses,
+    val_losses,
+    cross_validation_metrics,
+    roc_inputs,
+    cleaned_fit_tests,
+    parameters,
+    category_metadata,
+    mask_data,
+    base_url,
+    render_workers=None,
+    s3_client=None,
+):
+    """
+    The diagnostics stage: build every figure spec, then render and publish
+    them through diagnostics.publish_diagnostics. Returns the metrics artifact
+    fields and the stage timings.
+    """
+    started = time.perf_counter()
+    perimeter_figures, probe_point_rows = _perimeter_diff_diagnostic_figures(
+        cleaned_fit_tests=cleaned_fit_tests,
+        parameters=parameters,
+        category_metadata=category_metadata,
+        timestamp=timestamp,
+        mask_data=mask_data,
+        base_url=base_url,
+    )
+    figures = [
+        figure
+        for figure in (
+            _training_loss_figure(train_losses, val_losses, timestamp),
+            _cross_validation_top_k_hit_rate_figure(cross_validation_metrics, timestamp),
+            _roc_figure(*roc_inputs, timestamp),
         )
-    else:
-        with open(probe_points_path, 'w', encoding='utf-8') as handle:
-            json.dump(probe_point_rows, handle, indent=2)
-        logging.info("Saved custom perimeter diff probe points to %s", probe_points_path)
+        if figure is not None
+    ] + perimeter_figures
+    documents = []
+    if perimeter_figures:
+        documents.append({
+            'name': 'perimeter_diff_probe_points',
+            'filename': f"{timestamp}_custom_perimeter_diff_probe_points.json",
+            'payload': probe_point_rows,
+        })
+    build_seconds = time.perf_counter() - started
+
+    artifacts, timings = publish_diagnostics(
+        figures,
+        _diagnostics_publisher(timestamp, client=s3_client),
+        documents=documents,
+        render_workers=render_workers,
+    )
+    perimeter_artifacts = [artifacts.get(figure['name']) for figure in perimeter_figures]
+    fields = {
+        'training_loss_artifact': artifacts.get('training_loss'),
+        'cross_validation_top_k_hit_rate_artifact': artifacts.get('cross_validation_top_k_hit_rates'),
+        'roc_auc_artifact': artifacts.get('roc_auc'),
+        'perimeter_diff_diagnostics_artifacts': [artifact for artifact in perimeter_artifacts if artifact],
+    }
+    return fields, {'build_specs': build_seconds, **timings}
 
-    return artifact_paths
+
+def _run_custom_lr_diagnostics_stage(metrics, **diagnostics_kwargs):
+    """
+    Run _run_custom_lr_diagnostics and record its artifacts and status in
+    ``metrics``. The model is already live by then, so nothing in the stage
+    (building specs, probe logins, rendering, uploads) may fail the run: any
+    error is logged and recorded as ``metrics['diagnostics']['status'] ==
+    'failed'``.
+    """
+    try:
+        artifacts, timings = _run_custom_lr_diagnostics(**diagnostics_kwargs)
+    except Exception as exc:  # noqa: BLE001 - diagnostics are best effort
+        logging.exception("Diagnostics stage failed; the published model is unaffected.")
+        metrics['diagnostics'] = {'status': 'failed', 'error': f"{type(exc).__name__}: {exc}"}
+        return metrics
+    metrics.update(artifacts)
+    metrics['diagnostics'] = {'status': 'published', 'timings': timings}
+    logging.info("Published custom diagnostics in %.1fs", timings['render_and_publish'])
+    return metrics
 
 
 def train_custom_lr_with_split(
@@ -2090,12 +2080,29 @@ def train_custom_lr_with_split(
     epochs=50,
     learning_rate=0.01,
     class_weighting=False,
+    optimizer_name='adam',
+    early_stopping_patience=0,
+    convergence_tolerance=0.0,
+    initial_params=None,
 ):
+    """
+    Train custom_lr on ``train_idx`` and score ``val_idx`` after every epoch,
+    starting from ``initial_params`` when given (warm start).
+
+    ``optimizer_name='lbfgs'`` runs one full-batch L-BFGS step (up to
+    LBFGS_MAX_ITER iterations with a strong-Wolfe line search) per epoch and
+    ignores ``learning_rate``. Training stops before ``epochs`` when
+    _custom_lr_stop_reason says so; ``epochs_used`` and ``stop_reason`` in the
+    result record why.
+    """
+    if optimizer_name not in CUSTOM_LR_OPTIMIZERS:
+        raise ValueError(f"Unknown optimizer {optimizer_name!r}; expected one of {CUSTOM_LR_OPTIMIZERS}.")
     data = prep_data_in_torch_with_categories(
         cleaned_fit_tests,
         mask_categories=_custom_lr_mask_categories(category_metadata),
         style_categories=category_metadata['style_categories'],
         strap_categories=category_metadata['strap_type_categories'],
+        layout='index',
     )
     target = torch.tensor(
         pd.to_numeric(cleaned_fit_tests['qlft_pass_normalized'], errors='coerce').fillna(0).to_numpy(dtype=np.float32)
@@ -2106,11 +2113,18 @@ def train_custom_lr_with_split(
     y_train = target[train_idx]
     y_val = target[val_idx]
 
-    params = _initialize_custom_lr_parameters(category_metadata)
-    optimizer = torch.optim.Adam(list(params.values()), lr=learning_rate)
+    if initial_params is None:
+        params = _initialize_custom_lr_parameters(category_metadata)
+    else:
+        params = {key: value.detach().clone().requires_grad_() for key, value in initial_params.items()}
+    if optimizer_name == 'lbfgs':
+        optimizer = torch.optim.LBFGS(list(params.values()), max_iter=LBFGS_MAX_ITER, line_search_fn='strong_wolfe')
+    else:
+        optimizer = torch.optim.Adam(list(params.values()), lr=learning_rate)
     loss_fn = torch.nn.BCELoss(reduction='none')
     train_losses = []
     val_losses = []
+    stop_reason = None
 
     pos_count = float(y_train.sum().item())
     neg_count = float((1 - y_train).sum().item())
@@ -2125,17 +2139,24 @@ def train_custom_lr_with_split(
     )
     if class_weighting:
         logging.info("Class weighting enabled.")
+        class_weights = torch.where(y_train == 1, pos_weight_tensor, torch.tensor(1.0, dtype=torch.float32))
+    else:
+        class_weights = torch.ones_like(y_train)
 
-    for epoch in range(epochs):
+    def closure():
         optimizer.zero_grad()
         train_probs = calc_preds(train_data, params)
-        if class_weighting:
-            class_weights = torch.where(y_train == 1, pos_weight_tensor, torch.tensor(1.0, dtype=torch.float32))
-        else:
-            class_weights = torch.ones_like(y_train)
         loss = (loss_fn(train_probs, y_train) * class_weights).mean()
         loss.backward()
-        optimizer.step()
+        return loss
+
+    for epoch in range(epochs):
+        if optimizer_name == 'lbfgs':
+            # step() returns the loss from its first closure call, i.e. before the update.
+            loss = optimizer.step(closure)
+        else:
+            loss = closure()
+            optimizer.step()
         train_losses.append(float(loss.item()))
 
         with torch.no_grad():
@@ -2164,6 +2185,16 @@ def train_custom_lr_with_split(
                     recall,
                 )
 
+        stop_reason = _custom_lr_stop_reason(
+            train_losses,
+            val_losses,
+            early_stopping_patience=early_stopping_patience,
+            convergence_tolerance=convergence_tolerance,
+        )
+        if stop_reason:
+            logging.info("custom_lr stopped after epoch=%s (%s).", epoch + 1, stop_reason)
+            break
+
     with torch.no_grad():
         final_train_probs = calc_preds(train_data, params).squeeze(1).cpu().numpy()
         final_val_probs = calc_preds(val_data, params).squeeze(1).cpu().numpy()
@@ -2176,14 +2207,244 @@ def train_custom_lr_with_split(
         'val_probs': final_val_probs,
         'y_train': y_train.squeeze(1).cpu().numpy(),
         'y_val': y_val.squeeze(1).cpu().numpy(),
+        'epochs_used': len(train_losses),
+        'stop_reason': stop_reason,
+    }
+
+
+def _keep_batched_job_slices(params, optimizer, keep):
+    """
+    Stacked parameters and an Adam optimizer for only the ``keep`` positions,
+    carrying over each kept slice's moments so it continues its trajectory.
+    """
+    keep = torch.tensor(keep, dtype=torch.long)
+    kept_params = {key: value.detach()[keep].clone().requires_grad_() for key, value in params.items()}
+    kept_optimizer = torch.optim.Adam(list(kept_params.values()), **optimizer.defaults)
+    for key, value in params.items():
+        state = optimizer.state.get(value, {})
+        # Per-element moments follow their slice; the shared step count stays.
+        kept_optimizer.state[kept_params[key]] = {
+            name: state_value[keep].clone() if torch.is_tensor(state_value) and state_value.dim() > 0
+            else state_value
+            for name, state_value in state.items()
+        }
+    return kept_params, kept_optimizer
+
+
+def train_custom_lr_jobs_batched(
+    jobs,
+    cleaned_fit_tests,
+    category_metadata,
+    epochs=50,
+    learning_rate=0.01,
+    class_weighting=False,
+    optimizer_name='adam',
+):
+    """
+    Train every job in one tensor program: the K parameter sets are stacked
+    along a leading dimension, each job's rows are selected with a (K, rows)
+    mask, and one Adam loop updates all of them from a single calc_preds call
+    per epoch. Returns the same results by job name as
+    train_custom_lr_with_split.
+
+    Jobs share no parameters, so each slice gets exactly its own gradient, and
+    Adam is elementwise, so each slice follows its per-job trajectory. Results
+    match the per-job runs up to float summation order.
+
+    The forward pass at the start of an epoch scores every row with the
+    parameters from the previous step, so it also yields the previous epoch's
+    validation loss; one extra no-grad pass after the loop gives the last one.
+    A job that stops early keeps a snapshot of its parameters and scores from
+    that pass and its slice (with its Adam moments) leaves the stack, so the
+    remaining epochs only train the jobs still running; the loop ends once
+    every job has stopped.
+
+    L-BFGS's line search couples every parameter it optimizes, so only Adam
+    can be batched.
+    """
+    if optimizer_name != 'adam':
+        raise ValueError(f"Batched custom_lr training supports the adam optimizer only, not {optimizer_name!r}.")
+    data = prep_data_in_torch_with_categories(
+        cleaned_fit_tests,
+        mask_categories=_custom_lr_mask_categories(category_metadata),
+        style_categories=category_metadata['style_categories'],
+        strap_categories=category_metadata['strap_type_categories'],
+        layout='index',
+    )
+    target = torch.tensor(
+        pd.to_numeric(cleaned_fit_tests['qlft_pass_normalized'], errors='coerce').fillna(0).to_numpy(dtype=np.float32)
+    )
+    row_count = target.shape[0]
+
+    initial_params = []
+    for job in jobs:
+        torch.manual_seed(job.seed)
+        default_params = _initialize_custom_lr_parameters(category_metadata)
+        initial_params.append(default_params if job.initial_params is None else job.initial_params)
+    params = {
+        key: torch.stack([job_params[key].detach() for job_params in initial_params]).requires_grad_()
+        for key in initial_params[0]
     }
+    job_epochs = [epochs if job.epochs is None else job.epochs for job in jobs]
+
+    train_masks = torch.zeros((len(jobs), row_count), dtype=torch.float32)
+    val_masks = torch.zeros((len(jobs), row_count), dtype=torch.float32)
+    class_weights = torch.ones((len(jobs), row_count), dtype=torch.float32)
+    for job_number, job in enumerate(jobs):
+        train_idx = _as_row_index_tensor(job.train_idx)
+        val_idx = _as_row_index_tensor(job.val_idx)
+        train_masks[job_number, train_idx] = 1.0
+        val_masks[job_number, val_idx] = 1.0
+        if class_weighting:
+            y_train = target[train_idx]
+            pos_count = float(y_train.sum().item())
+            neg_count = float((1 - y_train).sum().item())
+            pos_weight = (neg_count / pos_count) if pos_count > 0 else 1.0
+            class_weights[job_number] = torch.where(target == 1, torch.tensor(pos_weight), torch.tensor(1.0))
+    train_weights = class_weights * train_masks / train_masks.sum(axis=1, keepdim=True).clamp(min=1.0)
+    val_weights = class_weights * val_masks / val_masks.sum(axis=1, keepdim=True).clamp(min=1.0)
+
+    logging.info(
+        "Training %s custom_lr jobs batched over %s rows (%s).",
+        len(jobs),
+        row_count,
+        ", ".join(job.name for job in jobs),
+    )
+    optimizer = torch.optim.Adam(list(params.values()), lr=learning_rate)
+    loss_fn = torch.nn.BCELoss(reduction='none')
+    stacked_targets = target.expand(len(jobs), row_count)
+    train_losses = [[] for _ in jobs]
+    val_losses = [[] for _ in jobs]
+    # Job numbers still training, in the order of the stacked parameter slices.
+    active = list(range(len(jobs)))
+    stopped = {}
+
+    def finish_epoch(probs):
+        """
+        Record the previous epoch's validation losses from ``probs``, stop
+        finished jobs and return the stack positions of the jobs still training.
+        """
+        with torch.no_grad():
+            epoch_val_losses = (loss_fn(probs, stacked_targets) * val_weights).sum(axis=1).tolist()
+        keep = []
+        for position, job_number in enumerate(active):
+            job = jobs[job_number]
+            val_losses[job_number].append(epoch_val_losses[position])
+            stop_reason = _custom_lr_stop_reason(
+                train_losses[job_number],
+                val_losses[job_number],
+                early_stopping_patience=job.early_stopping_patience,
+                convergence_tolerance=job.convergence_tolerance,
+            )
+            if stop_reason or len(train_losses[job_number]) >= job_epochs[job_number]:
+                stopped[job_number] = (
+                    stop_reason,
+                    {key: value[position].detach().clone() for key, value in params.items()},
+                    probs[position].detach().clone(),
+                )
+                logging.info(
+                    "custom_lr job=%s stopped after epoch=%s (%s).",
+                    job.name,
+                    len(train_losses[job_number]),
+                    stop_reason or 'epoch budget',
+                )
+            else:
+                keep.append(position)
+        return keep
+
+    for epoch in range(max(job_epochs, default=0)):
+        optimizer.zero_grad()
+        probs = calc_preds(data, params).squeeze(-1)
+        keep = list(range(len(active)))
+        if epoch > 0:
+            keep = finish_epoch(probs.detach())
+            if not keep:
+                active = []
+                break
+        job_losses = (loss_fn(probs, stacked_targets) * train_weights).sum(axis=1)
+        # Summing keeps each job's gradient independent of the others.
+        job_losses.sum().backward()
+        optimizer.step()
+        epoch_train_losses = job_losses.detach().tolist()
+        for position in keep:
+            train_losses[active[position]].append(epoch_train_losses[position])
+        if len(keep) < len(active):
+            # Stopped jobs leave the stack, so later epochs only compute the jobs still training.
+            params, optimizer = _keep_batched_job_slices(params, optimizer, keep)
+            train_weights = train_weights[keep]
+            val_weights = val_weights[keep]
+            stacked_targets = target.expand(len(keep), row_count)
+            active = [active[position] for position in keep]
+
+    if active:
+        with torch.no_grad():
+            final_probs = calc_preds(data, params).squeeze(-1)
+        if max(job_epochs, default=0) > 0:
+            finish_epoch(final_probs)
+
+    results = {}
+    for job_number, job in enumerate(jobs):
+        for epoch, (train_loss, val_loss) in enumerate(zip(train_losses[job_number], val_losses[job_number])):
+            if (epoch + 1) % 10 == 0 or epoch == 0:
+                logging.info(
+                    "custom_lr job=%s epoch=%s train_loss=%.4f val_loss=%.4f",
+                    job.name,
+                    epoch + 1,
+                    train_loss,
+                    val_loss,
+                )
+        if job_number in stopped:
+            stop_reason, job_params, job_probs = stopped[job_number]
+        else:
+            stop_reason = None
+            job_params = {key: value[job_number].detach().clone() for key, value in params.items()}
+            job_probs = final_probs[job_number]
+        train_idx = _as_row_index_tensor(job.train_idx)
+        val_idx = _as_row_index_tensor(job.val_idx)
+        results[job.name] = {
+            'params': job_params,
+            'train_losses': train_losses[job_number],
+            'val_losses': val_losses[job_number],
+            'train_probs': job_probs[train_idx].cpu().numpy(),
+            'val_probs': job_probs[val_idx].cpu().numpy(),
+            'y_train': target[train_idx].cpu().numpy(),
+            'y_val': target[val_idx].cpu().numpy(),
+            'epochs_used': len(train_losses[job_number]),
+            'stop_reason': stop_reason,
+        }
+    return results
+
+
+def run_ingestion_fetches(fetches):
+    """
+    Run independent, zero-argument fetches ({name: fn}) on a thread pool.
+
+    Returns (results, timings): each fetch's return value and its wall-clock
+    seconds, plus the 'total' for the whole phase, which is close to the
+    slowest fetch rather than the sum. The first failure is re-raised once
+    every fetch has finished.
+    """
+    def timed(fn):
+        started = time.perf_counter()
+        result = fn()
+        return result, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(len(fetches), 1)) as executor:
+        futures = {name: executor.submit(timed, fn) for name, fn in fetches.items()}
+    results = {}
+    timings = {}
+    for name, future in futures.items():
+        results[name], timings[name] = future.result()
+    timings['total'] = time.perf_counter() - started
+    return results, timings
+
 
 def main(argv=None):
     parser = argparse.ArgumentParser(description='Train fit predictor model.')
     parser.add_argument('--epochs', type=int, default=600, help='Number of training epochs.')
     parser.add_argument('--learning-rate', type=float, default=0.00005, help='Learning rate for optimizer.')
     parser.add_argument('--model-type', default='custom_lr', choices=['custom_lr'], help='Model type to train.')
-    parser.add_argument('--loss-plot', default='python/mask_recommender/training_loss.png', help='Path to save training loss plot.')
     parser.add_argument('--class-reweight', action='store_true', help='Reweight loss by class balance.')
     parser.add_argument('--cv-folds', type=int, default=5, help='Number of grouped user cross-validation folds for reporting.')
     parser.add_argument('--random-seed', type=int, default=42, help='Random seed for grouped holdout assignment and model initialization.')
@@ -2200,7 +2461,88 @@ def main(argv=None):
         help='Disable full-dataset retraining before artifact save.',
     )
     parser.set_defaults(retrain_with_full=True)
+    parser.add_argument(
+        '--cv-workers',
+        type=int,
+        default=1,
+        help=(
+            'Processes for training CV folds, the holdout split and the full retrain concurrently '
+            '(default 1 = serial, 0 = one per CPU). Each spawned worker re-imports this script with torch, '
+            'sklearn and matplotlib, which costs seconds, so only use more than one when each fold trains '
+            'for longer than that. Falls back to serial where process pools are unavailable.'
+        ),
+    )
+    parser.add_argument(
+        '--batched-cv',
+        action='store_true',
+        help=(
+            'Train CV folds, the holdout split and the full retrain as one batched tensor program '
+            'in a single process (ignores --cv-workers).'
+        ),
+    )
+    parser.add_argument(
+        '--optimizer',
+        default='adam',
+        choices=CUSTOM_LR_OPTIMIZERS,
+        help='adam, or full-batch lbfgs with a strong-Wolfe line search (ignores --learning-rate).',
+    )
+    parser.add_argument(
+        '--early-stopping-patience',
+        type=int,
+        default=0,
+        help='Stop CV folds and the holdout split after this many epochs without a lower val loss (0 = off).',
+    )
+    parser.add_argument(
+        '--convergence-tolerance',
+        type=float,
+        default=0.0,
+        help='Stop the full-dataset retrain once an epoch changes train loss by at most this fraction (0 = off).',
+    )
+    parser.add_argument(
+        '--warm-start',
+        action='store_true',
+        help=(
+            'Start the full-dataset retrain from the model custom_latest.json points at, mapped onto '
+            'the current categories, and fine-tune it for --warm-start-epochs.'
+        ),
+    )
+    parser.add_argument(
+        '--warm-start-epochs',
+        type=int,
+        default=100,
+        help='Epochs for the warm-started full-dataset retrain.',
+    )
+    parser.add_argument(
+        '--warm-start-skip-cv',
+        action='store_true',
+        help=(
+            'With --warm-start, skip the cross-validation folds. Evaluation never warm-starts (it would '
+            'start from a model trained on its validation users), so the folds otherwise train cold '
+            'for the full --epochs; the holdout split still runs to pick the threshold.'
+        ),
+    )
+    parser.add_argument(
+        '--no-diagnostics',
+        action='store_false',
+        dest='diagnostics',
+        help='Skip rendering and publishing the diagnostics figures after the model is published.',
+    )
+    parser.add_argument(
+        '--diagnostics-workers',
+        type=int,
+        default=None,
+        help=(
+            'Processes for rendering diagnostics figures (default 1 = serial, 0 = one per CPU, at most 4). '
+            'Spawned workers re-import this script, so a pool only pays off for many figures.'
+        ),
+    )
     args = parser.parse_args(argv)
+    if args.batched_cv and args.optimizer != 'adam':
+        parser.error('--batched-cv supports --optimizer adam only.')
+    if args.warm_start and not args.retrain_with_full:
+        parser.error('--warm-start applies to the full-dataset retrain; drop --no-retrain-with-full.')
+    if args.warm_start_skip_cv and not args.warm_start:
+        parser.error('--warm-start-skip-cv requires --warm-start.')
     # [ ] Get a table of users and facial features
     # [ ] Get a table of masks and perimeters
 
@@ -2231,15 +2573,33 @@ def main(argv=None):
     masks_url = f"{base_url}/masks.json?per_page=1000"
 
     session = build_session(None)
-    logging.info("Fetching fit test payload from Breathesafe.")
-    fit_tests_payload = fetch_facial_measurements_fit_tests(
-        base_url=base_url,
-        session=session,
-    )
-    fit_tests_df = pd.DataFrame(fit_tests_payload)
-
-    logging.info("Fetching masks payload from %s", masks_url)
-    masks_df = get_masks(session, masks_url)
+    export_cache = default_export_cache()
+    email = os.getenv('BREATHESAFE_SERVICE_EMAIL')
+    password = os.getenv('BREATHESAFE_SERVICE_PASSWORD')
+    logging.info("Fetching fit tests, masks (%s) and imputed fit tests from Breathesafe.", masks_url)
+    ingested, ingestion_timings = run_ingestion_fetches({
+        # Only the raw row count is logged; the rows used for training come
+        # from predict_arkit_from_traditional.
+        'fit_tests': lambda: fetch_fit_tests_frame(
+            base_url=base_url,
+            session=session,
+            cache=export_cache,
+            columns=['id'],
+        ),
+        'masks': lambda: get_masks(session, masks_url, cache=export_cache),
+        'predict_arkit_from_traditional': lambda: predict_arkit_from_traditional(
+            base_url=base_url,
+            email=email,
+            password=password,
+            cache=export_cache,
+        ),
+    })
+    ingestion_requests = session.timing_summary()
+    logging.info("Ingestion timings (seconds): %s", ingestion_timings)
+    logging.info("Ingestion requests: %s", ingestion_requests)
+    fit_tests_df = ingested['fit_tests']
+    masks_df = ingested['masks']
+    fit_tests_with_imputed_arkit_via_traditional_facial_measurements = ingested['predict_arkit_from_traditional']
     mask_candidates = build_mask_candidates(masks_df)
     model_config = TrainModelConfig(
         outer_dim=_set_num_masks_times_num_bins_plus_other_features(mask_candidates)
@@ -2248,14 +2608,6 @@ def main(argv=None):
         "num_masks_times_num_bins_plus_other_features=%s",
         model_config.outer_dim
     )
-    email = os.getenv('BREATHESAFE_SERVICE_EMAIL')
-    password = os.getenv('BREATHESAFE_SERVICE_PASSWORD')
-
-    fit_tests_with_imputed_arkit_via_traditional_facial_measurements = predict_arkit_from_traditional(
-        base_url=base_url,
-        email=email,
-        password=password
-    )
     logging.info(
         "Fetched/imputed fit tests rows=%s raw_fit_tests_rows=%s",
         fit_tests_with_imputed_arkit_via_traditional_facial_measurements.shape[0],
@@ -2284,13 +2636,19 @@ def main(argv=None):
     )
     mask_empirical_priors = compute_mask_empirical_priors(filtered_fit_tests)
     mask_candidates = attach_mask_empirical_priors_to_masks(mask_candidates, mask_empirical_priors)
+    # Mask-side training features come from the masks table, as mask data does
+    # at inference, not from the mask columns joined onto each fit test.
+    mask_features = build_mask_feature_store(
+        attach_mask_empirical_priors_to_masks(masks_df, mask_empirical_priors)
+    )
 
     cleaned_fit_tests = prepare_training_data(
         fit_tests_with_imputed_arkit_via_traditional_facial_measurements,
         mask_empirical_priors=mask_empirical_priors,
         use_facial_perimeter=False,
         use_diff_perimeter_bins=False,
-        use_diff_perimeter_mask_bins=False
+        use_diff_perimeter_mask_bins=False,
+        mask_features=mask_features
     )
 
     logging.info(
@@ -2298,6 +2656,7 @@ def main(argv=None):
         cleaned_fit_tests.shape[0],
         fit_tests_with_imputed_arkit_via_traditional_facial_measurements.shape[0]
     )
+    logging.info("Mask code parse cache: %s", MASK_CODE_CACHE.stats())
 
     if cleaned_fit_tests.empty:
         logging.warning("No fit tests available after filtering. Exiting.")
@@ -2305,14 +2664,12 @@ def main(argv=None):
 
     timestamp = datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')
     category_metadata = _custom_lr_category_metadata(cleaned_fit_tests)
-    cross_validation_metrics = _cross_validate_custom_lr(
-        cleaned_fit_tests,
-        category_metadata=category_metadata,
-        epochs=args.epochs,
-        learning_rate=args.learning_rate,
-        class_weighting=args.class_reweight,
-        num_folds=args.cv_folds,
-        random_seed=args.random_seed,
+    previous_model = _load_previous_custom_lr_model() if args.warm_start else None
+    skip_cross_validation = previous_model is not None and args.warm_start_skip_cv
+    cross_validation_jobs = [] if skip_cross_validation else _cross_validation_jobs(
+        _group_k_fold_indices_by_user(cleaned_fit_tests, num_folds=args.cv_folds),
+        args.random_seed,
+        early_stopping_patience=args.early_stopping_patience,
     )
     train_idx, val_idx = _group_train_val_indices_by_user(
         cleaned_fit_tests,
@@ -2342,16 +2699,57 @@ def main(argv=None):
         int(val_idx.numel()),
     )
 
-    torch.manual_seed(args.random_seed)
-    custom_result = train_custom_lr_with_split(
+    # CV folds, the holdout split and the full retrain are independent and
+    # each seeds torch itself, so they can train concurrently.
+    training_jobs = cross_validation_jobs + [
+        CustomLrTrainingJob(
+            'holdout',
+            train_idx,
+            val_idx,
+            args.random_seed,
+            early_stopping_patience=args.early_stopping_patience,
+        ),
+    ]
+    warm_start = None
+    if args.retrain_with_full:
+        # The full retrain has no held-out rows to be patient on, so it stops
+        # on training-loss convergence instead.
+        full_idx = torch.arange(cleaned_fit_tests.shape[0])
+        full_job = CustomLrTrainingJob(
+            'full_dataset',
+            full_idx,
+            full_idx,
+            args.random_seed + 10_000,
+            convergence_tolerance=args.convergence_tolerance,
+        )
+        if previous_model is not None:
+            warm_start = _warm_start_full_dataset_job(
+                full_job,
+                previous_model,
+                category_metadata,
+                args.warm_start_epochs,
+                evaluation={'epochs': int(args.epochs), 'cross_validation_skipped': skip_cross_validation},
+            )
+        training_jobs.append(full_job)
+    training_results = run_custom_lr_training_jobs(
+        training_jobs,
         cleaned_fit_tests,
-        train_idx=train_idx,
-        val_idx=val_idx,
-        category_metadata=category_metadata,
+        category_metadata,
         epochs=args.epochs,
         learning_rate=args.learning_rate,
         class_weighting=args.class_reweight,
+        workers=args.cv_workers,
+        batched=args.batched_cv,
+        optimizer_name=args.optimizer,
+    )
+    cross_validation_metrics = _summarize_cross_validation_jobs(
+        cleaned_fit_tests,
+        cross_validation_jobs,
+        training_results,
     )
+    if skip_cross_validation:
+        cross_validation_metrics['skipped'] = 'warm_start_skip_cv'
+    custom_result = training_results['holdout']
 
     params = custom_result['params']
     train_losses = custom_result['train_losses']
@@ -2372,16 +2770,7 @@ def main(argv=None):
         len(deduped_val_frame),
     )
 
-    best_threshold = 0.5
-    best_f1 = 0.0
-    if deduped_val_probs.size:
-        threshold_grid = np.arange(0.05, 0.96, 0.01)
-        for candidate in threshold_grid:
-            candidate_preds = (deduped_val_probs >= candidate).astype(float)
-            candidate_f1 = f1_score(deduped_val_labels, candidate_preds, zero_division=0)
-            if candidate_f1 > best_f1:
-                best_f1 = candidate_f1
-                best_threshold = float(candidate)
+    best_threshold, best_f1 = best_f1_threshold(deduped_val_labels, deduped_val_probs)
     logging.info("Selected threshold=%.2f with val_f1=%.3f", best_threshold, best_f1)
     holdout_top_k_metrics = _compute_top_k_hit_rates(
         deduped_val_frame,
@@ -2397,254 +2786,206 @@ def main(argv=None):
 
     saved_model_scope = 'split_train'
     if args.retrain_with_full:
-        logging.info("Retraining custom_lr model on full dataset for artifact save.")
-        full_idx = torch.arange(cleaned_fit_tests.shape[0])
-        torch.manual_seed(args.random_seed + 10_000)
-        full_result = train_custom_lr_with_split(
-            cleaned_fit_tests,
-            train_idx=full_idx,
-            val_idx=full_idx,
-            category_metadata=category_metadata,
-            epochs=args.epochs,
-            learning_rate=args.learning_rate,
-            class_weighting=args.class_reweight,
-        )
+        logging.info("Using custom_lr model retrained on full dataset for artifact save.")
+        full_result = training_results['full_dataset']
         params = full_result['params']
         saved_model_scope = 'full_dataset'
 
     prefix = f"mask_recommender/models/{timestamp}"
-    params_path = f"/tmp/mask_recommender_custom_params_{timestamp}.pt"
-    torch.save(params, params_path)
-    params_key = f"{prefix}/custom_model_params.pt"
-    params_uri = _upload_file_to_s3(params_path, params_key)
-
-    mask_data = {}
-    for _, row in masks_df.iterrows():
-        mask_id = row.get('id')
-        if pd.isna(mask_id):
-            continue
-        fit_family_id = pd.to_numeric(row.get('fit_family_id'), errors='coerce')
-        mask_data[str(int(mask_id))] = {
-            'id': int(mask_id),
-            'fit_family_id': int(fit_family_id) if pd.notna(fit_family_id) else None,
-            'unique_internal_model_code': row.get('unique_internal_model_code', ''),
-            'brand_model': derive_brand_model(
-                row.get('unique_internal_model_code', ''),
-                row.get('current_state')
-            ),
-            'perimeter_mm': row.get('perimeter_mm', None),
-            'strap_type': row.get('strap_type', ''),
-            'style': row.get('style', ''),
-            **mask_empirical_priors.get(int(mask_id), {}),
-        }
-
-    mask_data_key = f"{prefix}/custom_mask_data.json"
-    mask_data_uri = _upload_json_to_s3(mask_data, mask_data_key)
-
-    def predict_custom(inference_rows):
-        return _predict_custom_lr_probabilities(
-            inference_rows,
-            parameters=params,
-            category_metadata=category_metadata,
-        )
+    with _artifact_publisher() as publisher:
+        params_path = f"/tmp/mask_recommender_custom_params_{timestamp}.pt"
+        torch.save(params, params_path)
+        params_key = f"{prefix}/custom_model_params.pt"
+        params_uri = publisher.uri(params_key)
+        publisher.upload_file(params_path, params_key)
+
+        mask_data = {}
+        for _, row in masks_df.iterrows():
+            mask_id = row.get('id')
+            if pd.isna(mask_id):
+                continue
+            fit_family_id = pd.to_numeric(row.get('fit_family_id'), errors='coerce')
+            mask_data[str(int(mask_id))] = {
+                'id': int(mask_id),
+                'fit_family_id': int(fit_family_id) if pd.notna(fit_family_id) else None,
+                'unique_internal_model_code': row.get('unique_internal_model_code', ''),
+                'brand_model': MASK_CODE_CACHE.get(
+                    row.get('unique_internal_model_code', ''),
+                    row.get('current_state')
+                )['brand_model'],
+                'perimeter_mm': row.get('perimeter_mm', None),
+                'strap_type': row.get('strap_type', ''),
+                'style': row.get('style', ''),
+                **mask_empirical_priors.get(int(mask_id), {}),
+            }
+
+        mask_data_key = f"{prefix}/custom_mask_data.json"
+        mask_data_uri = publisher.uri(mask_data_key)
+        publisher.put_json(mask_data_key, mask_data)
+
+        def predict_custom(inference_rows):
+            return _predict_custom_lr_probabilities(
+                inference_rows,
+                parameters=params,
+                category_metadata=category_metadata,
+            )
 
-    images_dir = _images_output_dir()
-    os.makedirs(images_dir, exist_ok=True)
-    recommendations_path = os.path.join(images_dir, f"custom_recommendations_{timestamp}.json")
-    recommendation_preview = build_recommendation_preview(
-        user_ids=[99, 101],
-        fit_tests_df=fit_tests_with_imputed_arkit_via_traditional_facial_measurements,
-        mask_candidates=mask_candidates,
-        predict_fn=predict_custom,
-        output_path=None if _should_upload_visual_artifacts_to_s3() else recommendations_path,
-        threshold=best_threshold,
-    )
-    recommendations_artifact = recommendations_path
-    if _should_upload_visual_artifacts_to_s3():
-        recommendations_key = f"mask_recommender/models/{timestamp}/custom_recommendations_{timestamp}.json"
-        recommendations_uri = _best_effort_visual_upload(
-            lambda: _upload_json_to_s3(recommendation_preview, recommendations_key),
-            "custom recommendation preview",
-            fallback_artifact=None,
+        images_dir = _images_output_dir()
+        os.makedirs(images_dir, exist_ok=True)
+        recommendations_path = os.path.join(images_dir, f"custom_recommendations_{timestamp}.json")
+        recommendation_preview = build_recommendation_preview(
+            user_ids=[99, 101],
+            fit_tests_df=fit_tests_with_imputed_arkit_via_traditional_facial_measurements,
+            mask_candidates=mask_candidates,
+            predict_fn=predict_custom,
+            output_path=None if _should_upload_visual_artifacts_to_s3() else recommendations_path,
+            threshold=best_threshold,
         )
-        recommendations_artifact = recommendations_uri
-    else:
-        logging.info("Saved recommendation preview to %s", recommendations_path)
-
-    loss_plot_artifact = None
-    if train_losses:
-        loss_plot_path = os.path.join(images_dir, f"{timestamp}_custom_training_loss.png")
-        plt.figure(figsize=(8, 4))
-        epochs_range = range(1, len(train_losses) + 1)
-        plt.plot(epochs_range, train_losses, label='train loss')
-        if val_losses:
-            plt.plot(epochs_range, val_losses, label='val loss')
-        plt.xlabel('Epoch')
-        plt.ylabel('Loss')
-        plt.title('Custom LR Training Loss')
-        plt.grid(True, linestyle='--', alpha=0.4)
-        plt.legend()
-        plt.tight_layout()
-        loss_plot_artifact = loss_plot_path
+        recommendations_artifact = recommendations_path
         if _should_upload_visual_artifacts_to_s3():
-            loss_buf = io.BytesIO()
-            plt.savefig(loss_buf, format='png')
-            loss_buf.seek(0)
-            loss_plot_key = f"mask_recommender/models/{timestamp}/{timestamp}_custom_training_loss.png"
-            loss_plot_uri = _best_effort_visual_upload(
-                lambda: _upload_png_bytes_to_s3(loss_buf.getvalue(), loss_plot_key),
-                "custom training loss plot",
+            recommendations_key = f"mask_recommender/models/{timestamp}/custom_recommendations_{timestamp}.json"
+            recommendations_uri = _best_effort_visual_upload(
+                lambda: publisher.put_json(recommendations_key, recommendation_preview, required=False).result(),
+                "custom recommendation preview",
                 fallback_artifact=None,
             )
-            loss_plot_artifact = loss_plot_uri
+            recommendations_artifact = recommendations_uri
         else:
-            plt.savefig(loss_plot_path)
-            logging.info("Saved training loss plot to %s", loss_plot_path)
-        plt.close()
+            logging.info("Saved recommendation preview to %s", recommendations_path)
 
-    cross_validation_top_k_hit_rate_artifact = _build_cross_validation_top_k_hit_rate_plot(
-        cross_validation_metrics,
-        timestamp,
-    )
-
-    perimeter_diff_diagnostics_artifacts = _build_custom_lr_perimeter_diff_diagnostics(
-        cleaned_fit_tests=cleaned_fit_tests,
-        parameters=params,
-        category_metadata=category_metadata,
-        timestamp=timestamp,
-        mask_data=mask_data,
-        base_url=base_url,
-    )
-
-    roc_plot_path = os.path.join(images_dir, f"{timestamp}_custom_roc_auc.png")
-    plt.figure(figsize=(8, 4))
-    try:
-        train_fpr, train_tpr, _ = roc_curve(train_labels, train_probs)
-        train_auc = auc(train_fpr, train_tpr)
-        plt.plot(train_fpr, train_tpr, label=f'train (AUC={train_auc:.3f})', linewidth=2)
-    except ValueError:
-        train_auc = None
-        logging.warning("Skipping custom train ROC curve due to missing class labels.")
-    try:
-        val_fpr, val_tpr, _ = roc_curve(deduped_val_labels, deduped_val_probs)
-        val_auc = auc(val_fpr, val_tpr)
-        plt.plot(val_fpr, val_tpr, label=f'validation (AUC={val_auc:.3f})', linewidth=2)
-    except ValueError:
-        val_auc = None
-        logging.warning("Skipping custom validation ROC curve due to missing class labels.")
-    plt.plot([0, 1], [0, 1], linestyle='--', color='gray')
-    plt.xlabel('False Positive Rate')
-    plt.ylabel('True Positive Rate')
-    plt.title('Custom LR ROC-AUC Curves')
-    plt.grid(True, linestyle='--', alpha=0.4)
-    plt.legend()
-    plt.tight_layout()
-    roc_plot_artifact = roc_plot_path
-    if _should_upload_visual_artifacts_to_s3():
-        roc_buf = io.BytesIO()
-        plt.savefig(roc_buf, format='png')
-        roc_buf.seek(0)
-        roc_plot_key = f"mask_recommender/models/{timestamp}/{timestamp}_custom_roc_auc.png"
-        roc_plot_uri = _best_effort_visual_upload(
-            lambda: _upload_png_bytes_to_s3(roc_buf.getvalue(), roc_plot_key),
-            "custom ROC plot",
-            fallback_artifact=None,
+        try:
+            roc_auc = roc_auc_score(deduped_val_labels, deduped_val_probs)
+        except ValueError:
+            roc_auc = None
+        val_preds = (deduped_val_probs >= best_threshold).astype(float)
+        val_precision = precision_score(deduped_val_labels, val_preds, zero_division=0)
+        val_recall = recall_score(deduped_val_labels, val_preds, zero_division=0)
+
+        metrics = {
+            'timestamp': timestamp,
+            'environment': _env_name(),
+            'model_type': 'custom_lr',
+            'threshold': best_threshold,
+            'roc_auc': roc_auc,
+            'val_f1': best_f1,
+            'val_precision': val_precision,
+            'val_recall': val_recall,
+            'train_samples': int(len(train_labels)),
+            'val_samples': int(len(val_labels)),
+            'deduped_val_samples': int(len(deduped_val_labels)),
+            'train_users': int(len(train_user_ids)),
+            'val_users': int(len(val_user_ids)),
+            'random_seed': int(args.random_seed),
+            'cross_validation': cross_validation_metrics,
+            'holdout_top_k': holdout_top_k_metrics,
+            'holdout_top_3_any_fit': holdout_top_3_any_fit_metrics,
+            'losses': train_losses,
+            'val_losses': val_losses,
+            'optimizer': args.optimizer,
+            'epochs': int(args.epochs),
+            'early_stopping_patience': int(args.early_stopping_patience),
+            'convergence_tolerance': float(args.convergence_tolerance),
+            'epochs_used': {name: int(result['epochs_used']) for name, result in training_results.items()},
+            'stop_reasons': {name: result['stop_reason'] for name, result in training_results.items()},
+            'warm_start': warm_start,
+            'ingestion_timings': ingestion_timings,
+            'ingestion_requests': ingestion_requests,
+            'recommendations_artifact': recommendations_artifact,
+            # Filled in by the diagnostics stage, which runs after custom_latest.json is written.
+            'training_loss_artifact': None,
+            'cross_validation_top_k_hit_rate_artifact': None,
+            'roc_auc_artifact': None,
+            'perimeter_diff_diagnostics_artifacts': [],
+            'diagnostics': {'status': 'pending' if args.diagnostics else 'skipped'},
+            'retrain_with_full': bool(args.retrain_with_full),
+            'saved_model_training_scope': saved_model_scope,
+            'validation_metrics_source': 'grouped_user_split_deduped_validation',
+            'split_strategy': 'grouped_by_user_id',
+            'validation_deduping': 'drop_exact_duplicates_excluding_id_and_created_at',
+            'cross_validation_strategy': 'group_k_fold_by_user_id',
+            'top_k_metric_definition': 'per-user hit rate among users with at least one positive held-out fit test',
+            'top_3_any_fit_metric_definition': 'per-user probability that at least one of the top 3 tested recommendations fits; evaluated on users with at least 3 held-out tested masks',
+        }
+        metrics_key = f"{prefix}/custom_metrics.json"
+        metrics_uri = publisher.uri(metrics_key)
+        publisher.put_json(metrics_key, metrics)
+
+        metadata = {
+            'timestamp': timestamp,
+            'environment': _env_name(),
+            'model_type': 'custom_lr',
+            'threshold': best_threshold,
+            'retrain_with_full': bool(args.retrain_with_full),
+            'saved_model_training_scope': saved_model_scope,
+            'random_seed': int(args.random_seed),
+            'warm_started_from': warm_start['from_timestamp'] if warm_start else None,
+            'validation_metrics_source': 'grouped_user_split_deduped_validation',
+            'split_strategy': 'grouped_by_user_id',
+            'validation_deduping': 'drop_exact_duplicates_excluding_id_and_created_at',
+            'cross_validation_strategy': 'group_k_fold_by_user_id',
+            'cross_validation_folds': cross_validation_metrics.get('num_folds', 0),
+            **category_metadata,
+        }
+        metadata_key = f"{prefix}/custom_model_metadata.json"
+        metadata_uri = publisher.uri(metadata_key)
+        publisher.put_json(metadata_key, metadata)
+        bundle_path = f"/tmp/mask_recommender_custom_model_{timestamp}.bundle"
+        write_custom_lr_bundle(bundle_path, params, metadata, mask_data)
+        bundle_key = f"{prefix}/{BUNDLE_FILENAME}"
+        bundle_uri = publisher.uri(bundle_key)
+        publisher.upload_file(bundle_path, bundle_key)
+        local_artifact_dir = _save_local_custom_artifacts(
+            timestamp=timestamp,
+            params=params,
+            metadata=metadata,
+            mask_data=mask_data,
+            metrics=metrics,
         )
-        roc_plot_artifact = roc_plot_uri
-    else:
-        plt.savefig(roc_plot_path)
-        logging.info("Saved ROC-AUC plot to %s", roc_plot_path)
-    plt.close()
 
-    try:
-        roc_auc = roc_auc_score(deduped_val_labels, deduped_val_probs)
-    except ValueError:
-        roc_auc = None
-    val_preds = (deduped_val_probs >= best_threshold).astype(float)
-    val_precision = precision_score(deduped_val_labels, val_preds, zero_division=0)
-    val_recall = recall_score(deduped_val_labels, val_preds, zero_division=0)
-
-    metrics = {
-        'timestamp': timestamp,
-        'environment': _env_name(),
-        'model_type': 'custom_lr',
-        'threshold': best_threshold,
-        'roc_auc': roc_auc,
-        'val_f1': best_f1,
-        'val_precision': val_precision,
-        'val_recall': val_recall,
-        'train_samples': int(len(train_labels)),
-        'val_samples': int(len(val_labels)),
-        'deduped_val_samples': int(len(deduped_val_labels)),
-        'train_users': int(len(train_user_ids)),
-        'val_users': int(len(val_user_ids)),
-        'random_seed': int(args.random_seed),
-        'cross_validation': cross_validation_metrics,
-        'holdout_top_k': holdout_top_k_metrics,
-        'holdout_top_3_any_fit': holdout_top_3_any_fit_metrics,
-        'losses': train_losses,
-        'val_losses': val_losses,
-        'recommendations_artifact': recommendations_artifact,
-        'training_loss_artifact': loss_plot_artifact,
-        'cross_validation_top_k_hit_rate_artifact': cross_validation_top_k_hit_rate_artifact,
-        'roc_auc_artifact': roc_plot_artifact,
-        'perimeter_diff_diagnostics_artifacts': perimeter_diff_diagnostics_artifacts,
-        'retrain_with_full': bool(args.retrain_with_full),
-        'saved_model_training_scope': saved_model_scope,
-        'validation_metrics_source': 'grouped_user_split_deduped_validation',
-        'split_strategy': 'grouped_by_user_id',
-        'validation_deduping': 'drop_exact_duplicates_excluding_id_and_created_at',
-        'cross_validation_strategy': 'group_k_fold_by_user_id',
-        'top_k_metric_definition': 'per-user hit rate among users with at least one positive held-out fit test',
-        'top_3_any_fit_metric_definition': 'per-user probability that at least one of the top 3 tested recommendations fits; evaluated on users with at least 3 held-out tested masks',
-    }
-    metrics_key = f"{prefix}/custom_metrics.json"
-    metrics_uri = _upload_json_to_s3(metrics, metrics_key)
-
-    metadata = {
-        'timestamp': timestamp,
-        'environment': _env_name(),
-        'model_type': 'custom_lr',
-        'threshold': best_threshold,
-        'retrain_with_full': bool(args.retrain_with_full),
-        'saved_model_training_scope': saved_model_scope,
-        'random_seed': int(args.random_seed),
-        'validation_metrics_source': 'grouped_user_split_deduped_validation',
-        'split_strategy': 'grouped_by_user_id',
-        'validation_deduping': 'drop_exact_duplicates_excluding_id_and_created_at',
-        'cross_validation_strategy': 'group_k_fold_by_user_id',
-        'cross_validation_folds': cross_validation_metrics.get('num_folds', 0),
-        **category_metadata,
-    }
-    metadata_key = f"{prefix}/custom_model_metadata.json"
-    metadata_uri = _upload_json_to_s3(metadata, metadata_key)
-    local_artifact_dir = _save_local_custom_artifacts(
-        timestamp=timestamp,
-        params=params,
-        metadata=metadata,
-        mask_data=mask_data,
-        metrics=metrics,
-    )
-
-    latest_payload = {
-        'timestamp': timestamp,
-        'model_type': 'custom_lr',
-        'params_key': params_key,
-        'params_uri': params_uri,
-        'metadata_key': metadata_key,
-        'metadata_uri': metadata_uri,
-        'mask_data_key': mask_data_key,
-        'mask_data_uri': mask_data_uri,
-        'metrics_key': metrics_key,
-        'metrics_uri': metrics_uri,
-        'local_artifact_dir': str(local_artifact_dir),
-    }
-    latest_key = "mask_recommender/models/custom_latest.json"
-    latest_uri = _upload_json_to_s3(latest_payload, latest_key)
-    logging.info("Uploaded custom model params to %s", params_uri)
-    logging.info("Uploaded custom metadata to %s", metadata_uri)
-    logging.info("Uploaded custom metrics to %s", metrics_uri)
-    logging.info("Updated custom latest pointer at %s", latest_uri)
+        latest_payload = {
+            'timestamp': timestamp,
+            'model_type': 'custom_lr',
+            'params_key': params_key,
+            'params_uri': params_uri,
+            'metadata_key': metadata_key,
+            'metadata_uri': metadata_uri,
+            'mask_data_key': mask_data_key,
+            'mask_data_uri': mask_data_uri,
+            'metrics_key': metrics_key,
+            'metrics_uri': metrics_uri,
+            'bundle_key': bundle_key,
+            'bundle_uri': bundle_uri,
+            'local_artifact_dir': str(local_artifact_dir),
+        }
+        # Written only once every object it references has been uploaded.
+        latest_uri = publisher.publish_pointer(CUSTOM_LATEST_KEY, latest_payload)
+        logging.info("Uploaded custom model params to %s", params_uri)
+        logging.info("Uploaded custom metadata to %s", metadata_uri)
+        logging.info("Uploaded custom metrics to %s", metrics_uri)
+        logging.info("Updated custom latest pointer at %s", latest_uri)
+
+        if args.diagnostics:
+            _run_custom_lr_diagnostics_stage(
+                metrics,
+                timestamp=timestamp,
+                train_losses=train_losses,
+                val_losses=val_losses,
+                cross_validation_metrics=cross_validation_metrics,
+                roc_inputs=(train_labels, train_probs, deduped_val_labels, deduped_val_probs),
+                cleaned_fit_tests=cleaned_fit_tests,
+                parameters=params,
+                category_metadata=category_metadata,
+                mask_data=mask_data,
+                base_url=base_url,
+                render_workers=args.diagnostics_workers,
+                s3_client=publisher.client,
+            )
+            (local_artifact_dir / 'custom_metrics.json').write_text(json.dumps(metrics, indent=2), encoding='utf-8')
+            try:
+                publisher.put_json(metrics_key, metrics, required=False).result()
+            except Exception as exc:  # noqa: BLE001 - the first metrics upload already succeeded
+                logging.warning("Could not re-upload %s with the diagnostics results: %s", metrics_uri, exc)
+    logging.info("Artifact uploads: %s", publisher.timing_summary())
     return latest_payload
 
 
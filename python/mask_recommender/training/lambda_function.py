@@ -41,6 +41,26 @@ def _build_train_argv(event):
         argv.append('--class-reweight')
     if event.get('retrain_with_full'):
         argv.append('--retrain-with-full')
+    if event.get('cv_workers') is not None:
+        argv.extend(['--cv-workers', str(event['cv_workers'])])
+    if event.get('batched_cv'):
+        argv.append('--batched-cv')
+    if event.get('optimizer'):
+        argv.extend(['--optimizer', str(event['optimizer'])])
+    if event.get('early_stopping_patience') is not None:
+        argv.extend(['--early-stopping-patience', str(event['early_stopping_patience'])])
+    if event.get('convergence_tolerance') is not None:
+        argv.extend(['--convergence-tolerance', str(event['convergence_tolerance'])])
+    if event.get('warm_start'):
+        argv.append('--warm-start')
+    if event.get('warm_start_epochs') is not None:
+        argv.extend(['--warm-start-epochs', str(event['warm_start_epochs'])])
+    if event.get('warm_start_skip_cv'):
+        argv.append('--warm-start-skip-cv')
+    if event.get('no_diagnostics'):
+        argv.append('--no-diagnostics')
+    if event.get('diagnostics_workers') is not None:
+        argv.extend(['--diagnostics-workers', str(event['diagnostics_workers'])])
     return argv
 
 def handler(event, context):
@@ -220,6 +220,19 @@ def _upload_file_to_s3(local_path: str, key: str) -> str:
     return f"s3://{bucket}/{key}"
 
 
+def _copy_s3_object(source_key: str, key: str) -> str:
+    """Server-side copy within the bucket, for "latest" aliases of an uploaded artifact."""
+    if _is_test_env():
+        return f"file://{source_key}"
+    bucket = _s3_bucket()
+    s3 = boto3.client('s3', region_name=_s3_region())
+    try:
+        s3.copy_object(Bucket=bucket, Key=key, CopySource={'Bucket': bucket, 'Key': source_key})
+    except ClientError as e:
+        raise RuntimeError(f"Failed to copy s3://{bucket}/{source_key} to s3://{bucket}/{key}: {e}")
+    return f"s3://{bucket}/{key}"
+
+
 def save_trace(
     trace,
     trace_path='pymc_trace.nc'
@@ -235,7 +248,7 @@ def save_trace(
     uri = _upload_file_to_s3(tmp_path, key)
     # Also update the environment-specific "latest" pointer
     latest_key = f"{_s3_prefix()}/models/pymc_trace_latest.nc"
-    _upload_file_to_s3(tmp_path, latest_key)
+    _copy_s3_object(key, latest_key)
     print(f"Uploaded trace to {uri}")
     return uri
 
@@ -387,7 +400,7 @@ def save_mask_data_for_inference(mask_id_to_idx, df, filename='mask_data.json'):
     key = f"{_s3_prefix()}/artifacts/{os.path.basename(filename)}"
     uri = _upload_file_to_s3(tmp_path, key)
     latest_key = f"{_s3_prefix()}/models/mask_data_latest.json"
-    _upload_file_to_s3(tmp_path, latest_key)
+    _copy_s3_object(key, latest_key)
     print(f"Uploaded mask metadata to {uri}")
     return uri
 
@@ -409,7 +422,7 @@ def save_scaler_for_inference(scaler, filename='scaler.json'):
     key = f"{_s3_prefix()}/artifacts/{os.path.basename(filename)}"
     uri = _upload_file_to_s3(tmp_path, key)
     latest_key = f"{_s3_prefix()}/models/scaler_latest.json"
-    _upload_file_to_s3(tmp_path, latest_key)
+    _copy_s3_object(key, latest_key)
     print(f"Uploaded scaler to {uri}")
     return uri
 